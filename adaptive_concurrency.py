@@ -0,0 +1,185 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Control Adaptativo de Concurrencia (AIMD)
+=========================================
+
+Ajusta en caliente el número de peticiones de segmentos en vuelo según
+lo que el servidor de origen soporta realmente:
+
+- Incremento aditivo mientras el throughput medido siga creciendo
+- Reducción multiplicativa ante respuestas 429/503, errores o latencia inflada
+
+El límite actual y el motivo del último ajuste se exponen con snapshot()
+para mostrarlos en el progreso de la descarga.
+"""
+
+import threading
+import time
+from typing import Callable, Dict, List, Optional
+
+# Códigos HTTP que indican que el servidor pide bajar el ritmo
+THROTTLE_STATUS_CODES = (429, 503)
+
+
+class AdaptiveConcurrencyController:
+    """Limitador AIMD de peticiones concurrentes compartido por los workers de una descarga"""
+
+    def __init__(self, initial_limit: int, min_limit: int = 2, max_limit: int = 200,
+                 increase_step: int = 2, decrease_factor: float = 0.7,
+                 window_seconds: float = 2.0, min_samples: int = 8,
+                 log_function: Optional[Callable[[str], None]] = None):
+        self.min_limit = max(1, min_limit)
+        self.max_limit = max(self.min_limit, max_limit)
+        self.increase_step = increase_step
+        self.decrease_factor = decrease_factor
+        self.window_seconds = window_seconds
+        self.min_samples = min_samples
+        self.log_function = log_function
+
+        self._limit = min(max(initial_limit, self.min_limit), self.max_limit)
+        self._reason = 'inicial'
+        self._in_flight = 0
+        self._condition = threading.Condition()
+
+        # Métricas de la ventana actual
+        self._window_start = time.time()
+        self._window_latencies: List[float] = []
+        self._window_bytes = 0
+        self._window_errors = 0
+        self._window_throttled = 0
+        self._window_saturated = False
+
+        # Referencias entre ventanas
+        self._last_throughput = 0.0
+        self._baseline_latency: Optional[float] = None
+        self._adjustments = 0
+
+    @property
+    def limit(self) -> int:
+        return self._limit
+
+    @property
+    def reason(self) -> str:
+        return self._reason
+
+    def acquire(self) -> None:
+        """Bloquea hasta que haya hueco dentro del límite actual"""
+        with self._condition:
+            while self._in_flight >= self._limit:
+                self._condition.wait()
+            self._in_flight += 1
+            if self._in_flight >= self._limit:
+                self._window_saturated = True
+
+    def try_acquire(self) -> bool:
+        """Versión no bloqueante de acquire (para el backend asyncio)"""
+        with self._condition:
+            if self._in_flight >= self._limit:
+                return False
+            self._in_flight += 1
+            if self._in_flight >= self._limit:
+                self._window_saturated = True
+            return True
+
+    def release(self, latency: float, bytes_count: int = 0, status_code: Optional[int] = None,
+                error: bool = False) -> None:
+        """Registra el resultado de una petición y libera su hueco"""
+        with self._condition:
+            self._in_flight = max(0, self._in_flight - 1)
+            self._window_latencies.append(latency)
+            self._window_bytes += bytes_count
+            if status_code in THROTTLE_STATUS_CODES:
+                self._window_throttled += 1
+            elif error:
+                self._window_errors += 1
+
+            now = time.time()
+            if now - self._window_start >= self.window_seconds and len(self._window_latencies) >= self.min_samples:
+                self._evaluate_window(now)
+            self._condition.notify_all()
+
+    def abandon(self) -> None:
+        """
+        Libera el hueco de una petición abandonada sin contarla en la ventana.
+
+        El perdedor de una carrera de hedging (o la petición cancelada) no dice nada
+        de la salud del origen: contarlo como error o como latencia rezagada haría
+        que activar el hedging redujera la concurrencia con un servidor sano.
+        """
+        with self._condition:
+            self._in_flight = max(0, self._in_flight - 1)
+            self._condition.notify_all()
+
+    def set_bounds(self, min_limit: Optional[int] = None, max_limit: Optional[int] = None) -> None:
+        """Cambia los límites en caliente (por ejemplo, al cambiar el modo de velocidad)"""
+        with self._condition:
+            if min_limit is not None:
+                self.min_limit = max(1, min_limit)
+            if max_limit is not None:
+                self.max_limit = max(self.min_limit, max_limit)
+            clamped = min(max(self._limit, self.min_limit), self.max_limit)
+            if clamped != self._limit:
+                self._set_limit(clamped, 'límites actualizados')
+            self._condition.notify_all()
+
+    def snapshot(self) -> Dict[str, object]:
+        """Estado serializable para el payload de progreso"""
+        with self._condition:
+            return {
+                'limit': self._limit,
+                'reason': self._reason,
+                'in_flight': self._in_flight,
+                'min_limit': self.min_limit,
+                'max_limit': self.max_limit,
+                'throughput_mbps': round(self._last_throughput / (1024 * 1024), 2),
+                'baseline_latency': round(self._baseline_latency, 3) if self._baseline_latency else None,
+                'adjustments': self._adjustments
+            }
+
+    def _evaluate_window(self, now: float) -> None:
+        """Decide el nuevo límite a partir de la ventana cerrada (con el lock tomado)"""
+        samples = len(self._window_latencies)
+        duration = max(now - self._window_start, 1e-6)
+        throughput = self._window_bytes / duration
+        latencies = sorted(self._window_latencies)
+        median_latency = latencies[samples // 2]
+        error_rate = self._window_errors / samples
+
+        if self._baseline_latency is None or median_latency < self._baseline_latency:
+            self._baseline_latency = median_latency
+        else:
+            # Dejar que la referencia suba lentamente si la red cambia
+            self._baseline_latency = self._baseline_latency * 0.95 + median_latency * 0.05
+
+        if self._window_throttled:
+            self._set_limit(int(self._limit * 0.5), f'{self._window_throttled} respuestas 429/503 del servidor')
+        elif error_rate > 0.05:
+            self._set_limit(int(self._limit * self.decrease_factor), f'tasa de error {error_rate * 100:.0f}%')
+        elif (median_latency > self._baseline_latency * 2.5
+              and throughput <= self._last_throughput * 1.05):
+            self._set_limit(int(self._limit * 0.9), f'latencia inflada ({median_latency:.2f}s)')
+        elif self._window_saturated and throughput >= self._last_throughput * 0.95:
+            self._set_limit(self._limit + self.increase_step, 'throughput creciente')
+        else:
+            self._reason = 'estable'
+
+        self._last_throughput = throughput
+        self._window_start = now
+        self._window_latencies = []
+        self._window_bytes = 0
+        self._window_errors = 0
+        self._window_throttled = 0
+        self._window_saturated = self._in_flight >= self._limit
+
+    def _set_limit(self, new_limit: int, reason: str) -> None:
+        new_limit = min(max(new_limit, self.min_limit), self.max_limit)
+        self._reason = reason
+        if new_limit == self._limit:
+            return
+        old_limit = self._limit
+        self._limit = new_limit
+        self._adjustments += 1
+        if self.log_function:
+            arrow = '⬆️' if new_limit > old_limit else '⬇️'
+            self.log_function(f"{arrow} Concurrencia {old_limit} -> {new_limit} ({reason})")
@@ -15,13 +15,15 @@ Propósito: Descifrado de contenido multimedia académico
 
 import os
 import struct
-import requests
 import urllib3
 from typing import Dict, List, Optional, Tuple, Callable
 from Crypto.Cipher import AES
 from Crypto.Util.Padding import unpad
 import logging
 
+from http_pool import shared_session
+from m3u8_playlist import parse_playlist
+
 # Suprimir warnings SSL
 urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
 
@@ -30,8 +32,8 @@ class AESDecryptor:
     
     def __init__(self):
         self.logger = logging.getLogger(__name__)
-        self.session = requests.Session()
-        self.session.verify = False
+        # Conexiones compartidas con el resto de descargas del proceso
+        self.session = shared_session(verify=False)
         
         # Cache de claves descargadas
         self.key_cache = {}
@@ -305,45 +307,20 @@ class AESDecryptor:
         # TS válido tiene entropía media (no muy alta como datos encriptados, no muy baja como datos constantes)
         return 0.3 <= entropy_ratio <= 0.8
     
-    def extract_keys_from_m3u8(self, m3u8_content: str) -> List[Dict]:
-        """Extrae información de claves de encriptación del contenido M3U8"""
-        keys = []
-        lines = m3u8_content.split('\n')
-        
-        for line in lines:
-            line = line.strip()
-            if line.startswith('#EXT-X-KEY:'):
-                key_info = self._parse_key_line(line)
-                if key_info:
-                    keys.append(key_info)
-        
-        return keys
-    
-    def _parse_key_line(self, key_line: str) -> Optional[Dict]:
-        """Parsea una línea #EXT-X-KEY"""
-        try:
-            # Extraer atributos de la línea
-            attributes = {}
-            parts = key_line.replace('#EXT-X-KEY:', '').split(',')
-            
-            for part in parts:
-                if '=' in part:
-                    key, value = part.split('=', 1)
-                    # Remover comillas si existen
-                    value = value.strip('"')
-                    attributes[key.strip()] = value
-            
-            # Verificar que tenga los campos requeridos
-            if 'METHOD' in attributes and 'URI' in attributes:
-                return {
-                    'method': attributes['METHOD'],
-                    'uri': attributes['URI'],
-                    'iv': attributes.get('IV', '')
-                }
-        except Exception as e:
-            self.logger.error(f"Error parseando línea de clave: {e}")
+    def extract_keys_from_m3u8(self, m3u8_content: str, base_url: str = '') -> List[Dict]:
+        """
+        Extrae información de claves de encriptación del contenido M3U8
         
-        return None
+        Args:
+            m3u8_content (str): Texto de la playlist
+            base_url (str): URL de la playlist para resolver URIs relativas ('' las deja como están)
+        """
+        # Solo las claves con URI (METHOD=NONE no trae clave que descargar)
+        return [
+            {'method': key.method, 'uri': key.uri, 'iv': key.iv or ''}
+            for key in parse_playlist(m3u8_content, base_url).keys
+            if key.uri
+        ]
 
 
 def create_aes_decryptor():
@@ -9,6 +9,19 @@ from datetime import datetime
 from subprocess import run as subprocess_run, CalledProcessError
 from flask import Flask, render_template_string, request, send_file, jsonify
 from m3u8_downloader import M3U8Downloader
+from atomic_output import discard, prepare_staging, publish
+from bandwidth_limiter import get_bandwidth_limiter
+from http_pool import get_shared_pool, shared_session
+from live_recorder import LiveRecorder
+from manifest_cache import get_manifest_cache
+from m3u8_playlist import parse_playlist
+from merge_checkpoint import CheckpointedMerge
+from preflight import DownloadEstimate, find_disk_shortage
+from renditions import mux_command
+from segment_scheduler import get_global_scheduler
+from state_store import get_state_store
+from streaming_merge import StreamingMerger
+from ts_concat import concat_ts_segments
 import urllib3
 # Suprimir warnings de SSL no verificado
 urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
@@ -32,8 +45,66 @@ except ImportError as e:
 MAX_WORKERS_NORMAL = 30      # Modo normal (para usar internet simultáneamente)
 MAX_WORKERS_TURBO = 100      # Modo turbo (velocidad máxima)
 
-# Modo de velocidad por defecto ('normal' o 'turbo')
-DEFAULT_SPEED_MODE = 'normal'
+# Modo automático: arranca con MAX_WORKERS_NORMAL y ajusta (AIMD) entre estos límites
+# según throughput, latencia y respuestas 429/errores del servidor
+MIN_WORKERS_AUTO = 4
+MAX_WORKERS_AUTO = 300
+
+# Modo de velocidad por defecto ('normal', 'turbo' o 'auto')
+DEFAULT_SPEED_MODE = 'auto'
+
+# Backend de descarga de segmentos: 'threads' (un hilo por segmento en vuelo)
+# o 'asyncio' (un único event loop por descarga, requiere aiohttp)
+SEGMENT_BACKEND = 'threads'
+
+# Pool HTTP compartido por todas las descargas (conexiones TLS reutilizadas entre descargas)
+HTTP_POOL_MAX_CONNECTIONS = 600   # Conexiones en uso a la vez en todo el proceso
+HTTP_POOL_MAX_PER_HOST = 300      # Conexiones en uso a la vez contra un mismo host
+
+# Planificador global de segmentos (backend de hilos): un único pool de workers
+# que se reparte entre todas las descargas activas en lugar de un pool por descarga
+GLOBAL_SEGMENT_WORKERS = 300      # Presupuesto total de workers para todas las descargas
+SEGMENT_SCHEDULER_POLICY = 'fair' # 'fair' (reparto ponderado por prioridad) o 'priority' (estricto)
+
+# Hedging: duplicar las peticiones de segmento que superan un percentil de latencia
+HEDGE_SLOW_SEGMENTS = False       # True: activa las peticiones duplicadas
+HEDGE_PERCENTILE = 0.95           # Percentil de latencia a partir del cual se duplica
+HEDGE_BUDGET = 0.05               # Máximo de peticiones duplicadas (fracción de las totales)
+
+# Límite de ancho de banda (token bucket sobre los bytes recibidos, sin reducir workers)
+BANDWIDTH_LIMIT_MBPS = 0          # Límite global en MB/s (0 = sin límite)
+BANDWIDTH_SCHEDULE = []           # Franjas con su propio límite, ej: [{'start': '09:00', 'end': '18:00', 'mbps': 5}]
+
+# Unión en streaming: ffmpeg recibe por stdin los segmentos en orden mientras se descargan
+# (si no puede completarse se usa la unión clásica con filelist.txt; con pistas alternativas
+# de audio/subtítulos se usa siempre la unión clásica, que las multiplexa en la misma pasada)
+STREAMING_MERGE = False
+# Unión clásica: 'concat_list' (filelist.txt + demuxer concat de ffmpeg) o
+# 'ts_concat' (copia binaria en el kernel a un único .ts que ffmpeg remuxea)
+MERGE_STRATEGY = 'concat_list'
+# Unión incremental con checkpoints: el prefijo contiguo se añade a merged.ts durante la
+# descarga y al reanudar solo se procesa la cola nueva (no compatible con STREAMING_MERGE)
+INCREMENTAL_MERGE = False
+MERGE_CHECKPOINT_EVERY = 50       # Segmentos entre checkpoints (fsync + merge_checkpoint.json)
+
+# Caché de playlists compartida por todas las rutas (revalidación con ETag/Last-Modified)
+MANIFEST_CACHE_TTL = 30           # Segundos que una playlist VOD/maestra se sirve sin preguntar al servidor
+MANIFEST_CACHE_MAX_MB = 16        # Tamaño máximo de la caché (expulsión LRU)
+
+# Grabación de directos: duración máxima por defecto de cada grabación en minutos (0 = hasta
+# #EXT-X-ENDLIST o hasta que se detenga) y remux final del .ts grabado a MP4
+LIVE_MAX_DURATION_MINUTES = 0
+LIVE_REMUX_TO_MP4 = True
+
+# Estimación previa del tamaño (suma de #EXTINF, BANDWIDTH y HEAD de algunos segmentos) y
+# admisión por espacio libre en temp_segments/ y static/ antes de descargar
+PREFLIGHT_SIZE_SAMPLES = 5        # Segmentos consultados con HEAD (0 = solo BYTERANGE/BANDWIDTH)
+DISK_ADMISSION = 'queue'          # 'queue' (esperar a que otras descargas liberen espacio), 'refuse' u 'off'
+DISK_MIN_FREE_MB = 512            # Espacio que debe quedar libre con la descarga terminada
+DISK_WAIT_TIMEOUT_MINUTES = 30    # Espera máxima en cola por espacio antes de dar error
+
+# Buffer de escritura de cada segmento en disco (menos syscalls con segmentos grandes)
+SEGMENT_WRITE_BUFFER = 1024 * 1024
 
 # Organización automática de archivos por fecha
 AUTO_ORGANIZE_BY_DATE = True  # True: crea carpetas como "static/2024-01/"
@@ -43,7 +114,8 @@ ENABLE_DETAILED_LOGGING = True  # True: muestra más información durante descar
 
 # Otras configuraciones
 MAX_CONCURRENT_DOWNLOADS = 5
-DEFAULT_QUALITY = 'best'  # best, 1080p, 720p, 480p
+DEFAULT_QUALITY = 'best'  # best, worst, 1080p, 720p, 480p o auto (según el caudal medido)
+AUTO_QUALITY_TIME_BUDGET_MINUTES = 15  # Modo 'auto': mejor variante que se descargaría en este tiempo
 
 # Configuración de logging
 ENABLE_FILE_LOGGING = True  # True: guarda logs en archivos TXT
@@ -56,12 +128,36 @@ LOG_RETENTION_DAYS = 7  # Días que se mantienen los logs
 app = Flask(__name__)
 app.secret_key = 'supersecretkey'  # Cambia esto por una clave segura en producción
 
+# Límites del transporte HTTP compartido
+get_shared_pool().set_limits(max_connections=HTTP_POOL_MAX_CONNECTIONS, max_per_host=HTTP_POOL_MAX_PER_HOST)
+
+# Workers de segmentos compartidos por todas las descargas
+segment_scheduler = get_global_scheduler()
+segment_scheduler.set_budget(GLOBAL_SEGMENT_WORKERS)
+segment_scheduler.set_policy(SEGMENT_SCHEDULER_POLICY)
+
+# Límite de ancho de banda global y por descarga
+bandwidth_limiter = get_bandwidth_limiter()
+bandwidth_limiter.set_global_limit(BANDWIDTH_LIMIT_MBPS)
+bandwidth_limiter.set_schedule(BANDWIDTH_SCHEDULE)
+
+# Playlists compartidas entre /api/parse_master, /api/metadata, /analizar y las descargas
+manifest_cache = get_manifest_cache()
+manifest_cache.configure(ttl=MANIFEST_CACHE_TTL, max_bytes=MANIFEST_CACHE_MAX_MB * 1024 * 1024)
+
+# Estado de descargas y cola: SQLite en modo WAL con actualizaciones por descarga y por segmento
+# (la primera vez importa download_state.json)
+state_store = get_state_store()
+
 # Variables globales para el control de descargas
 multi_progress = {}
 cancelled_downloads = set()
 download_queue_storage = []  # Cola persistente
 queue_running = False
 current_speed_mode = DEFAULT_SPEED_MODE  # Variable global para el modo de velocidad
+active_downloaders = {}  # download_id -> M3U8Downloader en curso (para ajustes en caliente)
+stopped_recordings = set()  # Grabaciones en vivo detenidas por el usuario (lo grabado se conserva)
+disk_admission_lock = threading.Lock()  # Una decisión de admisión por disco a la vez
 
 # Directorios
 STATIC_DIR = 'static'
@@ -160,8 +256,11 @@ def log_info(message, download_id=None):
 
 def log_download_start(url, filename, mode, download_id=None):
     """Log inicio de descarga"""
-    workers = MAX_WORKERS_TURBO if mode == 'turbo' else MAX_WORKERS_NORMAL
-    log_info(f"🚀 Iniciando descarga en modo {mode.upper()} ({workers} workers)", download_id)
+    if mode == 'auto':
+        workers_label = f"adaptativo {MIN_WORKERS_AUTO}-{MAX_WORKERS_AUTO} workers"
+    else:
+        workers_label = f"{MAX_WORKERS_TURBO if mode == 'turbo' else MAX_WORKERS_NORMAL} workers"
+    log_info(f"🚀 Iniciando descarga en modo {mode.upper()} ({workers_label})", download_id)
     log_info(f"📁 Archivo: {filename}", download_id)
     log_info(f"🔗 URL: {url[:60]}{'...' if len(url) > 60 else ''}", download_id)
 
@@ -192,49 +291,151 @@ def get_organized_path(filename):
     else:
         return os.path.join(STATIC_DIR, filename)
 
+def get_unique_output_path(output_file):
+    """(nombre, ruta final) sin pisar un video existente: añade _1, _2... al nombre si hace falta"""
+    final_output_path = get_organized_path(output_file)
+    if os.path.exists(final_output_path):
+        base_name, extension = os.path.splitext(output_file)
+        counter = 1
+        while True:
+            test_filename = f"{base_name}_{counter}{extension}"
+            test_path = get_organized_path(test_filename)
+            if not os.path.exists(test_path):
+                return test_filename, test_path
+            counter += 1
+    return output_file, final_output_path
+
+def record_selected_variant(download_id, downloader):
+    """Guarda en multi_progress la variante elegida del master (y el caudal medido en modo 'auto')"""
+    variant = downloader.selected_variant
+    if variant is None:
+        return
+    progress = multi_progress[download_id]
+    progress['variant_url'] = variant.url
+    progress['variant_resolution'] = variant.resolution or ''
+    progress['variant_bandwidth'] = variant.bandwidth
+    if downloader.measured_throughput:
+        progress['measured_throughput_mbps'] = round(downloader.measured_throughput * 8 / 1_000_000, 2)
+
+def record_download_estimate(download_id, estimate):
+    """Guarda en multi_progress la duración y el tamaño esperados (estimación previa)"""
+    progress = multi_progress[download_id]
+    progress['expected_duration'] = round(estimate.duration, 1)
+    progress['expected_bytes'] = int(estimate.total_bytes) if estimate.total_bytes is not None else None
+    progress['size_estimate_method'] = estimate.method
+
+def pending_disk_needs(exclude_id):
+    """(directorio, bytes) que las demás descargas admitidas todavía van a escribir"""
+    temp_root = os.path.join(os.path.dirname(__file__), TEMP_DIR)
+    needs = []
+    for other_id, progress in list(multi_progress.items()):
+        if (other_id == exclude_id or progress.get('status') != 'downloading'
+                or progress.get('waiting_for_disk') or not progress.get('expected_bytes')):
+            continue
+        needs.append((temp_root, max(0, progress['expected_bytes'] - progress.get('bytes_downloaded', 0))))
+        if progress.get('final_output_path'):
+            needs.append((os.path.dirname(progress['final_output_path']), progress['expected_bytes']))
+    return needs
+
+def admit_download(download_id, needs, log_function):
+    """
+    Control de admisión por espacio en disco antes de descargar el primer segmento.
+    
+    Si no cabe y hay otras descargas en curso (que liberarán sus temporales al terminar),
+    espera en cola con DISK_ADMISSION = 'queue'; si no, la descarga queda en error reanudable.
+    
+    Returns:
+        bool: True si puede empezar (con False el estado ya refleja el motivo)
+    """
+    if DISK_ADMISSION == 'off':
+        return True
+    progress = multi_progress[download_id]
+    deadline = time.time() + DISK_WAIT_TIMEOUT_MINUTES * 60
+    while True:
+        with disk_admission_lock:
+            others = pending_disk_needs(download_id)
+            shortage = find_disk_shortage(needs + others, min_free_bytes=DISK_MIN_FREE_MB * 1024 * 1024)
+            if shortage is None:
+                if progress.pop('waiting_for_disk', None):
+                    log_function("✅ Ya hay espacio en disco: empieza la descarga")
+                return True
+        if download_id in cancelled_downloads or progress['status'] != 'downloading':
+            progress.pop('waiting_for_disk', None)
+            return False
+        if DISK_ADMISSION != 'queue' or not others or time.time() > deadline:
+            progress.pop('waiting_for_disk', None)
+            progress['status'] = 'error'
+            progress['error'] = shortage
+            progress['can_resume'] = True
+            log_function(f"💾 {shortage}")
+            save_download_state()
+            return False
+        if not progress.get('waiting_for_disk'):
+            progress['waiting_for_disk'] = True
+            log_function(f"⏳ {shortage}. En cola hasta que otras descargas liberen espacio")
+            save_download_state()
+        time.sleep(5)
+
 # Funciones para gestión de velocidad
 def get_current_workers():
-    """Obtiene el número de workers según el modo actual"""
+    """Obtiene el número máximo de workers según el modo actual"""
+    if current_speed_mode == 'auto':
+        return MAX_WORKERS_AUTO
     return MAX_WORKERS_TURBO if current_speed_mode == 'turbo' else MAX_WORKERS_NORMAL
 
+def get_initial_workers():
+    """Obtiene el número de workers con el que arranca una descarga"""
+    return MAX_WORKERS_NORMAL if current_speed_mode == 'auto' else get_current_workers()
+
+def parse_download_priority(value):
+    """Prioridad de una descarga para el planificador global (1 = normal, 10 = máxima)"""
+    try:
+        return max(1, min(10, int(value)))
+    except (TypeError, ValueError):
+        return 1
+
+def parse_bandwidth_limit(value):
+    """Límite de caudal en MB/s (None = sin límite)"""
+    try:
+        mbps = float(value)
+    except (TypeError, ValueError):
+        return None
+    return mbps if mbps > 0 else None
+
+def get_min_workers():
+    """Obtiene el mínimo de workers al que puede bajar el control adaptativo"""
+    return MIN_WORKERS_AUTO if current_speed_mode == 'auto' else min(MIN_WORKERS_AUTO, get_current_workers())
+
 # Funciones para persistencia
 def save_download_state():
-    """Guarda el estado de las descargas en un archivo JSON"""
-    import json
+    """Guarda el estado de las descargas (solo las filas que cambiaron) en la base de estado"""
     try:
-        state = {
-            'multi_progress': multi_progress,
-            'download_queue': download_queue_storage,
-            'queue_running': queue_running
-        }
-        with open('download_state.json', 'w', encoding='utf-8') as f:
-            json.dump(state, f, ensure_ascii=False, indent=2)
+        state_store.sync(multi_progress, download_queue_storage, queue_running)
     except Exception as e:
         print(f"Error guardando estado: {e}")
 
 def load_download_state():
-    """Carga el estado de las descargas desde un archivo JSON"""
-    import json
+    """Carga el estado de las descargas desde la base de estado"""
     global multi_progress, download_queue_storage, queue_running
     try:
-        if os.path.exists('download_state.json'):
-            with open('download_state.json', 'r', encoding='utf-8') as f:
-                state = json.load(f)
-                multi_progress = state.get('multi_progress', {})
-                download_queue_storage = state.get('download_queue', [])
-                queue_running = state.get('queue_running', False)
-                
-                # Limpiar descargas que ya no están activas
-                active_downloads = {}
-                for download_id, progress in multi_progress.items():
-                    if progress['status'] == 'downloading':
-                        # Marcar como pausada si estaba descargando
-                        progress['status'] = 'paused'
-                        progress['can_resume'] = True
-                    active_downloads[download_id] = progress
-                multi_progress = active_downloads
-                
-                print(f"Estado cargado: {len(multi_progress)} descargas, {len(download_queue_storage)} en cola")
+        multi_progress, download_queue_storage, queue_running = state_store.load()
+        
+        # Limpiar descargas que ya no están activas
+        active_downloads = {}
+        for download_id, progress in multi_progress.items():
+            if progress['status'] == 'downloading' and (progress.get('type') == 'live' or progress.get('is_live')):
+                # Un directo no se puede retomar: lo que se emitió mientras tanto ya no está
+                progress['status'] = 'error'
+                progress['error'] = 'Grabación interrumpida al cerrar la aplicación'
+                progress['can_resume'] = False
+            elif progress['status'] == 'downloading':
+                # Marcar como pausada si estaba descargando
+                progress['status'] = 'paused'
+                progress['can_resume'] = True
+            active_downloads[download_id] = progress
+        multi_progress = active_downloads
+        
+        print(f"Estado cargado: {len(multi_progress)} descargas, {len(download_queue_storage)} en cola")
     except Exception as e:
         print(f"Error cargando estado: {e}")
 
@@ -1180,7 +1381,8 @@ default_html = '''
                 <div class="mb-3">
                   <label class="form-label">Calidad preferida:</label>
                   <select class="form-control" id="quality-select" onchange="updateQuality(this.value)">
-                    <option value="auto">Automática</option>
+                    <option value="auto">Automática (según la conexión)</option>
+                    <option value="best">Máxima</option>
                     <option value="1080p">1080p</option>
                     <option value="720p">720p</option>
                     <option value="480p">480p</option>
@@ -1302,7 +1504,7 @@ let userConfig = {
     autoDownload: false,
     notifications: true,
     maxConcurrent: 5,
-    quality: 'auto'
+    quality: 'best'
 };
 
 // Objeto para trackear descargas activas para el cálculo de velocidad promedio
@@ -1368,10 +1570,11 @@ function updateQuality(value) {
 // ============================================================================
 
 // Variables globales para el selector de velocidad
-let currentSpeedMode = 'normal';
+let currentSpeedMode = 'auto';
 let speedModeData = {
     normal: { workers: 30, label: 'Normal', icon: '🐢' },
-    turbo: { workers: 100, label: 'Turbo', icon: '🚀' }
+    turbo: { workers: 100, label: 'Turbo', icon: '🚀' },
+    auto: { workers: 300, label: 'Auto', icon: '🧠' }
 };
 
 // Cargar modo de velocidad actual
@@ -1383,6 +1586,9 @@ async function loadSpeedMode() {
             currentSpeedMode = data.current_mode;
             speedModeData.normal.workers = data.modes.normal.workers;
             speedModeData.turbo.workers = data.modes.turbo.workers;
+            if (data.modes.auto) {
+                speedModeData.auto.workers = data.modes.auto.workers;
+            }
             updateSpeedModeUI();
         }
     } catch (error) {
@@ -1395,10 +1601,12 @@ function updateSpeedModeUI() {
     const mode = speedModeData[currentSpeedMode];
     document.getElementById('speed-mode-icon').textContent = mode.icon;
     document.getElementById('speed-mode-text').textContent = mode.label;
-    document.getElementById('speed-mode-workers').textContent = `(${mode.workers} workers)`;
+    document.getElementById('speed-mode-workers').textContent = currentSpeedMode === 'auto'
+        ? `(hasta ${mode.workers} workers)`
+        : `(${mode.workers} workers)`;
     
     const btn = document.getElementById('speed-mode-btn');
-    if (currentSpeedMode === 'turbo') {
+    if (currentSpeedMode === 'turbo' || currentSpeedMode === 'auto') {
         btn.className = 'btn btn-warning btn-sm d-flex align-items-center gap-2';
     } else {
         btn.className = 'btn btn-outline-warning btn-sm d-flex align-items-center gap-2';
@@ -1407,7 +1615,9 @@ function updateSpeedModeUI() {
 
 // Toggle entre modos de velocidad
 async function toggleSpeedMode() {
-    const newMode = currentSpeedMode === 'normal' ? 'turbo' : 'normal';
+    // Ciclo: normal -> turbo -> auto -> normal
+    const nextModes = { normal: 'turbo', turbo: 'auto', auto: 'normal' };
+    const newMode = nextModes[currentSpeedMode] || 'normal';
     
     try {
         const response = await fetch('/api/speed_mode', {
@@ -2657,6 +2867,7 @@ document.getElementById('descargar-form').addEventListener('submit', async funct
         // Si no hay problemas de encriptación o el usuario insiste, proceder con descarga
         let params = 'm3u8_url=' + encodeURIComponent(url);
         if (outputName) params += '&output_name=' + encodeURIComponent(outputName);
+        params += '&quality=' + encodeURIComponent(userConfig.quality || 'best');
         
         const downloadResponse = await fetch('/descargar', {
             method: 'POST',
@@ -2957,6 +3168,13 @@ function actualizarProgreso(download_id) {
                 if (data.estimated_time_formatted && data.estimated_time > 0) {
                     tiempoTexto += ' • Resta: ' + data.estimated_time_formatted;
                 }
+                // Tamaño esperado según la estimación previa (antes del primer byte)
+                if (data.expected_bytes) {
+                    tiempoTexto += ' • ~' + (data.expected_bytes / (1024 * 1024 * 1024)).toFixed(2) + ' GB';
+                }
+                if (data.waiting_for_disk) {
+                    velocidadTexto = 'En cola: esperando espacio en disco';
+                }
                 
                 stats.innerText = segmentos + ' • ' + velocidadTexto + tiempoTexto;
             } else {
@@ -2969,7 +3187,10 @@ function actualizarProgreso(download_id) {
             if (data.download_speed && data.download_speed > 0) {
                 const speedMBs = data.download_speed.toFixed(2);
                 const speedKBs = (data.download_speed * 1024).toFixed(0);
-                speedElement.innerHTML = `<strong>Velocidad:</strong> <span class="text-primary">${speedMBs} MB/s (${speedKBs} KB/s)</span>`;
+                const concurrencyText = data.concurrency_limit
+                    ? ` <span class="text-muted" title="${data.concurrency_reason || ''}">• ${data.concurrency_limit} conexiones</span>`
+                    : '';
+                speedElement.innerHTML = `<strong>Velocidad:</strong> <span class="text-primary">${speedMBs} MB/s (${speedKBs} KB/s)</span>${concurrencyText}`;
             } else {
                 speedElement.innerHTML = '<strong>Velocidad:</strong> <span class="text-muted">Calculando...</span>';
             }
@@ -4591,9 +4812,7 @@ def extract_m3u8_metadata(m3u8_url):
         }
         
         try:
-            response = requests.get(m3u8_url, headers=headers, timeout=15, verify=False)
-            response.raise_for_status()
-            content = response.text
+            content = manifest_cache.fetch(shared_session(headers=headers), m3u8_url, timeout=15)
             
             # Verificar que el contenido parece ser un M3U8 válido
             if not content.strip().startswith('#EXTM3U') and '#EXTINF:' not in content:
@@ -4613,47 +4832,34 @@ def extract_m3u8_metadata(m3u8_url):
                     pass
             return metadata
         
-        # 3. Extraer información del contenido M3U8
-        lines = content.strip().split('\n')
-        
-        for line in lines:
-            line = line.strip()
-            
-            # Extraer resolución
-            if 'RESOLUTION=' in line:
-                resolution_match = re.search(r'RESOLUTION=(\d+x\d+)', line)
-                if resolution_match:
-                    resolution = resolution_match.group(1)
-                    metadata['resolution'] = resolution
-                    # Determinar calidad basada en resolución
-                    height = int(resolution.split('x')[1])
-                    if height >= 1080:
-                        metadata['quality'] = '1080p'
-                    elif height >= 720:
-                        metadata['quality'] = '720p'
-                    elif height >= 480:
-                        metadata['quality'] = '480p'
-                    else:
-                        metadata['quality'] = f'{height}p'
-            
-            # Extraer bitrate
-            if 'BANDWIDTH=' in line:
-                bitrate_match = re.search(r'BANDWIDTH=(\d+)', line)
-                if bitrate_match:
-                    bitrate = int(bitrate_match.group(1))
-                    metadata['bitrate'] = f"{bitrate // 1000}kbps"
-            
-            # Extraer título de segmentos
-            if line.startswith('#EXTINF:') and ',' in line:
-                title_part = line.split(',', 1)[1].strip()
-                if title_part and title_part not in ['', 'no desc']:
-                    metadata['title'] = sanitize_filename(title_part)
-            
-            # Extraer duración total aproximada
-            if line.startswith('#EXT-X-TARGETDURATION:'):
-                duration_match = re.search(r'#EXT-X-TARGETDURATION:(\d+)', line)
-                if duration_match:
-                    metadata['duration'] = int(duration_match.group(1))
+        # 3. Extraer información del contenido M3U8 (una sola pasada con el parser compartido)
+        playlist = parse_playlist(content, m3u8_url)
+        
+        # Resolución y bitrate (la última variante que los declare, como en el manifiesto)
+        for variant in playlist.variants:
+            if variant.height:
+                metadata['resolution'] = variant.resolution
+                # Determinar calidad basada en resolución
+                height = variant.height
+                if height >= 1080:
+                    metadata['quality'] = '1080p'
+                elif height >= 720:
+                    metadata['quality'] = '720p'
+                elif height >= 480:
+                    metadata['quality'] = '480p'
+                else:
+                    metadata['quality'] = f'{height}p'
+            if variant.bandwidth:
+                metadata['bitrate'] = f"{variant.bandwidth // 1000}kbps"
+        
+        # Extraer título de segmentos
+        for segment in playlist.segments:
+            if segment.title and segment.title != 'no desc':
+                metadata['title'] = sanitize_filename(segment.title)
+        
+        # Extraer duración total aproximada
+        if playlist.target_duration:
+            metadata['duration'] = int(playlist.target_duration)
         
         # 4. Generar nombre sugerido inteligente
         name_parts = []
@@ -4685,9 +4891,9 @@ def extract_m3u8_metadata(m3u8_url):
         # 5. Información adicional
         metadata['video_info'] = {
             'source_domain': parsed_url.netloc,
-            'estimated_segments': content.count('#EXTINF:'),
-            'is_live': '#EXT-X-ENDLIST' not in content,
-            'version': '3' if '#EXT-X-VERSION:3' in content else 'unknown'
+            'estimated_segments': len(playlist.segments),
+            'is_live': not playlist.endlist,
+            'version': str(playlist.version) if playlist.version else 'unknown'
         }
         
     except requests.RequestException as e:
@@ -4908,6 +5114,8 @@ def descargar():
     output_name = request.form.get('output_name', '').strip()
     quality = request.form.get('quality', DEFAULT_QUALITY).strip()
     resume_id = request.form.get('resume_id', '').strip()  # Para reanudar
+    priority = parse_download_priority(request.form.get('priority', 1))
+    bandwidth_limit = parse_bandwidth_limit(request.form.get('bandwidth_limit'))
     
     # Validaciones de entrada
     if not m3u8_url:
@@ -4941,8 +5149,11 @@ def descargar():
     if resume_id and resume_id in multi_progress:
         download_id = resume_id
         output_file = multi_progress[download_id]['output_file']
+        # Descargas guardadas antes de registrar la ruta final: recalcularla
+        final_output_path = multi_progress[download_id].get('final_output_path') or get_organized_path(output_file)
         multi_progress[download_id]['status'] = 'downloading'
         multi_progress[download_id]['can_resume'] = False
+        quality = multi_progress[download_id].get('quality', quality)
     else:
         # Procesar nombre del archivo
         if output_name:
@@ -4962,21 +5173,8 @@ def descargar():
                 print(f"Error extrayendo nombre de M3U8: {e}")
                 output_file = f'video_{uuid.uuid4().hex[:8]}.mp4'
         
-        # Obtener ruta organizada por fecha si está habilitado
-        final_output_path = get_organized_path(output_file)
-        
-        # Verificar si el archivo ya existe en la ruta final
-        if os.path.exists(final_output_path):
-            base_name = output_file[:-4]  # Sin .mp4
-            counter = 1
-            while True:
-                test_filename = f"{base_name}_{counter}.mp4"
-                test_path = get_organized_path(test_filename)
-                if not os.path.exists(test_path):
-                    output_file = test_filename
-                    final_output_path = test_path
-                    break
-                counter += 1
+        # Obtener ruta organizada por fecha (sin pisar un archivo que ya exista)
+        output_file, final_output_path = get_unique_output_path(output_file)
         
         # Directorios para compatibilidad
         static_dir = os.path.join(os.path.dirname(__file__), STATIC_DIR)
@@ -4992,6 +5190,7 @@ def descargar():
             'error': '',
             'porcentaje': 0,
             'output_file': output_file,
+            'final_output_path': final_output_path,  # Destino en la biblioteca (también al reanudar)
             'url': m3u8_url,
             'quality': quality,
             'start_time': time.time(),
@@ -5003,7 +5202,15 @@ def descargar():
             'last_bytes': 0,
             'elapsed_time': 0,  # Tiempo transcurrido en segundos
             'estimated_time': 0,  # Tiempo estimado restante en segundos
-            'total_time': 0  # Tiempo total cuando termine
+            'total_time': 0,  # Tiempo total cuando termine
+            'concurrency_limit': 0,  # Segmentos en vuelo permitidos ahora mismo
+            'concurrency_reason': '',  # Motivo del último ajuste de concurrencia
+            'priority': priority,  # Peso en el reparto de workers del planificador global
+            'bandwidth_limit_mbps': bandwidth_limit,  # Límite de caudal propio (None = solo el global)
+            'retries': 0,  # Reintentos diferidos programados
+            'failed_segments': {},  # índice -> error de los segmentos que fallaron definitivamente
+            'hedges_issued': 0,  # Peticiones duplicadas lanzadas por lentitud
+            'hedges_won': 0  # Peticiones duplicadas que terminaron antes que la original
         }
     
     def run_download():
@@ -5012,6 +5219,9 @@ def descargar():
         
         # Crear directorio temporal único para esta descarga (fuera del try)
         temp_dir = os.path.join(os.path.dirname(__file__), TEMP_DIR, download_id)
+        merger = None  # Unión en streaming (si STREAMING_MERGE está activo)
+        staged_output = None  # Archivo temporal junto al destino final, publicado con rename atómico
+        checkpoint = None  # Unión incremental (si INCREMENTAL_MERGE está activo)
         
         try:
             # Verificar si ya fue cancelado antes de empezar
@@ -5023,7 +5233,6 @@ def descargar():
             # Crear el directorio temporal
             if not os.path.exists(temp_dir):
                 os.makedirs(temp_dir, exist_ok=True)
-            original_dir = os.getcwd()
             
             # Obtener número de workers según modo actual
             workers = get_current_workers()
@@ -5042,129 +5251,236 @@ def descargar():
                 max_workers=workers,
                 temp_dir=temp_dir,
                 download_id=download_id,
-                log_function=downloader_log
+                log_function=downloader_log,
+                initial_workers=get_initial_workers(),
+                min_workers=get_min_workers(),
+                backend=SEGMENT_BACKEND,
+                scheduler=segment_scheduler,
+                priority=multi_progress[download_id].get('priority', 1),
+                hedge=HEDGE_SLOW_SEGMENTS,
+                hedge_percentile=HEDGE_PERCENTILE,
+                hedge_budget=HEDGE_BUDGET,
+                write_buffer_size=SEGMENT_WRITE_BUFFER,
+                rate_limiter=bandwidth_limiter,
+                merge_strategy=MERGE_STRATEGY,
+                quality=quality,
+                time_budget=AUTO_QUALITY_TIME_BUDGET_MINUTES * 60,
+                # Al reanudar, la misma variante: los segmentos ya descargados son de ella
+                variant_url=multi_progress[download_id].get('variant_url'),
+                alternate_renditions=True
             )
-            segment_urls = downloader._get_segment_urls()
+            bandwidth_limiter.set_download_limit(download_id, multi_progress[download_id].get('bandwidth_limit_mbps'))
+            active_downloaders[download_id] = downloader
+            # En vivo no se espera al final de la playlist: los segmentos se descargan según aparecen
+            segment_urls = downloader._get_segment_urls(collect_live=False)
+            live_follower = None
+            if downloader.is_live:
+                def track_live_segment(index, segment):
+                    """Los segmentos nuevos amplían segment_urls (None en los que salieron de la ventana sin verlos)"""
+                    if index < len(segment_urls):
+                        segment_urls[index] = segment
+                        return
+                    segment_urls.extend([None] * (index - len(segment_urls)))
+                    segment_urls.append(segment)
+                    multi_progress[download_id]['total'] = len(segment_urls)
+                
+                live_follower = downloader.create_live_follower(on_segment=track_live_segment)
+                # Los índices cuentan desde la primera secuencia vista: al reanudar ya no coincidirían
+                multi_progress[download_id]['is_live'] = True
             multi_progress[download_id]['total'] = len(segment_urls)
+            record_selected_variant(download_id, downloader)
+            multi_progress[download_id]['renditions'] = [track.label for track in downloader.rendition_tracks]
+            # fMP4/CMAF: la unión es init + fragmentos concatenados, sin ffmpeg ni etapas MPEG-TS
+            is_fmp4 = downloader.container == 'fmp4'
+            
+            # Unión en streaming solo sin pistas alternativas: ffmpeg las recibe en la única unión final
+            stream_merge = (STREAMING_MERGE and not is_fmp4 and live_follower is None
+                            and not downloader.rendition_tracks)
+            
+            # Unión incremental: el prefijo confirmado en merged.ts no se vuelve a descargar ni a unir
+            merged_prefix = 0
+            if INCREMENTAL_MERGE and not stream_merge and not is_fmp4 and live_follower is None:
+                checkpoint = CheckpointedMerge(temp_dir, len(segment_urls), log_function=downloader_log,
+                                               checkpoint_every=MERGE_CHECKPOINT_EVERY)
+                merged_prefix = checkpoint.load()
             
-            # Obtener segmentos ya descargados para reanudación
+            # Obtener segmentos ya descargados para reanudación (solo los que siguen en disco)
             downloaded_segments = multi_progress[download_id].get('downloaded_segments', [])
-            start_index = len(downloaded_segments)
+            already_downloaded = {
+                i for i in downloaded_segments
+                if os.path.exists(os.path.join(temp_dir, downloader.segment_filename(i)))
+            } | set(range(merged_prefix)) | downloader.prefetched_segments
+            multi_progress[download_id]['downloaded_segments'] = sorted(already_downloaded)
+            multi_progress[download_id]['current'] = len(already_downloaded)
+            previous_failures = multi_progress[download_id].get('failed_segments') or {}
+            if already_downloaded:
+                log_to_file(f"🔁 Reanudando: {len(segment_urls) - len(already_downloaded)} segmentos pendientes "
+                            f"({len(previous_failures)} con fallo definitivo en el intento anterior)", "INFO", download_id)
             
-            for i, url in enumerate(segment_urls):
-                # Verificar cancelación en cada iteración
-                if download_id in cancelled_downloads:
-                    multi_progress[download_id]['status'] = 'cancelled'
-                    multi_progress[download_id]['error'] = 'Descarga cancelada por el usuario'
-                    multi_progress[download_id]['can_resume'] = True
-                    save_download_state()
+            # Estimación previa: duración y tamaño esperados antes del primer byte (ETA y admisión por disco)
+            # (en vivo no hay total que estimar)
+            if live_follower is None:
+                estimate = downloader.preflight_estimate(segment_urls, samples=PREFLIGHT_SIZE_SAMPLES)
+            else:
+                estimate = DownloadEstimate(0, 0.0)
+            record_download_estimate(download_id, estimate)
+            expected_pending = {'bytes': sum(estimate.segment_bytes(segment) for i, segment in enumerate(segment_urls)
+                                             if i not in already_downloaded)}
+            if estimate.total_bytes is not None:
+                # Pico de disco: segmentos temporales (y joined.ts con ts_concat) más el archivo final
+                temp_bytes = expected_pending['bytes'] + estimate.rendition_bytes
+                if MERGE_STRATEGY == 'ts_concat' and not stream_merge and not is_fmp4:
+                    temp_bytes += estimate.expected_bytes
+                disk_needs = [(temp_dir, temp_bytes), (os.path.dirname(final_output_path), estimate.total_bytes)]
+                if not admit_download(download_id, disk_needs, downloader_log):
                     return
+            if downloader.measured_throughput and expected_pending['bytes']:
+                # Modo 'auto': el caudal ya medido da un ETA antes del primer segmento
+                multi_progress[download_id]['estimated_time'] = expected_pending['bytes'] / downloader.measured_throughput
+            
+            # Estado para velocidad agregada (todos los workers en paralelo)
+            speed_window = {'bytes': 0, 'start': time.time(), 'session_bytes': 0, 'session_segments': 0,
+                            'session_expected': 0.0}
+            
+            def on_segment_done(index, bytes_downloaded, segment_duration):
+                """Actualiza el progreso tras cada segmento (llamado desde el hilo de run_download)"""
+                progress = multi_progress[download_id]
+                current_time = time.time()
+                progress['elapsed_time'] = current_time - progress['start_time']
+                progress['downloaded_segments'].append(index)
+                # Cada segmento queda registrado al momento (una fila), sin esperar al siguiente guardado
+                state_store.add_segment(download_id, index)
                 
-                # Saltar segmentos ya descargados
-                if i < start_index:
-                    multi_progress[download_id]['current'] = i + 1
-                    continue
-                    
-                try:
-                    # Obtener tiempo antes de la descarga
-                    segment_start_time = time.time()
-                    
-                    # Descargar segmento con reintentos inteligentes
-                    result = None
-                    last_error = None
-                    
-                    for attempt in range(3):
-                        result = downloader._download_segment(url, i)
-                        if result:
-                            # Descarga exitosa con validación incluida
-                            break
-                        
-                        # Si es el primer intento, verificar si el servidor devuelve algo
-                        if attempt == 0:
-                            try:
-                                # Intentar hacer un HEAD request para verificar si la URL es válida
-                                test_response = downloader.session.head(url, timeout=5)
-                                if test_response.status_code in [404, 403, 410]:
-                                    last_error = f"Segmento no disponible en servidor (HTTP {test_response.status_code})"
-                                    break  # No reintentar si el segmento no existe
-                            except:
-                                pass  # Continuar con reintentos normales
-                        
-                        # Pausa breve antes del siguiente intento
-                        if attempt < 2:  # No esperar después del último intento
-                            time.sleep(0.5)
-                    
-                    # Verificar que el resultado es válido
-                    if not result:
-                        error_msg = last_error or "No se pudo descargar el segmento (falló tras reintentos)"
-                        raise Exception(error_msg)
-                    
-                    segment_name, bytes_downloaded = result
-                    
-                    seg_path = os.path.join(temp_dir, f'segment_{i:05d}.ts')
-                    if not os.path.exists(seg_path):
-                        raise FileNotFoundError(f"No se encontró el archivo {seg_path} tras la descarga.")
-                    
-                    # Calcular velocidad de descarga
-                    current_time = time.time()
-                    time_diff = current_time - multi_progress[download_id]['last_update_time']
-                    
-                    # Calcular tiempo transcurrido
-                    elapsed_time = current_time - multi_progress[download_id]['start_time']
-                    multi_progress[download_id]['elapsed_time'] = elapsed_time
-                    
-                    if time_diff > 0 and isinstance(bytes_downloaded, (int, float)) and bytes_downloaded > 0:
-                        # Actualizar bytes totales descargados
-                        multi_progress[download_id]['bytes_downloaded'] += bytes_downloaded
-                        
-                        # Calcular velocidad en MB/s
-                        segment_duration = current_time - segment_start_time
-                        if segment_duration > 0:
-                            bytes_per_second = bytes_downloaded / segment_duration
-                            speed_mbps = bytes_per_second / (1024 * 1024)  # Convertir a MB/s
-                            
-                            # Usar promedio móvil para suavizar la velocidad
-                            current_speed = multi_progress[download_id]['download_speed']
-                            if current_speed == 0:
-                                multi_progress[download_id]['download_speed'] = speed_mbps
-                            else:
-                                # Promedio móvil con factor 0.3 para suavizar
-                                multi_progress[download_id]['download_speed'] = (current_speed * 0.7) + (speed_mbps * 0.3)
-                            
-                            # Calcular tiempo estimado restante
-                            segments_remaining = len(segment_urls) - (i + 1)
-                            if segments_remaining > 0 and multi_progress[download_id]['download_speed'] > 0:
-                                # Estimar bytes promedio por segmento
-                                avg_bytes_per_segment = multi_progress[download_id]['bytes_downloaded'] / (i + 1 - start_index) if (i + 1 - start_index) > 0 else bytes_downloaded
-                                estimated_bytes_remaining = segments_remaining * avg_bytes_per_segment
-                                estimated_seconds = estimated_bytes_remaining / (multi_progress[download_id]['download_speed'] * 1024 * 1024)
-                                multi_progress[download_id]['estimated_time'] = estimated_seconds
-                            else:
-                                multi_progress[download_id]['estimated_time'] = 0
-                        
-                        multi_progress[download_id]['last_update_time'] = current_time
-                    
-                    # Marcar segmento como descargado
-                    multi_progress[download_id]['downloaded_segments'].append(i)
-                    
-                except Exception as err:
-                    multi_progress[download_id]['error'] = f"Error al descargar el segmento {i+1}/{len(segment_urls)}: {err}. Puedes reanudar luego."
-                    multi_progress[download_id]['status'] = 'error'
-                    multi_progress[download_id]['can_resume'] = True
-                    save_download_state()
-                    break
-                    
-                porcentaje = int(((i + 1) / len(segment_urls)) * 100) if len(segment_urls) > 0 else 0
-                multi_progress[download_id]['current'] = i + 1
-                multi_progress[download_id]['porcentaje'] = porcentaje
+                if isinstance(bytes_downloaded, (int, float)) and bytes_downloaded > 0:
+                    progress['bytes_downloaded'] += bytes_downloaded
+                    speed_window['bytes'] += bytes_downloaded
+                    speed_window['session_bytes'] += bytes_downloaded
+                speed_window['session_segments'] += 1
+                segment_expected = estimate.segment_bytes(segment_urls[index])
+                expected_pending['bytes'] = max(0.0, expected_pending['bytes'] - segment_expected)
+                speed_window['session_expected'] += segment_expected
+                
+                # Velocidad agregada en MB/s medida sobre ventanas de al menos 0.5 s
+                window_duration = current_time - speed_window['start']
+                if window_duration >= 0.5 and speed_window['bytes'] > 0:
+                    speed_mbps = (speed_window['bytes'] / window_duration) / (1024 * 1024)
+                    current_speed = progress['download_speed']
+                    if current_speed == 0:
+                        progress['download_speed'] = speed_mbps
+                    else:
+                        # Promedio móvil con factor 0.3 para suavizar
+                        progress['download_speed'] = (current_speed * 0.7) + (speed_mbps * 0.3)
+                    speed_window['bytes'] = 0
+                    speed_window['start'] = current_time
+                    progress['last_update_time'] = current_time
+                
+                # Calcular tiempo estimado restante
+                completed = len(progress['downloaded_segments'])
+                segments_remaining = len(segment_urls) - completed
+                speed = progress['download_speed'] * 1024 * 1024 or (downloader.measured_throughput or 0)
+                if segments_remaining > 0 and expected_pending['bytes'] > 0 and speed > 0:
+                    # Bytes esperados de los segmentos que faltan, corregidos con la desviación
+                    # observada entre lo estimado y lo recibido en esta sesión
+                    correction = 1.0
+                    if speed_window['session_segments'] >= 3 and speed_window['session_expected'] > 0:
+                        correction = speed_window['session_bytes'] / speed_window['session_expected']
+                    progress['estimated_time'] = expected_pending['bytes'] * correction / speed
+                elif segments_remaining > 0 and progress['download_speed'] > 0 and speed_window['session_segments'] > 0:
+                    avg_bytes_per_segment = speed_window['session_bytes'] / speed_window['session_segments']
+                    estimated_bytes_remaining = segments_remaining * avg_bytes_per_segment
+                    progress['estimated_time'] = estimated_bytes_remaining / (progress['download_speed'] * 1024 * 1024)
+                else:
+                    progress['estimated_time'] = 0
+                
+                porcentaje = int((completed / len(segment_urls)) * 100) if len(segment_urls) > 0 else 0
+                progress['current'] = completed
+                progress['porcentaje'] = porcentaje
+                
+                # Límite de concurrencia actual y motivo del último ajuste
+                concurrency = downloader.concurrency.snapshot()
+                progress['concurrency_limit'] = concurrency['limit']
+                progress['concurrency_reason'] = concurrency['reason']
+                if downloader.hedging is not None:
+                    hedging = downloader.hedging.snapshot()
+                    progress['hedges_issued'] = hedging['hedges_issued']
+                    progress['hedges_won'] = hedging['hedges_won']
                 
                 # Log progreso cada 25%
                 log_download_progress(output_file, porcentaje)
                 
-                # Guardar estado cada 10 segmentos
-                if (i + 1) % 10 == 0:
+                # Guardar el resto del progreso cada 10 segmentos (solo esta fila cambia)
+                if completed % 10 == 0:
                     save_download_state()
+            
+            def on_segment_retry(index, attempt, delay, error):
+                multi_progress[download_id]['retries'] = multi_progress[download_id].get('retries', 0) + 1
+            
+            # Toda etapa de unión escribe junto al destino final: publicar es un rename, nunca una copia
+            staged_output = prepare_staging(final_output_path)
+            
+            # Unión en streaming: el remux avanza con el prefijo contiguo de segmentos completados
+            if stream_merge:
+                merger = StreamingMerger(
+                    staged_output,
+                    temp_dir,
+                    len(segment_urls),
+                    ready=already_downloaded,
+                    log_function=downloader_log
+                )
+                if not merger.start():
+                    merger = None
+            elif checkpoint is not None:
+                checkpoint.start(ready=already_downloaded)
+            
+            # Descarga concurrente; los fallos van a una cola de reintentos con backoff
+            summary = downloader.download_segments_concurrent(
+                segment_urls,
+                skip_indices=already_downloaded,
+                on_segment=on_segment_done,
+                is_cancelled=lambda: download_id in cancelled_downloads,
+                on_retry=on_segment_retry,
+                on_ordered=(merger.mark_ready if merger is not None
+                            else checkpoint.mark_ready if checkpoint is not None else None),
+                live=live_follower
+            )
+            
+            # Confirmar lo unido hasta ahora (también si hubo fallos: al reanudar solo se une la cola)
+            merged_complete = checkpoint.close() if checkpoint is not None else False
+            
+            # Registrar por segmento los fallos definitivos: al reanudar solo se piden esos
+            failed_segments = summary['failed']
+            multi_progress[download_id]['failed_segments'] = {
+                str(index): error for index, error in sorted(failed_segments.items())
+            }
+            if failed_segments and live_follower is not None:
+                # En vivo no se puede reintentar más tarde: el segmento queda como hueco en el video
+                log_to_file(f"⚠️ {len(failed_segments)} segmentos del directo quedan como huecos: "
+                            f"{sorted(failed_segments)}", "WARNING", download_id)
+            elif failed_segments:
+                first_failed = min(failed_segments)
+                multi_progress[download_id]['error'] = (
+                    f"{len(failed_segments)} de {len(segment_urls)} segmentos fallaron tras reintentos "
+                    f"(primero: {first_failed+1}/{len(segment_urls)}: {failed_segments[first_failed]}). "
+                    f"Puedes reanudar para reintentar solo esos segmentos."
+                )
+                multi_progress[download_id]['status'] = 'error'
+                multi_progress[download_id]['can_resume'] = True
+                log_to_file(f"❌ Segmentos con fallo definitivo: {sorted(failed_segments)}", "ERROR", download_id)
+                save_download_state()
+            
+            # Una pista de audio/subtítulos incompleta también impide la unión (se reanuda igual que el video)
+            rendition_failures = [f"{track.label}: {track.failed} segmentos"
+                                  for track in downloader.rendition_tracks if track.failed]
+            if rendition_failures and multi_progress[download_id]['status'] == 'downloading':
+                multi_progress[download_id]['error'] = (
+                    f"Pistas alternativas incompletas ({', '.join(rendition_failures)}). "
+                    f"Puedes reanudar para reintentar solo esos segmentos."
+                )
+                multi_progress[download_id]['status'] = 'error'
+                multi_progress[download_id]['can_resume'] = True
+                save_download_state()
                 
+
             # Verificar cancelación antes de la fusión
             if download_id in cancelled_downloads:
                 multi_progress[download_id]['status'] = 'cancelled'
@@ -5174,50 +5490,83 @@ def descargar():
                 return
                 
             # Fusión y movimiento del archivo MP4
+            streamed = False
+            rendition_tracks = []
+            if multi_progress[download_id]['status'] == 'downloading':
+                # Audio/subtítulos de #EXT-X-MEDIA: una entrada más del mismo ffmpeg
+                rendition_tracks = downloader.merge_renditions()
+            if merger is not None:
+                if multi_progress[download_id]['status'] == 'downloading':
+                    streamed = merger.finish()
+                else:
+                    merger.abort('hay segmentos fallidos')
+            
             if multi_progress[download_id]['status'] == 'downloading':
-                # Crear una lista con las rutas absolutas de los segmentos
-                list_path = os.path.join(temp_dir, 'filelist.txt')
-                with open(list_path, 'w', encoding='utf-8') as f:
-                    for i in range(len(segment_urls)):
-                        segment_filename = f'segment_{i:05d}.ts'
+                if not streamed:
+                    # Rutas absolutas de los segmentos presentes, en orden de playlist
+                    # (con unión incremental, merged.ts sustituye al prefijo ya unido)
+                    segment_paths = []
+                    first_pending = 0
+                    if checkpoint is not None and checkpoint.committed:
+                        segment_paths.append(os.path.abspath(checkpoint.merged_path))
+                        first_pending = checkpoint.committed
+                    for i in range(first_pending, len(segment_urls)):
+                        segment_filename = downloader.segment_filename(i)
                         segment_path = os.path.join(temp_dir, segment_filename)
-                        # Verificar si el segmento existe
-                        if os.path.exists(segment_path) and os.path.getsize(segment_path) > 0:
-                            # Normalizar a barras forward para ffmpeg en Windows
-                            norm_path = os.path.abspath(segment_path).replace('\\\\', '/')
-                            f.write(f"file '{norm_path}'\n")
+                        # Verificar si el segmento existe (los validados al escribirlos no se vuelven a consultar)
+                        if segment_filename in downloader.validated_segments or (
+                                os.path.exists(segment_path) and os.path.getsize(segment_path) > 0):
+                            segment_paths.append(os.path.abspath(segment_path))
                         else:
                             log_to_file(f"Segmento faltante o vacío: {segment_filename}", "WARNING", download_id)
+                    
+                    if is_fmp4:
+                        command = None  # Init + fragmentos (por stdin al ffmpeg de las pistas, si las hay)
+                    elif merged_complete or len(segment_paths) == 1:
+                        # merged.ts ya contiene todo: ffmpeg solo remuxea una entrada
+                        command = mux_command(['-i', segment_paths[0]], rendition_tracks, staged_output)
+                    elif MERGE_STRATEGY == 'ts_concat':
+                        # Un único .ts concatenado en el kernel como entrada de ffmpeg
+                        joined_path = os.path.join(temp_dir, 'joined.ts')
+                        concat_ts_segments(segment_paths, joined_path, log_function=downloader_log)
+                        command = mux_command(['-i', joined_path], rendition_tracks, staged_output)
+                    else:
+                        # Crear una lista con las rutas absolutas de los segmentos
+                        list_path = os.path.join(temp_dir, 'filelist.txt')
+                        with open(list_path, 'w', encoding='utf-8') as f:
+                            for segment_path in segment_paths:
+                                # Normalizar a barras forward para ffmpeg en Windows
+                                norm_path = segment_path.replace('\\\\', '/')
+                                f.write(f"file '{norm_path}'\n")
+                        command = mux_command(['-f', 'concat', '-safe', '0', '-i', list_path], rendition_tracks, staged_output)
                 
-                # Ejecutar FFmpeg con la ruta correcta
-                try:
-                    command = ['ffmpeg', '-f', 'concat', '-safe', '0', '-i', list_path, '-c', 'copy', '-y', output_file]
-                    log_to_file(f"Comando FFmpeg a ejecutar: {' '.join(command)}", "INFO", download_id)
-                    process = subprocess_run(command, capture_output=True, text=True, encoding='utf-8', check=True)
-                    log_to_file(f"FFmpeg stdout: {process.stdout}", "INFO", download_id)
+                    # Ejecutar FFmpeg con la ruta correcta
+                    try:
+                        if command is None:
+                            downloader.merge_fmp4(segment_paths, staged_output, tracks=rendition_tracks)
+                        else:
+                            log_to_file(f"Comando FFmpeg a ejecutar: {' '.join(command)}", "INFO", download_id)
+                            process = subprocess_run(command, capture_output=True, text=True, encoding='utf-8', check=True)
+                            log_to_file(f"FFmpeg stdout: {process.stdout}", "INFO", download_id)
                     
-                    # Verificar que el archivo de salida existe y no está vacío
-                    if not os.path.exists(output_file) or os.path.getsize(output_file) == 0:
-                        log_to_file("El archivo de salida no fue creado o está vacío", "ERROR", download_id)
+                        # Verificar que el archivo de salida existe y no está vacío
+                        if not os.path.exists(staged_output) or os.path.getsize(staged_output) == 0:
+                            log_to_file("El archivo de salida no fue creado o está vacío", "ERROR", download_id)
+                            multi_progress[download_id]['status'] = 'error'
+                            multi_progress[download_id]['error'] = "No se pudo generar el archivo final de video."
+                            multi_progress[download_id]['can_resume'] = True
+                            save_download_state()
+                            return
+                    except CalledProcessError as e:
+                        log_to_file(f"Error en FFmpeg: {e.stderr}", "ERROR", download_id)
                         multi_progress[download_id]['status'] = 'error'
-                        multi_progress[download_id]['error'] = "No se pudo generar el archivo final de video."
+                        multi_progress[download_id]['error'] = "Error en FFmpeg al unir segmentos de video."
                         multi_progress[download_id]['can_resume'] = True
                         save_download_state()
                         return
-                except CalledProcessError as e:
-                    log_to_file(f"Error en FFmpeg: {e.stderr}", "ERROR", download_id)
-                    multi_progress[download_id]['status'] = 'error'
-                    multi_progress[download_id]['error'] = "Error en FFmpeg al unir segmentos de video."
-                    multi_progress[download_id]['can_resume'] = True
-                    save_download_state()
-                    return
                 
-                # Usar la ruta organizada final (ya calculada con lógica de duplicados)
-                output_path = os.path.abspath(os.path.join(original_dir, output_file))
-                if os.path.exists(output_path) and os.path.getsize(output_path) > 0:
-                    # Asegurar que el directorio de destino existe
-                    os.makedirs(os.path.dirname(final_output_path), exist_ok=True)
-                    os.replace(output_path, final_output_path)
+                # Publicar en la ruta organizada final (ya calculada con lógica de duplicados)
+                if publish(staged_output, final_output_path):
                     multi_progress[download_id]['status'] = 'done'
                     multi_progress[download_id]['end_time'] = time.time()
                     multi_progress[download_id]['total_time'] = multi_progress[download_id]['end_time'] - multi_progress[download_id]['start_time']
@@ -5270,6 +5619,20 @@ def descargar():
             log_to_file(f"❌ Error completo en descarga {download_id}: {error_msg}", "ERROR", download_id)
             log_to_file(f"🔗 URL problemática: {m3u8_url}", "ERROR", download_id)
         finally:
+            # Una unión en streaming que no llegó a completarse no deja salida parcial
+            if merger is not None:
+                merger.abort()
+            # La unión incremental confirma su último checkpoint para la próxima reanudación
+            if checkpoint is not None:
+                checkpoint.close()
+            # Un archivo final que no llegó a publicarse no queda en la biblioteca
+            if staged_output is not None:
+                discard(staged_output)
+            
+            # Un directo interrumpido no se puede reanudar (la ventana ya avanzó)
+            if multi_progress[download_id].get('is_live') and multi_progress[download_id]['status'] != 'done':
+                multi_progress[download_id]['can_resume'] = False
+            
             # Guardar estado final
             save_download_state()
             
@@ -5283,6 +5646,8 @@ def descargar():
             
             # Limpiar el ID de cancelación cuando termine la descarga
             cancelled_downloads.discard(download_id)
+            active_downloaders.pop(download_id, None)
+            bandwidth_limiter.unregister(download_id)
     
     thread = threading.Thread(target=run_download)
     thread.start()
@@ -5315,6 +5680,209 @@ def cancelar_descarga(download_id):
     
     return jsonify({'success': True}), 200
 
+@app.route('/grabar_directo', methods=['POST'])
+def grabar_directo():
+    """Graba un directo HLS: cada segmento se descarga al aparecer y se añade a un archivo que crece"""
+    active_downloads = sum(1 for d in multi_progress.values() if d['status'] == 'downloading')
+    if active_downloads >= MAX_CONCURRENT_DOWNLOADS:
+        return jsonify({
+            'error': f'Máximo {MAX_CONCURRENT_DOWNLOADS} descargas simultáneas permitidas. Espera a que termine alguna.'
+        }), 429
+    
+    m3u8_url = request.form.get('m3u8_url', '').strip()
+    output_name = request.form.get('output_name', '').strip()
+    quality = request.form.get('quality', DEFAULT_QUALITY).strip()
+    bandwidth_limit = parse_bandwidth_limit(request.form.get('bandwidth_limit'))
+    try:
+        max_minutes = float(request.form.get('max_minutes') or LIVE_MAX_DURATION_MINUTES)
+    except ValueError:
+        return jsonify({'error': 'Duración máxima no válida'}), 400
+    max_duration = max_minutes * 60 if max_minutes > 0 else None
+    
+    if not m3u8_url:
+        return jsonify({'error': 'URL M3U8 no proporcionada'}), 400
+    if not is_valid_m3u8_url(m3u8_url):
+        return jsonify({'error': 'URL M3U8 no válida'}), 400
+    for existing_id, progress in multi_progress.items():
+        if progress.get('url') == m3u8_url and progress.get('status') == 'downloading':
+            return jsonify({
+                'error': f'Ya hay una descarga activa de esta URL (ID: {existing_id})',
+                'existing_download_id': existing_id
+            }), 409
+    
+    if output_name:
+        output_name = sanitize_filename(output_name)
+        if not output_name.lower().endswith('.mp4'):
+            output_name += '.mp4'
+    else:
+        output_name = f"directo_{datetime.now().strftime('%Y%m%d_%H%M%S')}.mp4"
+    output_file, final_output_path = get_unique_output_path(output_name)
+    
+    download_id = uuid.uuid4().hex[:8]
+    multi_progress[download_id] = {
+        'type': 'live',
+        'total': 0,  # Desconocido hasta que termine el directo
+        'current': 0,
+        'status': 'downloading',
+        'error': '',
+        'porcentaje': 0,
+        'output_file': output_file,
+        'final_output_path': final_output_path,
+        'url': m3u8_url,
+        'quality': quality,
+        'start_time': time.time(),
+        'can_resume': False,
+        'bytes_downloaded': 0,
+        'download_speed': 0.0,
+        'elapsed_time': 0,
+        'estimated_time': 0,
+        'total_time': 0,
+        'priority': 10,  # Un directo que se retrasa pierde segmentos: va por delante en el planificador
+        'bandwidth_limit_mbps': bandwidth_limit,
+        'max_duration': max_duration,
+        'recorded_seconds': 0.0,  # Segundos de contenido ya escritos en el archivo
+        'live_lag_seconds': 0.0,  # Contenido publicado por el servidor que aún no está en el archivo
+        'live_window': 0,  # Segmentos vistos y todavía no escritos
+        'lost_segments': 0,  # Salieron de la ventana antes de descargarlos o fallaron
+        'stop_reason': ''
+    }
+    
+    def run_live_recording():
+        temp_dir = os.path.join(os.path.dirname(__file__), TEMP_DIR, download_id)
+        staged_recording = None  # Archivo que crece durante la grabación
+        staged_output = None  # MP4 remuxeado, publicado con rename atómico
+        
+        def downloader_log(message):
+            log_info(message, download_id)
+        
+        def on_recorded(recorder):
+            progress = multi_progress[download_id]
+            now = time.time()
+            progress['current'] = recorder.segments_recorded
+            progress['bytes_downloaded'] = recorder.bytes_written
+            progress['recorded_seconds'] = round(recorder.recorded_seconds, 1)
+            progress['live_lag_seconds'] = round(recorder.lag_seconds, 1)
+            progress['live_window'] = recorder.window_size
+            progress['lost_segments'] = recorder.lost_segments
+            progress['elapsed_time'] = now - progress['start_time']
+            if progress['elapsed_time'] > 0:
+                progress['download_speed'] = recorder.bytes_written / (1024 * 1024) / progress['elapsed_time']
+            if max_duration:
+                progress['porcentaje'] = min(100, round(recorder.recorded_seconds / max_duration * 100, 1))
+        
+        try:
+            os.makedirs(temp_dir, exist_ok=True)
+            log_download_start(m3u8_url, output_file, current_speed_mode, download_id)
+            downloader = M3U8Downloader(
+                m3u8_url=m3u8_url,
+                output_filename=output_file,
+                max_workers=get_current_workers(),
+                temp_dir=temp_dir,
+                download_id=download_id,
+                log_function=downloader_log,
+                initial_workers=get_initial_workers(),
+                min_workers=get_min_workers(),
+                backend=SEGMENT_BACKEND,
+                scheduler=segment_scheduler,
+                priority=multi_progress[download_id]['priority'],
+                write_buffer_size=SEGMENT_WRITE_BUFFER,
+                rate_limiter=bandwidth_limiter,
+                quality=quality
+            )
+            bandwidth_limiter.set_download_limit(download_id, bandwidth_limit)
+            active_downloaders[download_id] = downloader
+            
+            # El archivo que crece se escribe junto al destino (oculto) y se publica al terminar
+            staged_recording = prepare_staging(os.path.splitext(final_output_path)[0] + '.ts')
+            recorder = LiveRecorder(
+                downloader,
+                staged_recording,
+                max_duration=max_duration,
+                is_stopped=lambda: download_id in stopped_recordings or download_id in cancelled_downloads,
+                on_progress=on_recorded,
+                log_function=downloader_log
+            )
+            summary = recorder.run()
+            record_selected_variant(download_id, downloader)
+            on_recorded(recorder)
+            multi_progress[download_id]['stop_reason'] = summary['reason']
+            
+            if download_id in cancelled_downloads:
+                multi_progress[download_id]['status'] = 'cancelled'
+                return
+            if not summary['segments']:
+                raise ValueError('No se grabó ningún segmento del directo')
+            
+            staged_output = prepare_staging(final_output_path)
+            if summary['container'] == 'fmp4':
+                # Init + fragmentos ya forman un MP4 fragmentado
+                os.replace(staged_recording, staged_output)
+            elif LIVE_REMUX_TO_MP4:
+                command = ['ffmpeg', '-i', staged_recording, '-c', 'copy', '-y', staged_output]
+                try:
+                    subprocess_run(command, capture_output=True, text=True, encoding='utf-8', check=True)
+                except (CalledProcessError, OSError) as e:
+                    # Mejor un .ts reproducible que perder la grabación
+                    log_to_file(f"No se pudo remuxear la grabación a MP4, se conserva el .ts: {getattr(e, 'stderr', e)}",
+                                "WARNING", download_id)
+                    discard(staged_output)
+                    staged_output = staged_recording
+            else:
+                staged_output = staged_recording
+            
+            if staged_output == staged_recording:
+                output_ts = os.path.splitext(output_file)[0] + '.ts'
+                final_ts = os.path.splitext(final_output_path)[0] + '.ts'
+                multi_progress[download_id]['output_file'] = output_ts
+                multi_progress[download_id]['final_output_path'] = final_ts
+            if not publish(staged_output, multi_progress[download_id]['final_output_path']):
+                raise ValueError('El archivo de la grabación está vacío.')
+            
+            progress = multi_progress[download_id]
+            progress['status'] = 'done'
+            progress['porcentaje'] = 100
+            progress['end_time'] = time.time()
+            progress['total_time'] = progress['end_time'] - progress['start_time']
+            log_download_complete(progress['output_file'], format_duration(summary['seconds']), progress['download_speed'])
+            try:
+                save_video_metadata_with_path(progress['final_output_path'], m3u8_url)
+            except Exception as meta_error:
+                print(f"Error al guardar metadatos: {meta_error}")
+        except Exception as e:
+            multi_progress[download_id]['status'] = 'error'
+            multi_progress[download_id]['error'] = str(e)
+            log_download_error(output_file, str(e), download_id)
+        finally:
+            for path in (staged_recording, staged_output):
+                if path is not None:
+                    discard(path)
+            save_download_state()
+            try:
+                import shutil
+                shutil.rmtree(temp_dir, ignore_errors=True)
+            except Exception as cleanup_error:
+                print(f"Error al limpiar directorio temporal {temp_dir}: {cleanup_error}")
+            cancelled_downloads.discard(download_id)
+            stopped_recordings.discard(download_id)
+            active_downloaders.pop(download_id, None)
+            bandwidth_limiter.unregister(download_id)
+    
+    thread = threading.Thread(target=run_live_recording)
+    thread.start()
+    save_download_state()
+    return jsonify({'download_id': download_id}), 202
+
+@app.route('/detener_grabacion/<download_id>', methods=['POST'])
+def detener_grabacion(download_id):
+    """Detiene una grabación en vivo conservando lo grabado (cancelar la descarta)"""
+    progress = multi_progress.get(download_id)
+    if progress is None or progress.get('type') != 'live':
+        return jsonify({'success': False, 'error': 'ID de grabación no encontrado.'}), 404
+    if progress['status'] != 'downloading':
+        return jsonify({'success': False, 'error': 'La grabación no está en curso.'}), 409
+    stopped_recordings.add(download_id)
+    return jsonify({'success': True}), 200
+
 @app.route('/eliminar/<filename>', methods=['DELETE'])
 def eliminar_archivo(filename):
     try:
@@ -5746,6 +6314,8 @@ def get_api_stats():
                 'total_size_bytes': total_size,
                 'total_size_formatted': format_file_size(total_size),
                 'active_downloads': download_stats,
+                'http_pool': get_shared_pool().stats(),
+                'segment_scheduler': segment_scheduler.snapshot(),
                 'timestamp': time.time()
             }
         })
@@ -5987,70 +6557,39 @@ def parse_master_playlist(m3u8_url):
             'qualities': [{'url': str, 'bandwidth': int, 'resolution': str, 'label': str}]
         }
     """
-    import requests
-    import re
-    
     try:
         log_to_file(f"🔍 Analizando URL: {m3u8_url}")
-        response = requests.get(m3u8_url, timeout=10, verify=False)
-        response.raise_for_status()
-        content = response.text
+        content = manifest_cache.fetch(shared_session(), m3u8_url, timeout=10)
         
         log_to_file(f"📄 Contenido descargado ({len(content)} chars)")
         log_to_file(f"📄 Primeras 500 chars: {content[:500]}")
         
         # Verificar si es un Master Playlist
-        has_stream_inf = '#EXT-X-STREAM-INF' in content
-        log_to_file(f"🔍 ¿Contiene #EXT-X-STREAM-INF? {has_stream_inf}")
+        playlist = parse_playlist(content, m3u8_url)
+        log_to_file(f"🔍 ¿Contiene #EXT-X-STREAM-INF? {playlist.is_master}")
         
-        if not has_stream_inf:
+        if not playlist.is_master:
             log_to_file(f"❌ No es Master Playlist - no contiene #EXT-X-STREAM-INF")
             return {'is_master': False, 'qualities': []}
         
         qualities = []
-        lines = content.strip().split('\n')
-        
-        for i, line in enumerate(lines):
-            if line.startswith('#EXT-X-STREAM-INF'):
-                # Parsear información de la calidad
-                bandwidth = None
-                resolution = None
-                
-                # Extraer BANDWIDTH
-                bandwidth_match = re.search(r'BANDWIDTH=(\d+)', line)
-                if bandwidth_match:
-                    bandwidth = int(bandwidth_match.group(1))
-                
-                # Extraer RESOLUTION
-                resolution_match = re.search(r'RESOLUTION=(\d+x\d+)', line)
-                if resolution_match:
-                    resolution = resolution_match.group(1)
-                
-                # La siguiente línea debería ser la URL
-                if i + 1 < len(lines):
-                    quality_url = lines[i + 1].strip()
-                    
-                    # Convertir URL relativa a absoluta
-                    if not quality_url.startswith('http'):
-                        from urllib.parse import urljoin
-                        quality_url = urljoin(m3u8_url, quality_url)
-                    
-                    # Generar etiqueta descriptiva
-                    label_parts = []
-                    if resolution:
-                        label_parts.append(resolution)
-                    if bandwidth:
-                        bitrate_mbps = bandwidth / 1000000
-                        label_parts.append(f"{bitrate_mbps:.1f} Mbps")
-                    
-                    label = " - ".join(label_parts) if label_parts else f"Calidad {len(qualities) + 1}"
-                    
-                    qualities.append({
-                        'url': quality_url,
-                        'bandwidth': bandwidth or 0,
-                        'resolution': resolution or 'Desconocida',
-                        'label': label
-                    })
+        for variant in playlist.variants:
+            # Generar etiqueta descriptiva
+            label_parts = []
+            if variant.resolution:
+                label_parts.append(variant.resolution)
+            if variant.bandwidth:
+                bitrate_mbps = variant.bandwidth / 1000000
+                label_parts.append(f"{bitrate_mbps:.1f} Mbps")
+            
+            label = " - ".join(label_parts) if label_parts else f"Calidad {len(qualities) + 1}"
+            
+            qualities.append({
+                'url': variant.url,
+                'bandwidth': variant.bandwidth,
+                'resolution': variant.resolution or 'Desconocida',
+                'label': label
+            })
         
         # Ordenar por bandwidth (mayor a menor)
         qualities.sort(key=lambda x: x['bandwidth'], reverse=True)
@@ -6292,8 +6831,15 @@ def handle_speed_mode():
             'workers': workers,
             'modes': {
                 'normal': {'workers': MAX_WORKERS_NORMAL, 'label': 'Normal'},
-                'turbo': {'workers': MAX_WORKERS_TURBO, 'label': 'Turbo'}
-            }
+                'turbo': {'workers': MAX_WORKERS_TURBO, 'label': 'Turbo'},
+                'auto': {'workers': MAX_WORKERS_AUTO, 'min_workers': MIN_WORKERS_AUTO, 'label': 'Auto'}
+            },
+            'active': {
+                download_id: downloader.concurrency.snapshot()
+                for download_id, downloader in list(active_downloaders.items())
+            },
+            'scheduler': segment_scheduler.snapshot(),
+            'bandwidth': bandwidth_limiter.snapshot()
         })
     
     elif request.method == 'POST':
@@ -6302,18 +6848,27 @@ def handle_speed_mode():
             data = request.get_json()
             new_mode = data.get('mode', '').lower()
             
-            if new_mode not in ['normal', 'turbo']:
+            if new_mode not in ['normal', 'turbo', 'auto']:
                 return jsonify({'success': False, 'error': 'Modo no válido'}), 400
             
+            # Opcional: límite global de caudal junto con el modo
+            if 'bandwidth_limit' in data:
+                bandwidth_limiter.set_global_limit(parse_bandwidth_limit(data.get('bandwidth_limit')))
+            
             current_speed_mode = new_mode
             workers = get_current_workers()
             
+            # Aplicar los nuevos límites a las descargas en curso
+            for downloader in list(active_downloaders.values()):
+                downloader.concurrency.set_bounds(min_limit=get_min_workers(), max_limit=workers)
+            
             log_info(f"Modo de velocidad cambiado a {new_mode.upper()} ({workers} workers)")
             
             return jsonify({
                 'success': True,
                 'current_mode': current_speed_mode,
                 'workers': workers,
+                'bandwidth': bandwidth_limiter.snapshot(),
                 'message': f'Modo cambiado a {new_mode.upper()}'
             })
             
@@ -6323,6 +6878,68 @@ def handle_speed_mode():
     # Método no permitido
     return jsonify({'success': False, 'error': 'Método no permitido'}), 405
 
+@app.route('/api/priority/<download_id>', methods=['POST'])
+def set_download_priority(download_id):
+    """Cambia la prioridad de una descarga en el reparto global de workers"""
+    try:
+        if download_id not in multi_progress:
+            return jsonify({'success': False, 'error': 'Descarga no encontrada'}), 404
+        
+        data = request.get_json() or {}
+        priority = parse_download_priority(data.get('priority', 1))
+        multi_progress[download_id]['priority'] = priority
+        segment_scheduler.set_priority(download_id, priority)
+        save_download_state()
+        log_info(f"Prioridad cambiada a {priority}", download_id)
+        
+        return jsonify({
+            'success': True,
+            'priority': priority,
+            'scheduler': segment_scheduler.snapshot()
+        })
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@app.route('/api/bandwidth', methods=['GET', 'POST'])
+def handle_bandwidth_limits():
+    """Consulta o cambia los límites de ancho de banda (global, horarios y por descarga)"""
+    if request.method == 'GET':
+        return jsonify({'success': True, 'bandwidth': bandwidth_limiter.snapshot()})
+    
+    try:
+        data = request.get_json() or {}
+        download_limits = data.get('downloads') or {}
+        # Validar todos los ids antes de tocar nada: un id erróneo no deja cambios a medias
+        unknown_ids = [download_id for download_id in download_limits if download_id not in multi_progress]
+        if unknown_ids:
+            return jsonify({'success': False, 'error': f"Descarga no encontrada: {', '.join(unknown_ids)}"}), 404
+        
+        # set_schedule valida todas las franjas antes de aplicarlas, así que va primero
+        if 'schedule' in data:
+            bandwidth_limiter.set_schedule(data.get('schedule') or [])
+        if 'global_mbps' in data:
+            bandwidth_limiter.set_global_limit(parse_bandwidth_limit(data.get('global_mbps')))
+        for download_id, mbps in download_limits.items():
+            limit = parse_bandwidth_limit(mbps)
+            multi_progress[download_id]['bandwidth_limit_mbps'] = limit
+            bandwidth_limiter.set_download_limit(download_id, limit)
+        
+        snapshot = bandwidth_limiter.snapshot()
+        log_info(f"Límites de ancho de banda actualizados: global {snapshot['effective_global_mbps'] or 'sin límite'} MB/s")
+        return jsonify({'success': True, 'bandwidth': snapshot})
+    except (KeyError, TypeError, ValueError) as e:
+        return jsonify({'success': False, 'error': f'Límite no válido: {e}'}), 400
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@app.route('/api/manifest_cache', methods=['GET', 'DELETE'])
+def handle_manifest_cache():
+    """Contadores de la caché de playlists (GET) o vaciarla (DELETE)"""
+    if request.method == 'DELETE':
+        manifest_cache.invalidate()
+        log_info("Caché de playlists vaciada")
+    return jsonify({'success': True, 'manifest_cache': manifest_cache.snapshot()})
+
 @app.route('/api/log_js_error', methods=['POST'])
 def log_js_error():
     """Registra errores de JavaScript en el log del servidor"""
@@ -6945,9 +7562,10 @@ def process_aes_download(download_id: str, m3u8_url: str, output_name: str, prog
             multi_progress[download_id]['error'] = 'No se pudo descifrar ningún segmento'
             return
         
-        # 5. Unir segmentos descifrados con FFmpeg
+        # 5. Unir segmentos descifrados con FFmpeg (en un temporal junto al destino)
         multi_progress[download_id]['status'] = 'merging'
         output_path = get_organized_path(f"{output_name}.mp4")
+        staged_output = prepare_staging(output_path)
         
         log_to_file(f"[{download_id}] Uniendo {decrypt_results['decrypted_segments']} segmentos descifrados")
         
@@ -6960,12 +7578,12 @@ def process_aes_download(download_id: str, m3u8_url: str, output_name: str, prog
         # Ejecutar FFmpeg
         ffmpeg_command = [
             'ffmpeg', '-f', 'concat', '-safe', '0', '-i', file_list_path,
-            '-c', 'copy', output_path, '-y'
+            '-c', 'copy', staged_output, '-y'
         ]
         
         result = subprocess_run(ffmpeg_command, capture_output=True, text=True)
         
-        if result.returncode == 0:
+        if result.returncode == 0 and publish(staged_output, output_path):
             # Éxito
             multi_progress[download_id]['status'] = 'completed'
             multi_progress[download_id]['porcentaje'] = 100
@@ -6983,6 +7601,7 @@ def process_aes_download(download_id: str, m3u8_url: str, output_name: str, prog
             
             log_to_file(f"[{download_id}] ✅ Descarga AES-128 completada: {output_path}")
         else:
+            discard(staged_output)
             multi_progress[download_id]['status'] = 'error'
             multi_progress[download_id]['error'] = f'Error en FFmpeg: {result.stderr}'
             log_to_file(f"[{download_id}] ❌ Error FFmpeg: {result.stderr}")
@@ -6998,6 +7617,10 @@ if __name__ == '__main__':
     log_to_file("🚀 Aplicación M3U8 Downloader iniciada")
     log_to_file(f"📁 Directorio de logs: {LOG_DIRECTORY}")
     log_to_file(f"🔧 Modo de velocidad por defecto: {current_speed_mode}")
-    log_to_file(f"⚙️ Workers Normal: {MAX_WORKERS_NORMAL}, Turbo: {MAX_WORKERS_TURBO}")
+    log_to_file(f"⚙️ Workers Normal: {MAX_WORKERS_NORMAL}, Turbo: {MAX_WORKERS_TURBO}, Auto: {MIN_WORKERS_AUTO}-{MAX_WORKERS_AUTO}")
+    log_to_file(f"🔌 Pool HTTP compartido: {HTTP_POOL_MAX_CONNECTIONS} conexiones, {HTTP_POOL_MAX_PER_HOST} por host")
+    log_to_file(f"🧵 Planificador global: {GLOBAL_SEGMENT_WORKERS} workers compartidos (política: {SEGMENT_SCHEDULER_POLICY})")
+    log_to_file(f"🚦 Límite de ancho de banda: {f'{BANDWIDTH_LIMIT_MBPS} MB/s' if BANDWIDTH_LIMIT_MBPS else 'sin límite'}"
+                f" ({len(BANDWIDTH_SCHEDULE)} franjas horarias)")
     
     app.run(debug=True, host='0.0.0.0', port=5000)
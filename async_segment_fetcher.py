@@ -0,0 +1,304 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Backend asyncio para la descarga de segmentos
+=============================================
+
+Alternativa al ThreadPoolExecutor de M3U8Downloader: todas las peticiones
+de segmentos corren como corrutinas en un único event loop, con un pool de
+conexiones acotado (aiohttp.TCPConnector). Miles de segmentos en vuelo ya no
+cuestan un hilo del sistema operativo cada uno.
+
+Se activa con M3U8Downloader(..., backend='asyncio'). Requiere aiohttp;
+si no está instalado, el downloader vuelve al backend de hilos.
+"""
+
+import asyncio
+import os
+import time
+from collections import deque
+from typing import Callable, Deque, Iterable, List, Optional, Tuple, TYPE_CHECKING
+
+from hedging import HEDGE, PRIMARY, HedgeRace
+from segment_scheduler import run_windowed_async
+
+try:
+    import aiohttp
+    AIOHTTP_AVAILABLE = True
+except ImportError:
+    AIOHTTP_AVAILABLE = False
+
+if TYPE_CHECKING:
+    from m3u8_downloader import FetchUnit, M3U8Downloader
+    from m3u8_playlist import MediaSegment
+
+# (resultado, error, duración, reintentable) igual que M3U8Downloader._attempt_segment
+SegmentOutcome = Tuple[Optional[Tuple[str, int]], Optional[str], float, bool]
+# Espera máxima de un turno antes de volver a probar el límite adaptativo: los huecos que liberan
+# los hilos de las pistas alternativas (mismo AdaptiveConcurrency) no despiertan a este event loop
+SLOT_RECHECK_INTERVAL = 0.1
+
+
+class AsyncSegmentFetcher:
+    """Descarga segmentos de un M3U8Downloader sobre un único event loop"""
+
+    def __init__(self, downloader: 'M3U8Downloader', max_connections: Optional[int] = None,
+                 chunk_size: int = 64 * 1024):
+        if not AIOHTTP_AVAILABLE:
+            raise RuntimeError("El backend asyncio requiere aiohttp: pip install aiohttp")
+        self.downloader = downloader
+        self.max_connections = max_connections or downloader.max_workers
+        self.chunk_size = chunk_size
+        self._waiters: Deque[asyncio.Future] = deque()
+
+    def run(self, work: Iterable['FetchUnit'],
+            on_done: Callable[['FetchUnit', Optional[Tuple[str, int]], Optional[str], float, bool], None],
+            should_stop: Optional[Callable[[], bool]] = None,
+            on_ordered: Optional[Callable[['FetchUnit', 'SegmentOutcome'], None]] = None,
+            max_reorder: Optional[int] = None) -> bool:
+        """
+        Descarga los segmentos indicados bloqueando hasta terminar.
+
+        Args:
+            work: Peticiones planificadas por M3U8Downloader._plan_fetch_units (un intento cada una;
+                  se consumen de forma perezosa)
+            on_done: Callback (petición, resultado, error, duración, reintentable) en el hilo que llama
+            should_stop: Consultada periódicamente; si devuelve True se cancela lo pendiente
+            on_ordered: Callback (petición, resultado) en el orden de `work`
+            max_reorder: Cuánto puede adelantarse la descarga al primer segmento sin entregar
+
+        Returns:
+            bool: True si la descarga se detuvo antes de terminar
+        """
+        return asyncio.run(self._run(work, on_done, should_stop, on_ordered, max_reorder))
+
+    async def _run(self, work, on_done, should_stop, on_ordered, max_reorder) -> bool:
+        connector = aiohttp.TCPConnector(
+            limit=self.max_connections,
+            limit_per_host=self.max_connections,
+            ssl=False,  # Igual que session.verify = False en el backend de hilos
+            ttl_dns_cache=300
+        )
+        timeout = aiohttp.ClientTimeout(total=None, sock_connect=10, sock_read=15)
+        async with aiohttp.ClientSession(headers=self.downloader.headers, connector=connector,
+                                         timeout=timeout) as session:
+            # Solo se crean N+k corrutinas a la vez, no una por segmento de la playlist
+            return await run_windowed_async(
+                lambda unit: self._attempt(session, unit),
+                work,
+                window=self.downloader._window_size,
+                on_complete=lambda unit, outcome: on_done(unit, *outcome),
+                on_ordered=on_ordered,
+                should_stop=should_stop,
+                max_reorder=max_reorder
+            )
+
+    async def _attempt(self, session, unit: 'FetchUnit') -> SegmentOutcome:
+        """Equivalente asíncrono de M3U8Downloader._attempt_segment"""
+        start_time = time.time()
+        if self.downloader.hedging is not None:
+            result = await self._fetch_hedged(session, unit)
+        else:
+            result = await self._fetch_segment(session, unit.segment, unit.index, unit.filename, unit.validate)
+        if result:
+            return result, None, time.time() - start_time, False
+
+        # Tras el primer fallo, comprobar si el servidor todavía ofrece el segmento
+        if unit.attempts <= 1:
+            try:
+                async with session.head(unit.segment.url, timeout=aiohttp.ClientTimeout(total=5)) as test_response:
+                    if test_response.status in [404, 403, 410]:
+                        # No reintentar si el segmento no existe
+                        return None, f"Segmento no disponible en servidor (HTTP {test_response.status})", time.time() - start_time, False
+            except (aiohttp.ClientError, asyncio.TimeoutError):
+                pass  # Continuar con reintentos normales
+
+        return None, "No se pudo descargar el segmento", time.time() - start_time, True
+
+    async def _fetch_hedged(self, session, unit: 'FetchUnit') -> Optional[Tuple[str, int]]:
+        """Equivalente asíncrono de M3U8Downloader._download_segment_hedged"""
+        hedging = self.downloader.hedging
+        delay = hedging.delay()
+        start_time = time.time()
+        if delay is None:
+            result = await self._fetch_segment(session, unit.segment, unit.index, unit.filename, unit.validate)
+            if result:
+                hedging.record_latency(time.time() - start_time)
+            return result
+
+        race = HedgeRace()
+        primary = asyncio.ensure_future(self._fetch_segment(
+            session, unit.segment, unit.index, unit.filename, unit.validate, race, PRIMARY))
+        try:
+            done, _ = await asyncio.wait({primary}, timeout=delay)
+            if done or not hedging.try_spend():
+                result = await primary
+                if result:
+                    hedging.record_latency(time.time() - start_time)
+                return result
+
+            self.downloader.log_function(f"🏁 Segmento {unit.index}: supera {delay:.2f}s, lanzando petición duplicada")
+            hedge = asyncio.ensure_future(self._fetch_segment(
+                session, unit.segment, unit.index, unit.filename, unit.validate, race, HEDGE))
+            pending = {primary, hedge}
+            result = None
+            try:
+                while pending and result is None:
+                    done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                    for task in done:
+                        if task.exception() is None and task.result():
+                            result = task.result()
+                            if task is hedge:
+                                hedging.record_win()
+                                self.downloader.log_function(f"🏁 Segmento {unit.index}: ganó la petición duplicada")
+                            else:
+                                hedging.record_latency(time.time() - start_time)
+            finally:
+                # El perdedor se cancela y borra su archivo temporal
+                for task in pending:
+                    task.cancel()
+            return result
+        finally:
+            if not primary.done():
+                primary.cancel()
+
+    async def _fetch_segment(self, session, segment: 'MediaSegment', index: int, segment_filename: str,
+                             validate: bool = True, race: Optional[HedgeRace] = None,
+                             contender: int = PRIMARY) -> Optional[Tuple[str, int]]:
+        """Equivalente asíncrono de M3U8Downloader._download_segment"""
+        downloader = self.downloader
+        final_path = os.path.join(downloader.temp_dir, segment_filename)
+        segment_path = final_path if race is None else os.path.join(
+            downloader.temp_dir, HedgeRace.temp_filename(segment_filename, contender))
+        range_header = segment.range_header
+        request_headers = {'Range': range_header, 'Accept-Encoding': 'identity'} if range_header else None
+        byte_limit = segment.byte_length if range_header else None
+
+        # Las copias de hedging no ocupan hueco del límite adaptativo
+        counted = contender == PRIMARY
+        if counted:
+            await self._acquire_slot()
+        request_start = time.time()
+        status_code = None
+        bytes_downloaded = 0
+        succeeded = False
+        cancelled = False
+        try:
+            downloader.log_function(f"🔍 Descargando segmento {index}: {segment}")
+            async with session.get(segment.url, headers=request_headers) as response:
+                status_code = response.status
+                downloader.log_function(f"📥 Segmento {index} - Status: {response.status}, Content-Type: {response.headers.get('content-type', 'N/A')}, Size: {response.headers.get('content-length', 'N/A')}")
+                if response.status >= 400:
+                    downloader.log_function(f"⚠️ Error descargando segmento {index}: HTTP {response.status}")
+                    return None
+
+                content_type = response.headers.get('content-type', '').lower()
+                if content_type and 'text/html' in content_type:
+                    downloader.log_function(f"⚠️ Segmento {index} devolvió HTML en lugar de video (posible error 404/403)")
+                    return None
+
+                # Si el servidor ignora Range y devuelve el recurso completo, solo sirve cuando el rango empieza en 0
+                if range_header and response.status != 206 and segment.byte_offset:
+                    downloader.log_function(f"⚠️ Segmento {index}: el servidor ignoró la cabecera Range ({range_header})")
+                    return None
+
+                # Validación sobre los primeros bytes en memoria, igual que el backend de hilos
+                header = bytearray()
+                header_size = downloader.validation_header_size
+                header_valid = not validate
+                with open(segment_path, 'wb', buffering=downloader.write_buffer_size) as f:
+                    async for chunk in response.content.iter_chunked(self.chunk_size):
+                        if byte_limit is not None:
+                            chunk = chunk[:byte_limit - bytes_downloaded]
+                        if not header_valid and len(header) < header_size:
+                            header += chunk[:header_size - len(header)]
+                            if len(header) >= header_size:
+                                header_valid = downloader._validate_ts_header(header, len(header), segment_path)
+                                if not header_valid:
+                                    break
+                        f.write(chunk)
+                        bytes_downloaded += len(chunk)
+                        if downloader.rate_limiter is not None:
+                            delay = downloader.rate_limiter.reserve(downloader.download_id, len(chunk))
+                            if delay > 0:
+                                await asyncio.sleep(delay)
+                        if byte_limit is not None and bytes_downloaded >= byte_limit:
+                            break
+
+            if not header_valid and validate and len(header) < header_size:
+                header_valid = downloader._validate_ts_header(header, bytes_downloaded, segment_path)
+
+            if header_valid and byte_limit is not None and bytes_downloaded != byte_limit:
+                downloader.log_function(f"⚠️ Segmento {index}: rango incompleto ({bytes_downloaded}/{byte_limit} bytes)")
+                self._remove_partial(segment_path)
+                return None
+
+            if bytes_downloaded > 0 and header_valid:
+                if race is not None:
+                    if not race.claim(contender):
+                        self._remove_partial(segment_path)
+                        return None
+                    os.replace(segment_path, final_path)
+                if validate:
+                    downloader.validated_segments[segment_filename] = bytes_downloaded
+                downloader.log_function(f"✅ Segmento {index} validado correctamente")
+                succeeded = True
+                return (segment_filename, bytes_downloaded)
+
+            downloader.log_function(f"⚠️ Segmento {index} descargado pero no es MPEG-TS válido")
+            self._remove_partial(segment_path)
+            return None
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            downloader.log_function(f"⚠️ Error descargando segmento {index}: {e}")
+            self._remove_partial(segment_path)
+            return None
+        except asyncio.CancelledError:
+            cancelled = True
+            self._remove_partial(segment_path)
+            raise
+        finally:
+            if counted and (cancelled or (race is not None and not succeeded and race.lost(contender))):
+                # Perdedor de la carrera de hedging (cancelado o sin poder publicar): no cuenta para el AIMD
+                downloader.concurrency.abandon()
+                self._wake_next()
+            elif counted:
+                downloader.concurrency.release(
+                    time.time() - request_start,
+                    bytes_count=bytes_downloaded,
+                    status_code=status_code,
+                    error=not succeeded
+                )
+                self._wake_next()
+
+    async def _acquire_slot(self) -> None:
+        """Espera turno dentro del límite adaptativo sin bloquear el event loop"""
+        first_attempt = True
+        while not self.downloader.concurrency.try_acquire():
+            waiter = asyncio.get_running_loop().create_future()
+            # Quien ya fue despertado y no consiguió hueco conserva su turno
+            if first_attempt:
+                self._waiters.append(waiter)
+            else:
+                self._waiters.appendleft(waiter)
+            first_attempt = False
+            try:
+                await asyncio.wait_for(waiter, SLOT_RECHECK_INTERVAL)
+            except asyncio.TimeoutError:
+                pass  # wait_for cancela el waiter y _wake_next lo salta: volver a intentarlo
+        # Si el límite subió puede haber más hueco: despertar al siguiente
+        self._wake_next()
+
+    def _wake_next(self) -> None:
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                break
+
+    @staticmethod
+    def _remove_partial(segment_path: str) -> None:
+        try:
+            if os.path.exists(segment_path):
+                os.remove(segment_path)
+        except OSError:
+            pass
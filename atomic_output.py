@@ -0,0 +1,52 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Publicación Atómica del Archivo Final
+=====================================
+
+Las etapas de unión (ffmpeg concat, unión en streaming, concatenación
+binaria, descifrado AES) escriben en un archivo temporal oculto junto al
+destino final y lo publican con un rename. Al estar en el mismo directorio,
+el rename es atómico y nunca se convierte en una copia entre sistemas de
+archivos; la biblioteca tampoco ve nunca un MP4 a medio escribir (los
+listados con glob('*.mp4') ignoran los archivos que empiezan por punto).
+"""
+
+import os
+
+
+def staging_path(final_path: str) -> str:
+    """Ruta temporal junto al destino: '.<nombre>.partial<ext>' (conserva la extensión para ffmpeg)"""
+    directory, filename = os.path.split(os.path.abspath(final_path))
+    name, extension = os.path.splitext(filename)
+    return os.path.join(directory, f'.{name}.partial{extension}')
+
+
+def prepare_staging(final_path: str) -> str:
+    """Crea el directorio de destino, elimina restos de un intento anterior y devuelve la ruta temporal"""
+    path = staging_path(final_path)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    discard(path)
+    return path
+
+
+def publish(staged_path: str, final_path: str) -> bool:
+    """
+    Publica el archivo temporal en su destino con un rename atómico.
+
+    Returns:
+        bool: False si el archivo temporal no existe o está vacío
+    """
+    if not os.path.exists(staged_path) or os.path.getsize(staged_path) == 0:
+        return False
+    os.replace(staged_path, final_path)
+    return True
+
+
+def discard(staged_path: str) -> None:
+    """Borra un archivo temporal que no llegó a publicarse"""
+    try:
+        if os.path.exists(staged_path):
+            os.remove(staged_path)
+    except OSError:
+        pass
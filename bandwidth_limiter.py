@@ -0,0 +1,213 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Limitador de Ancho de Banda (Token Bucket)
+==========================================
+
+Hasta ahora la única forma de "dejar ancho de banda a otros usuarios" era el
+modo normal con menos workers, que igualmente satura el enlace a ráfagas.
+Aquí el límite se aplica sobre los bytes escritos: cada trozo recibido
+consume tokens de un cubo global y del cubo de su descarga, y el hilo (o la
+corrutina) espera lo necesario. El paralelismo sigue alto; solo se reparte
+el caudal.
+
+- Límite global en MB/s (con horarios por franja del día)
+- Límite por descarga en MB/s
+- Cambios en caliente desde /api/bandwidth y /api/speed_mode
+"""
+
+import threading
+import time
+from datetime import datetime
+from typing import Dict, List, Optional
+
+MB = 1024 * 1024
+# Ráfaga máxima acumulable, en segundos de caudal
+DEFAULT_BURST_SECONDS = 0.5
+# Cada cuánto se vuelve a mirar la franja horaria activa
+SCHEDULE_CHECK_INTERVAL = 30.0
+
+
+class TokenBucket:
+    """Cubo de tokens (bytes) con deuda: reserve() nunca bloquea, devuelve cuánto esperar"""
+
+    def __init__(self, rate: Optional[float] = None, burst_seconds: float = DEFAULT_BURST_SECONDS):
+        self.burst_seconds = burst_seconds
+        self._lock = threading.Lock()
+        self.rate: Optional[float] = None
+        self._tokens = 0.0
+        self._last = time.monotonic()
+        self.consumed = 0
+        self.set_rate(rate)
+
+    def set_rate(self, rate: Optional[float]) -> None:
+        """Bytes por segundo (None o 0 = sin límite)"""
+        with self._lock:
+            self._refill()
+            self.rate = rate if rate and rate > 0 else None
+            if self.rate is None:
+                self._tokens = 0.0
+            else:
+                self._tokens = min(self._tokens, self.rate * self.burst_seconds)
+
+    def reserve(self, nbytes: int) -> float:
+        """Descuenta nbytes y devuelve los segundos que hay que esperar antes de seguir"""
+        with self._lock:
+            self.consumed += nbytes
+            if self.rate is None:
+                return 0.0
+            self._refill()
+            self._tokens -= nbytes
+            return -self._tokens / self.rate if self._tokens < 0 else 0.0
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        if self.rate is not None:
+            self._tokens = min(self.rate * self.burst_seconds, self._tokens + (now - self._last) * self.rate)
+        self._last = now
+
+
+def _parse_hhmm(value: str) -> int:
+    """'HH:MM' -> minutos desde medianoche"""
+    hours, _, minutes = str(value).strip().partition(':')
+    total = int(hours) * 60 + int(minutes or 0)
+    if not 0 <= total <= 24 * 60:
+        raise ValueError(f"Hora no válida: {value}")
+    return total
+
+
+class BandwidthLimiter:
+    """Registro de límites: cubo global (con horarios) y un cubo por descarga"""
+
+    def __init__(self, global_mbps: Optional[float] = None):
+        self._lock = threading.Lock()
+        self.global_mbps = global_mbps or None
+        self._global = TokenBucket(self._to_rate(self.global_mbps))
+        self._downloads: Dict[str, TokenBucket] = {}
+        self._download_mbps: Dict[str, float] = {}
+        self._schedule: List[Dict[str, object]] = []
+        self._active_rule: Optional[Dict[str, object]] = None
+        self._next_schedule_check = 0.0
+
+    @staticmethod
+    def _to_rate(mbps: Optional[float]) -> Optional[float]:
+        return mbps * MB if mbps and mbps > 0 else None
+
+    def set_global_limit(self, mbps: Optional[float]) -> None:
+        """Límite global base (se aplica fuera de las franjas del horario)"""
+        with self._lock:
+            self.global_mbps = mbps if mbps and mbps > 0 else None
+            self._next_schedule_check = 0.0
+        self._apply_schedule(force=True)
+
+    def set_download_limit(self, download_id: str, mbps: Optional[float]) -> None:
+        """Límite de una descarga (None o 0 lo quita)"""
+        with self._lock:
+            if mbps and mbps > 0:
+                self._download_mbps[download_id] = mbps
+            else:
+                self._download_mbps.pop(download_id, None)
+            bucket = self._downloads.get(download_id)
+        if bucket is not None:
+            bucket.set_rate(self._to_rate(mbps))
+
+    def set_schedule(self, rules: List[Dict[str, object]]) -> None:
+        """
+        Franjas horarias con su propio límite global.
+
+        Args:
+            rules: [{'start': 'HH:MM', 'end': 'HH:MM', 'mbps': float}, ...]; una franja
+                   con start > end cruza la medianoche y mbps 0 significa sin límite
+        """
+        parsed = []
+        for rule in rules or []:
+            parsed.append({
+                'start': _parse_hhmm(rule['start']),
+                'end': _parse_hhmm(rule['end']),
+                'mbps': float(rule.get('mbps') or 0)
+            })
+        with self._lock:
+            self._schedule = parsed
+        self._apply_schedule(force=True)
+
+    def register(self, download_id: str) -> None:
+        with self._lock:
+            if download_id not in self._downloads:
+                self._downloads[download_id] = TokenBucket(self._to_rate(self._download_mbps.get(download_id)))
+
+    def unregister(self, download_id: str) -> None:
+        with self._lock:
+            self._downloads.pop(download_id, None)
+
+    def reserve(self, download_id: Optional[str], nbytes: int) -> float:
+        """Consume nbytes de los cubos global y de la descarga; devuelve la espera necesaria"""
+        self._apply_schedule()
+        delay = self._global.reserve(nbytes)
+        bucket = self._downloads.get(download_id) if download_id is not None else None
+        if bucket is not None:
+            delay = max(delay, bucket.reserve(nbytes))
+        return delay
+
+    def throttle(self, download_id: Optional[str], nbytes: int) -> None:
+        """Versión bloqueante de reserve() para el backend de hilos"""
+        delay = self.reserve(download_id, nbytes)
+        if delay > 0:
+            time.sleep(delay)
+
+    def effective_global_mbps(self) -> Optional[float]:
+        rule = self._active_rule
+        if rule is not None:
+            return rule['mbps'] or None
+        return self.global_mbps
+
+    def _apply_schedule(self, force: bool = False) -> None:
+        now = time.monotonic()
+        if not force and now < self._next_schedule_check:
+            return
+        with self._lock:
+            self._next_schedule_check = now + SCHEDULE_CHECK_INTERVAL
+            current = datetime.now()
+            minute = current.hour * 60 + current.minute
+            active = None
+            for rule in self._schedule:
+                start, end = rule['start'], rule['end']
+                inside = start <= minute < end if start <= end else (minute >= start or minute < end)
+                if inside:
+                    active = rule
+                    break
+            self._active_rule = active
+        self._global.set_rate(self._to_rate(self.effective_global_mbps()))
+
+    def snapshot(self) -> Dict[str, object]:
+        with self._lock:
+            schedule = [{
+                'start': f"{rule['start'] // 60:02d}:{rule['start'] % 60:02d}",
+                'end': f"{rule['end'] // 60:02d}:{rule['end'] % 60:02d}",
+                'mbps': rule['mbps']
+            } for rule in self._schedule]
+            downloads = {
+                download_id: {
+                    'limit_mbps': self._download_mbps.get(download_id),
+                    'bytes': bucket.consumed
+                }
+                for download_id, bucket in self._downloads.items()
+            }
+        return {
+            'global_mbps': self.global_mbps,
+            'effective_global_mbps': self.effective_global_mbps(),
+            'schedule': schedule,
+            'downloads': downloads
+        }
+
+
+_limiter: Optional[BandwidthLimiter] = None
+_limiter_lock = threading.Lock()
+
+
+def get_bandwidth_limiter() -> BandwidthLimiter:
+    """Limitador único del proceso (se crea la primera vez que se pide)"""
+    global _limiter
+    with _limiter_lock:
+        if _limiter is None:
+            _limiter = BandwidthLimiter()
+        return _limiter
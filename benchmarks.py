@@ -0,0 +1,419 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Benchmarks de Rendimiento del Descargador M3U8
+==============================================
+
+Mide el descargador contra un origen HLS local (servido en un proceso
+aparte para no contaminar las métricas de hilos del proceso medido).
+
+Uso:
+    python benchmarks.py backends [--segments 2000] [--workers 200] [--latency 0.05]
+    python benchmarks.py merge [--segments 2000] [--segment-size 1048576]
+    python benchmarks.py playlist [--lines 100000] [--repeat 5]
+"""
+
+import argparse
+import os
+import re
+import shutil
+import socket
+import subprocess
+import tempfile
+import threading
+import time
+import tracemalloc
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from multiprocessing import Process
+from typing import Dict, List, Tuple
+from urllib.parse import urljoin
+
+
+def safe_print(message):
+    """Print seguro que maneja emojis en Windows"""
+    try:
+        print(message)
+    except UnicodeEncodeError:
+        safe_message = message.encode('ascii', errors='replace').decode('ascii')
+        print(safe_message)
+
+
+# ============================================================================
+# ORIGEN HLS LOCAL
+# ============================================================================
+
+def make_ts_payload(size: int) -> bytes:
+    """Genera un segmento MPEG-TS sintético (paquetes de 188 bytes con sync byte 0x47)"""
+    packet = bytes([0x47, 0x00, 0x11, 0x10]) + b'\xff' * 184
+    return packet * max(1, size // 188)
+
+
+def build_media_playlist(segments: int, target_duration: int = 4) -> str:
+    """Playlist VOD con segmentos seg_00000.ts, seg_00001.ts, ..."""
+    lines = ['#EXTM3U', '#EXT-X-VERSION:3', f'#EXT-X-TARGETDURATION:{target_duration}',
+             '#EXT-X-MEDIA-SEQUENCE:0', '#EXT-X-PLAYLIST-TYPE:VOD']
+    for i in range(segments):
+        lines.append(f'#EXTINF:{target_duration}.000,')
+        lines.append(f'seg_{i:05d}.ts')
+    lines.append('#EXT-X-ENDLIST')
+    return '\n'.join(lines) + '\n'
+
+
+class _HLSOriginHandler(BaseHTTPRequestHandler):
+    """Sirve la playlist y los segmentos sintéticos con latencia artificial"""
+    protocol_version = 'HTTP/1.1'  # Keep-alive como un CDN real
+    playlist = b''
+    payload = b''
+    latency = 0.0
+
+    def do_GET(self):
+        if self.path.endswith('.m3u8'):
+            body = self.playlist
+            content_type = 'application/vnd.apple.mpegurl'
+        elif self.path.startswith('/seg_'):
+            if self.latency:
+                time.sleep(self.latency)
+            body = self.payload
+            content_type = 'video/mp2t'
+        else:
+            self.send_error(404)
+            return
+        self.send_response(200)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_HEAD(self):
+        self.send_response(200 if self.path.startswith('/seg_') else 404)
+        self.send_header('Content-Length', str(len(self.payload)))
+        self.end_headers()
+
+    def log_message(self, format, *args):
+        pass
+
+
+def _serve_hls_origin(port: int, segments: int, segment_size: int, latency: float) -> None:
+    _HLSOriginHandler.playlist = build_media_playlist(segments).encode('utf-8')
+    _HLSOriginHandler.payload = make_ts_payload(segment_size)
+    _HLSOriginHandler.latency = latency
+    server = ThreadingHTTPServer(('127.0.0.1', port), _HLSOriginHandler)
+    server.daemon_threads = True
+    server.request_queue_size = 1024
+    server.serve_forever()
+
+
+def start_hls_origin(segments: int, segment_size: int, latency: float) -> Tuple[Process, str]:
+    """Arranca el origen en otro proceso y devuelve (proceso, url de la playlist)"""
+    with socket.socket() as probe:
+        probe.bind(('127.0.0.1', 0))
+        port = probe.getsockname()[1]
+
+    process = Process(target=_serve_hls_origin, args=(port, segments, segment_size, latency), daemon=True)
+    process.start()
+
+    deadline = time.time() + 10
+    while time.time() < deadline:
+        try:
+            with socket.create_connection(('127.0.0.1', port), timeout=0.2):
+                break
+        except OSError:
+            time.sleep(0.05)
+    return process, f'http://127.0.0.1:{port}/index.m3u8'
+
+
+class ThreadPeakSampler:
+    """Muestrea threading.active_count() en segundo plano y guarda el máximo"""
+
+    def __init__(self, interval: float = 0.01):
+        self.interval = interval
+        self.peak = threading.active_count()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._sample, daemon=True)
+
+    def _sample(self):
+        while not self._stop.is_set():
+            self.peak = max(self.peak, threading.active_count())
+            time.sleep(self.interval)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+
+
+# ============================================================================
+# BENCHMARK: BACKEND DE HILOS vs ASYNCIO
+# ============================================================================
+
+def benchmark_backends(segments: int, segment_size: int, workers: int, latency: float) -> List[Dict]:
+    """Descarga la misma playlist con cada backend y compara tiempo, throughput y pico de hilos"""
+    from m3u8_downloader import M3U8Downloader
+
+    process, playlist_url = start_hls_origin(segments, segment_size, latency)
+    results = []
+    try:
+        for backend in ('threads', 'asyncio'):
+            temp_dir = tempfile.mkdtemp(prefix=f'bench_{backend}_')
+            try:
+                downloader = M3U8Downloader(
+                    m3u8_url=playlist_url,
+                    max_workers=workers,
+                    temp_dir=temp_dir,
+                    log_function=lambda message: None,
+                    backend=backend
+                )
+                if downloader.backend != backend:
+                    safe_print(f"⚠️ Backend '{backend}' no disponible, se omite")
+                    continue
+                segment_urls = downloader._get_segment_urls()
+
+                with ThreadPeakSampler() as sampler:
+                    start_time = time.time()
+                    successful = downloader._download_segments_parallel(segment_urls)
+                    elapsed = time.time() - start_time
+
+                total_bytes = sum(os.path.getsize(os.path.join(temp_dir, name)) for name in successful)
+                results.append({
+                    'backend': backend,
+                    'segments': len(successful),
+                    'seconds': elapsed,
+                    'mb_per_second': total_bytes / (1024 * 1024) / elapsed if elapsed > 0 else 0,
+                    'segments_per_second': len(successful) / elapsed if elapsed > 0 else 0,
+                    'peak_threads': sampler.peak
+                })
+            finally:
+                shutil.rmtree(temp_dir, ignore_errors=True)
+    finally:
+        process.terminate()
+        process.join()
+
+    safe_print("")
+    safe_print(f"RESULTADOS: {segments} segmentos de {segment_size // 1024} KB, "
+               f"{workers} workers, latencia {latency * 1000:.0f} ms")
+    safe_print("-" * 72)
+    safe_print(f"{'Backend':<10}{'Segmentos':>10}{'Tiempo (s)':>12}{'MB/s':>10}{'seg/s':>10}{'Pico hilos':>14}")
+    for row in results:
+        safe_print(f"{row['backend']:<10}{row['segments']:>10}{row['seconds']:>12.2f}"
+                   f"{row['mb_per_second']:>10.1f}{row['segments_per_second']:>10.0f}{row['peak_threads']:>14}")
+    return results
+
+
+# ============================================================================
+# BENCHMARK: UNIÓN CON FILELIST (CONCAT DEMUXER) vs CONCATENACIÓN BINARIA
+# ============================================================================
+
+def _make_source_segment(segment_size: int, work_dir: str) -> Tuple[str, bool]:
+    """Segmento de origen: uno real generado con ffmpeg si está disponible, o uno sintético"""
+    source_path = os.path.join(work_dir, 'source.ts')
+    duration = max(1, segment_size // (256 * 1024))
+    try:
+        subprocess.run(['ffmpeg', '-hide_banner', '-loglevel', 'error', '-f', 'lavfi',
+                        '-i', 'testsrc=size=640x360:rate=25', '-t', str(duration),
+                        '-c:v', 'mpeg2video', '-b:v', f'{segment_size * 8 // duration}',
+                        '-f', 'mpegts', '-y', source_path], check=True, capture_output=True)
+        return source_path, True
+    except (FileNotFoundError, subprocess.CalledProcessError):
+        with open(source_path, 'wb') as f:
+            f.write(make_ts_payload(segment_size))
+        return source_path, False
+
+
+def benchmark_merge(segments: int, segment_size: int) -> List[Dict]:
+    """Compara la unión actual (filelist.txt + ffmpeg concat) con la concatenación en el kernel"""
+    from ts_concat import concat_ts_segments
+
+    work_dir = tempfile.mkdtemp(prefix='bench_merge_')
+    results = []
+    try:
+        source_path, have_ffmpeg = _make_source_segment(segment_size, work_dir)
+        segment_paths = []
+        for i in range(segments):
+            path = os.path.join(work_dir, f'segment_{i:05d}.ts')
+            shutil.copyfile(source_path, path)
+            segment_paths.append(path)
+        total_mb = sum(os.path.getsize(path) for path in segment_paths) / (1024 * 1024)
+
+        def timed(label, function):
+            start_time = time.time()
+            function()
+            elapsed = time.time() - start_time
+            results.append({'method': label, 'seconds': elapsed,
+                            'mb_per_second': total_mb / elapsed if elapsed > 0 else 0})
+
+        def python_copy():
+            # Referencia: copia en espacio de usuario, archivo por archivo
+            with open(os.path.join(work_dir, 'copied.ts'), 'wb') as output:
+                for path in segment_paths:
+                    with open(path, 'rb') as segment_file:
+                        shutil.copyfileobj(segment_file, output, 1024 * 1024)
+
+        joined_path = os.path.join(work_dir, 'joined.ts')
+        timed('copyfileobj -> .ts', python_copy)
+        timed('ts_concat -> .ts', lambda: concat_ts_segments(segment_paths, joined_path))
+
+        if have_ffmpeg:
+            list_path = os.path.join(work_dir, 'filelist.txt')
+
+            def concat_list():
+                with open(list_path, 'w', encoding='utf-8') as f:
+                    for path in segment_paths:
+                        f.write(f"file '{path}'\n")
+                subprocess.run(['ffmpeg', '-hide_banner', '-loglevel', 'error', '-f', 'concat', '-safe', '0',
+                                '-i', list_path, '-c', 'copy', '-y', os.path.join(work_dir, 'list.mp4')],
+                               check=True, capture_output=True)
+
+            def ts_concat_remux():
+                concat_ts_segments(segment_paths, joined_path)
+                subprocess.run(['ffmpeg', '-hide_banner', '-loglevel', 'error', '-i', joined_path,
+                                '-c', 'copy', '-y', os.path.join(work_dir, 'joined.mp4')],
+                               check=True, capture_output=True)
+
+            timed('concat_list -> .mp4', concat_list)
+            timed('ts_concat -> .mp4', ts_concat_remux)
+        else:
+            safe_print("⚠️ ffmpeg no disponible: solo se mide la concatenación binaria")
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    safe_print("")
+    safe_print(f"RESULTADOS: {segments} segmentos, {total_mb:.0f} MB en total")
+    safe_print("-" * 52)
+    safe_print(f"{'Método':<24}{'Tiempo (s)':>14}{'MB/s':>14}")
+    for row in results:
+        safe_print(f"{row['method']:<24}{row['seconds']:>14.2f}{row['mb_per_second']:>14.0f}")
+    return results
+
+
+# ============================================================================
+# BENCHMARK: ANÁLISIS DE PLAYLISTS (PASADAS AD-HOC vs PARSER ÚNICO)
+# ============================================================================
+
+def build_large_playlist(lines: int, key_every: int = 500, discontinuity_every: int = 1000) -> str:
+    """Media playlist de unas `lines` líneas con rotación de claves y discontinuidades"""
+    output = ['#EXTM3U', '#EXT-X-VERSION:3', '#EXT-X-TARGETDURATION:4', '#EXT-X-MEDIA-SEQUENCE:0',
+              '#EXT-X-PLAYLIST-TYPE:VOD']
+    i = 0
+    while len(output) < lines - 1:
+        if i % key_every == 0:
+            output.append(f'#EXT-X-KEY:METHOD=AES-128,URI="keys/key_{i // key_every}.bin",IV=0x{i:032x}')
+        if i and i % discontinuity_every == 0:
+            output.append('#EXT-X-DISCONTINUITY')
+        output.append(f'#EXTINF:4.000,segment {i}')
+        output.append(f'media/seg_{i:06d}.ts')
+        i += 1
+    output.append('#EXT-X-ENDLIST')
+    return '\n'.join(output) + '\n'
+
+
+def _legacy_scans(content: str, base_url: str) -> Tuple[List[str], List[Dict]]:
+    """Lo que hacían los consumidores antes del parser compartido: cada uno su pasada por líneas"""
+    # _get_segment_urls: buscar sub-playlists
+    sub_playlists = [line.strip() for line in content.splitlines() if line.strip().endswith('.m3u8')]
+    # _collect_all_segments: URLs de segmentos
+    segments = [urljoin(base_url, line.strip()) for line in content.splitlines()
+                if line.strip() and not line.strip().startswith('#') and not line.strip().endswith('.m3u8')]
+    # DRMResearchModule.analyze_manifest: segmentos por extensión + claves por regex
+    drm_segments = [urljoin(base_url, line.strip()) for line in content.split('\n')
+                    if line.strip() and not line.strip().startswith('#')
+                    and any(ext in line.lower() for ext in ['.ts', '.m4s', '.jpg', '.jpeg', '.png', '.gif'])]
+    keys = [{'method': re.search(r'METHOD=([^,\s]+)', line).group(1),
+             'uri': urljoin(base_url, re.search(r'URI="([^"]+)"', line).group(1))}
+            for line in re.findall(r'#EXT-X-KEY:([^\n]+)', content)]
+    # AESDecryptor.extract_keys_from_m3u8: otra vez las claves
+    aes_keys = [line for line in content.split('\n') if line.strip().startswith('#EXT-X-KEY:')]
+    # extract_m3u8_metadata y parse_master_playlist: resolución, bitrate, variantes y títulos
+    variants = [line for line in content.strip().split('\n') if line.startswith('#EXT-X-STREAM-INF')]
+    titles = [line.split(',', 1)[1].strip() for line in content.strip().split('\n')
+              if line.startswith('#EXTINF:') and ',' in line]
+    del sub_playlists, drm_segments, aes_keys, variants, titles
+    return segments, keys
+
+
+def _retained_bytes(function) -> Tuple[object, int]:
+    """Ejecuta function y devuelve (resultado, bytes que siguen asignados mientras vive el resultado)"""
+    tracemalloc.start()
+    result = function()
+    retained = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return result, retained
+
+
+def benchmark_playlist(lines: int, repeat: int) -> List[Dict]:
+    """Compara las pasadas ad-hoc de cada consumidor con parse_playlist (una pasada, registros __slots__)"""
+    from m3u8_playlist import parse_playlist
+
+    base_url = 'https://cdn.example.com/videos/1234/index.m3u8'
+    content = build_large_playlist(lines)
+    results = []
+
+    def time_once(function):
+        start_time = time.perf_counter()
+        function()
+        return time.perf_counter() - start_time
+
+    def timed(label, function):
+        best = min(time_once(function) for _ in range(max(1, repeat)))
+        results.append({'method': label, 'seconds': best, 'lines_per_second': lines / best if best > 0 else 0})
+
+    timed('pasadas ad-hoc (6)', lambda: _legacy_scans(content, base_url))
+    timed('parse_playlist (1)', lambda: parse_playlist(content, base_url))
+
+    # Memoria retenida: registros dict (un dict por segmento) frente a MediaSegment con __slots__
+    def legacy_records():
+        segments, _ = _legacy_scans(content, base_url)
+        return [{'url': url, 'duration': 4.0, 'sequence': i, 'byte_offset': None, 'byte_length': None,
+                 'key': None, 'map': None, 'discontinuity': False} for i, url in enumerate(segments)]
+
+    legacy, legacy_bytes = _retained_bytes(legacy_records)
+    playlist, model_bytes = _retained_bytes(lambda: parse_playlist(content, base_url))
+    segment_count = len(playlist.segments)
+    del legacy
+
+    safe_print("")
+    safe_print(f"RESULTADOS: {lines} líneas, {segment_count} segmentos, {len(playlist.keys)} claves")
+    safe_print("-" * 58)
+    safe_print(f"{'Método':<24}{'Tiempo (s)':>14}{'Líneas/s':>20}")
+    for row in results:
+        safe_print(f"{row['method']:<24}{row['seconds']:>14.3f}{row['lines_per_second']:>20,.0f}")
+    safe_print("")
+    safe_print(f"Memoria retenida por segmento: dict {legacy_bytes / segment_count:.0f} B, "
+               f"MediaSegment {model_bytes / segment_count:.0f} B")
+    results.append({'method': 'memory', 'dict_bytes_per_segment': legacy_bytes / segment_count,
+                    'slots_bytes_per_segment': model_bytes / segment_count})
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmarks del descargador M3U8')
+    subparsers = parser.add_subparsers(dest='benchmark', required=True)
+
+    backends_parser = subparsers.add_parser('backends', help='Backend de hilos vs asyncio')
+    backends_parser.add_argument('--segments', type=int, default=2000)
+    backends_parser.add_argument('--segment-size', type=int, default=256 * 1024)
+    backends_parser.add_argument('--workers', type=int, default=200)
+    backends_parser.add_argument('--latency', type=float, default=0.05,
+                                 help='Latencia artificial por segmento en segundos')
+
+    merge_parser = subparsers.add_parser('merge', help='Unión con filelist vs concatenación binaria')
+    merge_parser.add_argument('--segments', type=int, default=2000)
+    merge_parser.add_argument('--segment-size', type=int, default=1024 * 1024)
+
+    playlist_parser = subparsers.add_parser('playlist', help='Pasadas ad-hoc vs parser único de playlists')
+    playlist_parser.add_argument('--lines', type=int, default=100000)
+    playlist_parser.add_argument('--repeat', type=int, default=5)
+
+    args = parser.parse_args()
+    if args.benchmark == 'backends':
+        benchmark_backends(args.segments, args.segment_size, args.workers, args.latency)
+    elif args.benchmark == 'merge':
+        benchmark_merge(args.segments, args.segment_size)
+    elif args.benchmark == 'playlist':
+        benchmark_playlist(args.lines, args.repeat)
+
+
+if __name__ == '__main__':
+    main()
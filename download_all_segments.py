@@ -10,12 +10,15 @@ de un contenido HLS para análisis académico completo.
 
 import json
 import os
-import requests
 import time
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from concurrent.futures import ThreadPoolExecutor
 from tqdm import tqdm
 from datetime import datetime
 
+from http_pool import shared_session
+from segment_scheduler import DEFAULT_WINDOW_SLACK, run_windowed
+from ts_validator import validate_ts_bytes, validate_ts_file
+
 def safe_print(message):
     """Print seguro que maneja emojis en Windows"""
     try:
@@ -31,7 +34,7 @@ class CompleteSegmentDownloader:
         self.analysis_file = analysis_file
         self.output_dir = output_dir
         self.max_workers = max_workers
-        self.session = requests.Session()
+        self.session = shared_session(verify=True)  # Conexiones compartidas del proceso
         self.download_stats = {
             'total_segments': 0,
             'downloaded': 0,
@@ -87,8 +90,8 @@ class CompleteSegmentDownloader:
             with open(segment_path, 'wb') as f:
                 f.write(response.content)
             
-            # Validar que es MPEG-TS válido
-            is_valid = self.validate_ts_segment(segment_path)
+            # Validar que es MPEG-TS válido (sobre los bytes ya en memoria)
+            is_valid = validate_ts_bytes(response.content, require_tables=False)['valid']
             
             return {
                 'success': True, 
@@ -102,12 +105,7 @@ class CompleteSegmentDownloader:
     
     def validate_ts_segment(self, segment_path):
         """Valida que un segmento sea MPEG-TS válido"""
-        try:
-            with open(segment_path, 'rb') as f:
-                first_byte = f.read(1)
-                return len(first_byte) > 0 and first_byte[0] == 0x47
-        except:
-            return False
+        return validate_ts_file(segment_path, require_tables=False)['valid']
     
     def download_all_segments(self):
         """Descarga todos los segmentos usando threading"""
@@ -117,48 +115,51 @@ class CompleteSegmentDownloader:
         # Cargar URLs de segmentos
         segments = self.load_analysis_data()
         
-        # Preparar datos para descarga
-        segment_data = [(i, url) for i, url in enumerate(segments)]
+        # Preparar datos para descarga (generador: las tareas se crean a medida que hay hueco)
+        segment_data = enumerate(segments)
         
         # Estadísticas
         self.download_stats['start_time'] = datetime.now()
-        downloaded_count = 0
-        failed_count = 0
-        total_size = 0
-        cached_count = 0
-        valid_segments = 0
+        counts = {'downloaded': 0, 'failed': 0, 'total_size': 0, 'cached': 0, 'valid': 0}
         
         safe_print(f"Descargando {len(segments)} segmentos con {self.max_workers} workers...")
         safe_print(f"Directorio de salida: {self.output_dir}")
         safe_print("")
         
-        # Descarga paralela con barra de progreso
-        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
-            # Enviar todas las tareas
-            futures = {executor.submit(self.download_single_segment, seg_info): seg_info 
-                      for seg_info in segment_data}
-            
-            # Procesar resultados con barra de progreso
-            with tqdm(total=len(segments), desc="Descargando segmentos", unit="seg") as pbar:
-                for future in as_completed(futures):
-                    result = future.result()
+        # Descarga paralela con barra de progreso; solo N+k tareas pendientes a la vez
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor, \
+                tqdm(total=len(segments), desc="Descargando segmentos", unit="seg") as pbar:
+
+            def on_complete(seg_info, result):
+                if result['success']:
+                    counts['downloaded'] += 1
+                    counts['total_size'] += result['size']
                     
-                    if result['success']:
-                        downloaded_count += 1
-                        total_size += result['size']
-                        
-                        if result.get('cached', False):
-                            cached_count += 1
-                        
-                        if result.get('valid_ts', False):
-                            valid_segments += 1
-                        
-                        # Actualizar descripción de la barra
-                        pbar.set_description(f"Descargados: {downloaded_count}, Fallos: {failed_count}")
-                    else:
-                        failed_count += 1
+                    if result.get('cached', False):
+                        counts['cached'] += 1
                     
-                    pbar.update(1)
+                    if result.get('valid_ts', False):
+                        counts['valid'] += 1
+                    
+                    # Actualizar descripción de la barra
+                    pbar.set_description(f"Descargados: {counts['downloaded']}, Fallos: {counts['failed']}")
+                else:
+                    counts['failed'] += 1
+                
+                pbar.update(1)
+
+            run_windowed(
+                lambda seg_info: executor.submit(self.download_single_segment, seg_info),
+                segment_data,
+                window=self.max_workers + DEFAULT_WINDOW_SLACK,
+                on_complete=on_complete
+            )
+        
+        downloaded_count = counts['downloaded']
+        failed_count = counts['failed']
+        total_size = counts['total_size']
+        cached_count = counts['cached']
+        valid_segments = counts['valid']
         
         # Finalizar estadísticas
         self.download_stats['end_time'] = datetime.now()
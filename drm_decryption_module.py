@@ -16,15 +16,19 @@ NO para uso comercial o distribución no autorizada.
 import os
 import json
 import struct
-import requests
 import urllib3
 # Suprimir warnings de SSL no verificado
 urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
 from typing import Dict, List, Optional, Tuple
 from datetime import datetime
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from concurrent.futures import ThreadPoolExecutor
 from tqdm import tqdm
 
+from atomic_output import discard, prepare_staging, publish
+from http_pool import shared_session
+from segment_scheduler import DEFAULT_MAX_REORDER, DEFAULT_WINDOW_SLACK, run_windowed
+from ts_validator import validate_ts_files
+
 # Funciones de criptografía
 try:
     from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
@@ -52,8 +56,7 @@ class DRMDecryptionModule:
     def __init__(self, analysis_file: str, output_dir: str = "decrypted_content", progress_callback=None):
         self.analysis_file = analysis_file
         self.output_dir = output_dir
-        self.session = requests.Session()
-        self.session.verify = False  # Deshabilitar verificación SSL para certificados auto-firmados
+        self.session = shared_session(verify=False)  # Deshabilitar verificación SSL para certificados auto-firmados
         self.progress_callback = progress_callback
         self.decryption_stats = {
             'total_segments': 0,
@@ -301,10 +304,11 @@ class DRMDecryptionModule:
         
         # Preparar segmentos para procesamiento
         segments = manifest_info.get('segments', [])
-        segment_data = [(i, url) for i, url in enumerate(segments)]
+        segment_data = enumerate(segments)  # Perezoso: la ventana los pide según hay hueco
         
         self.decryption_stats['total_segments'] = len(segments)
         self.decryption_stats['start_time'] = datetime.now()
+        self.decryption_stats['current_segment'] = 0
         
         # Contadores
         results = []
@@ -313,49 +317,52 @@ class DRMDecryptionModule:
         safe_print(f"Claves disponibles: {len(decryption_keys)}")
         safe_print("")
         
-        # Procesamiento paralelo
-        with ThreadPoolExecutor(max_workers=max_workers) as executor:
-            futures = {executor.submit(self.process_segment_with_decryption, 
-                                     seg_info, decryption_keys): seg_info 
-                      for seg_info in segment_data}
-            
-            # Procesar con barra de progreso
-            with tqdm(total=len(segments), desc="Descifrando segmentos", unit="seg") as pbar:
-                for future in as_completed(futures):
-                    result = future.result()
-                    results.append(result)
-                    
-                    # Actualizar estadísticas
-                    if result['encrypted']:
-                        self.decryption_stats['encrypted_segments'] += 1
-                    
-                    if result['decrypted'] and result['valid_ts']:
-                        self.decryption_stats['decrypted_successfully'] += 1
-                    elif result['encrypted'] and not result['decrypted']:
-                        self.decryption_stats['decryption_failed'] += 1
-                    
-                    # Actualizar contador de progreso
-                    self.decryption_stats['current_segment'] = len(results)
-                    
-                    # Llamar callback de progreso si está disponible (cada segmento procesado)
-                    if self.progress_callback:
-                        progress_data = {
-                            'status': 'processing',
-                            'current_segment': self.decryption_stats['current_segment'],
-                            'total_segments': self.decryption_stats['total_segments'],
-                            'decrypted_successfully': self.decryption_stats['decrypted_successfully'],
-                            'decryption_failed': self.decryption_stats['decryption_failed'],
-                            'encrypted_segments': self.decryption_stats['encrypted_segments'],
-                            'start_time': self.decryption_stats['start_time'].timestamp() if self.decryption_stats['start_time'] else None,
-                            'timestamp': datetime.now().timestamp()
-                        }
-                        self.progress_callback(progress_data)
-                    
-                    # Actualizar descripción
-                    desc = f"Descifrados: {self.decryption_stats['decrypted_successfully']}, " \
-                           f"Fallos: {self.decryption_stats['decryption_failed']}"
-                    pbar.set_description(desc)
-                    pbar.update(1)
+        # Procesamiento paralelo con ventana deslizante (no un future por segmento)
+        with ThreadPoolExecutor(max_workers=max_workers) as executor, \
+                tqdm(total=len(segments), desc="Descifrando segmentos", unit="seg") as pbar:
+
+            def on_complete(seg_info, result):
+                # Actualizar estadísticas
+                if result['encrypted']:
+                    self.decryption_stats['encrypted_segments'] += 1
+                
+                if result['decrypted'] and result['valid_ts']:
+                    self.decryption_stats['decrypted_successfully'] += 1
+                elif result['encrypted'] and not result['decrypted']:
+                    self.decryption_stats['decryption_failed'] += 1
+                
+                # Actualizar contador de progreso
+                self.decryption_stats['current_segment'] += 1
+                
+                # Llamar callback de progreso si está disponible (cada segmento procesado)
+                if self.progress_callback:
+                    progress_data = {
+                        'status': 'processing',
+                        'current_segment': self.decryption_stats['current_segment'],
+                        'total_segments': self.decryption_stats['total_segments'],
+                        'decrypted_successfully': self.decryption_stats['decrypted_successfully'],
+                        'decryption_failed': self.decryption_stats['decryption_failed'],
+                        'encrypted_segments': self.decryption_stats['encrypted_segments'],
+                        'start_time': self.decryption_stats['start_time'].timestamp() if self.decryption_stats['start_time'] else None,
+                        'timestamp': datetime.now().timestamp()
+                    }
+                    self.progress_callback(progress_data)
+                
+                # Actualizar descripción
+                desc = f"Descifrados: {self.decryption_stats['decrypted_successfully']}, " \
+                       f"Fallos: {self.decryption_stats['decryption_failed']}"
+                pbar.set_description(desc)
+                pbar.update(1)
+
+            run_windowed(
+                lambda seg_info: executor.submit(self.process_segment_with_decryption, seg_info, decryption_keys),
+                segment_data,
+                window=max_workers + DEFAULT_WINDOW_SLACK,
+                on_complete=on_complete,
+                on_ordered=lambda seg_info, result: results.append(result),  # Reporte en orden de playlist
+                # Un segmento atascado no deja crecer el buffer de reordenación hasta toda la playlist
+                max_reorder=max(DEFAULT_MAX_REORDER, max_workers + DEFAULT_WINDOW_SLACK)
+            )
         
         # Finalizar
         self.decryption_stats['end_time'] = datetime.now()
@@ -540,25 +547,19 @@ class DRMDecryptionModule:
             
             safe_print(f"Encontrados {len(segment_files)} segmentos para validar y unir")
             
-            # Validar segmentos con ffprobe para evitar corruptos
+            # Validar segmentos para evitar corruptos: sync bytes, continuidad y PAT/PMT
+            # en un pool de procesos, en lugar de un ffprobe por segmento
             valid_segments = []
             corrupted_count = 0
             
+            reports = validate_ts_files([os.path.join(decrypted_dir, f) for f in segment_files])
             for segment_file in segment_files:
-                segment_path = os.path.join(decrypted_dir, segment_file)
-                
-                # Verificar con ffprobe si el segmento es válido
-                probe_cmd = ['ffprobe', '-v', 'quiet', '-show_entries', 'format=duration', segment_path]
-                try:
-                    probe_result = subprocess.run(probe_cmd, capture_output=True, text=True, timeout=5)
-                    if probe_result.returncode == 0:
-                        valid_segments.append(segment_file)
-                    else:
-                        corrupted_count += 1
-                        safe_print(f"Omitiendo segmento corrupto: {segment_file}")
-                except subprocess.TimeoutExpired:
+                report = reports[os.path.join(decrypted_dir, segment_file)]
+                if report['valid']:
+                    valid_segments.append(segment_file)
+                else:
                     corrupted_count += 1
-                    safe_print(f"Timeout verificando segmento: {segment_file}")
+                    safe_print(f"Omitiendo segmento corrupto: {segment_file} ({report['reason']})")
             
             if not valid_segments:
                 merge_result['error'] = "No se encontraron segmentos válidos para unir"
@@ -588,6 +589,8 @@ class DRMDecryptionModule:
             safe_print(f"Archivo de salida: {output_path}")
             safe_print("Ejecutando FFmpeg para unir segmentos...")
             
+            staged_output = prepare_staging(output_path)
+            
             # Comando FFmpeg para concatenar segmentos con configuración mejorada y progreso
             ffmpeg_cmd = [
                 'ffmpeg',
@@ -600,7 +603,7 @@ class DRMDecryptionModule:
                 '-progress', 'pipe:1',  # Enviar progreso a stdout
                 '-v', 'warning',  # Reducir verbosidad
                 '-y',  # Sobrescribir archivo de salida
-                output_path
+                staged_output  # Temporal junto al destino, publicado con rename atómico
             ]
             
             # Ejecutar FFmpeg con monitoreo de progreso
@@ -680,7 +683,7 @@ class DRMDecryptionModule:
             
             if result.returncode == 0:
                 # Unión exitosa
-                if os.path.exists(output_path):
+                if publish(staged_output, output_path):
                     file_size = os.path.getsize(output_path)
                     
                     merge_result.update({
@@ -708,6 +711,7 @@ class DRMDecryptionModule:
                     merge_result['error'] = "Archivo de salida no fue creado por FFmpeg"
             else:
                 # Error en FFmpeg
+                discard(staged_output)
                 error_msg = result.stderr if result.stderr else "Error desconocido en FFmpeg"
                 merge_result['error'] = f"FFmpeg falló: {error_msg}"
                 safe_print(f"❌ Error en FFmpeg: {error_msg}")
@@ -12,20 +12,22 @@ Propósito: Análisis educativo de mecanismos DRM en contenido HLS
 Uso: Solo para fines académicos y de investigación
 """
 
-import requests
 import urllib3
 # Suprimir warnings de SSL no verificado
 urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
-import re
 import os
 import struct
 import tempfile
 import json
 from datetime import datetime
-from urllib.parse import urljoin, urlparse
+from urllib.parse import urlparse
 from typing import Dict, List, Optional, Tuple
 import logging
 
+from http_pool import shared_session
+from manifest_cache import get_manifest_cache
+from m3u8_playlist import EncryptionKey, Playlist, parse_playlist
+
 # Función segura para print con emojis en Windows
 def safe_print(message):
     """Print seguro que maneja emojis en Windows"""
@@ -56,8 +58,8 @@ class DRMResearchModule:
     def __init__(self, research_dir: str = "drm_research", thesis_mode: bool = True):
         self.thesis_mode = thesis_mode
         self.research_dir = research_dir
-        self.session = requests.Session()
-        self.session.verify = False  # Deshabilitar verificación SSL para certificados auto-firmados
+        # Sesión propia sobre el pool de conexiones compartido del proceso
+        self.session = shared_session(verify=False)  # Deshabilitar verificación SSL para certificados auto-firmados
         self.setup_research_environment()
         self.analysis_log = []
         
@@ -168,49 +170,27 @@ class DRMResearchModule:
         """Analiza el manifest M3U8 en detalle"""
         self.logger.info("Analizando estructura del manifest M3U8")
         
-        response = self.session.get(m3u8_url)
-        response.raise_for_status()
-        
-        manifest_content = response.text
+        manifest_content = get_manifest_cache().fetch(self.session, m3u8_url, timeout=15)
+        playlist = parse_playlist(manifest_content, m3u8_url)
         
         manifest_info = {
             'url': m3u8_url,
             'content_length': len(manifest_content),
-            'is_master_playlist': '#EXT-X-STREAM-INF' in manifest_content,
-            'has_encryption': '#EXT-X-KEY' in manifest_content,
-            'segments': [],
-            'encryption_keys': [],
+            'is_master_playlist': playlist.is_master,
+            'has_encryption': bool(playlist.keys),
+            # Segmentos (incluyendo formatos disfrazados: .jpg, .png...)
+            'segments': [segment.url for segment in playlist.segments],
+            # Información de claves de encriptación
+            'encryption_keys': [self.parse_encryption_key(key) for key in playlist.keys],
             'raw_content': manifest_content
         }
         
-        # Extraer segmentos (incluyendo formatos disfrazados)
-        lines = manifest_content.split('\n')
-        segments = []
-        
-        for line in lines:
-            line = line.strip()
-            # Buscar líneas que no son comentarios y contienen URLs de segmentos
-            if line and not line.startswith('#'):
-                # Detectar diferentes formatos de segmentos
-                if any(ext in line.lower() for ext in ['.ts', '.m4s', '.jpg', '.jpeg', '.png', '.gif']):
-                    segment_url = urljoin(m3u8_url, line)
-                    segments.append(segment_url)
-                    manifest_info['segments'].append(segment_url)
-        
-        # Extraer información de claves de encriptación
-        key_pattern = r'#EXT-X-KEY:([^\n]+)'
-        key_lines = re.findall(key_pattern, manifest_content)
-        
-        for key_line in key_lines:
-            key_info = self.parse_encryption_key_line(key_line, m3u8_url)
-            manifest_info['encryption_keys'].append(key_info)
-        
-        self.logger.info(f"Manifest analizado: {len(segments)} segmentos, {len(key_lines)} claves")
+        self.logger.info(f"Manifest analizado: {len(playlist.segments)} segmentos, {len(playlist.keys)} claves")
         
         # Si es Master Playlist y no tiene claves, analizar el child playlist
         if manifest_info['is_master_playlist'] and not manifest_info['has_encryption']:
             self.logger.info("Master Playlist detectado sin claves, analizando child playlist...")
-            child_url = self._get_best_quality_child_playlist(m3u8_url, manifest_content)
+            child_url = self._get_best_quality_child_playlist(playlist)
             if child_url and child_url != m3u8_url:
                 self.logger.info(f"Analizando child playlist: {child_url}")
                 child_manifest = self.analyze_manifest(child_url)
@@ -227,67 +207,35 @@ class DRMResearchModule:
         
         return manifest_info
     
-    def _get_best_quality_child_playlist(self, m3u8_url: str, manifest_content: str) -> str:
+    def _get_best_quality_child_playlist(self, playlist: Playlist) -> Optional[str]:
         """Obtiene la URL del child playlist de mejor calidad desde un Master Playlist"""
         best_url = None
         best_bandwidth = 0
         
-        lines = manifest_content.strip().split('\n')
-        
-        for i, line in enumerate(lines):
-            if line.startswith('#EXT-X-STREAM-INF'):
-                # Extraer BANDWIDTH
-                bandwidth_match = re.search(r'BANDWIDTH=(\d+)', line)
-                bandwidth = int(bandwidth_match.group(1)) if bandwidth_match else 0
-                
-                # La siguiente línea debe contener la URL
-                if i + 1 < len(lines):
-                    url_line = lines[i + 1].strip()
-                    if url_line and not url_line.startswith('#'):
-                        # Convertir URL relativa a absoluta
-                        if url_line.startswith('http'):
-                            quality_url = url_line
-                        else:
-                            quality_url = urljoin(m3u8_url, url_line)
-                        
-                        # Mantener la mejor calidad (mayor bandwidth)
-                        if bandwidth > best_bandwidth:
-                            best_bandwidth = bandwidth
-                            best_url = quality_url
+        for variant in playlist.variants:
+            # Mantener la mejor calidad (mayor bandwidth)
+            if variant.bandwidth > best_bandwidth:
+                best_bandwidth = variant.bandwidth
+                best_url = variant.url
         
         return best_url
     
-    def parse_encryption_key_line(self, key_line: str, base_url: str) -> Dict:
-        """Parsea línea EXT-X-KEY para extraer información de encriptación"""
+    def parse_encryption_key(self, key: EncryptionKey) -> Dict:
+        """Convierte una etiqueta EXT-X-KEY ya analizada en el dict de información de encriptación"""
         key_info = {
-            'raw_line': key_line,
-            'method': None,
-            'uri': None,
+            'raw_line': key.raw,
+            'method': key.method,
+            'uri': key.uri,  # Ya resuelta contra la URL del manifest
             'iv': None,
-            'key_format': None,
-            'key_format_versions': None
+            'key_format': key.key_format,
+            'key_format_versions': key.key_format_versions
         }
         
-        # Extraer método de encriptación
-        method_match = re.search(r'METHOD=([^,\s]+)', key_line)
-        if method_match:
-            key_info['method'] = method_match.group(1)
-        
-        # Extraer URI de la clave
-        uri_match = re.search(r'URI="([^"]+)"', key_line)
-        if uri_match:
-            key_info['uri'] = urljoin(base_url, uri_match.group(1))
-        
-        # Extraer IV (Initialization Vector)
-        iv_match = re.search(r'IV=0x([0-9A-Fa-f]+)', key_line)
-        if iv_match:
-            key_info['iv'] = iv_match.group(1)
-            key_info['iv_bytes'] = bytes.fromhex(iv_match.group(1))
-        
-        # Extraer formato de clave
-        format_match = re.search(r'KEYFORMAT="([^"]+)"', key_line)
-        if format_match:
-            key_info['key_format'] = format_match.group(1)
+        # IV (Initialization Vector) en hexadecimal sin el prefijo 0x
+        iv_bytes = key.iv_bytes
+        if iv_bytes is not None:
+            key_info['iv'] = iv_bytes.hex()
+            key_info['iv_bytes'] = iv_bytes
         
         return key_info
     
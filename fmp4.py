@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Segmentos fMP4/CMAF
+===================
+
+Las playlists HLS con #EXT-X-MAP sirven un init segment (ftyp + moov) y
+fragmentos .m4s (styp/moof + mdat). No llevan sync byte 0x47, así que se
+reconocen por la cabecera de su primera caja ISO-BMFF.
+
+Un MP4 fragmentado reproducible es simplemente el init seguido de los
+fragmentos en orden: la unión es una concatenación binaria, sin ffmpeg.
+Con pistas alternativas ese mismo flujo se envía por stdin al ffmpeg que las
+multiplexa, sin escribir antes el MP4 solo de video.
+Si el init cambia a mitad de playlist (discontinuidades), el nuevo init se
+inserta antes del primer fragmento que lo usa.
+"""
+
+import os
+import shutil
+import struct
+import subprocess
+import tempfile
+from typing import Callable, List, Optional, Sequence, Tuple
+
+from ts_concat import concat_ts_segments
+
+# Cajas con las que puede empezar un fragmento (.m4s) y un init segment
+FRAGMENT_BOX_TYPES = {b'styp', b'moof', b'sidx', b'emsg', b'prft', b'free', b'skip'}
+INIT_BOX_TYPES = {b'ftyp', b'moov'}
+BOX_HEADER_SIZE = 8
+# Trozo de copia de cada archivo hacia el stdin de ffmpeg
+PIPE_CHUNK_SIZE = 1024 * 1024
+
+
+def read_box_header(data, offset: int = 0) -> Optional[Tuple[int, bytes]]:
+    """(tamaño, tipo) de la caja que empieza en offset, o None si la cabecera no es plausible"""
+    if len(data) < offset + BOX_HEADER_SIZE:
+        return None
+    size, box_type = struct.unpack_from('>I4s', data, offset)
+    if size == 1:  # largesize de 64 bits a continuación
+        if len(data) < offset + 16:
+            return None
+        size = struct.unpack_from('>Q', data, offset + 8)[0]
+    elif size != 0 and size < BOX_HEADER_SIZE:  # 0 = hasta el final del archivo
+        return None
+    if not all(0x20 <= byte < 0x7F for byte in box_type):
+        return None
+    return size, bytes(box_type)
+
+
+def is_fragment_header(data) -> bool:
+    """True si los bytes empiezan como un fragmento fMP4 (styp/moof/sidx...)"""
+    box = read_box_header(data)
+    return box is not None and box[1] in FRAGMENT_BOX_TYPES
+
+
+def is_init_header(data) -> bool:
+    """True si los bytes empiezan como un init segment (ftyp o moov)"""
+    box = read_box_header(data)
+    return box is not None and box[1] in INIT_BOX_TYPES
+
+
+def concat_fmp4_segments(segment_paths: Sequence[str], init_paths: Sequence[Optional[str]], output_path: str,
+                         sizes: Optional[Sequence[int]] = None,
+                         log_function: Optional[Callable[[str], None]] = None) -> int:
+    """
+    Une init segment y fragmentos en un único MP4 fragmentado.
+
+    Args:
+        segment_paths: Rutas de los fragmentos en orden de playlist
+        init_paths: Init segment de cada fragmento (misma longitud que segment_paths)
+        output_path: Archivo de salida (se sobrescribe)
+        sizes: Tamaños ya conocidos de cada fragmento (evita un stat por archivo)
+        log_function: Función de logging
+
+    Returns:
+        int: Bytes escritos en output_path
+    """
+    paths, path_sizes = _stream_paths(segment_paths, init_paths, sizes)
+    return concat_ts_segments(paths, output_path, sizes=path_sizes, log_function=log_function)
+
+
+def pipe_fmp4_segments(segment_paths: Sequence[str], init_paths: Sequence[Optional[str]], command: List[str],
+                       log_function: Optional[Callable[[str], None]] = None) -> None:
+    """
+    Envía init segment y fragmentos por el stdin de un ffmpeg (entrada `-f mp4 -i pipe:0`).
+
+    Con pistas alternativas el MP4 fragmentado no llega a escribirse: ffmpeg lo
+    multiplexa con las pistas en la misma pasada y solo escribe la salida final.
+
+    Raises:
+        subprocess.CalledProcessError: Si ffmpeg falla (stderr en el atributo stderr)
+    """
+    log = log_function or print
+    paths, _ = _stream_paths(segment_paths, init_paths, None)
+    log(f"🎞️ Enviando init segment + {len(segment_paths)} fragmentos fMP4 a ffmpeg...")
+    with tempfile.TemporaryFile() as stderr_file:
+        process = subprocess.Popen(command, stdin=subprocess.PIPE, stdout=subprocess.DEVNULL, stderr=stderr_file)
+        try:
+            for path in paths:
+                with open(path, 'rb') as source:
+                    shutil.copyfileobj(source, process.stdin, PIPE_CHUNK_SIZE)
+        except BrokenPipeError:
+            pass  # ffmpeg terminó antes de tiempo: su código de salida dice por qué
+        except OSError:
+            process.kill()
+            raise
+        finally:
+            try:
+                process.stdin.close()
+            except OSError:
+                pass
+        returncode = process.wait()
+        if returncode != 0:
+            stderr_file.seek(0)
+            stderr = stderr_file.read().decode('utf-8', errors='replace')[-500:]
+            raise subprocess.CalledProcessError(returncode, command, stderr=stderr)
+
+
+def _stream_paths(segment_paths: Sequence[str], init_paths: Sequence[Optional[str]],
+                  sizes: Optional[Sequence[int]]) -> Tuple[List[str], Optional[List[int]]]:
+    """Archivos en orden de escritura (cada init antes del primer fragmento que lo usa) y sus tamaños"""
+    paths: List[str] = []
+    path_sizes: Optional[List[Optional[int]]] = [] if sizes is not None else None
+    current_init = None
+    for position, (segment_path, init_path) in enumerate(zip(segment_paths, init_paths)):
+        if init_path is not None and init_path != current_init:
+            paths.append(init_path)
+            if path_sizes is not None:
+                path_sizes.append(None)
+            current_init = init_path
+        paths.append(segment_path)
+        if path_sizes is not None:
+            path_sizes.append(sizes[position])
+
+    if path_sizes is not None and any(size is None for size in path_sizes):
+        # Los init son pequeños: medir solo esos
+        path_sizes = [size if size is not None else os.path.getsize(path) for path, size in zip(paths, path_sizes)]
+    return paths, path_sizes
@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Peticiones Duplicadas (Hedging) para Segmentos Lentos
+=====================================================
+
+Unos pocos segmentos por descarga tardan 10 veces la mediana y, con la
+unión en orden, son ellos los que marcan el tiempo total. Con hedging,
+cuando una petición supera un percentil de la latencia observada se lanza
+una copia y la primera respuesta completa y válida gana; la otra se aborta.
+
+- HedgingPolicy: percentil de latencia, presupuesto máximo de copias y contadores
+- HedgeRace: coordina a los dos contendientes de un mismo segmento
+
+Al ganar, la respuesta HTTP del perdedor se corta (shutdown del socket): un
+perdedor bloqueado en una lectura no espera al timeout para soltar su hueco.
+"""
+
+import socket
+import threading
+from collections import deque
+from typing import Any, Deque, Dict, Optional
+
+# Contendientes de una carrera
+PRIMARY = 0
+HEDGE = 1
+
+
+class HedgingPolicy:
+    """Decide cuándo duplicar una petición y lleva la cuenta de copias lanzadas y ganadas"""
+
+    def __init__(self, percentile: float = 0.95, budget_ratio: float = 0.05, min_samples: int = 20,
+                 min_delay: float = 0.5, window: int = 500):
+        self.percentile = min(max(percentile, 0.5), 0.999)
+        self.budget_ratio = budget_ratio
+        self.min_samples = min_samples
+        self.min_delay = min_delay
+        self._latencies: Deque[float] = deque(maxlen=window)
+        self._threshold: Optional[float] = None
+        self._samples_since_update = 0
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.issued = 0
+        self.won = 0
+
+    def record_latency(self, latency: float) -> None:
+        """Latencia de una petición completada con éxito (no se registran las copias)"""
+        with self._lock:
+            self._latencies.append(latency)
+            self._samples_since_update += 1
+            # Recalcular el percentil cada cierto número de muestras, no en cada una
+            if len(self._latencies) >= self.min_samples and (
+                    self._threshold is None or self._samples_since_update >= 20):
+                ordered = sorted(self._latencies)
+                position = min(len(ordered) - 1, int(len(ordered) * self.percentile))
+                self._threshold = max(self.min_delay, ordered[position])
+                self._samples_since_update = 0
+
+    def delay(self) -> Optional[float]:
+        """Segundos tras los que una petición se considera rezagada (None sin muestras suficientes)"""
+        with self._lock:
+            self.requests += 1
+            return self._threshold
+
+    def try_spend(self) -> bool:
+        """Reserva una copia si el presupuesto lo permite (fracción de las peticiones totales)"""
+        with self._lock:
+            if self.issued + 1 > max(1.0, self.requests * self.budget_ratio):
+                return False
+            self.issued += 1
+            return True
+
+    def record_win(self) -> None:
+        with self._lock:
+            self.won += 1
+
+    def snapshot(self) -> Dict[str, object]:
+        with self._lock:
+            return {
+                'requests': self.requests,
+                'hedges_issued': self.issued,
+                'hedges_won': self.won,
+                'threshold_seconds': round(self._threshold, 3) if self._threshold else None,
+                'percentile': self.percentile,
+                'budget_ratio': self.budget_ratio
+            }
+
+
+class HedgeRace:
+    """Carrera entre la petición original y su copia: solo el primero en terminar bien publica"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.winner: Optional[int] = None
+        self._responses: Dict[int, Any] = {}
+
+    @property
+    def decided(self) -> bool:
+        return self.winner is not None
+
+    def lost(self, contender: int) -> bool:
+        """True si el otro contendiente ya ganó (el perdedor debe abortar cuanto antes)"""
+        return self.winner is not None and self.winner != contender
+
+    def attach(self, contender: int, response: Any) -> bool:
+        """Registra la respuesta en curso de un contendiente. False si ya perdió (debe abortar)"""
+        with self._lock:
+            if self.lost(contender):
+                return False
+            self._responses[contender] = response
+            return True
+
+    def claim(self, contender: int) -> bool:
+        """Intenta ganar la carrera. Devuelve True solo al primero que lo pide y corta al otro"""
+        with self._lock:
+            if self.winner is not None:
+                return self.winner == contender
+            self.winner = contender
+            losers = [response for owner, response in self._responses.items() if owner != contender]
+            self._responses.clear()
+        for response in losers:
+            _abort_response(response)
+        return True
+
+    @staticmethod
+    def temp_filename(filename: str, contender: int) -> str:
+        """Cada contendiente escribe en su propio archivo hasta ganar"""
+        return f'{filename}.h{contender}'
+
+
+def _abort_response(response: Any) -> None:
+    """Corta una respuesta de requests en curso: cerrar no basta para despertar un recv bloqueado"""
+    connection = getattr(getattr(response, 'raw', None), 'connection', None)
+    sock = getattr(connection, 'sock', None)
+    try:
+        if sock is not None:
+            sock.shutdown(socket.SHUT_RDWR)
+    except OSError:
+        pass
+    try:
+        response.close()
+    except Exception:
+        pass
@@ -0,0 +1,222 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Pool HTTP Compartido por Todo el Proceso
+========================================
+
+Cada cliente (M3U8Downloader, AESDecryptor, DRMResearchModule, las rutas de
+metadatos...) sigue teniendo su propia requests.Session con sus headers y
+cookies, pero todas montan el MISMO adaptador de transporte. Así dos
+descargas del mismo CDN reutilizan las conexiones TLS ya abiertas.
+
+- Pools de conexiones por host (urllib3 ya los separa por esquema/host/puerto)
+- Límite global de conexiones en uso y límite por host
+- Estadísticas de reutilización (hit rate) y conexiones por host con stats()
+"""
+
+import threading
+import time
+from typing import Dict, Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+
+# Límites por defecto (app.py los ajusta con set_limits)
+DEFAULT_MAX_CONNECTIONS = 600
+DEFAULT_MAX_PER_HOST = 300
+# Si un límite no se libera en este tiempo (respuesta nunca cerrada) se continúa igualmente
+DEFAULT_WAIT_TIMEOUT = 30.0
+
+
+class _HostStats:
+    """Contadores de un host (se modifican con el lock del registro tomado)"""
+    __slots__ = ('requests', 'new_connections', 'in_use', 'peak_in_use', 'waits', 'wait_timeouts')
+
+    def __init__(self):
+        self.requests = 0
+        self.new_connections = 0
+        self.in_use = 0
+        self.peak_in_use = 0
+        self.waits = 0
+        self.wait_timeouts = 0
+
+
+class _LimitedPoolMixin:
+    """Reserva hueco en el registro al sacar una conexión del pool y lo libera al devolverla"""
+    registry: 'SharedHTTPPool' = None
+
+    def _get_conn(self, timeout=None):
+        self.registry._acquire(self)
+        try:
+            return super()._get_conn(timeout=timeout)
+        except Exception:
+            self.registry._release(self)
+            raise
+
+    def _put_conn(self, conn):
+        try:
+            super()._put_conn(conn)
+        finally:
+            self.registry._release(self)
+
+    def _new_conn(self):
+        self.registry._count_new_connection(self)
+        return super()._new_conn()
+
+
+class SharedHTTPAdapter(HTTPAdapter):
+    """HTTPAdapter cuyos pools de urllib3 respetan los límites del registro"""
+
+    def __init__(self, registry: 'SharedHTTPPool', **kwargs):
+        self.registry = registry
+        super().__init__(**kwargs)
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        attrs = {'registry': self.registry}
+        self.poolmanager.pool_classes_by_scheme = {
+            'http': type('SharedHTTPConnectionPool', (_LimitedPoolMixin, HTTPConnectionPool), attrs),
+            'https': type('SharedHTTPSConnectionPool', (_LimitedPoolMixin, HTTPSConnectionPool), attrs),
+        }
+
+
+class SharedHTTPPool:
+    """Registro de transporte HTTP compartido con límite global y por host"""
+
+    def __init__(self, max_connections: int = DEFAULT_MAX_CONNECTIONS,
+                 max_per_host: int = DEFAULT_MAX_PER_HOST,
+                 wait_timeout: float = DEFAULT_WAIT_TIMEOUT, max_hosts: int = 64):
+        self.max_connections = max(1, max_connections)
+        self.max_per_host = max(1, min(max_per_host, self.max_connections))
+        self.wait_timeout = wait_timeout
+        self._condition = threading.Condition()
+        self._in_use = 0
+        self._hosts: Dict[str, _HostStats] = {}
+        self._pools: Dict[str, HTTPConnectionPool] = {}
+        self.adapter = SharedHTTPAdapter(
+            self,
+            pool_connections=max_hosts,         # Hosts con pool vivo a la vez
+            pool_maxsize=self.max_per_host,     # Conexiones keep-alive conservadas por host
+            max_retries=3,                      # Reintentos automáticos de conexión
+            pool_block=False                    # El límite lo aplica el registro, con timeout
+        )
+
+    def mount(self, session: requests.Session) -> requests.Session:
+        """Monta el transporte compartido en una sesión existente"""
+        session.mount('http://', self.adapter)
+        session.mount('https://', self.adapter)
+        return session
+
+    def new_session(self, headers: Optional[Dict[str, str]] = None, verify: bool = False) -> requests.Session:
+        """Sesión propia (headers/cookies) sobre las conexiones compartidas"""
+        session = requests.Session()
+        session.verify = verify
+        if headers:
+            session.headers.update(headers)
+        return self.mount(session)
+
+    def set_limits(self, max_connections: Optional[int] = None, max_per_host: Optional[int] = None) -> None:
+        """Cambia los límites en caliente"""
+        with self._condition:
+            if max_connections is not None:
+                self.max_connections = max(1, max_connections)
+            if max_per_host is not None:
+                self.max_per_host = max(1, max_per_host)
+            self.max_per_host = min(self.max_per_host, self.max_connections)
+            self._condition.notify_all()
+
+    def stats(self) -> Dict[str, object]:
+        """Conexiones en uso, abiertas y tasa de reutilización global y por host"""
+        with self._condition:
+            hosts = {}
+            total_requests = 0
+            total_new = 0
+            for host, host_stats in self._hosts.items():
+                pool = self._pools.get(host)
+                idle = pool.pool.qsize() if pool and pool.pool else 0
+                total_requests += host_stats.requests
+                total_new += host_stats.new_connections
+                hosts[host] = {
+                    'requests': host_stats.requests,
+                    'new_connections': host_stats.new_connections,
+                    'reuse_rate': self._reuse_rate(host_stats.requests, host_stats.new_connections),
+                    'in_use': host_stats.in_use,
+                    'peak_in_use': host_stats.peak_in_use,
+                    'idle': idle,
+                    'waits': host_stats.waits,
+                    'wait_timeouts': host_stats.wait_timeouts
+                }
+            return {
+                'max_connections': self.max_connections,
+                'max_per_host': self.max_per_host,
+                'in_use': self._in_use,
+                'requests': total_requests,
+                'new_connections': total_new,
+                'reuse_rate': self._reuse_rate(total_requests, total_new),
+                'hosts': hosts
+            }
+
+    @staticmethod
+    def _reuse_rate(requests_count: int, new_connections: int) -> float:
+        if not requests_count:
+            return 0.0
+        return round(max(0.0, 1 - new_connections / requests_count), 3)
+
+    def _host_stats(self, pool: HTTPConnectionPool) -> _HostStats:
+        """Contadores del host del pool (con el lock tomado)"""
+        host = f"{pool.host}:{pool.port}"
+        host_stats = self._hosts.get(host)
+        if host_stats is None:
+            host_stats = self._hosts[host] = _HostStats()
+        self._pools[host] = pool
+        return host_stats
+
+    def _count_new_connection(self, pool: HTTPConnectionPool) -> None:
+        with self._condition:
+            self._host_stats(pool).new_connections += 1
+
+    def _acquire(self, pool: HTTPConnectionPool) -> None:
+        deadline = time.time() + self.wait_timeout
+        with self._condition:
+            host_stats = self._host_stats(pool)
+            waited = False
+            while self._in_use >= self.max_connections or host_stats.in_use >= self.max_per_host:
+                waited = True
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    host_stats.wait_timeouts += 1
+                    break
+                self._condition.wait(remaining)
+            if waited:
+                host_stats.waits += 1
+            self._in_use += 1
+            host_stats.in_use += 1
+            host_stats.requests += 1
+            host_stats.peak_in_use = max(host_stats.peak_in_use, host_stats.in_use)
+
+    def _release(self, pool: HTTPConnectionPool) -> None:
+        with self._condition:
+            host_stats = self._host_stats(pool)
+            if host_stats.in_use > 0:
+                host_stats.in_use -= 1
+                self._in_use = max(0, self._in_use - 1)
+            self._condition.notify_all()
+
+
+_shared_pool: Optional[SharedHTTPPool] = None
+_shared_pool_lock = threading.Lock()
+
+
+def get_shared_pool() -> SharedHTTPPool:
+    """Registro único del proceso (se crea la primera vez que se pide)"""
+    global _shared_pool
+    with _shared_pool_lock:
+        if _shared_pool is None:
+            _shared_pool = SharedHTTPPool()
+        return _shared_pool
+
+
+def shared_session(headers: Optional[Dict[str, str]] = None, verify: bool = False) -> requests.Session:
+    """Atajo: nueva sesión montada sobre el pool compartido del proceso"""
+    return get_shared_pool().new_session(headers=headers, verify=verify)
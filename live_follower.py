@@ -0,0 +1,216 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Seguimiento de Playlists en Vivo
+================================
+
+Sigue una media playlist en vivo por #EXT-X-MEDIA-SEQUENCE en lugar de
+comparar URLs: cada segmento se identifica por su número de secuencia, así
+que el orden se conserva aunque el servidor reutilice nombres, y los
+segmentos que salen de la ventana antes de verlos se cuentan como perdidos.
+
+La playlist se recarga al ritmo que marca la especificación HLS (RFC 8216
+6.3.4): tras una recarga con segmentos nuevos se espera #EXT-X-TARGETDURATION,
+y si no ha cambiado, la mitad. Los segmentos nuevos quedan disponibles al
+instante para los workers de descarga: iterar el follower devuelve
+NOT_READY mientras no hay nada nuevo, que es lo que entiende run_windowed.
+"""
+
+import threading
+import time
+from collections import deque
+from typing import Callable, Deque, Iterator, List, Optional
+
+import requests
+
+from manifest_cache import get_manifest_cache
+from m3u8_playlist import MediaSegment, Playlist, parse_playlist
+from segment_scheduler import NOT_READY
+
+# Espera mínima entre recargas aunque la playlist anuncie un target duration menor
+MIN_RELOAD_INTERVAL = 0.5
+# Sin segmentos nuevos durante este tiempo (o 3 target durations) se da el directo por terminado
+DEFAULT_STALL_TIMEOUT = 30.0
+# Errores de recarga consecutivos antes de abandonar
+MAX_RELOAD_ERRORS = 3
+
+
+class LivePlaylistFollower:
+    """Recarga una media playlist en vivo y encola sus segmentos nuevos en orden de secuencia"""
+
+    def __init__(self, session, playlist_url: str, initial: Optional[Playlist] = None,
+                 log_function: Optional[Callable[[str], None]] = None,
+                 stall_timeout: float = DEFAULT_STALL_TIMEOUT, request_timeout: float = 10,
+                 on_segment: Optional[Callable[[int, MediaSegment], None]] = None):
+        self.session = session
+        self.playlist_url = playlist_url
+        self.log_function = log_function or print
+        self.stall_timeout = stall_timeout
+        self.request_timeout = request_timeout
+        self.on_segment = on_segment  # (índice, segmento) por cada segmento nuevo, desde el hilo que recarga
+        self.target_duration = 6.0
+        self.first_sequence: Optional[int] = None  # Secuencia del primer segmento visto (índice 0)
+        self.next_sequence: Optional[int] = None   # Siguiente secuencia que se espera
+        self.segments_seen = 0
+        self.duration_seen = 0.0  # Segundos de contenido vistos: posición del borde del directo
+        self.lost = 0          # Segmentos que salieron de la ventana antes de verlos
+        self.sequence_resets = 0  # Veces que el servidor reinició #EXT-X-MEDIA-SEQUENCE
+        self.reloads = 0
+        self.ended = False     # #EXT-X-ENDLIST, directo parado o follower detenido
+        self.end_reason = ''
+        self.playlist: Optional[Playlist] = None
+        self._pending: Deque[MediaSegment] = deque()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._last_new_segment = time.time()
+        self._sequence_shift = 0  # Se suma a la secuencia del servidor tras un reinicio de la numeración
+        self._window_keys: set = set()  # MediaSegment.key de la última ventana recibida
+        if initial is not None:
+            self._ingest(initial)
+
+    def index_of(self, segment: MediaSegment) -> int:
+        """Índice estable del segmento en la grabación (0 = primer segmento visto)"""
+        return segment.sequence - (self.first_sequence or 0)
+
+    def _ingest(self, playlist: Playlist) -> int:
+        """Encola los segmentos con secuencia no vista. Devuelve cuántos eran nuevos"""
+        self.playlist = playlist
+        if playlist.target_duration:
+            self.target_duration = playlist.target_duration
+        new_segments: List[MediaSegment] = []
+        if playlist.segments and self.next_sequence is not None:
+            self._check_sequence_reset(playlist.segments)
+        for segment in playlist.segments:
+            # Numeración de la grabación: continúa tras un reinicio de la secuencia del servidor
+            segment.sequence += self._sequence_shift
+            if self.next_sequence is None:
+                self.first_sequence = self.next_sequence = segment.sequence
+            if segment.sequence < self.next_sequence:
+                continue  # Ya visto en una recarga anterior
+            if segment.sequence > self.next_sequence:
+                gap = segment.sequence - self.next_sequence
+                self.lost += gap
+                self.log_function(f"⚠️ {gap} segmentos salieron de la ventana en vivo antes de verlos "
+                                  f"(secuencias {self.next_sequence}-{segment.sequence - 1})")
+            new_segments.append(segment)
+            self.next_sequence = segment.sequence + 1
+
+        self._window_keys = {segment.key for segment in playlist.segments}
+
+        if self.on_segment:
+            for segment in new_segments:
+                self.on_segment(self.index_of(segment), segment)
+        with self._lock:
+            self._pending.extend(new_segments)
+            self.segments_seen += len(new_segments)
+            self.duration_seen += sum(segment.duration for segment in new_segments)
+            if playlist.endlist:
+                self._finish('#EXT-X-ENDLIST')
+        if new_segments:
+            self._last_new_segment = time.time()
+        return len(new_segments)
+
+    def _check_sequence_reset(self, segments: List[MediaSegment]) -> None:
+        """
+        Detecta que la secuencia retrocedió (el encoder se reinició) y reancla la numeración.
+
+        Si toda la ventana queda por detrás de lo ya visto y no comparte ningún
+        segmento con la ventana anterior, no es una copia atrasada de la playlist sino
+        otra numeración: sus segmentos continúan la grabación en lugar de descartarse
+        hasta el timeout.
+        """
+        newest = segments[-1].sequence + self._sequence_shift
+        if newest >= self.next_sequence - 1:
+            return
+        if any(segment.key in self._window_keys for segment in segments):
+            return  # Réplica atrasada de la misma ventana: sus segmentos ya se vieron
+        last_seen = self.next_sequence - 1 - self._sequence_shift
+        self.sequence_resets += 1
+        self._sequence_shift = self.next_sequence - segments[0].sequence
+        self.log_function(f"⚠️ La secuencia de la playlist en vivo retrocedió (de {last_seen} a "
+                          f"{segments[0].sequence}); se reancla la numeración")
+
+    def _finish(self, reason: str) -> None:
+        if not self.ended:
+            self.ended = True
+            self.end_reason = reason
+
+    def reload(self) -> int:
+        """Recarga la playlist una vez. Devuelve los segmentos nuevos encolados"""
+        # Siempre contra el servidor, pero condicional: un 304 no vuelve a transferir la playlist
+        content = get_manifest_cache().fetch(self.session, self.playlist_url, timeout=self.request_timeout, max_age=0)
+        self.reloads += 1
+        return self._ingest(parse_playlist(content, self.playlist_url))
+
+    def reload_interval(self, changed: bool) -> float:
+        """Target duration tras una recarga con novedades, la mitad si no cambió (RFC 8216 6.3.4)"""
+        return max(MIN_RELOAD_INTERVAL, self.target_duration if changed else self.target_duration / 2)
+
+    def _follow_loop(self) -> None:
+        changed = True
+        errors = 0
+        stall_timeout = max(self.stall_timeout, 3 * self.target_duration)
+        while not self.ended:
+            if self._stop.wait(self.reload_interval(changed)):
+                break
+            try:
+                changed = self.reload() > 0
+                errors = 0
+            except requests.exceptions.RequestException as e:
+                errors += 1
+                changed = False
+                self.log_function(f"⚠️ Error recargando la playlist en vivo ({errors}/{MAX_RELOAD_ERRORS}): {e}")
+                if errors >= MAX_RELOAD_ERRORS:
+                    self._finish(f'errores de recarga: {e}')
+                    break
+            if not changed and time.time() - self._last_new_segment > stall_timeout:
+                self._finish(f'sin segmentos nuevos en {stall_timeout:.0f}s')
+        self._finish('detenido')
+        self.log_function(f"🏁 Seguimiento en vivo terminado ({self.end_reason}): {self.segments_seen} segmentos, "
+                          f"{self.lost} perdidos, {self.reloads} recargas")
+
+    def start(self) -> None:
+        """Sigue la playlist en un hilo propio hasta ENDLIST, parada del directo o stop()"""
+        if self._thread is None and not self.ended:
+            self.log_function(f"📡 Siguiendo playlist en vivo cada ~{self.target_duration:g}s "
+                              f"(desde la secuencia {self.first_sequence})")
+            self._thread = threading.Thread(target=self._follow_loop, name='live-follower', daemon=True)
+            self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join()
+        self._finish('detenido')
+
+    def collect(self) -> List[MediaSegment]:
+        """Sigue la playlist en el hilo actual hasta que termine y devuelve todos los segmentos pendientes"""
+        if not self.ended:
+            self._follow_loop()
+        return self.take()
+
+    def take(self) -> List[MediaSegment]:
+        """Saca todos los segmentos encolados (sin bloquear)"""
+        with self._lock:
+            segments = list(self._pending)
+            self._pending.clear()
+        return segments
+
+    @property
+    def finished(self) -> bool:
+        """True cuando el seguimiento terminó y no quedan segmentos por entregar"""
+        with self._lock:
+            return self.ended and not self._pending
+
+    def __iter__(self) -> Iterator[object]:
+        """Segmentos nuevos en orden de secuencia; NOT_READY mientras se espera la siguiente recarga"""
+        while True:
+            with self._lock:
+                if self._pending:
+                    item = self._pending.popleft()
+                elif self.ended:
+                    return
+                else:
+                    item = NOT_READY
+            yield item
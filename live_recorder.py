@@ -0,0 +1,181 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Grabación de Directos
+=====================
+
+Un directo no se puede tratar como "recoger la playlist un rato y luego
+descargar": los segmentos salen de la ventana en vivo mientras se espera y
+el conjunto de URLs crece sin límite. La grabación descarga cada segmento
+en cuanto aparece (LivePlaylistFollower + download_segments_concurrent) y
+lo añade en orden a un archivo que va creciendo; el segmento temporal se
+borra al escribirlo, así que en memoria y en disco solo queda la ventana de
+segmentos vistos y aún no escritos.
+
+La grabación termina con #EXT-X-ENDLIST, al alcanzar la duración máxima o
+cuando el usuario la detiene. El retraso respecto al borde del directo es
+el contenido ya publicado por el servidor que todavía no está en el archivo.
+"""
+
+import os
+import threading
+from typing import TYPE_CHECKING, Callable, Dict, Optional, Tuple
+
+from live_follower import LivePlaylistFollower
+from m3u8_playlist import MediaSegment
+from ts_concat import append_segment
+
+if TYPE_CHECKING:
+    from m3u8_downloader import M3U8Downloader
+
+
+class LiveRecorder:
+    """Graba una playlist en vivo en un único archivo que crece segmento a segmento"""
+
+    def __init__(self, downloader: 'M3U8Downloader', output_path: str, max_duration: Optional[float] = None,
+                 is_stopped: Optional[Callable[[], bool]] = None,
+                 on_progress: Optional[Callable[['LiveRecorder'], None]] = None,
+                 log_function: Optional[Callable[[str], None]] = None):
+        """
+        Args:
+            downloader: Descargador ya configurado con la URL de la playlist
+            output_path: Archivo que va creciendo (.ts, o MP4 fragmentado si la playlist es fMP4)
+            max_duration: Segundos de contenido a grabar como máximo (None = sin límite)
+            is_stopped: Función consultada periódicamente; True detiene la grabación conservando lo grabado
+            on_progress: Callback tras cada segmento escrito en output_path
+            log_function: Función de logging
+        """
+        self.downloader = downloader
+        self.output_path = output_path
+        self.max_duration = max_duration
+        self.is_stopped = is_stopped
+        self.on_progress = on_progress
+        self.log_function = log_function or downloader.log_function
+        self.follower: Optional[LivePlaylistFollower] = None
+        self.segments_recorded = 0
+        self.recorded_seconds = 0.0
+        self.failed_segments = 0
+        self.failed_seconds = 0.0
+        self.bytes_written = 0
+        self.stop_reason = ''
+        self._limit_reached = False
+        # Ventana: segmentos vistos en la playlist que aún no están en el archivo
+        self._window: Dict[int, MediaSegment] = {}
+        self._lock = threading.Lock()
+        self._fd: Optional[int] = None
+        self._current_init: Optional[Tuple[str, Optional[int], Optional[int]]] = None
+
+    @property
+    def lost_segments(self) -> int:
+        """Segmentos que faltan en la grabación: salieron de la ventana antes de verlos o fallaron"""
+        return (self.follower.lost if self.follower is not None else 0) + self.failed_segments
+
+    @property
+    def lag_seconds(self) -> float:
+        """Segundos de contenido publicados por el servidor que aún no están en el archivo"""
+        if self.follower is None:
+            return 0.0
+        return max(0.0, self.follower.duration_seen - self.recorded_seconds - self.failed_seconds)
+
+    @property
+    def window_size(self) -> int:
+        with self._lock:
+            return len(self._window)
+
+    def snapshot(self) -> Dict[str, object]:
+        return {
+            'segments': self.segments_recorded,
+            'seconds': round(self.recorded_seconds, 1),
+            'bytes': self.bytes_written,
+            'lost': self.lost_segments,
+            'lag_seconds': round(self.lag_seconds, 1),
+            'window': self.window_size,
+            'reason': self.stop_reason,
+            'container': self.downloader.container,
+        }
+
+    def _track(self, index: int, segment: MediaSegment) -> None:
+        with self._lock:
+            self._window[index] = segment
+
+    def _take(self, index: int) -> Optional[MediaSegment]:
+        with self._lock:
+            return self._window.pop(index, None)
+
+    def _should_stop(self) -> bool:
+        return self._limit_reached or bool(self.is_stopped and self.is_stopped())
+
+    def _write_init(self, index: int, init: MediaSegment) -> None:
+        """Escribe el init segment antes del primer fragmento que lo usa (y cada vez que cambia)"""
+        if init.key == self._current_init:
+            return
+        inits = self.downloader.segment_inits
+        if index < len(inits) and inits[index] is not None:
+            init_path = inits[index]  # Ya descargado con la playlist inicial
+        else:
+            init_path = os.path.join(self.downloader.temp_dir, f'init_live_{index:05d}.mp4')
+            self.downloader._download_init_section(init, init_path)
+        self.bytes_written += append_segment(self._fd, init_path, self.bytes_written)
+        self._current_init = init.key
+
+    def _append(self, index: int) -> None:
+        """on_ordered: añade el segmento al archivo y lo borra del directorio temporal"""
+        segment = self._take(index)
+        filename = self.downloader.segment_filename(index)
+        segment_path = os.path.join(self.downloader.temp_dir, filename)
+        size = self.downloader.validated_segments.pop(filename, None)
+        if segment is not None and segment.init is not None:
+            self._write_init(index, segment.init)
+        self.bytes_written += append_segment(self._fd, segment_path, self.bytes_written, size)
+        try:
+            os.remove(segment_path)
+        except OSError:
+            pass
+        self.segments_recorded += 1
+        self.recorded_seconds += segment.duration if segment is not None else 0.0
+        if self.max_duration and self.recorded_seconds >= self.max_duration and not self._limit_reached:
+            self._limit_reached = True
+            self.stop_reason = f'duración máxima ({self.max_duration:g}s)'
+            self.log_function(f"⏱️ Duración máxima alcanzada: {self.recorded_seconds:.0f}s grabados")
+        if self.on_progress:
+            self.on_progress(self)
+
+    def _skip(self, index: int, error: str) -> None:
+        """on_failed: el segmento queda como hueco en la grabación"""
+        segment = self._take(index)
+        self.failed_segments += 1
+        self.failed_seconds += segment.duration if segment is not None else 0.0
+
+    def run(self) -> Dict[str, object]:
+        """
+        Graba hasta #EXT-X-ENDLIST, la duración máxima o is_stopped().
+
+        Returns:
+            Dict: Resumen de snapshot() con el motivo de parada en 'reason'
+        """
+        self.downloader._get_segment_urls(collect_live=False)
+        if not self.downloader.is_live:
+            self.log_function("ℹ️ La playlist ya está completa (#EXT-X-ENDLIST): se graba entera")
+        self.follower = self.downloader.create_live_follower(on_segment=self._track)
+        os.makedirs(os.path.dirname(os.path.abspath(self.output_path)), exist_ok=True)
+        self._fd = os.open(self.output_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC | getattr(os, 'O_BINARY', 0), 0o644)
+        self.log_function(f"🔴 Grabando directo en: '{self.output_path}'"
+                          + (f" (máximo {self.max_duration:g}s)" if self.max_duration else ''))
+        try:
+            summary = self.downloader.download_segments_concurrent(
+                [],
+                live=self.follower,
+                on_ordered=self._append,
+                on_failed=self._skip,
+                is_cancelled=self._should_stop
+            )
+        finally:
+            os.close(self._fd)
+            self._fd = None
+
+        if not self.stop_reason:
+            self.stop_reason = 'detenida por el usuario' if summary['cancelled'] else self.follower.end_reason
+        self.log_function(f"⏹️ Grabación terminada ({self.stop_reason}): {self.segments_recorded} segmentos, "
+                          f"{self.recorded_seconds:.0f}s, {self.bytes_written / (1024 * 1024):.1f} MB, "
+                          f"{self.lost_segments} perdidos")
+        return self.snapshot()
@@ -1,12 +1,33 @@
 import os
+import shutil
 import time
-from typing import Optional, Callable, List, Tuple, Union, Dict
-from urllib.parse import urljoin, urlparse
+from collections import deque
+from typing import Optional, Callable, Deque, Iterable, Iterator, List, Sequence, Tuple, Union, Dict, Set
+from urllib.parse import urlparse
 
 import requests
-from requests.adapters import HTTPAdapter
 from tqdm import tqdm
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+import threading
+
+from adaptive_concurrency import AdaptiveConcurrencyController
+from atomic_output import discard, prepare_staging, publish
+from bandwidth_limiter import BandwidthLimiter
+from fmp4 import concat_fmp4_segments, is_fragment_header, is_init_header, pipe_fmp4_segments
+from hedging import HEDGE, PRIMARY, HedgeRace, HedgingPolicy
+from http_pool import shared_session
+from live_follower import LivePlaylistFollower
+from manifest_cache import get_manifest_cache
+from m3u8_playlist import MediaSegment, Playlist, VariantStream, as_media_segment, init_sections, parse_playlist
+from async_segment_fetcher import AsyncSegmentFetcher, AIOHTTP_AVAILABLE
+from renditions import (RENDITION_KINDS, WEBVTT_CONTAINER, RenditionTrack, is_raw_segment_header, mux_command,
+                        pick_rendition, raw_container_for)
+from preflight import PREFLIGHT_SAMPLES, DownloadEstimate, estimate_download
+from ts_concat import concat_ts_segments
+from variant_selector import (DEFAULT_TIME_BUDGET, PROBE_SEGMENTS, measure_throughput, select_for_throughput,
+                              select_variant, variant_rank)
+from ts_validator import TS_PACKET_SIZE, find_sync_offset
+from segment_scheduler import DEFAULT_WINDOW_SLACK, NOT_READY, DeferredRetryQueue, GlobalSegmentScheduler, run_windowed
 
 # Import solo de las funciones específicas necesarias
 from subprocess import CompletedProcess, CalledProcessError, run
@@ -15,6 +36,69 @@ from typing import TYPE_CHECKING
 if TYPE_CHECKING:
     import subprocess
 
+# Recursos más grandes que esto se piden en trozos paralelos con cabeceras Range
+RANGE_SPLIT_THRESHOLD = 16 * 1024 * 1024
+RANGE_PART_SIZE = 4 * 1024 * 1024
+# Escritura de segmentos: trozos leídos de la red y buffer de escritura del archivo
+STREAM_CHUNK_SIZE = 64 * 1024
+DEFAULT_WRITE_BUFFER = 1024 * 1024
+# Bytes iniciales que se conservan en memoria para validar el segmento sin releerlo
+# (varios paquetes para comprobar que el sync byte se repite cada 188 bytes)
+VALIDATION_HEADER_SIZE = 4 * TS_PACKET_SIZE
+# Estrategias de unión final de segmentos
+MERGE_STRATEGIES = ('concat_list', 'ts_concat')
+# Extensión de los segmentos en el directorio temporal según el contenedor de la playlist
+SEGMENT_EXTENSIONS = {'ts': '.ts', 'fmp4': '.m4s', 'aac': '.aac', 'ac3': '.ac3', 'ec3': '.ec3', 'mp3': '.mp3',
+                      WEBVTT_CONTAINER: '.vtt'}
+
+
+class FetchUnit:
+    """Petición a programar: un segmento completo o uno de los trozos Range de un segmento grande"""
+    __slots__ = ('index', 'segment', 'filename', 'validate', 'part', 'parts', 'attempts')
+
+    def __init__(self, index: int, segment: MediaSegment, segment_filename: str, part: int = 0, parts: int = 1):
+        self.index = index
+        self.segment = segment
+        self.part = part
+        self.parts = parts
+        self.filename = segment_filename if parts == 1 else f'{segment_filename}.part{part:03d}'
+        # Los trozos intermedios no empiezan necesariamente en un paquete TS ni en una caja MP4: se valida el segmento unido
+        self.validate = parts == 1
+        self.attempts = 0
+
+
+class _RangedPartCollector:
+    """Reúne los trozos de cada segmento partido y los une en orden cuando están todos"""
+
+    def __init__(self, downloader: 'M3U8Downloader'):
+        self.downloader = downloader
+        # Trozos pendientes por segmento partido (se registra con el primer trozo que termina)
+        self.remaining: Dict[int, int] = {}
+        self.bytes: Dict[int, int] = {}
+        self.failed = set()
+
+    def feed(self, unit: FetchUnit, result: Optional[Tuple[str, int]], error: Optional[str],
+             elapsed: float) -> Optional[Tuple[Optional[Tuple[str, int]], Optional[str], float]]:
+        """Devuelve el resultado del segmento cuando está completo (o falla); None mientras falten trozos"""
+        if unit.parts == 1:
+            return result, error, elapsed
+        if unit.index in self.failed:
+            return None
+        if not result:
+            self.failed.add(unit.index)
+            return None, f"Trozo {unit.part + 1}/{unit.parts}: {error or 'falló la descarga'}", elapsed
+
+        self.bytes[unit.index] = self.bytes.get(unit.index, 0) + result[1]
+        self.remaining[unit.index] = self.remaining.get(unit.index, unit.parts) - 1
+        if self.remaining[unit.index]:
+            return None
+        del self.remaining[unit.index]
+        joined = self.downloader._join_segment_parts(unit.index, unit.parts, self.bytes.pop(unit.index))
+        if not joined:
+            return None, "El segmento unido a partir de trozos Range no es válido", elapsed
+        return joined, None, elapsed
+
+
 class M3U8Downloader:
     """
     Versión 4.2: Soporte completo para streams dinámicos y live streams.
@@ -24,14 +108,72 @@ class M3U8Downloader:
     - Evita duplicados usando sets
     - Timeout inteligente para streams que no se actualizan
     """
-    def __init__(self, m3u8_url: str, output_filename: str = 'output.mp4', max_workers: int = 30, temp_dir: str = 'temp_segments', download_id: Optional[str] = None, log_function: Optional[Callable[[str], None]] = None):
+    def __init__(self, m3u8_url: str, output_filename: str = 'output.mp4', max_workers: int = 30, temp_dir: str = 'temp_segments', download_id: Optional[str] = None, log_function: Optional[Callable[[str], None]] = None, initial_workers: Optional[int] = None, min_workers: int = 2, backend: str = 'threads', scheduler: Optional[GlobalSegmentScheduler] = None, priority: int = 1, hedge: bool = False, hedge_percentile: float = 0.95, hedge_budget: float = 0.05, write_buffer_size: int = DEFAULT_WRITE_BUFFER, rate_limiter: Optional[BandwidthLimiter] = None, merge_strategy: str = 'concat_list', quality: str = 'best', time_budget: float = DEFAULT_TIME_BUDGET, variant_url: Optional[str] = None, alternate_renditions: bool = False):
         self.m3u8_url = m3u8_url
         self.output_filename = output_filename
         self.temp_dir = temp_dir
         self.download_id = download_id
         self.log_function = log_function or print
+        # Backend de descarga de segmentos: 'threads' (ThreadPoolExecutor) o 'asyncio' (aiohttp)
+        if backend == 'asyncio' and not AIOHTTP_AVAILABLE:
+            self.log_function("⚠️ aiohttp no está instalado: usando el backend de hilos")
+            backend = 'threads'
+        self.backend = backend
+        # Planificador global opcional: los workers se comparten con las demás descargas activas
+        self.scheduler = scheduler
+        self.priority = priority
+        # Hedging opcional: duplicar las peticiones que superan el percentil de latencia observado
+        self.hedging = HedgingPolicy(percentile=hedge_percentile, budget_ratio=hedge_budget) if hedge else None
+        self._hedge_executor: Optional[ThreadPoolExecutor] = None
+        self._contender_executor: Optional[ThreadPoolExecutor] = None
+        self._hedge_lock = threading.Lock()
+        # Buffer de escritura de cada segmento (menos syscalls write por segmento)
+        self.write_buffer_size = max(STREAM_CHUNK_SIZE, write_buffer_size)
+        # Segmentos ya validados al escribirlos: archivo -> bytes (el merge no los vuelve a abrir)
+        self.validated_segments: Dict[str, int] = {}
+        self.validation_header_size = VALIDATION_HEADER_SIZE
+        # Límite de caudal (token bucket global y por descarga) aplicado a los bytes escritos
+        self.rate_limiter = rate_limiter
+        # Unión final: 'concat_list' (demuxer concat de ffmpeg) o 'ts_concat' (copia binaria en el kernel)
+        self.merge_strategy = merge_strategy if merge_strategy in MERGE_STRATEGIES else 'concat_list'
+        if rate_limiter is not None and download_id:
+            rate_limiter.register(download_id)
+        # Contenedor de los segmentos: 'ts' (MPEG-TS) o 'fmp4' (CMAF con #EXT-X-MAP, se detecta al leer la playlist)
+        self.container = 'ts'
+        # Init segment (ruta local) de cada índice de segmento en playlists fMP4
+        self.segment_inits: List[Optional[str]] = []
+        # Playlists ya analizadas por _get_segment_urls (reutilizables sin volver a parsear el texto)
+        self.master_playlist: Optional[Playlist] = None
+        self.playlist: Optional[Playlist] = None
+        self.media_playlist_url = m3u8_url
+        # Variante de un master: 'best', 'worst', '1080p'... o 'auto' (caudal medido frente a time_budget).
+        # variant_url fija una variante ya elegida (al reanudar, los índices de segmento deben coincidir)
+        self.quality = quality or 'best'
+        self.time_budget = time_budget
+        self.variant_url = variant_url
+        self.selected_variant: Optional[VariantStream] = None
+        self.measured_throughput: Optional[float] = None  # bytes/s estimados para la descarga en modo 'auto'
+        # Muestras de la medición (índice -> archivo) y las que se adoptaron como segmentos ya descargados
+        self._probe_files: Dict[int, str] = {}
+        self._probe_variant_url: Optional[str] = None
+        self.prefetched_segments: Set[int] = set()
+        # Pistas #EXT-X-MEDIA (audio/subtítulos) con playlist propia de la variante elegida: se
+        # descargan a la vez que el video con sus mismos workers (download_segments_concurrent)
+        self.alternate_renditions = alternate_renditions
+        self.rendition_tracks: List[RenditionTrack] = []
+        # Executor de la descarga principal cuando este descargador es una pista alternativa
+        self.shared_executor = None
+        # Playlist sin #EXT-X-ENDLIST: los segmentos siguen apareciendo mientras se descarga
+        self.is_live = False
         # Aumentar workers para mayor paralelismo
         self.max_workers = max_workers
+        # Límite adaptativo (AIMD) de segmentos en vuelo; max_workers actúa como techo
+        self.concurrency = AdaptiveConcurrencyController(
+            initial_limit=initial_workers or max_workers,
+            min_limit=min(min_workers, max_workers),
+            max_limit=max_workers,
+            log_function=self.log_function
+        )
         # Headers optimizados para mejor rendimiento
         parsed = urlparse(self.m3u8_url)
         origin = f"{parsed.scheme}://{parsed.netloc}" if parsed.scheme and parsed.netloc else None
@@ -43,129 +185,374 @@ class M3U8Downloader:
             'Cache-Control': 'no-cache',
             **({'Referer': origin + '/','Origin': origin} if origin else {})
         }
-        # Session reutilizable para conexiones persistentes
-        self.session = requests.Session()
-        self.session.headers.update(self.headers)
-        # Deshabilitar verificación SSL para evitar errores con certificados auto-firmados
-        self.session.verify = False
+        # Session propia (headers) sobre el pool de conexiones compartido por todo el proceso:
+        # varias descargas del mismo CDN reutilizan las conexiones TLS ya abiertas
+        self.session = shared_session(headers=self.headers, verify=False)
         # Suprimir warnings de SSL no verificado
         import urllib3
         urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
-        # Configuración optimizada de la sesión
-        adapter = HTTPAdapter(
-            pool_connections=max_workers,  # Pool de conexiones
-            pool_maxsize=max_workers * 2,  # Tamaño máximo del pool
-            max_retries=3,  # Reintentos automáticos
-            pool_block=False  # No bloquear cuando el pool está lleno
-        )
-        self.session.mount('http://', adapter)
-        self.session.mount('https://', adapter)
 
-    def _get_segment_urls(self) -> List[str]:
-        self.log_function("📄 Obteniendo lista de segmentos desde el M3U8...")
-        response = self.session.get(self.m3u8_url, timeout=10)
-        response.raise_for_status()
-        
-        playlist_content = response.text
-        lines = playlist_content.splitlines()
+    def _get_segment_urls(self, collect_live: bool = True) -> List[MediaSegment]:
+        """
+        Lee la playlist (eligiendo variante si es un master) y devuelve sus segmentos.
 
-        sub_playlists = [line.strip() for line in lines if line.strip().endswith('.m3u8')]
+        Args:
+            collect_live: En playlists en vivo, seguir recargando hasta el final antes de devolver.
+                          Con False se devuelven solo los segmentos actuales y el resto se sigue
+                          con create_live_follower() mientras se descarga.
+        """
+        self.log_function("📄 Obteniendo lista de segmentos desde el M3U8...")
+        # La misma playlist suele haberse pedido ya desde /api/metadata, /api/parse_master o /analizar
+        manifests = get_manifest_cache()
+        playlist_content = manifests.fetch(self.session, self.m3u8_url, timeout=10)
+        playlist = parse_playlist(playlist_content, self.m3u8_url)
         
-        if sub_playlists:
-            best_quality_url = urljoin(self.m3u8_url, sub_playlists[-1])
-            self.log_function(f"ℹ️ Manifiesto maestro detectado. Seleccionando la mejor calidad: {best_quality_url}")
-            response = self.session.get(best_quality_url, timeout=10)
-            response.raise_for_status()
-            playlist_content = response.text
-            lines = playlist_content.splitlines()
+        if playlist.is_master:
+            self.master_playlist = playlist
+            variant = self._select_variant(playlist)
+            self.selected_variant = variant
+            best_quality_url = variant.url
+            playlist_content = manifests.fetch(self.session, best_quality_url, timeout=10)
+            playlist = parse_playlist(playlist_content, best_quality_url)
             base_url_for_segments = best_quality_url
         else:
             base_url_for_segments = self.m3u8_url
+        self.playlist = playlist
+        self.media_playlist_url = base_url_for_segments
 
-        # Verificar si es un stream en vivo o VOD completo
-        is_live_stream = '#EXT-X-PLAYLIST-TYPE:VOD' not in playlist_content
-        has_endlist = '#EXT-X-ENDLIST' in playlist_content
+        # Solo #EXT-X-ENDLIST garantiza que la playlist está completa (también sin PLAYLIST-TYPE:VOD)
+        self.is_live = not playlist.endlist
         
-        self.log_function(f"🔍 Tipo de stream: {'LIVE/Dinámico' if is_live_stream else 'VOD'}")
-        self.log_function(f"🔍 Marcador de fin: {'Encontrado' if has_endlist else 'No encontrado'}")
+        self.log_function(f"🔍 Tipo de stream: {'LIVE/Dinámico' if self.is_live else 'VOD'}")
+        self.log_function(f"🔍 Marcador de fin: {'Encontrado' if playlist.endlist else 'No encontrado'}")
         
         # Recopilar todos los segmentos disponibles
-        segment_urls = self._collect_all_segments(base_url_for_segments, playlist_content, is_live_stream, has_endlist)
+        if self.is_live and collect_live:
+            segment_urls = self._collect_all_segments(base_url_for_segments, playlist)
+        else:
+            segment_urls = list(playlist.segments)
         
         if not segment_urls:
-            if '#EXT-X-KEY' in playlist_content:
+            if playlist.keys:
                 raise ValueError("El video está CIFRADO (#EXT-X-KEY detectado). Este script no puede procesarlo.")
             raise ValueError("No se encontraron segmentos de video (.ts) en el manifiesto.")
             
         self.log_function(f"✅ Encontrados {len(segment_urls)} segmentos totales.")
+        byterange_count = sum(1 for segment in segment_urls if segment.has_byterange)
+        if byterange_count:
+            self.log_function(f"📐 {byterange_count} segmentos con #EXT-X-BYTERANGE (se pedirán con cabeceras Range)")
+        inits = init_sections(segment_urls)
+        # Audio empaquetado / WebVTT (pistas alternativas) se reconocen por la extensión
+        self.container = 'fmp4' if inits else (raw_container_for(segment_urls[0].url) or 'ts')
+        if inits:
+            self.log_function(f"🎞️ Playlist fMP4/CMAF (#EXT-X-MAP): {len(inits)} init segment(s); "
+                              f"la unión será una concatenación binaria sin ffmpeg")
+        self._adopt_probe_segments(len(segment_urls))
         if len(segment_urls) == 0:
             self.log_function("⚠️ ADVERTENCIA: No se encontraron segmentos en la playlist!")
             self.log_function(f"🔍 Contenido de playlist recibido:")
             self.log_function(playlist_content[:500] + "..." if len(playlist_content) > 500 else playlist_content)
+        if self.alternate_renditions and self.selected_variant is not None:
+            self._plan_renditions(self.master_playlist, self.selected_variant)
         return segment_urls
 
-    def _collect_all_segments(self, base_url: str, initial_content: str, is_live: bool, has_endlist: bool) -> List[str]:
-        """Recopila todos los segmentos disponibles, siguiendo actualizaciones si es necesario"""
-        all_segments = set()  # Usar set para evitar duplicados
-        current_content = initial_content
-        
-        # Extraer segmentos del contenido inicial
-        lines = current_content.splitlines()
-        initial_segments = [urljoin(base_url, line.strip()) for line in lines 
-                          if line and not line.startswith('#') and not line.strip().endswith('.m3u8')]
-        all_segments.update(initial_segments)
-        self.log_function(f"📊 Segmentos iniciales encontrados: {len(initial_segments)}")
-        
-        # Si es VOD con ENDLIST, ya tenemos todos los segmentos
-        if not is_live and has_endlist:
-            return list(all_segments)
-        
-        # Si es live stream o no tiene ENDLIST, seguir buscando actualizaciones
-        if is_live or not has_endlist:
-            self.log_function("🔄 Stream dinámico detectado. Buscando segmentos adicionales...")
-            max_attempts = 10  # Máximo 10 intentos para evitar bucles infinitos
-            attempt = 0
-            
-            while attempt < max_attempts:
-                try:
-                    # Esperar un poco antes de la siguiente consulta
-                    if attempt > 0:
-                        self.log_function(f"⏳ Esperando nuevos segmentos... (intento {attempt + 1}/{max_attempts})")
-                        time.sleep(3)
-                    
-                    # Obtener playlist actualizada
-                    response = self.session.get(base_url, timeout=10)
-                    response.raise_for_status()
-                    updated_content = response.text
-                    
-                    # Extraer nuevos segmentos
-                    lines = updated_content.splitlines()
-                    new_segments = [urljoin(base_url, line.strip()) for line in lines 
-                                  if line and not line.startswith('#') and not line.strip().endswith('.m3u8')]
-                    
-                    previous_count = len(all_segments)
-                    all_segments.update(new_segments)
-                    new_count = len(all_segments)
-                    
-                    if new_count > previous_count:
-                        self.log_function(f"🆕 Encontrados {new_count - previous_count} segmentos adicionales (total: {new_count})")
-                    
-                    # Verificar si ahora tiene ENDLIST
-                    if '#EXT-X-ENDLIST' in updated_content:
-                        self.log_function("🏁 Marcador de fin encontrado. Stream completo.")
-                        break
-                    
-                    # Si no hay nuevos segmentos en varias iteraciones, probablemente terminó
-                    if new_count == previous_count:
-                        attempt += 1
-                    else:
-                        attempt = 0  # Reiniciar contador si encontramos nuevos segmentos
-                        
-                except Exception as e:
-                    self.log_function(f"⚠️ Error al buscar actualizaciones: {e}")
-                    break
-        
-        return list(all_segments)
+    def _plan_renditions(self, master: Playlist, variant: VariantStream) -> None:
+        """Prepara las pistas de audio/subtítulos con playlist propia que usa la variante elegida"""
+        self.rendition_tracks = []
+        for media_type, group_id in (('AUDIO', variant.audio), ('SUBTITLES', variant.subtitles)):
+            rendition = pick_rendition(master.renditions, media_type, group_id)
+            if rendition is None:
+                continue
+            if self.is_live:
+                self.log_function(f"⚠️ La pista {media_type} '{rendition.name}' no se descarga en directos")
+                continue
+            kind = RENDITION_KINDS[media_type]
+            child = M3U8Downloader(
+                rendition.uri,
+                temp_dir=os.path.join(self.temp_dir, kind),
+                max_workers=self.max_workers,
+                download_id=self.download_id,
+                log_function=lambda message, kind=kind: self.log_function(f"[{kind}] {message}"),
+                write_buffer_size=self.write_buffer_size,
+                rate_limiter=self.rate_limiter
+            )
+            # Mismo límite AIMD y mismas conexiones que el video
+            child.concurrency = self.concurrency
+            child.session = self.session
+            try:
+                segments = child._get_segment_urls()
+            except (requests.exceptions.RequestException, ValueError) as e:
+                self.log_function(f"⚠️ No se pudo leer la pista {media_type} '{rendition.name}': {e}")
+                continue
+            track = RenditionTrack(rendition, kind, child, segments)
+            self.rendition_tracks.append(track)
+            self.log_function(f"🎧 Pista alternativa {track.label}: {len(segments)} segmentos "
+                              f"({child.container}), se descarga junto al video")
+
+    def merge_renditions(self) -> List[RenditionTrack]:
+        """Une los segmentos de cada pista alternativa; devuelve las pistas listas para ffmpeg"""
+        merged = []
+        for track in self.rendition_tracks:
+            if track.merge():
+                merged.append(track)
+            else:
+                self.log_function(f"⚠️ La pista {track.label} no tiene segmentos: se omite")
+        return merged
+
+    def preflight_estimate(self, segments: List[MediaSegment], samples: int = PREFLIGHT_SAMPLES) -> DownloadEstimate:
+        """Duración y tamaño esperados (playlist y pistas alternativas) antes de descargar nada"""
+        variant = self.selected_variant
+        bandwidth = (variant.average_bandwidth or variant.bandwidth) if variant is not None else None
+        estimate = estimate_download(self.session, segments, bandwidth=bandwidth, samples=samples)
+        for track in self.rendition_tracks:
+            track_estimate = estimate_download(self.session, track.segments, samples=min(samples, 2))
+            estimate.rendition_bytes += track_estimate.expected_bytes or 0.0
+        if estimate.expected_bytes is not None:
+            method = {'byterange': '#EXT-X-BYTERANGE', 'head': f'{estimate.samples} HEAD',
+                      'bandwidth': 'BANDWIDTH'}[estimate.method]
+            self.log_function(f"📏 Estimación previa: {estimate.duration / 60:.1f} min, "
+                              f"~{estimate.total_bytes / (1024 * 1024):.0f} MB (según {method})")
+        else:
+            self.log_function(f"📏 Estimación previa: {estimate.duration / 60:.1f} min, tamaño desconocido")
+        return estimate
+
+    def _select_variant(self, master: Playlist) -> VariantStream:
+        """Elige la variante del master según quality (o la fijada en variant_url)"""
+        variants = master.variants
+        if self.variant_url:
+            for variant in variants:
+                if variant.url == self.variant_url:
+                    self.log_function(f"ℹ️ Manifiesto maestro detectado. Variante ya elegida: {self._describe(variant)}")
+                    return variant
+            self.log_function("⚠️ La variante elegida anteriormente ya no está en el master; se vuelve a elegir")
+        if self.quality.strip().lower() == 'auto':
+            variant = self._select_variant_by_throughput(variants)
+        else:
+            variant = select_variant(variants, self.quality)
+            self.log_function(f"ℹ️ Manifiesto maestro detectado ({len(variants)} variantes). "
+                              f"Calidad '{self.quality}': {self._describe(variant)}")
+        return variant
+
+    def _select_variant_by_throughput(self, variants: List[VariantStream]) -> VariantStream:
+        """Modo 'auto': mide el caudal con los primeros segmentos de la variante más alta"""
+        best = max(variants, key=variant_rank)
+        try:
+            probe_playlist = parse_playlist(get_manifest_cache().fetch(self.session, best.url, timeout=10), best.url)
+        except requests.exceptions.RequestException as e:
+            self.log_function(f"⚠️ No se pudo leer la variante para medir el caudal ({e}): se usa la mejor calidad")
+            return best
+        samples = probe_playlist.segments[:PROBE_SEGMENTS]
+        on_chunk = None
+        if self.rate_limiter is not None:
+            # La medición respeta el mismo límite de ancho de banda que la descarga
+            on_chunk = lambda nbytes: self.rate_limiter.throttle(self.download_id, nbytes)
+        # En VOD las muestras se guardan: si gana esta variante son los primeros segmentos de la descarga
+        paths = None
+        if probe_playlist.endlist:
+            os.makedirs(self.temp_dir, exist_ok=True)
+            paths = [os.path.join(self.temp_dir, f'probe_{index:05d}') for index in range(len(samples))]
+        per_connection, sizes = measure_throughput(self.session, samples, on_chunk=on_chunk, paths=paths)
+        if paths:
+            self._probe_variant_url = best.url
+            self._probe_files = {index: path for index, path in enumerate(paths) if sizes[index]}
+        content_seconds = probe_playlist.total_duration
+        if not per_connection or not content_seconds:
+            self.log_function("⚠️ No se pudo medir el caudal: se usa la mejor calidad")
+            return best
+        # La descarga reparte el trabajo entre tantas conexiones como permita el límite de concurrencia
+        connections = self.concurrency.limit
+        throughput = per_connection * connections
+        self.measured_throughput = throughput
+        # En vivo no hay final: hay que descargar más rápido de lo que se emite
+        time_budget = content_seconds if not probe_playlist.endlist else self.time_budget
+        variant, estimate = select_for_throughput(variants, throughput, content_seconds, time_budget)
+        self.log_function(f"📶 Caudal medido con {len(samples)} segmentos: {per_connection * 8 / 1_000_000:.1f} Mbps "
+                          f"por conexión (~{throughput * 8 / 1_000_000:.1f} Mbps con {connections}). "
+                          f"Calidad automática: {self._describe(variant)}"
+                          + (f" (~{estimate:.0f}s estimados para {content_seconds:.0f}s de contenido, "
+                             f"presupuesto {time_budget:.0f}s)" if estimate is not None else ''))
+        return variant
+
+    def _adopt_probe_segments(self, segment_count: int) -> None:
+        """Las muestras de la medición de caudal pasan a ser los primeros segmentos si ganó su variante"""
+        probes, self._probe_files = self._probe_files, {}
+        keep = (not self.is_live and self.selected_variant is not None
+                and self.selected_variant.url == self._probe_variant_url)
+        for index, path in probes.items():
+            if keep and index < segment_count and os.path.exists(path):
+                size = os.path.getsize(path)
+                with open(path, 'rb') as f:
+                    header = f.read(VALIDATION_HEADER_SIZE)
+                if self._validate_ts_header(header, size, path):
+                    filename = self.segment_filename(index)
+                    os.replace(path, os.path.join(self.temp_dir, filename))
+                    self.validated_segments[filename] = size
+                    self.prefetched_segments.add(index)
+                    continue
+            if os.path.exists(path):
+                os.remove(path)
+        if self.prefetched_segments:
+            self.log_function(f"♻️ {len(self.prefetched_segments)} segmentos de la medición de caudal se reutilizan")
+
+    @staticmethod
+    def _describe(variant: VariantStream) -> str:
+        parts = [variant.resolution or 'resolución desconocida']
+        if variant.bandwidth:
+            parts.append(f"{variant.bandwidth / 1_000_000:.1f} Mbps")
+        return f"{' - '.join(parts)} ({variant.url})"
+
+    def _collect_all_segments(self, base_url: str, initial_playlist: Playlist) -> List[MediaSegment]:
+        """Sigue una playlist en vivo hasta #EXT-X-ENDLIST (o hasta que deje de crecer) y devuelve todos sus segmentos"""
+        self.log_function(f"📊 Segmentos iniciales encontrados: {len(initial_playlist.segments)}")
+        self.log_function("🔄 Stream dinámico detectado. Buscando segmentos adicionales...")
+        follower = self.create_live_follower(base_url, initial_playlist)
+        return follower.collect()
+
+    def create_live_follower(self, playlist_url: Optional[str] = None,
+                             initial_playlist: Optional[Playlist] = None,
+                             on_segment: Optional[Callable[[int, MediaSegment], None]] = None) -> LivePlaylistFollower:
+        """Follower por #EXT-X-MEDIA-SEQUENCE de la media playlist leída por _get_segment_urls"""
+        return LivePlaylistFollower(self.session, playlist_url or self.media_playlist_url,
+                                    initial=initial_playlist if initial_playlist is not None else self.playlist,
+                                    log_function=self.log_function, on_segment=on_segment)
+
+    def segment_filename(self, index: int) -> str:
+        """Nombre del segmento en el directorio temporal (.ts o .m4s según el contenedor)"""
+        return f'segment_{index:05d}{SEGMENT_EXTENSIONS[self.container]}'
+
+    def _prepare_init_sections(self, segment_urls: List[MediaSegment]) -> None:
+        """
+        Descarga una sola vez cada init segment (#EXT-X-MAP) de una playlist fMP4.
+
+        Raises:
+            ValueError: Si algún init no se puede descargar (sin él los fragmentos no sirven)
+        """
+        segments = [as_media_segment(segment) for segment in segment_urls]
+        sections = init_sections(segments)
+        if not sections:
+            self.segment_inits = []
+            return
+        self.container = 'fmp4'
+        os.makedirs(self.temp_dir, exist_ok=True)
+        init_files: Dict[Tuple[str, Optional[int], Optional[int]], str] = {}
+        for number, init in enumerate(sections):
+            init_path = os.path.join(self.temp_dir, f'init_{number:02d}.mp4')
+            # Al reanudar, el init ya descargado se reutiliza
+            if not (os.path.exists(init_path) and os.path.getsize(init_path) > 0):
+                self._download_init_section(init, init_path)
+            init_files[init.key] = init_path
+        self.segment_inits = [init_files[segment.init.key] if segment.init is not None else None
+                              for segment in segments]
+
+    def _download_init_section(self, init: MediaSegment, init_path: str) -> None:
+        request_headers = self.headers
+        if init.range_header:
+            request_headers = {**self.headers, 'Range': init.range_header, 'Accept-Encoding': 'identity'}
+        try:
+            response = self.session.get(init.url, headers=request_headers, timeout=15)
+            response.raise_for_status()
+        except requests.exceptions.RequestException as e:
+            raise ValueError(f"No se pudo descargar el init segment (#EXT-X-MAP) {init}: {e}")
+        data = response.content
+        if init.byte_length is not None:
+            # Si el servidor ignora Range llega el recurso completo: recortar en memoria (el init es pequeño)
+            start = (init.byte_offset or 0) if response.status_code != 206 else 0
+            data = data[start:start + init.byte_length]
+        if not is_init_header(data):
+            raise ValueError(f"El init segment {init} no es un MP4 válido (primeros bytes: {data[:16].hex()})")
+        temp_path = init_path + '.tmp'
+        with open(temp_path, 'wb') as f:
+            f.write(data)
+        os.replace(temp_path, init_path)
+        self.log_function(f"🎞️ Init segment descargado: {init} ({len(data):,} bytes)")
+
+    def _probe_resource_size(self, segment: MediaSegment) -> Optional[int]:
+        """Tamaño del recurso si el servidor acepta peticiones Range (None si no se puede partir)"""
+        try:
+            response = self.session.head(segment.url, timeout=5, allow_redirects=True)
+            length = response.headers.get('content-length')
+            if response.ok and length and 'bytes' in response.headers.get('accept-ranges', '').lower():
+                return int(length)
+
+            # Algunos servidores no anuncian Accept-Ranges: probar con un Range de 1 byte
+            probe_headers = {**self.headers, 'Range': 'bytes=0-0', 'Accept-Encoding': 'identity'}
+            with self.session.get(segment.url, headers=probe_headers, stream=True, timeout=5) as response:
+                content_range = response.headers.get('content-range', '')
+                if response.status_code == 206 and '/' in content_range:
+                    total = content_range.rsplit('/', 1)[1]
+                    return int(total) if total.isdigit() else None
+        except (requests.exceptions.RequestException, ValueError):
+            pass
+        return None
+
+    def _plan_fetch_units(self, work: Iterable[Tuple[int, MediaSegment]], probe_sizes: bool = False,
+                          ordered_indices: Optional[Deque[int]] = None) -> Iterator[FetchUnit]:
+        """
+        Convierte (índice, segmento) en peticiones, partiendo los recursos grandes en trozos Range
+        para que un único archivo grande pueda usar todos los workers disponibles.
+
+        Es un generador: la ventana deslizante pide las peticiones a medida que hay hueco,
+        así que ni las peticiones ni el orden de playlist se materializan para toda la lista.
+
+        Args:
+            work: (índice, segmento) en orden de playlist
+            probe_sizes: Consultar el tamaño de los segmentos sin BYTERANGE (solo compensa
+                         cuando hay menos segmentos que workers)
+            ordered_indices: Si se indica, recibe cada índice al planificarse (orden de playlist)
+        """
+        split_count = 0
+        for index, segment in work:
+            segment = as_media_segment(segment)
+            size = segment.byte_length
+            if size is None and probe_sizes:
+                size = self._probe_resource_size(segment)
+            if ordered_indices is not None:
+                ordered_indices.append(index)
+
+            if size is None or size <= RANGE_SPLIT_THRESHOLD:
+                yield FetchUnit(index, segment, self.segment_filename(index))
+                continue
+
+            parts = -(-size // RANGE_PART_SIZE)
+            split_count += 1
+            for part in range(parts):
+                offset = part * RANGE_PART_SIZE
+                yield FetchUnit(index, segment.slice(offset, min(RANGE_PART_SIZE, size - offset)),
+                                self.segment_filename(index), part=part, parts=parts)
+
+        if split_count:
+            self.log_function(f"✂️ {split_count} segmentos grandes divididos en trozos Range de {RANGE_PART_SIZE // (1024 * 1024)} MB")
+
+    def _join_segment_parts(self, index: int, parts: int, total_bytes: int) -> Optional[Tuple[str, int]]:
+        """Une en orden los trozos de un segmento y valida el resultado"""
+        segment_filename = self.segment_filename(index)
+        segment_path = os.path.join(self.temp_dir, segment_filename)
+        try:
+            with open(segment_path, 'wb', buffering=self.write_buffer_size) as output:
+                for part in range(parts):
+                    part_path = f'{segment_path}.part{part:03d}'
+                    with open(part_path, 'rb') as part_file:
+                        if part == 0:
+                            # Validar con la cabecera del primer trozo, que ya se está leyendo para copiarla
+                            header = part_file.read(VALIDATION_HEADER_SIZE)
+                            if not self._validate_ts_header(header, total_bytes, segment_path):
+                                self.log_function(f"⚠️ Segmento {index} unido desde {parts} trozos pero no es un segmento válido")
+                                raise ValueError('segmento inválido')
+                            output.write(header)
+                        shutil.copyfileobj(part_file, output, 1024 * 1024)
+                    os.remove(part_path)
+        except (OSError, ValueError) as e:
+            if not isinstance(e, ValueError):
+                self.log_function(f"❌ Error uniendo los trozos del segmento {index}: {e}")
+            try:
+                os.remove(segment_path)
+            except OSError:
+                pass
+            return None
+
+        self.validated_segments[segment_filename] = total_bytes
+        self.log_function(f"🧩 Segmento {index} unido desde {parts} trozos Range ({total_bytes / (1024 * 1024):.1f} MB)")
+        return (segment_filename, total_bytes)
 
     def _validate_ts_segment(self, segment_path: str) -> bool:
         """Valida que un archivo sea un segmento MPEG-TS válido o encriptado válido"""
@@ -178,41 +565,66 @@ class M3U8Downloader:
                 return False
             
             with open(segment_path, 'rb') as f:
-                first_bytes = f.read(16)  # Leer más bytes para mejor detección
-                
-                # 1. Verificar si es MPEG-TS válido (sync byte 0x47)
-                for i in range(min(4, len(first_bytes))):
-                    if first_bytes[i] == 0x47:
-                        return True
-                
-                # 2. Verificar si es contenido encriptado válido (AES-128)
-                if self._is_valid_encrypted_segment(first_bytes):
-                    self.log_function(f"✅ Segmento encriptado válido detectado: {segment_path}")
-                    return True
-                
-                # 3. Si no encontramos 0x47 ni encriptación, verificar errores HTML/texto
-                try:
-                    text_content = first_bytes.decode('utf-8', errors='ignore').lower()
-                    if any(keyword in text_content for keyword in ['<html', '<!doctype', 'error', '404', '403']):
-                        self.log_function(f"❌ Contenido HTML/error detectado: {text_content[:50]}...")
-                        return False
-                except:
-                    pass
-                
-                # 4. Log para debugging de contenido desconocido
-                first_hex = first_bytes.hex()
-                self.log_function(f"❓ DETECTADO: Formato desconocido - posible corrupción de red")
-                self.log_function(f"📁 Archivo: {segment_path}, Tamaño: {file_size} bytes")
-                self.log_function(f"🔍 Primeros bytes: {first_hex}")
-                
-                # Nuevo: Detectar formatos disfrazados
-                disguise_info = self._detect_disguised_format(segment_path, first_bytes)
-                if disguise_info['is_disguised']:
-                    self.log_function(f"🎭 FORMATO DISFRAZADO: {disguise_info['disguise_type']} -> {disguise_info['actual_format']}")
-                    # Los archivos disfrazados necesitan descifrado especial
-                    return True
-                    
+                header = f.read(VALIDATION_HEADER_SIZE)  # Varios paquetes para comprobar el sync cada 188 bytes
+            return self._validate_ts_header(header, file_size, segment_path)
+        except Exception as e:
+            self.log_function(f"❌ Error validando segmento {segment_path}: {e}")
+            return False
+
+    def _validate_ts_header(self, header: bytes, file_size: int, segment_path: str) -> bool:
+        """
+        Igual que _validate_ts_segment pero sobre los primeros bytes ya en memoria.
+
+        Args:
+            header: Primeros bytes del segmento (idealmente VALIDATION_HEADER_SIZE)
+            file_size: Tamaño total del segmento en bytes
+            segment_path: Ruta del archivo (para logs y detección de formatos disfrazados)
+        """
+        try:
+            if self.container not in ('ts', 'fmp4'):
+                # Audio empaquetado o WebVTT de una pista alternativa
+                return file_size > 0 and is_raw_segment_header(self.container, bytes(header[:16]))
+            if file_size < 188:  # Tamaño mínimo de un paquete MPEG-TS
                 return False
+            first_bytes = bytes(header[:16])
+            
+            # 1. Verificar si es MPEG-TS válido (sync byte 0x47 repetido cada 188 bytes)
+            sync_offset = find_sync_offset(header)
+            if sync_offset is not None and sync_offset < 4:
+                return True
+            
+            # 1b. En playlists fMP4 (#EXT-X-MAP) los fragmentos empiezan con una caja styp/moof
+            if self.container == 'fmp4' and is_fragment_header(header):
+                return True
+            
+            # 2. Verificar si es contenido encriptado válido (AES-128)
+            if self._is_valid_encrypted_segment(first_bytes):
+                self.log_function(f"✅ Segmento encriptado válido detectado: {segment_path}")
+                return True
+            
+            # 3. Si no encontramos 0x47 ni encriptación, verificar errores HTML/texto
+            try:
+                text_content = first_bytes.decode('utf-8', errors='ignore').lower()
+                if any(keyword in text_content for keyword in ['<html', '<!doctype', 'error', '404', '403']):
+                    self.log_function(f"❌ Contenido HTML/error detectado: {text_content[:50]}...")
+                    return False
+            except:
+                pass
+            
+            # 4. Log para debugging de contenido desconocido
+            first_hex = first_bytes.hex()
+            self.log_function(f"❓ DETECTADO: Formato desconocido - posible corrupción de red")
+            self.log_function(f"📁 Archivo: {segment_path}, Tamaño: {file_size} bytes")
+            self.log_function(f"🔍 Primeros bytes: {first_hex}")
+            
+            # Nuevo: Detectar formatos disfrazados
+            disguise_info = self._detect_disguised_format(segment_path, first_bytes)
+            if disguise_info['is_disguised']:
+                self.log_function(f"🎭 FORMATO DISFRAZADO: {disguise_info['disguise_type']} -> {disguise_info['actual_format']}")
+                # Los archivos disfrazados necesitan descifrado especial
+                return True
+                
+            return False
         except Exception as e:
             self.log_function(f"❌ Error validando segmento {segment_path}: {e}")
             return False
@@ -288,16 +700,46 @@ class M3U8Downloader:
                 return True
         return False
 
-    def _download_segment(self, url: str, index: int) -> Optional[Tuple[str, int]]:
-        segment_filename = f'segment_{index:05d}.ts'
-        segment_path = os.path.join(self.temp_dir, segment_filename)
+    def _download_segment(self, segment: Union[MediaSegment, str], index: int, filename: Optional[str] = None,
+                          validate: bool = True, race: Optional[HedgeRace] = None,
+                          contender: int = PRIMARY) -> Optional[Tuple[str, int]]:
+        segment = as_media_segment(segment)
+        url = segment.url
+        segment_filename = filename or self.segment_filename(index)
+        final_path = os.path.join(self.temp_dir, segment_filename)
+        # En una carrera de hedging cada contendiente escribe en su propio archivo hasta ganar
+        segment_path = final_path if race is None else os.path.join(self.temp_dir, HedgeRace.temp_filename(segment_filename, contender))
+        # Segmentos #EXT-X-BYTERANGE y trozos de recursos grandes: pedir solo su rango
+        range_header = segment.range_header
+        request_headers = self.headers
+        if range_header:
+            request_headers = {**self.headers, 'Range': range_header, 'Accept-Encoding': 'identity'}
+        # Respetar el límite adaptativo de concurrencia y medir la petición
+        # (las copias de hedging van por fuera: su presupuesto propio ya las limita)
+        counted = contender == PRIMARY
+        if counted:
+            self.concurrency.acquire()
+        request_start = time.time()
+        status_code = None
+        bytes_downloaded = 0
+        succeeded = False
+        response = None
         try:
             # Log detallado para debugging
-            self.log_function(f"🔍 Descargando segmento {index}: {url}")
+            self.log_function(f"🔍 Descargando segmento {index}: {segment}")
             
-            response = self.session.get(url, headers=self.headers, stream=True, timeout=15)
+            response = self.session.get(url, headers=request_headers, stream=True, timeout=15)
+            if race is not None and not race.attach(contender, response):
+                return None  # El otro contendiente ya publicó el segmento
+            status_code = response.status_code
             response.raise_for_status()
             
+            # Si el servidor ignora Range y devuelve el recurso completo, solo sirve cuando el rango empieza en 0
+            byte_limit = segment.byte_length if range_header else None
+            if range_header and response.status_code != 206 and segment.byte_offset:
+                self.log_function(f"⚠️ Segmento {index}: el servidor ignoró la cabecera Range ({range_header})")
+                return None
+            
             # Log de la respuesta
             self.log_function(f"📥 Segmento {index} - Status: {response.status_code}, Content-Type: {response.headers.get('content-type', 'N/A')}, Size: {response.headers.get('content-length', 'N/A')}")
             
@@ -307,40 +749,70 @@ class M3U8Downloader:
                 self.log_function(f"⚠️ Segmento {index} devolvió HTML en lugar de video (posible error 404/403)")
                 return None
             
-            bytes_downloaded = 0
-            with open(segment_path, 'wb') as f:
-                for chunk in response.iter_content(chunk_size=8192):
+            # Los primeros bytes se conservan en memoria y se validan en cuanto llegan:
+            # un segmento inválido se corta sin descargarlo entero y nunca se reabre el archivo
+            header = bytearray()
+            header_valid = not validate
+            with open(segment_path, 'wb', buffering=self.write_buffer_size) as f:
+                for chunk in response.iter_content(chunk_size=STREAM_CHUNK_SIZE):
+                    if race is not None and race.lost(contender):
+                        break  # El otro contendiente ya publicó el segmento
+                    if byte_limit is not None:
+                        chunk = chunk[:byte_limit - bytes_downloaded]
+                    if not header_valid and len(header) < VALIDATION_HEADER_SIZE:
+                        header += chunk[:VALIDATION_HEADER_SIZE - len(header)]
+                        if len(header) >= VALIDATION_HEADER_SIZE:
+                            header_valid = self._validate_ts_header(header, len(header), segment_path)
+                            if not header_valid:
+                                break
                     f.write(chunk)
                     bytes_downloaded += len(chunk)
+                    if self.rate_limiter is not None:
+                        self.rate_limiter.throttle(self.download_id, len(chunk))
+                    if byte_limit is not None and bytes_downloaded >= byte_limit:
+                        break
             
-            file_size = os.path.getsize(segment_path)
-            if file_size > 0:
-                # Validar que el segmento sea un archivo MPEG-TS válido
-                if self._validate_ts_segment(segment_path):
-                    self.log_function(f"✅ Segmento {index} validado correctamente")
+            if race is not None and race.lost(contender):
+                os.remove(segment_path)
+                return None
+            
+            if byte_limit is not None and bytes_downloaded != byte_limit and header_valid:
+                self.log_function(f"⚠️ Segmento {index}: rango incompleto ({bytes_downloaded}/{byte_limit} bytes)")
+                os.remove(segment_path)
+                return None
+            
+            if bytes_downloaded > 0 or header:
+                # Validar que el segmento sea un archivo MPEG-TS válido (segmentos de menos de un paquete llegan aquí sin validar)
+                if header_valid or (validate and len(header) < VALIDATION_HEADER_SIZE
+                                    and self._validate_ts_header(header, bytes_downloaded, segment_path)):
+                    if race is not None:
+                        if not race.claim(contender):
+                            os.remove(segment_path)
+                            return None
+                        os.replace(segment_path, final_path)
+                    if validate:
+                        self.validated_segments[segment_filename] = bytes_downloaded
+                        self.log_function(f"✅ Segmento {index} validado correctamente")
+                    succeeded = True
                     return (segment_filename, bytes_downloaded)
                 else:
-                    # Log detallado del archivo rechazado
-                    self.log_function(f"⚠️ Segmento {index} descargado pero no es MPEG-TS válido")
-                    self.log_function(f"📁 Archivo: {segment_path}, Tamaño: {os.path.getsize(segment_path)} bytes")
+                    # Log detallado del segmento rechazado (con la cabecera en memoria, sin reabrir el archivo)
+                    self.log_function(f"⚠️ Segmento {index} descargado pero no es MPEG-TS{'/fMP4' if self.container == 'fmp4' else ''} válido")
+                    self.log_function(f"📁 Archivo: {segment_path}, Tamaño: {bytes_downloaded} bytes")
                     
                     # Mostrar primeros bytes para debugging y detectar tipo de corrupción
-                    try:
-                        with open(segment_path, 'rb') as f:
-                            first_bytes = f.read(16)
-                            self.log_function(f"🔍 Primeros bytes: {first_bytes.hex()}")
-                            
-                            # Detectar tipos comunes de corrupción
-                            if first_bytes[:4] == b'\x83\xe1\x38\x99':
-                                self.log_function(f"🔐 DETECIDO: Contenido encriptado/comprimido - el servidor devuelve datos protegidos")
-                            elif first_bytes.startswith(b'<html') or first_bytes.startswith(b'<!DOCTYPE'):
-                                self.log_function(f"🌐 DETECTADO: Página HTML - posible error 404/403 del servidor")
-                            elif all(b == 0 for b in first_bytes):
-                                self.log_function(f"🚫 DETECTADO: Archivo vacío/nulo")
-                            else:
-                                self.log_function(f"❓ DETECTADO: Formato desconocido - posible corrupción de red")
-                    except:
-                        pass
+                    first_bytes = bytes(header[:16])
+                    self.log_function(f"🔍 Primeros bytes: {first_bytes.hex()}")
+                    
+                    # Detectar tipos comunes de corrupción
+                    if first_bytes[:4] == b'\x83\xe1\x38\x99':
+                        self.log_function(f"🔐 DETECIDO: Contenido encriptado/comprimido - el servidor devuelve datos protegidos")
+                    elif first_bytes.startswith(b'<html') or first_bytes.startswith(b'<!DOCTYPE'):
+                        self.log_function(f"🌐 DETECTADO: Página HTML - posible error 404/403 del servidor")
+                    elif all(b == 0 for b in first_bytes):
+                        self.log_function(f"🚫 DETECTADO: Archivo vacío/nulo")
+                    else:
+                        self.log_function(f"❓ DETECTADO: Formato desconocido - posible corrupción de red")
                     
                     self.log_function(f"🗑️ Eliminando segmento {index}")
                     os.remove(segment_path)
@@ -350,62 +822,417 @@ class M3U8Downloader:
                     os.remove(segment_path)
                 return None
         except requests.exceptions.RequestException as e:
-            self.log_function(f"⚠️ Error descargando segmento {index}: {e}")
+            if race is None or not race.lost(contender):
+                self.log_function(f"⚠️ Error descargando segmento {index}: {e}")
             return None
+        finally:
+            # Devolver la conexión al pool compartido aunque no se haya leído el cuerpo
+            if response is not None:
+                response.close()
+            if race is not None and not succeeded and os.path.exists(segment_path):
+                # Contendiente cortado a mitad de lectura: su archivo temporal sobra
+                try:
+                    os.remove(segment_path)
+                except OSError:
+                    pass
+            if counted and race is not None and not succeeded and race.lost(contender):
+                # Perdió la carrera de hedging: ni error ni muestra de latencia para el AIMD
+                self.concurrency.abandon()
+            elif counted:
+                self.concurrency.release(
+                    time.time() - request_start,
+                    bytes_count=bytes_downloaded,
+                    status_code=status_code,
+                    error=not succeeded
+                )
+
+    def _attempt_segment(self, unit: FetchUnit) -> Tuple[Optional[Tuple[str, int]], Optional[str], float, bool]:
+        """
+        Un único intento de descarga (los reintentos los programa DeferredRetryQueue).
+
+        Returns:
+            Tuple: (resultado, error, duración en segundos, ¿merece la pena reintentar?)
+        """
+        start_time = time.time()
+        if self.hedging is not None:
+            result = self._download_segment_hedged(unit)
+        else:
+            result = self._download_segment(unit.segment, unit.index, unit.filename, unit.validate)
+        if result:
+            return result, None, time.time() - start_time, False
 
-    def _download_segments_parallel(self, segment_urls: List[str]) -> List[str]:
+        # Tras el primer fallo, comprobar si el servidor todavía ofrece el segmento
+        if unit.attempts <= 1:
+            try:
+                test_response = self.session.head(unit.segment.url, timeout=5)
+                if test_response.status_code in [404, 403, 410]:
+                    # No reintentar si el segmento no existe
+                    return None, f"Segmento no disponible en servidor (HTTP {test_response.status_code})", time.time() - start_time, False
+            except requests.exceptions.RequestException:
+                pass  # Continuar con reintentos normales
+
+        return None, "No se pudo descargar el segmento", time.time() - start_time, True
+
+    def _download_segment_hedged(self, unit: FetchUnit) -> Optional[Tuple[str, int]]:
+        """Descarga con copia de respaldo si la petición supera el percentil de latencia"""
+        delay = self.hedging.delay()
+        if delay is None:
+            # Aún sin muestras suficientes para saber qué es "lento"
+            start_time = time.time()
+            result = self._download_segment(unit.segment, unit.index, unit.filename, unit.validate)
+            if result:
+                self.hedging.record_latency(time.time() - start_time)
+            return result
+
+        # Los dos contendientes corren como futures: el worker vuelve con el primero que gane
+        # (el perdedor se corta al reclamar la victoria y termina en su hilo)
+        race = HedgeRace()
+        start_time = time.time()
+        primary = self._get_contender_executor().submit(
+            self._download_segment, unit.segment, unit.index, unit.filename, unit.validate, race, PRIMARY)
+        done, _ = wait([primary], timeout=delay)
+        if done or not self.hedging.try_spend():
+            result = primary.result()
+            if result:
+                self.hedging.record_latency(time.time() - start_time)
+            return result
+
+        self.log_function(f"🏁 Segmento {unit.index}: supera {delay:.2f}s, lanzando petición duplicada")
+        hedge = self._get_hedge_executor().submit(
+            self._download_segment, unit.segment, unit.index, unit.filename, unit.validate, race, HEDGE)
+        pending = {primary, hedge}
+        result = None
+        while pending and result is None:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None and future.result():
+                    result = future.result()
+                    if future is hedge:
+                        self.hedging.record_win()
+                        self.log_function(f"🏁 Segmento {unit.index}: ganó la petición duplicada")
+                    else:
+                        self.hedging.record_latency(time.time() - start_time)
+        return result
+
+    def _get_contender_executor(self) -> ThreadPoolExecutor:
+        """Pool de las peticiones originales con hedging (el worker espera a la primera que gane)"""
+        with self._hedge_lock:
+            if self._contender_executor is None:
+                self._contender_executor = ThreadPoolExecutor(max_workers=self.max_workers,
+                                                              thread_name_prefix='contender')
+            return self._contender_executor
+
+    def _get_hedge_executor(self) -> ThreadPoolExecutor:
+        """Pool pequeño para las copias, acotado por el presupuesto de hedging"""
+        with self._hedge_lock:
+            if self._hedge_executor is None:
+                workers = max(2, int(self.max_workers * self.hedging.budget_ratio * 2))
+                self._hedge_executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='hedge')
+            return self._hedge_executor
+
+    def _shutdown_hedging(self) -> None:
+        with self._hedge_lock:
+            for executor in (self._contender_executor, self._hedge_executor):
+                if executor is not None:
+                    executor.shutdown(wait=True)
+            self._contender_executor = None
+            self._hedge_executor = None
+            if self.hedging is not None:
+                snapshot = self.hedging.snapshot()
+                if snapshot['hedges_issued']:
+                    self.log_function(f"🏁 Hedging: {snapshot['hedges_issued']} peticiones duplicadas, "
+                                      f"{snapshot['hedges_won']} ganadas (umbral p{int(snapshot['percentile'] * 100)}: "
+                                      f"{snapshot['threshold_seconds']}s)")
+
+    def download_segments_concurrent(self, segment_urls: List[MediaSegment], skip_indices: Optional[set] = None,
+                                     on_segment: Optional[Callable[[int, int, float], None]] = None,
+                                     is_cancelled: Optional[Callable[[], bool]] = None,
+                                     max_attempts: int = 4,
+                                     on_ordered: Optional[Callable[[int], None]] = None,
+                                     on_retry: Optional[Callable[[int, int, float, str], None]] = None,
+                                     live: Optional[LivePlaylistFollower] = None,
+                                     on_failed: Optional[Callable[[int, str], None]] = None) -> Dict[str, object]:
+        """
+        Motor concurrente de descarga de segmentos usado por la interfaz web.
+
+        Cada segmento se intenta una vez en la pasada principal. Los que fallan pasan
+        a una cola de reintentos diferidos (backoff exponencial con jitter) que se
+        atiende después, sin dejar workers dormidos entre intentos. Un fallo
+        permanente ya no detiene la descarga: se registra y se sigue con el resto.
+
+        Args:
+            segment_urls: Segmentos de la playlist (MediaSegment o URLs sueltas)
+            skip_indices: Índices ya descargados (reanudación) que no se vuelven a pedir
+            on_segment: Callback (índice, bytes, duración) por cada segmento completado.
+                        Se invoca siempre desde el hilo que llama a este método.
+            is_cancelled: Función consultada periódicamente para abortar la descarga
+            max_attempts: Intentos por segmento antes de darlo por fallido permanentemente
+            on_ordered: Callback (índice) cada vez que avanza el prefijo contiguo de
+                        segmentos completados, en orden de playlist
+            on_retry: Callback (índice, intento siguiente, espera en segundos, error)
+                      cuando un segmento pasa a la cola de reintentos
+            live: Follower de una playlist en vivo (se arranca aquí). Sus segmentos se descargan a
+                  medida que aparecen, con índice = secuencia - primera secuencia vista;
+                  segment_urls se ignora. Cancelar la descarga detiene el follower. Los
+                  reintentos se intercalan con los segmentos nuevos (antes de que salgan de
+                  la ventana) y un fallo permanente no bloquea el prefijo de on_ordered
+            on_failed: Callback (índice, error) cuando un segmento falla definitivamente
+
+        Returns:
+            Dict: {'completed': [índices], 'failed': {índice: error}, 'cancelled': bool,
+                   'retries': reintentos programados}
+        """
+        os.makedirs(self.temp_dir, exist_ok=True)
+        skip = set(skip_indices or ())
+        summary: Dict[str, object] = {'completed': [], 'failed': {}, 'cancelled': False, 'retries': 0}
+        pool_label = 'planificador global' if self.scheduler is not None and self.backend == 'threads' else 'pool propio'
+        retry_queue = DeferredRetryQueue(max_attempts=max_attempts)
+        if live is not None:
+            # En vivo: las peticiones se crean a medida que el follower encuentra segmentos nuevos
+            self._prepare_init_sections(live.playlist.segments if live.playlist is not None else [])
+            live.start()
+            ordered_indices: Deque[int] = deque()
+            units = self._live_fetch_units(live, skip, ordered_indices, retry_queue)
+            collector = _RangedPartCollector(self)
+            workers = self.max_workers
+            self.log_function(f"⚡ Descargando segmentos en vivo según aparecen con hasta {workers} workers "
+                              f"(backend: {self.backend}, {pool_label})")
+        else:
+            self._prepare_init_sections(segment_urls)
+            pending_count = len(segment_urls) - sum(1 for i in skip if 0 <= i < len(segment_urls))
+            if not pending_count and not self.rendition_tracks:
+                return summary
+            # Perezoso: run_windowed saca peticiones (y su índice en orden de playlist) según hay hueco
+            ordered_indices = deque()
+            pending_work = ((i, segment) for i, segment in enumerate(segment_urls) if i not in skip)
+            probe_sizes = pending_count < self.max_workers
+            units = self._plan_fetch_units(pending_work, probe_sizes, ordered_indices)
+            collector = _RangedPartCollector(self)
+            planned = pending_count
+            if probe_sizes:
+                # Pocos segmentos: planificarlos ya para ajustar el pool a los trozos Range
+                units = list(units)
+                planned = len(units)
+            # El pool propio también atiende a las pistas alternativas
+            workers = max(1, min(self.max_workers, planned + sum(len(track.segments) for track in self.rendition_tracks)))
+            self.log_function(f"⚡ Descargando {pending_count} segmentos en paralelo con hasta {workers} workers (backend: {self.backend}, {pool_label})")
+        # Solo los completados que esperan a uno anterior: el prefijo ya entregado sale de la memoria
+        completed = set()
+        given_up = set()
+
+        def advance_ordered() -> None:
+            while ordered_indices and (ordered_indices[0] in completed or ordered_indices[0] in given_up):
+                index = ordered_indices.popleft()
+                if index in completed:
+                    completed.discard(index)
+                    on_ordered(index)
+                else:
+                    given_up.discard(index)
+
+        def handle_outcome(unit: FetchUnit, result: Optional[Tuple[str, int]], error: Optional[str], elapsed: float) -> None:
+            outcome = collector.feed(unit, result, error, elapsed)
+            if outcome is None:
+                return  # Faltan trozos de este segmento
+            result, error, elapsed = outcome
+            index = unit.index
+            if result:
+                summary['completed'].append(index)
+                if on_segment:
+                    on_segment(index, result[1], elapsed)
+                if on_ordered:
+                    # Avanzar el prefijo contiguo de segmentos completados
+                    completed.add(index)
+                    advance_ordered()
+            else:
+                summary['failed'][index] = error
+                self.log_function(f"❌ Segmento {index} falló definitivamente tras {unit.attempts} intentos: {error}")
+                if on_failed:
+                    on_failed(index, error)
+                if on_ordered and live is not None:
+                    # En vivo no se puede esperar a un segmento que ya salió de la ventana: se salta
+                    given_up.add(index)
+                    advance_ordered()
+
+        def handle_attempt(unit: FetchUnit, result: Optional[Tuple[str, int]], error: Optional[str],
+                           elapsed: float, retryable: bool) -> None:
+            if not result and retryable:
+                delay = retry_queue.defer(unit, unit.attempts)
+                if delay is not None:
+                    summary['retries'] += 1
+                    self.log_function(f"🔁 Segmento {unit.index}: reintento {unit.attempts + 1}/{max_attempts} en {delay:.1f}s ({error})")
+                    if on_retry:
+                        on_retry(unit.index, unit.attempts + 1, delay, error)
+                    return
+                error = f"{error} (falló tras {unit.attempts} intentos)"
+            handle_outcome(unit, result, error, elapsed)
+
+        def should_stop() -> bool:
+            return bool(is_cancelled and is_cancelled())
+
+        def submit_attempt(executor, unit: FetchUnit):
+            unit.attempts += 1
+            return executor.submit(self._attempt_segment, unit)
+
+        def count_attempts(batch: Iterable[FetchUnit]) -> Iterator[FetchUnit]:
+            # Perezoso: en vivo el lote es un generador que no termina hasta el final del directo
+            for unit in batch:
+                if unit is not NOT_READY:
+                    unit.attempts += 1
+                yield unit
+
+        def run_pass(batch: Iterable[FetchUnit]) -> bool:
+            if self.backend == 'asyncio':
+                return AsyncSegmentFetcher(self).run(count_attempts(batch), handle_attempt, should_stop)
+            # Ventana deslizante: solo N+k futures vivos aunque la playlist tenga miles de segmentos
+            return run_windowed(
+                lambda unit: submit_attempt(executor, unit),
+                batch,
+                window=self._window_size,
+                on_complete=lambda unit, outcome: handle_attempt(unit, *outcome),
+                should_stop=should_stop
+            )
+
+        job = None
+        executor = None
+        if self.shared_executor is not None:
+            # Pista alternativa: sus segmentos van a los workers (y al límite) de la descarga principal
+            executor = self.shared_executor
+        elif self.backend != 'asyncio':
+            if self.scheduler is not None:
+                # Workers del pool global; nunca más tareas en vuelo que el límite AIMD de esta descarga
+                executor = job = self.scheduler.register(self.download_id or id(self), priority=self.priority,
+                                                         capacity=lambda: self.concurrency.limit)
+            else:
+                executor = ThreadPoolExecutor(max_workers=workers)
+
+        # Pistas alternativas en paralelo con el video, con el mismo presupuesto de workers
+        tracks = self.rendition_tracks if live is None else []
+        tracks_aborted = threading.Event()
+        rendition_pool = None
+        if tracks:
+            shared = executor
+            if shared is None:
+                # Backend asyncio: las pistas comparten un pool de hilos acotado por max_workers
+                shared = rendition_pool = ThreadPoolExecutor(max_workers=self.max_workers)
+            for track in tracks:
+                track.start(shared, lambda: tracks_aborted.is_set() or should_stop())
+
+        try:
+            stopped = run_pass(units)
+
+            # Reintentos diferidos: solo cuando vence su backoff, en lotes concurrentes
+            if len(retry_queue) and not stopped:
+                self.log_function(f"🔁 Pasada principal terminada. {len(retry_queue)} segmentos en cola de reintentos")
+            while len(retry_queue) and not stopped:
+                wait_time = retry_queue.next_due_in()
+                if wait_time > 0:
+                    time.sleep(min(wait_time, 0.5))
+                    stopped = should_stop()
+                    continue
+                stopped = run_pass(retry_queue.pop_due())
+        except BaseException:
+            tracks_aborted.set()
+            raise
+        finally:
+            if live is not None:
+                live.stop()
+            for track in tracks:
+                track.join()
+            if rendition_pool is not None:
+                rendition_pool.shutdown(wait=True)
+            if job is not None:
+                job.close()
+            elif executor is not None and executor is not self.shared_executor:
+                executor.shutdown(wait=True)
+            self._shutdown_hedging()
+
+        # Lo que quedó en cola al cancelar no es un fallo permanente: se reintentará al reanudar
+        retry_queue.drain()
+        summary['cancelled'] = stopped
+        return summary
+
+    def _live_fetch_units(self, follower: LivePlaylistFollower, skip: set, ordered_indices: Deque[int],
+                          retry_queue: DeferredRetryQueue) -> Iterator[object]:
+        """Peticiones para los segmentos que va encontrando el follower (NOT_READY mientras no hay nuevos)"""
+        for segment in follower:
+            # Los reintentos vencidos van primero: esperar al final del directo sería perderlos
+            yield from retry_queue.pop_due()
+            if segment is NOT_READY:
+                yield NOT_READY
+                continue
+            index = follower.index_of(segment)
+            if index in skip:
+                continue
+            ordered_indices.append(index)
+            yield FetchUnit(index, segment, self.segment_filename(index))
+
+    def _window_size(self) -> int:
+        """Tareas pendientes permitidas: límite de concurrencia actual más una holgura"""
+        return min(self.concurrency.limit, self.max_workers) + DEFAULT_WINDOW_SLACK
+
+    def _download_segments_parallel(self, segment_urls: List[MediaSegment]) -> List[str]:
         if not os.path.exists(self.temp_dir):
             os.makedirs(self.temp_dir)
             self.log_function(f"📁 Directorio temporal creado en: '{self.temp_dir}'")
         
         successful_segments = []
-        failed_segments = 0
-        encrypted_segments_detected = 0
-        
-        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
-            futures = {executor.submit(self._download_segment, url, i): i for i, url in enumerate(segment_urls)}
-            
-            completed_count = 0
-            for future in tqdm(as_completed(futures), total=len(segment_urls), desc="📥 Descargando segmentos (paralelo)"):
-                result = future.result()
-                completed_count += 1
-                
-                if result:
-                    segment_filename, bytes_downloaded = result
-                    successful_segments.append(segment_filename)
-                else:
-                    failed_segments += 1
-                    
-                    # Detectar si es probable contenido encriptado
-                    # Si los primeros 10 segmentos fallan, es probable que todo esté encriptado
-                    if completed_count <= 10 and failed_segments >= completed_count:
-                        encrypted_segments_detected += 1
-                    
-                    # Si los primeros 10 segmentos fallan completamente, abortar
-                    if completed_count >= 10 and successful_segments == 0:
-                        self.log_function(f"🔐 DETECTADO: Los primeros {completed_count} segmentos fallaron completamente.")
-                        self.log_function("🔐 Esto indica contenido ENCRIPTADO/DRM que no se puede descargar.")
-                        self.log_function("💡 Sugerencia: Usa el botón 'Solo Ver' para reproducir este contenido.")
-                        
-                        # Cancelar futures pendientes
-                        for pending_future in futures:
-                            pending_future.cancel()
-                        
-                        raise ValueError("CONTENIDO ENCRIPTADO/DRM detectado: Todos los segmentos iniciales fallaron. Usa el modo 'Solo Ver' para reproducir este contenido.")
-                
-                # Verificación adicional: si más del 95% de segmentos completados han fallado y ya completamos suficientes
-                if completed_count >= 20:
-                    failure_rate = failed_segments / completed_count
-                    if failure_rate > 0.95:
-                        self.log_function(f"🔐 DETECTADO: {failure_rate*100:.1f}% de segmentos han fallado ({failed_segments}/{completed_count}).")
-                        self.log_function("🔐 Esto indica contenido ENCRIPTADO/DRM que no se puede descargar.")
-                        self.log_function("💡 Sugerencia: Usa el botón 'Solo Ver' para reproducir este contenido.")
-                        
-                        # Cancelar futures pendientes
-                        for pending_future in futures:
-                            pending_future.cancel()
-                        
-                        raise ValueError("CONTENIDO ENCRIPTADO/DRM detectado: Tasa de fallo muy alta en segmentos. Usa el modo 'Solo Ver' para reproducir este contenido.")
+        counters = {'completed': 0, 'failed': 0}
+        abort = {'message': None}
+
+        def record_result(result: Optional[Tuple[str, int]]) -> None:
+            """Contabiliza un segmento y decide si el contenido parece ENCRIPTADO/DRM"""
+            counters['completed'] += 1
+            if result:
+                segment_filename, bytes_downloaded = result
+                successful_segments.append(segment_filename)
+                return
+
+            counters['failed'] += 1
+            completed_count = counters['completed']
+            failed_segments = counters['failed']
+
+            # Si los primeros 10 segmentos fallan completamente, abortar
+            if completed_count >= 10 and not successful_segments:
+                self.log_function(f"🔐 DETECTADO: Los primeros {completed_count} segmentos fallaron completamente.")
+                self.log_function("🔐 Esto indica contenido ENCRIPTADO/DRM que no se puede descargar.")
+                self.log_function("💡 Sugerencia: Usa el botón 'Solo Ver' para reproducir este contenido.")
+                abort['message'] = "CONTENIDO ENCRIPTADO/DRM detectado: Todos los segmentos iniciales fallaron. Usa el modo 'Solo Ver' para reproducir este contenido."
+
+            # Verificación adicional: si más del 95% de segmentos completados han fallado y ya completamos suficientes
+            elif completed_count >= 20 and failed_segments / completed_count > 0.95:
+                failure_rate = failed_segments / completed_count
+                self.log_function(f"🔐 DETECTADO: {failure_rate*100:.1f}% de segmentos han fallado ({failed_segments}/{completed_count}).")
+                self.log_function("🔐 Esto indica contenido ENCRIPTADO/DRM que no se puede descargar.")
+                self.log_function("💡 Sugerencia: Usa el botón 'Solo Ver' para reproducir este contenido.")
+                abort['message'] = "CONTENIDO ENCRIPTADO/DRM detectado: Tasa de fallo muy alta en segmentos. Usa el modo 'Solo Ver' para reproducir este contenido."
+
+        self._prepare_init_sections(segment_urls)
+        units = self._plan_fetch_units(enumerate(segment_urls), probe_sizes=len(segment_urls) < self.max_workers)
+        collector = _RangedPartCollector(self)
+
+        with tqdm(total=len(segment_urls), desc=f"📥 Descargando segmentos ({self.backend})") as pbar:
+            def on_done(unit, result, error=None, elapsed=0.0, retryable=False):
+                outcome = collector.feed(unit, result, error, elapsed)
+                if outcome is None:
+                    return  # Faltan trozos de este segmento
+                record_result(outcome[0])
+                pbar.update(1)
+
+            if self.backend == 'asyncio':
+                AsyncSegmentFetcher(self).run(units, on_done, lambda: abort['message'] is not None)
+            else:
+                with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+                    run_windowed(
+                        lambda unit: executor.submit(self._download_segment, unit.segment, unit.index,
+                                                     unit.filename, unit.validate),
+                        units,
+                        window=self._window_size,
+                        on_complete=on_done,
+                        should_stop=lambda: abort['message'] is not None
+                    )
+
+        if abort['message']:
+            raise ValueError(abort['message'])
 
         successful_segments.sort()
         
@@ -435,7 +1262,10 @@ class M3U8Downloader:
         invalid_count = 0
         for segment_filename in successful_segments:
             segment_path = os.path.join(self.temp_dir, segment_filename)
-            if os.path.exists(segment_path) and os.path.getsize(segment_path) > 0:
+            if segment_filename in self.validated_segments:
+                # Ya validado al escribirlo: no hace falta volver a abrirlo
+                valid_segments.append(segment_path)
+            elif os.path.exists(segment_path) and os.path.getsize(segment_path) > 0:
                 # Validar que es un archivo MPEG-TS válido
                 if self._validate_ts_segment(segment_path):
                     valid_segments.append(segment_path)
@@ -455,25 +1285,48 @@ class M3U8Downloader:
         if len(valid_segments) < len(successful_segments) * 0.8:  # Si perdemos más del 20% de segmentos
             self.log_function(f"⚠️ ADVERTENCIA: Solo {len(valid_segments)}/{len(successful_segments)} segmentos son válidos. El video final puede estar incompleto.")
             
-        self.log_function(f"📋 Creando lista de {len(valid_segments)} segmentos válidos...")
+        # La salida se escribe en un temporal junto al destino (crea el directorio) y se publica con rename
+        staged_output = prepare_staging(self.output_filename)
         
-        # Escribir lista de archivos con rutas absolutas y escape correcto
-        with open(list_path, 'w', encoding='utf-8') as f:
-            for segment_path in valid_segments:
-                # Usar rutas absolutas y escapar comillas para FFmpeg
-                abs_path = os.path.abspath(segment_path).replace('\\', '/')
-                f.write(f"file '{abs_path}'\n")
-        
-        # Asegurar que el directorio de salida existe
-        output_dir = os.path.dirname(os.path.abspath(self.output_filename))
-        os.makedirs(output_dir, exist_ok=True)
+        if self.container == 'fmp4':
+            # fMP4/CMAF: init + fragmentos concatenados ya forman el MP4 final
+            if self.merge_fmp4(valid_segments, staged_output) and publish(staged_output, self.output_filename):
+                self.log_function(f"✅ ¡Éxito! Video guardado como '{self.output_filename}' (tamaño: {os.path.getsize(self.output_filename):,} bytes)")
+            discard(staged_output)
+            return
         
-        # Comando FFmpeg mejorado con más opciones de compatibilidad
-        command = [
-            'ffmpeg', '-f', 'concat', '-safe', '0', '-i', list_path,
-            '-c', 'copy', '-avoid_negative_ts', 'make_zero',
-            '-fflags', '+genpts', '-y', self.output_filename
-        ]
+        if self.merge_strategy == 'ts_concat':
+            # Copia binaria de los segmentos a un único .ts; ffmpeg solo remuxea esa entrada
+            if self.output_filename.lower().endswith('.ts'):
+                if self._concat_segments(valid_segments, staged_output) and publish(staged_output, self.output_filename):
+                    self.log_function(f"✅ ¡Éxito! Video guardado como '{self.output_filename}' (tamaño: {os.path.getsize(self.output_filename):,} bytes)")
+                discard(staged_output)
+                return
+            joined_path = self._concat_segments(valid_segments, os.path.join(self.temp_dir, 'joined.ts'))
+            if joined_path is None:
+                return
+            list_path = joined_path
+            command = [
+                'ffmpeg', '-i', joined_path,
+                '-c', 'copy', '-avoid_negative_ts', 'make_zero',
+                '-fflags', '+genpts', '-y', staged_output
+            ]
+        else:
+            self.log_function(f"📋 Creando lista de {len(valid_segments)} segmentos válidos...")
+            
+            # Escribir lista de archivos con rutas absolutas y escape correcto
+            with open(list_path, 'w', encoding='utf-8') as f:
+                for segment_path in valid_segments:
+                    # Usar rutas absolutas y escapar comillas para FFmpeg
+                    abs_path = os.path.abspath(segment_path).replace('\\', '/')
+                    f.write(f"file '{abs_path}'\n")
+            
+            # Comando FFmpeg mejorado con más opciones de compatibilidad
+            command = [
+                'ffmpeg', '-f', 'concat', '-safe', '0', '-i', list_path,
+                '-c', 'copy', '-avoid_negative_ts', 'make_zero',
+                '-fflags', '+genpts', '-y', staged_output
+            ]
         
         self.log_function(f"🔧 Comando FFmpeg: {' '.join(command)}")
         
@@ -485,12 +1338,12 @@ class M3U8Downloader:
             
             self.log_function(f"📤 FFmpeg stdout: {process.stdout}")
             
-            # Verificar que el archivo de salida existe y no está vacío
-            if os.path.exists(self.output_filename):
+            # Publicar solo si el archivo de salida existe y no está vacío
+            if publish(staged_output, self.output_filename):
                 file_size = os.path.getsize(self.output_filename)
                 self.log_function(f"✅ ¡Éxito! Video guardado como '{self.output_filename}' (tamaño: {file_size:,} bytes)")
-                if file_size == 0:
-                    self.log_function("⚠️ ADVERTENCIA: El archivo de salida está vacío!")
+            elif os.path.exists(staged_output):
+                self.log_function("⚠️ ADVERTENCIA: El archivo de salida está vacío!")
             else:
                 self.log_function(f"⚠️ ADVERTENCIA: El archivo de salida '{self.output_filename}' no fue creado!")
                 
@@ -502,7 +1355,7 @@ class M3U8Downloader:
             
             # Información adicional para debugging
             self.log_function(f"📋 Lista de archivos usada: {list_path}")
-            if os.path.exists(list_path):
+            if self.merge_strategy == 'concat_list' and os.path.exists(list_path):
                 with open(list_path, 'r', encoding='utf-8') as f:
                     content = f.read()
                     self.log_function(f"📄 Contenido de filelist.txt:\n{content}")
@@ -510,6 +1363,60 @@ class M3U8Downloader:
         except FileNotFoundError:
             self.log_function("\n❌ Error: 'ffmpeg' no encontrado. Asegúrate de que esté instalado y en el PATH.")
             self.log_function("💡 Descarga FFmpeg desde: https://ffmpeg.org/download.html")
+        finally:
+            discard(staged_output)
+
+    def _concat_segments(self, segment_paths: List[str], joined_path: str) -> Optional[str]:
+        """Une los segmentos en joined_path con copias en el kernel; devuelve la ruta o None"""
+        # Tamaños ya conocidos de los segmentos validados al escribirlos (sin stat por archivo)
+        sizes = [self.validated_segments.get(os.path.basename(path)) for path in segment_paths]
+        if any(size is None for size in sizes):
+            sizes = None
+        self.log_function(f"🧩 Concatenando {len(segment_paths)} segmentos en un único .ts...")
+        try:
+            concat_ts_segments(segment_paths, joined_path, sizes=sizes, log_function=self.log_function)
+        except OSError as e:
+            self.log_function(f"❌ Error concatenando segmentos: {e}")
+            return None
+        return joined_path
+
+    def merge_fmp4(self, segment_paths: List[str], output_path: str,
+                   tracks: Sequence[RenditionTrack] = ()) -> bool:
+        """
+        Concatena init segment(s) y fragmentos fMP4 en output_path, sin ffmpeg. True si se escribió.
+
+        Con pistas alternativas el mismo flujo entra por stdin al ffmpeg que las
+        multiplexa: la salida se escribe una sola vez.
+
+        Raises:
+            subprocess.CalledProcessError: Si ffmpeg falla al multiplexar las pistas
+        """
+        inits_by_filename = {self.segment_filename(index): init for index, init in enumerate(self.segment_inits)}
+        init_paths = [inits_by_filename.get(os.path.basename(path)) for path in segment_paths]
+        # Fragmentos posteriores a la playlist inicial (directos): siguen con el último init conocido
+        for position in range(1, len(init_paths)):
+            if init_paths[position] is None:
+                init_paths[position] = init_paths[position - 1]
+        if not init_paths or init_paths[0] is None:
+            self.log_function("❌ Falta el init segment (#EXT-X-MAP) del primer fragmento: no se puede unir")
+            return False
+        if tracks:
+            command = mux_command(['-hide_banner', '-loglevel', 'error', '-f', 'mp4', '-i', 'pipe:0'],
+                                  tracks, output_path)
+            try:
+                pipe_fmp4_segments(segment_paths, init_paths, command, log_function=self.log_function)
+            except OSError as e:
+                self.log_function(f"❌ Error enviando fragmentos fMP4 a ffmpeg: {e}")
+                return False
+            return True
+        sizes = [self.validated_segments.get(os.path.basename(path)) for path in segment_paths]
+        self.log_function(f"🎞️ Uniendo init segment + {len(segment_paths)} fragmentos fMP4 por concatenación binaria...")
+        try:
+            concat_fmp4_segments(segment_paths, init_paths, output_path, sizes=sizes, log_function=self.log_function)
+        except OSError as e:
+            self.log_function(f"❌ Error concatenando fragmentos fMP4: {e}")
+            return False
+        return True
 
     def _cleanup(self) -> None:
         if os.path.exists(self.temp_dir):
@@ -524,8 +1431,13 @@ class M3U8Downloader:
 
     def download(self) -> None:
         try:
-            segment_urls = self._get_segment_urls()
-            successful_segments = self._download_segments_parallel(segment_urls)
+            segment_urls = self._get_segment_urls(collect_live=False)
+            if self.is_live:
+                # En vivo: descargar cada segmento en cuanto aparece mientras se sigue la playlist
+                summary = self.download_segments_concurrent(segment_urls, live=self.create_live_follower())
+                successful_segments = [self.segment_filename(index) for index in sorted(summary['completed'])]
+            else:
+                successful_segments = self._download_segments_parallel(segment_urls)
             self._merge_segments(successful_segments)
         except Exception as e:
             self.log_function(f"\n🔴 Ha ocurrido un error inesperado: {e}")
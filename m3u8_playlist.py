@@ -0,0 +1,396 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Modelo de Playlist M3U8
+=======================
+
+Un único parser para las playlists HLS, compartido por el descargador, la
+interfaz web, el análisis DRM y el descifrador AES. Recorre el texto una
+sola vez y produce registros compactos (__slots__):
+
+- MediaSegment: URL absoluta, número de secuencia, duración, rango de bytes
+  (#EXT-X-BYTERANGE), clave en vigor (#EXT-X-KEY), init segment (#EXT-X-MAP)
+  y marca de discontinuidad
+- EncryptionKey, VariantStream (#EXT-X-STREAM-INF) y MediaRendition (#EXT-X-MEDIA)
+
+Los segmentos comparten por referencia la clave y el init en vigor, así que
+una playlist de decenas de miles de entradas no repite esos objetos.
+"""
+
+import re
+from typing import Callable, Dict, List, Optional, Tuple
+from urllib.parse import urljoin
+
+# Atributos de una etiqueta: CLAVE=valor o CLAVE="valor con, comas"
+_ATTRIBUTE_RE = re.compile(r'([A-Z0-9-]+)=("[^"]*"|[^,]*)')
+
+
+class EncryptionKey:
+    """Una etiqueta #EXT-X-KEY (METHOD=NONE también se registra: corta el cifrado anterior)"""
+    __slots__ = ('method', 'uri', 'iv', 'key_format', 'key_format_versions', 'raw')
+
+    def __init__(self, method: str, uri: Optional[str] = None, iv: Optional[str] = None,
+                 key_format: Optional[str] = None, key_format_versions: Optional[str] = None, raw: str = ''):
+        self.method = method
+        self.uri = uri
+        self.iv = iv  # Tal como aparece en la playlist ('0x...')
+        self.key_format = key_format
+        self.key_format_versions = key_format_versions
+        self.raw = raw
+
+    @property
+    def is_encrypted(self) -> bool:
+        return self.method.upper() != 'NONE'
+
+    @property
+    def iv_bytes(self) -> Optional[bytes]:
+        if not self.iv:
+            return None
+        try:
+            return bytes.fromhex(self.iv[2:] if self.iv[:2].lower() == '0x' else self.iv)
+        except ValueError:
+            return None
+
+    def __repr__(self) -> str:
+        return f'EncryptionKey({self.method!r}, {self.uri!r})'
+
+
+class MediaSegment:
+    """Un segmento de la playlist: URL absoluta, duración, rango de bytes, clave e init segment en vigor"""
+    __slots__ = ('url', 'duration', 'byte_offset', 'byte_length', 'init', 'sequence', 'discontinuity',
+                 'encryption', 'title')
+
+    def __init__(self, url: str, duration: float = 0.0, byte_offset: Optional[int] = None,
+                 byte_length: Optional[int] = None, init: Optional['MediaSegment'] = None,
+                 sequence: int = 0, discontinuity: bool = False, encryption: Optional[EncryptionKey] = None,
+                 title: str = ''):
+        self.url = url
+        self.duration = duration
+        self.byte_offset = byte_offset
+        self.byte_length = byte_length
+        self.init = init  # #EXT-X-MAP en vigor (None en playlists MPEG-TS)
+        self.sequence = sequence  # #EXT-X-MEDIA-SEQUENCE + posición
+        self.discontinuity = discontinuity  # Precedido por #EXT-X-DISCONTINUITY
+        self.encryption = encryption  # #EXT-X-KEY en vigor (None si no hay cifrado)
+        self.title = title  # Texto tras la coma de #EXTINF
+
+    @property
+    def has_byterange(self) -> bool:
+        return self.byte_length is not None
+
+    @property
+    def range_header(self) -> Optional[str]:
+        """Valor de la cabecera Range para este segmento (None si es el archivo completo)"""
+        if self.byte_length is None:
+            return None
+        start = self.byte_offset or 0
+        return f'bytes={start}-{start + self.byte_length - 1}'
+
+    @property
+    def key(self) -> Tuple[str, Optional[int], Optional[int]]:
+        """Identidad del segmento para eliminar duplicados entre recargas de la playlist"""
+        return (self.url, self.byte_offset, self.byte_length)
+
+    def slice(self, offset: int, length: int) -> 'MediaSegment':
+        """Sub-rango del segmento (offset relativo al inicio del segmento)"""
+        return MediaSegment(self.url, 0.0, (self.byte_offset or 0) + offset, length, self.init,
+                            self.sequence, encryption=self.encryption)
+
+    def __str__(self) -> str:
+        if self.byte_length is None:
+            return self.url
+        return f'{self.url} [{self.range_header}]'
+
+    def __repr__(self) -> str:
+        return f'MediaSegment({str(self)!r})'
+
+
+class VariantStream:
+    """Una variante de un master playlist (#EXT-X-STREAM-INF + URI)"""
+    __slots__ = ('url', 'bandwidth', 'average_bandwidth', 'resolution', 'codecs', 'frame_rate',
+                 'audio', 'subtitles')
+
+    def __init__(self, url: str, bandwidth: int = 0, average_bandwidth: int = 0, resolution: Optional[str] = None,
+                 codecs: Optional[str] = None, frame_rate: Optional[float] = None, audio: Optional[str] = None,
+                 subtitles: Optional[str] = None):
+        self.url = url
+        self.bandwidth = bandwidth
+        self.average_bandwidth = average_bandwidth
+        self.resolution = resolution  # 'ANCHOxALTO'
+        self.codecs = codecs
+        self.frame_rate = frame_rate
+        self.audio = audio  # GROUP-ID de las pistas de audio (#EXT-X-MEDIA)
+        self.subtitles = subtitles
+
+    @property
+    def height(self) -> int:
+        """Altura en píxeles (0 si la variante no declara RESOLUTION)"""
+        try:
+            return int(self.resolution.split('x')[1]) if self.resolution else 0
+        except (IndexError, ValueError):
+            return 0
+
+    def __repr__(self) -> str:
+        return f'VariantStream({self.url!r}, bandwidth={self.bandwidth}, resolution={self.resolution!r})'
+
+
+class MediaRendition:
+    """Una pista alternativa de un master playlist (#EXT-X-MEDIA: audio, subtítulos...)"""
+    __slots__ = ('type', 'group_id', 'name', 'language', 'default', 'autoselect', 'uri')
+
+    def __init__(self, type: str, group_id: str, name: str = '', language: Optional[str] = None,
+                 default: bool = False, autoselect: bool = False, uri: Optional[str] = None):
+        self.type = type  # AUDIO, SUBTITLES, VIDEO o CLOSED-CAPTIONS
+        self.group_id = group_id
+        self.name = name
+        self.language = language
+        self.default = default
+        self.autoselect = autoselect
+        self.uri = uri  # None si la pista va multiplexada en la variante
+
+    def __repr__(self) -> str:
+        return f'MediaRendition({self.type!r}, {self.group_id!r}, {self.name!r})'
+
+
+class Playlist:
+    """Resultado de parse_playlist: master (variantes y pistas) o media playlist (segmentos)"""
+    __slots__ = ('base_url', 'version', 'target_duration', 'media_sequence', 'playlist_type', 'endlist',
+                 'segments', 'variants', 'renditions', 'keys')
+
+    def __init__(self, base_url: str):
+        self.base_url = base_url
+        self.version: Optional[int] = None
+        self.target_duration: Optional[float] = None
+        self.media_sequence = 0
+        self.playlist_type: Optional[str] = None  # 'VOD', 'EVENT' o None
+        self.endlist = False
+        self.segments: List[MediaSegment] = []
+        self.variants: List[VariantStream] = []
+        self.renditions: List[MediaRendition] = []
+        self.keys: List[EncryptionKey] = []  # Todas las #EXT-X-KEY en orden de aparición
+
+    @property
+    def is_master(self) -> bool:
+        return bool(self.variants)
+
+    @property
+    def is_vod(self) -> bool:
+        return self.playlist_type == 'VOD'
+
+    @property
+    def has_encryption(self) -> bool:
+        return any(key.is_encrypted for key in self.keys)
+
+    @property
+    def total_duration(self) -> float:
+        """Suma de los #EXTINF en segundos"""
+        return sum(segment.duration for segment in self.segments)
+
+    def __repr__(self) -> str:
+        kind = f'{len(self.variants)} variantes' if self.is_master else f'{len(self.segments)} segmentos'
+        return f'Playlist({self.base_url!r}, {kind})'
+
+
+def as_media_segment(segment) -> MediaSegment:
+    """Acepta un MediaSegment o una URL suelta (compatibilidad con código que pasa str)"""
+    return segment if isinstance(segment, MediaSegment) else MediaSegment(str(segment))
+
+
+def parse_byterange(value: str) -> Tuple[int, Optional[int]]:
+    """'<n>[@<o>]' -> (longitud, offset o None si continúa tras el sub-rango anterior)"""
+    length, _, offset = value.strip().partition('@')
+    return int(length), (int(offset) if offset else None)
+
+
+def parse_attributes(value: str) -> Dict[str, str]:
+    """'URI="init.mp4",BYTERANGE="720@0"' -> {'URI': 'init.mp4', 'BYTERANGE': '720@0'}"""
+    return {key: raw.strip('"') for key, raw in _ATTRIBUTE_RE.findall(value)}
+
+
+def _make_resolver(base_url: str) -> Callable[[str], str]:
+    """
+    urljoin con atajo para el caso habitual: un nombre relativo simple ('seg_00001.ts')
+    se resuelve concatenándolo al directorio de la playlist, sin reanalizar la URL base.
+    """
+    base_dir = urljoin(base_url, '.') if base_url else ''
+
+    def resolve(uri: str) -> str:
+        if uri.startswith(('http://', 'https://')):
+            return uri
+        if uri[0] in '/.?' or ':' in uri or '/.' in uri:
+            return urljoin(base_url, uri)  # Rutas absolutas, '..', query relativa, otros esquemas
+        return base_dir + uri
+
+    return resolve
+
+
+def parse_map(value: str, base_url: str) -> Optional[MediaSegment]:
+    """Init segment de una etiqueta #EXT-X-MAP (None si no trae URI)"""
+    attributes = parse_attributes(value)
+    uri = attributes.get('URI')
+    if not uri:
+        return None
+    init = MediaSegment(urljoin(base_url, uri))
+    if 'BYTERANGE' in attributes:
+        try:
+            length, offset = parse_byterange(attributes['BYTERANGE'])
+            init.byte_offset, init.byte_length = offset or 0, length
+        except ValueError:
+            pass
+    return init
+
+
+def _parse_key(value: str, base_url: str) -> EncryptionKey:
+    attributes = parse_attributes(value)
+    uri = attributes.get('URI')
+    return EncryptionKey(attributes.get('METHOD', 'NONE'), urljoin(base_url, uri) if uri else None,
+                         attributes.get('IV'), attributes.get('KEYFORMAT'), attributes.get('KEYFORMATVERSIONS'),
+                         raw=value)
+
+
+def _parse_variant(value: str) -> VariantStream:
+    attributes = parse_attributes(value)
+
+    def number(name: str, cast=int):
+        try:
+            return cast(attributes[name]) if name in attributes else None
+        except ValueError:
+            return None
+
+    return VariantStream('', number('BANDWIDTH') or 0, number('AVERAGE-BANDWIDTH') or 0,
+                         attributes.get('RESOLUTION'), attributes.get('CODECS'), number('FRAME-RATE', float),
+                         attributes.get('AUDIO'), attributes.get('SUBTITLES'))
+
+
+def _parse_rendition(value: str, base_url: str) -> MediaRendition:
+    attributes = parse_attributes(value)
+    uri = attributes.get('URI')
+    return MediaRendition(attributes.get('TYPE', ''), attributes.get('GROUP-ID', ''), attributes.get('NAME', ''),
+                          attributes.get('LANGUAGE'), attributes.get('DEFAULT') == 'YES',
+                          attributes.get('AUTOSELECT') == 'YES', urljoin(base_url, uri) if uri else None)
+
+
+def parse_playlist(content: str, base_url: str = '') -> Playlist:
+    """
+    Analiza una playlist HLS (master o media) en una sola pasada.
+
+    Args:
+        content: Texto de la playlist
+        base_url: URL de la playlist para resolver rutas relativas ('' las deja relativas)
+
+    Returns:
+        Playlist: Variantes y pistas (master) o segmentos (media playlist)
+    """
+    playlist = Playlist(base_url)
+    resolve = _make_resolver(base_url)
+    segments = playlist.segments
+    duration = 0.0
+    title = ''
+    pending_range: Optional[Tuple[int, Optional[int]]] = None
+    pending_variant: Optional[VariantStream] = None
+    discontinuity = False
+    current_init: Optional[MediaSegment] = None
+    current_key: Optional[EncryptionKey] = None
+    # Fin del último sub-rango por recurso (para BYTERANGE sin @offset)
+    next_offsets: Dict[str, int] = {}
+
+    for raw_line in content.splitlines():
+        line = raw_line.strip()
+        if not line:
+            continue
+        if line[0] == '#':
+            if line.startswith('#EXTINF:'):
+                length_text, _, title = line[8:].partition(',')
+                try:
+                    duration = float(length_text)
+                except ValueError:
+                    duration = 0.0
+            elif line.startswith('#EXT-X-BYTERANGE:'):
+                try:
+                    pending_range = parse_byterange(line[17:])
+                except ValueError:
+                    pending_range = None
+            elif line.startswith('#EXT-X-KEY:'):
+                current_key = _parse_key(line[11:], base_url)
+                playlist.keys.append(current_key)
+                if not current_key.is_encrypted:
+                    current_key = None
+            elif line.startswith('#EXT-X-MAP:'):
+                current_init = parse_map(line[11:], base_url)
+            elif line == '#EXT-X-DISCONTINUITY':
+                discontinuity = True
+            elif line.startswith('#EXT-X-STREAM-INF:'):
+                pending_variant = _parse_variant(line[18:])
+            elif line.startswith('#EXT-X-MEDIA:'):
+                playlist.renditions.append(_parse_rendition(line[13:], base_url))
+            elif line.startswith('#EXT-X-MEDIA-SEQUENCE:'):
+                try:
+                    playlist.media_sequence = int(line[22:])
+                except ValueError:
+                    pass
+            elif line.startswith('#EXT-X-TARGETDURATION:'):
+                try:
+                    playlist.target_duration = float(line[22:])
+                except ValueError:
+                    pass
+            elif line.startswith('#EXT-X-PLAYLIST-TYPE:'):
+                playlist.playlist_type = line[21:].strip().upper()
+            elif line.startswith('#EXT-X-VERSION:'):
+                try:
+                    playlist.version = int(line[15:])
+                except ValueError:
+                    pass
+            elif line == '#EXT-X-ENDLIST':
+                playlist.endlist = True
+            continue
+
+        # Línea URI: variante de un master playlist o segmento de una media playlist
+        if pending_variant is not None or line.endswith('.m3u8'):
+            variant = pending_variant or VariantStream('')
+            variant.url = resolve(line)
+            playlist.variants.append(variant)
+            pending_variant = None
+            continue
+
+        url = resolve(line)
+        sequence = playlist.media_sequence + len(segments)
+        if pending_range:
+            length, offset = pending_range
+            if offset is None:
+                offset = next_offsets.get(url, 0)
+            next_offsets[url] = offset + length
+            segment = MediaSegment(url, duration, offset, length, current_init, sequence, discontinuity, current_key)
+        else:
+            segment = MediaSegment(url, duration, None, None, current_init, sequence, discontinuity, current_key)
+        if title:
+            segment.title = title.strip()
+        segments.append(segment)
+        duration = 0.0
+        title = ''
+        pending_range = None
+        discontinuity = False
+
+    return playlist
+
+
+def init_sections(segments: List[MediaSegment]) -> List[MediaSegment]:
+    """Init segments distintos referenciados por los segmentos, en orden de aparición"""
+    sections: Dict[Tuple[str, Optional[int], Optional[int]], MediaSegment] = {}
+    for segment in segments:
+        if segment.init is not None:
+            sections.setdefault(segment.init.key, segment.init)
+    return list(sections.values())
+
+
+def parse_media_segments(content: str, base_url: str) -> List[MediaSegment]:
+    """
+    Extrae los segmentos de una media playlist (atajo sobre parse_playlist).
+
+    Args:
+        content: Texto de la playlist
+        base_url: URL de la playlist para resolver rutas relativas
+
+    Returns:
+        List[MediaSegment]: Segmentos en el orden de la playlist
+    """
+    return parse_playlist(content, base_url).segments
@@ -0,0 +1,220 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Caché de Manifiestos M3U8
+=========================
+
+Una descarga desde la interfaz pide la misma playlist varias veces:
+/api/parse_master, /api/metadata, /analizar, el nombre sugerido en
+/descargar y finalmente _get_segment_urls (normalmente también la playlist
+hija). Esta caché, compartida por todo el proceso, guarda el texto de las
+playlists maestras y de medios:
+
+- Mientras la entrada está fresca (TTL) se sirve sin tocar la red
+- Al caducar se revalida con If-None-Match / If-Modified-Since: un 304
+  reutiliza el cuerpo guardado
+- Las playlists en vivo caducan a la mitad de su #EXT-X-TARGETDURATION
+- Cache-Control: no-store se respeta y max-age acorta el TTL
+- Expulsión LRU limitada por bytes y por número de entradas
+- Peticiones simultáneas de la misma URL comparten una sola descarga
+"""
+
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Optional
+
+DEFAULT_TTL = 30.0
+DEFAULT_MAX_BYTES = 16 * 1024 * 1024
+DEFAULT_MAX_ENTRIES = 256
+
+_TARGET_DURATION_RE = re.compile(r'#EXT-X-TARGETDURATION:\s*([\d.]+)')
+_MAX_AGE_RE = re.compile(r'max-age=(\d+)')
+
+
+class CachedManifest:
+    """Cuerpo de una playlist con sus validadores HTTP"""
+
+    __slots__ = ('url', 'text', 'etag', 'last_modified', 'expires', 'stored_at', 'size')
+
+    def __init__(self, url: str, text: str, etag: Optional[str], last_modified: Optional[str], expires: float):
+        self.url = url
+        self.text = text
+        self.etag = etag
+        self.last_modified = last_modified
+        self.expires = expires
+        self.stored_at = time.time()  # Última vez que el servidor lo entregó o lo confirmó (304)
+        self.size = len(text.encode('utf-8'))
+
+    @property
+    def fresh(self) -> bool:
+        return time.time() < self.expires
+
+    def conditional_headers(self) -> Dict[str, str]:
+        headers = {}
+        if self.etag:
+            headers['If-None-Match'] = self.etag
+        if self.last_modified:
+            headers['If-Modified-Since'] = self.last_modified
+        return headers
+
+
+class ManifestCache:
+    """Caché LRU de playlists con TTL y revalidación condicional"""
+
+    def __init__(self, ttl: float = DEFAULT_TTL, max_bytes: int = DEFAULT_MAX_BYTES,
+                 max_entries: int = DEFAULT_MAX_ENTRIES):
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self._entries: 'OrderedDict[str, CachedManifest]' = OrderedDict()
+        self._inflight: Dict[str, threading.Event] = {}
+        self._lock = threading.Lock()
+        self.bytes = 0
+        self.hits = 0          # Servidas desde la caché sin petición
+        self.revalidated = 0   # 304: el servidor confirmó que no cambió
+        self.misses = 0        # Descargadas completas
+        self.evictions = 0
+
+    def configure(self, ttl: Optional[float] = None, max_bytes: Optional[int] = None,
+                  max_entries: Optional[int] = None) -> None:
+        with self._lock:
+            if ttl is not None:
+                self.ttl = max(0.0, float(ttl))
+            if max_bytes is not None:
+                self.max_bytes = max(0, int(max_bytes))
+            if max_entries is not None:
+                self.max_entries = max(1, int(max_entries))
+            self._evict()
+
+    def fetch(self, session, url: str, timeout: float = 10, max_age: Optional[float] = None) -> str:
+        """
+        Texto de la playlist, desde la caché o desde la red.
+
+        Args:
+            session: requests.Session con la que pedirla (cabeceras, proxies, pool)
+            url: URL de la playlist
+            timeout: Timeout de la petición
+            max_age: Antigüedad máxima aceptable en segundos. 0 obliga a revalidar
+                     (p. ej. las recargas de una playlist en vivo); None usa el TTL de la entrada
+
+        Raises:
+            requests.exceptions.RequestException: Si la petición falla
+        """
+        requested_at = time.time()
+        while True:
+            with self._lock:
+                entry = self._entries.get(url)
+                if entry is not None and self._usable(entry, max_age, requested_at):
+                    self._entries.move_to_end(url)
+                    self.hits += 1
+                    return entry.text
+                waiter = self._inflight.get(url)
+                if waiter is None:
+                    self._inflight[url] = threading.Event()
+                    break
+            # Otra petición ya está descargando esta URL: su resultado es tan reciente como el nuestro
+            waiter.wait(timeout)
+
+        try:
+            return self._request(session, url, entry, timeout)
+        finally:
+            with self._lock:
+                self._inflight.pop(url).set()
+
+    @staticmethod
+    def _usable(entry: CachedManifest, max_age: Optional[float], requested_at: float) -> bool:
+        if entry.stored_at >= requested_at:
+            return True  # Llegó de la red después de que se pidiera
+        if max_age is None:
+            return entry.fresh
+        return max_age > 0 and entry.fresh and time.time() - entry.stored_at <= max_age
+
+    def _request(self, session, url: str, entry: Optional[CachedManifest], timeout: float) -> str:
+        headers = entry.conditional_headers() if entry is not None else {}
+        response = session.get(url, headers=headers or None, timeout=timeout)
+        if response.status_code == 304 and entry is not None:
+            with self._lock:
+                entry.stored_at = time.time()
+                entry.expires = entry.stored_at + self._ttl_for(entry.text, response)
+                if url in self._entries:
+                    self._entries.move_to_end(url)
+                self.revalidated += 1
+            return entry.text
+        response.raise_for_status()
+        text = response.text
+        with self._lock:
+            self.misses += 1
+            self._store(url, text, response)
+        return text
+
+    def _ttl_for(self, text: str, response) -> float:
+        ttl = self.ttl
+        cache_control = (response.headers.get('Cache-Control') or '').lower()
+        max_age = _MAX_AGE_RE.search(cache_control)
+        if max_age:
+            ttl = min(ttl, float(max_age.group(1)))
+        if '#EXTINF' in text and '#EXT-X-ENDLIST' not in text:
+            # Playlist en vivo: no servirla más allá de la mitad del target duration
+            target = _TARGET_DURATION_RE.search(text)
+            ttl = min(ttl, float(target.group(1)) / 2 if target else 1.0)
+        return ttl
+
+    def _store(self, url: str, text: str, response) -> None:
+        old = self._entries.pop(url, None)
+        if old is not None:
+            self.bytes -= old.size
+        if 'no-store' in (response.headers.get('Cache-Control') or '').lower():
+            return
+        entry = CachedManifest(url, text, response.headers.get('ETag'), response.headers.get('Last-Modified'),
+                               time.time() + self._ttl_for(text, response))
+        if entry.size > self.max_bytes:
+            return
+        self._entries[url] = entry
+        self.bytes += entry.size
+        self._evict()
+
+    def _evict(self) -> None:
+        while self._entries and (self.bytes > self.max_bytes or len(self._entries) > self.max_entries):
+            _, entry = self._entries.popitem(last=False)
+            self.bytes -= entry.size
+            self.evictions += 1
+
+    def invalidate(self, url: Optional[str] = None) -> None:
+        """Olvida una URL (o toda la caché si url es None)"""
+        with self._lock:
+            if url is None:
+                self._entries.clear()
+                self.bytes = 0
+            elif url in self._entries:
+                self.bytes -= self._entries.pop(url).size
+
+    def snapshot(self) -> Dict[str, object]:
+        with self._lock:
+            requests_total = self.hits + self.revalidated + self.misses
+            return {
+                'entries': len(self._entries),
+                'bytes': self.bytes,
+                'max_bytes': self.max_bytes,
+                'max_entries': self.max_entries,
+                'ttl_seconds': self.ttl,
+                'hits': self.hits,
+                'revalidated': self.revalidated,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_ratio': round((self.hits + self.revalidated) / requests_total, 3) if requests_total else 0.0,
+            }
+
+
+_cache: Optional[ManifestCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_manifest_cache() -> ManifestCache:
+    """Caché única del proceso (se crea la primera vez que se pide)"""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = ManifestCache()
+        return _cache
@@ -0,0 +1,178 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Unión Incremental con Checkpoints
+=================================
+
+Si ffmpeg falla o el proceso se reinicia con el 95% de los segmentos
+descargados, run_download reconstruía filelist.txt y lo unía todo desde
+cero. Aquí la unión avanza durante la descarga: el prefijo contiguo de
+segmentos completados se añade a temp_dir/merged.ts con copias en el kernel
+y cada cierto número de segmentos se confirma un checkpoint
+(merge_checkpoint.json con segmentos y bytes, tras fsync del archivo).
+
+Al reanudar, merged.ts se recorta al último checkpoint y solo se descargan
+y unen los segmentos posteriores. Los segmentos ya confirmados se borran
+del disco para no duplicar el espacio ocupado.
+"""
+
+import json
+import os
+import queue
+import threading
+import time
+from typing import Callable, Iterable, Optional
+
+from ts_concat import append_segment
+
+MERGED_FILENAME = 'merged.ts'
+CHECKPOINT_FILENAME = 'merge_checkpoint.json'
+
+
+class CheckpointedMerge:
+    """Añade segmentos en orden a merged.ts y confirma checkpoints reanudables"""
+
+    def __init__(self, temp_dir: str, total: int, log_function: Optional[Callable[[str], None]] = None,
+                 checkpoint_every: int = 50, remove_merged: bool = True,
+                 filename_for: Callable[[int], str] = lambda index: f'segment_{index:05d}.ts'):
+        self.temp_dir = temp_dir
+        self.total = total
+        self.log_function = log_function or print
+        self.checkpoint_every = max(1, checkpoint_every)
+        self.remove_merged = remove_merged
+        self.filename_for = filename_for
+        self.merged_path = os.path.join(temp_dir, MERGED_FILENAME)
+        self.checkpoint_path = os.path.join(temp_dir, CHECKPOINT_FILENAME)
+        self.committed = 0         # Segmentos confirmados en el último checkpoint
+        self.committed_bytes = 0
+        self._appended = 0         # Segmentos ya escritos en merged.ts (confirmados o no)
+        self._appended_bytes = 0
+        self._cursor = 0           # Siguiente índice a encolar
+        self._ready = set()
+        self._lock = threading.Lock()
+        self._queue: 'queue.Queue[Optional[int]]' = queue.Queue()
+        self._writer: Optional[threading.Thread] = None
+        self._fd: Optional[int] = None
+        self.error: Optional[str] = None
+
+    @property
+    def complete(self) -> bool:
+        return self.committed >= self.total
+
+    def load(self) -> int:
+        """
+        Lee el checkpoint de una ejecución anterior y recorta merged.ts a lo confirmado.
+
+        Returns:
+            int: Segmentos iniciales ya unidos (no hace falta descargarlos)
+        """
+        committed, committed_bytes = 0, 0
+        try:
+            with open(self.checkpoint_path, 'r', encoding='utf-8') as f:
+                checkpoint = json.load(f)
+            committed = int(checkpoint.get('segments', 0))
+            committed_bytes = int(checkpoint.get('bytes', 0))
+            if checkpoint.get('total') not in (None, self.total):
+                # La playlist cambió: el prefijo ya no es fiable
+                committed, committed_bytes = 0, 0
+        except (OSError, ValueError, TypeError):
+            pass
+
+        # Lo escrito tras el último checkpoint (caída a mitad de un append) se descarta
+        merged_size = os.path.getsize(self.merged_path) if os.path.exists(self.merged_path) else 0
+        if merged_size < committed_bytes:
+            committed, committed_bytes = 0, 0
+        self._fd = os.open(self.merged_path, os.O_WRONLY | os.O_CREAT | getattr(os, 'O_BINARY', 0), 0o644)
+        os.ftruncate(self._fd, committed_bytes)
+
+        self.committed = self._appended = self._cursor = min(committed, self.total)
+        self.committed_bytes = self._appended_bytes = committed_bytes
+        if self.committed:
+            self.log_function(f"🧷 Checkpoint de unión: {self.committed}/{self.total} segmentos ya unidos "
+                              f"({committed_bytes / (1024 * 1024):.1f} MB)")
+        return self.committed
+
+    def start(self, ready: Iterable[int] = ()) -> None:
+        """Arranca el hilo de escritura; ready son los segmentos ya presentes en disco"""
+        if self._fd is None:
+            self.load()
+        self._writer = threading.Thread(target=self._write_loop, name='merge-checkpoint', daemon=True)
+        self._writer.start()
+        with self._lock:
+            self._ready.update(index for index in ready if index >= self._cursor)
+        self._advance()
+
+    def mark_ready(self, index: int) -> None:
+        """Un segmento terminó de descargarse (pensado para on_ordered de download_segments_concurrent)"""
+        with self._lock:
+            self._ready.add(index)
+        self._advance()
+
+    def _advance(self) -> None:
+        with self._lock:
+            while self._cursor < self.total and self._cursor in self._ready:
+                self._queue.put(self._cursor)
+                self._ready.discard(self._cursor)
+                self._cursor += 1
+
+    def _write_loop(self) -> None:
+        while True:
+            index = self._queue.get()
+            if index is None:
+                break
+            if self.error:
+                continue  # Tras un error solo se vacía la cola; el checkpoint sigue siendo válido
+            segment_path = os.path.join(self.temp_dir, self.filename_for(index))
+            try:
+                self._appended_bytes += append_segment(self._fd, segment_path, self._appended_bytes)
+                self._appended += 1
+                if self._appended - self.committed >= self.checkpoint_every:
+                    self._commit()
+            except OSError as e:
+                self.error = f"segmento {index}: {e}"
+                self.log_function(f"⚠️ Unión incremental detenida en el {self.error}")
+
+    def _commit(self) -> None:
+        """Confirma lo escrito: fsync de merged.ts, checkpoint atómico y borrado de los segmentos unidos"""
+        if self._appended == self.committed:
+            return
+        os.fsync(self._fd)
+        temp_path = self.checkpoint_path + '.tmp'
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump({'segments': self._appended, 'bytes': self._appended_bytes,
+                       'total': self.total, 'updated': time.time()}, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, self.checkpoint_path)
+
+        if self.remove_merged:
+            for index in range(self.committed, self._appended):
+                try:
+                    os.remove(os.path.join(self.temp_dir, self.filename_for(index)))
+                except OSError:
+                    pass
+        self.committed = self._appended
+        self.committed_bytes = self._appended_bytes
+
+    def close(self) -> bool:
+        """
+        Espera a que se escriba lo encolado y confirma el último checkpoint.
+
+        Returns:
+            bool: True si merged.ts contiene ya todos los segmentos de la playlist
+        """
+        if self._writer is not None:
+            self._queue.put(None)
+            self._writer.join()
+            self._writer = None
+        if self._fd is not None:
+            try:
+                if not self.error:
+                    self._commit()
+            except OSError as e:
+                self.error = f"checkpoint: {e}"
+                self.log_function(f"⚠️ No se pudo guardar el checkpoint de unión: {e}")
+            finally:
+                os.close(self._fd)
+                self._fd = None
+        return self.complete and not self.error
@@ -0,0 +1,201 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Estimación Previa de Tamaño y Duración
+======================================
+
+El ETA de run_download se calculaba con la velocidad suavizada por el
+tamaño medio de los segmentos ya descargados: no significaba nada hasta
+bien avanzada la descarga. Antes del primer byte ya se puede saber:
+
+- La duración: suma de #EXTINF
+- El tamaño esperado, por orden de fiabilidad:
+  1. #EXT-X-BYTERANGE en todos los segmentos (tamaño exacto)
+  2. Content-Length de unos pocos segmentos repartidos por la playlist
+     (peticiones HEAD en paralelo) extrapolado con la duración
+  3. BANDWIDTH de la variante elegida por la duración
+
+Con ese tamaño el progreso estima el tiempo restante desde el principio y
+la admisión comprueba que los segmentos temporales y el archivo final caben
+en el disco antes de empezar.
+"""
+
+import os
+import shutil
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import requests
+
+from m3u8_playlist import MediaSegment
+
+# Segmentos cuyo Content-Length se consulta (repartidos por toda la playlist)
+PREFLIGHT_SAMPLES = 5
+# Margen sobre el tamaño estimado al comprobar el espacio libre (variaciones de bitrate)
+DISK_SAFETY_MARGIN = 1.15
+
+
+class DownloadEstimate:
+    """Duración y tamaño esperados de una descarga antes de empezarla"""
+
+    __slots__ = ('segments', 'duration', 'expected_bytes', 'bytes_per_second', 'method', 'samples',
+                 'rendition_bytes')
+
+    def __init__(self, segments: int, duration: float, expected_bytes: Optional[float] = None,
+                 bytes_per_second: Optional[float] = None, method: Optional[str] = None, samples: int = 0):
+        self.segments = segments
+        self.duration = duration
+        self.expected_bytes = expected_bytes  # Solo la playlist principal (lo que cuenta el progreso)
+        self.bytes_per_second = bytes_per_second
+        self.method = method  # 'byterange', 'head', 'bandwidth' o None si no se pudo estimar
+        self.samples = samples
+        self.rendition_bytes = 0.0  # Pistas alternativas que se descargan a la vez
+
+    @property
+    def total_bytes(self) -> Optional[float]:
+        """Bytes esperados de la playlist y sus pistas alternativas (lo que ocupará en disco)"""
+        if self.expected_bytes is None:
+            return None
+        return self.expected_bytes + self.rendition_bytes
+
+    def segment_bytes(self, segment: MediaSegment) -> float:
+        """Tamaño esperado de un segmento (0 si no hay estimación)"""
+        if segment.byte_length is not None:
+            return float(segment.byte_length)
+        if self.bytes_per_second and segment.duration > 0:
+            return self.bytes_per_second * segment.duration
+        if self.expected_bytes and self.segments:
+            return self.expected_bytes / self.segments
+        return 0.0
+
+    def to_dict(self) -> Dict[str, object]:
+        return {
+            'segments': self.segments,
+            'duration': round(self.duration, 1),
+            'expected_bytes': int(self.expected_bytes) if self.expected_bytes is not None else None,
+            'rendition_bytes': int(self.rendition_bytes),
+            'method': self.method,
+            'samples': self.samples,
+        }
+
+
+def _sample_indices(count: int, samples: int) -> List[int]:
+    """Índices repartidos uniformemente (primero y último incluidos)"""
+    if count <= samples:
+        return list(range(count))
+    if samples <= 1:
+        return [0]
+    return sorted({round(i * (count - 1) / (samples - 1)) for i in range(samples)})
+
+
+def sample_segment_sizes(session, segments: Sequence[MediaSegment], samples: int = PREFLIGHT_SAMPLES,
+                         timeout: float = 5) -> List[Tuple[MediaSegment, int]]:
+    """
+    Content-Length de unos pocos segmentos con peticiones HEAD en paralelo.
+
+    Returns:
+        Lista de (segmento, bytes) de las respuestas que anunciaron tamaño
+    """
+    def head(segment: MediaSegment) -> Optional[int]:
+        try:
+            response = session.head(segment.url, timeout=timeout, allow_redirects=True)
+            length = response.headers.get('content-length')
+            if response.ok and length and length.isdigit() and int(length) > 0:
+                return int(length)
+        except requests.exceptions.RequestException:
+            pass
+        return None
+
+    chosen = [segments[index] for index in _sample_indices(len(segments), samples)]
+    if not chosen:
+        return []
+    with ThreadPoolExecutor(max_workers=len(chosen)) as executor:
+        sizes = list(executor.map(head, chosen))
+    return [(segment, size) for segment, size in zip(chosen, sizes) if size is not None]
+
+
+def estimate_download(session, segments: Sequence[MediaSegment], bandwidth: Optional[int] = None,
+                      samples: int = PREFLIGHT_SAMPLES) -> DownloadEstimate:
+    """
+    Estima duración y tamaño de una lista de segmentos.
+
+    Args:
+        session: requests.Session con la que consultar los tamaños
+        segments: Segmentos de la media playlist
+        bandwidth: BANDWIDTH (bits/s) de la variante, si viene de un master
+        samples: Segmentos a consultar con HEAD (0 = solo BYTERANGE y BANDWIDTH)
+    """
+    duration = sum(segment.duration for segment in segments)
+    estimate = DownloadEstimate(len(segments), duration)
+    if not segments:
+        return estimate
+
+    if all(segment.byte_length is not None for segment in segments):
+        estimate.expected_bytes = float(sum(segment.byte_length for segment in segments))
+        estimate.bytes_per_second = estimate.expected_bytes / duration if duration > 0 else None
+        estimate.method = 'byterange'
+        return estimate
+
+    sampled = sample_segment_sizes(session, segments, samples) if samples > 0 else []
+    if sampled:
+        sampled_bytes = sum(size for _, size in sampled)
+        sampled_duration = sum(segment.duration for segment, _ in sampled)
+        estimate.samples = len(sampled)
+        if sampled_duration > 0 and duration > 0:
+            estimate.bytes_per_second = sampled_bytes / sampled_duration
+            estimate.expected_bytes = estimate.bytes_per_second * duration
+        else:
+            estimate.expected_bytes = sampled_bytes / len(sampled) * len(segments)
+        estimate.method = 'head'
+    elif bandwidth and duration > 0:
+        estimate.bytes_per_second = bandwidth / 8
+        estimate.expected_bytes = estimate.bytes_per_second * duration
+        estimate.method = 'bandwidth'
+    return estimate
+
+
+def _existing_path(path: str) -> str:
+    """El propio path o su primer ancestro que exista (el destino aún puede no estar creado)"""
+    path = os.path.abspath(path)
+    while not os.path.exists(path):
+        parent = os.path.dirname(path)
+        if parent == path:
+            break
+        path = parent
+    return path
+
+
+def find_disk_shortage(needs: Sequence[Tuple[str, float]], min_free_bytes: int = 0,
+                       margin: float = DISK_SAFETY_MARGIN) -> Optional[str]:
+    """
+    Comprueba que los bytes pendientes de escribir caben en cada sistema de archivos.
+
+    Args:
+        needs: (directorio, bytes) que se van a escribir; los que comparten
+               dispositivo se suman (p. ej. temp_segments/ y static/ en el mismo disco)
+        min_free_bytes: Espacio que debe quedar libre después
+        margin: Factor sobre los bytes estimados
+
+    Returns:
+        str: Descripción del primer déficit, o None si todo cabe
+    """
+    devices: Dict[int, List[object]] = {}
+    for path, size in needs:
+        existing = _existing_path(path)
+        try:
+            device = os.stat(existing).st_dev
+        except OSError:
+            continue
+        entry = devices.setdefault(device, [existing, 0.0])
+        entry[1] += max(0.0, size)
+
+    for path, required in devices.values():
+        try:
+            free = shutil.disk_usage(path).free
+        except OSError:
+            continue
+        needed = required * margin + min_free_bytes
+        if needed > free:
+            return (f"Espacio insuficiente en {path}: se necesitan ~{needed / (1024 ** 3):.2f} GB "
+                    f"y hay {free / (1024 ** 3):.2f} GB libres")
+    return None
@@ -0,0 +1,201 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Pistas Alternativas (#EXT-X-MEDIA)
+==================================
+
+Muchos masters sirven el audio (y los subtítulos) como playlists aparte: la
+variante de video no lleva audio multiplexado y descargar solo la variante
+produce un MP4 mudo. Aquí se elige, para cada grupo que referencia la
+variante (AUDIO=, SUBTITLES=), la pista DEFAULT (o AUTOSELECT, o la primera)
+y se descarga con un M3U8Downloader propio que envía sus segmentos al mismo
+pool de workers que el video: ambas pistas avanzan a la vez con un único
+presupuesto y un único límite AIMD. En la unión final ffmpeg recibe el video
+y las pistas como entradas de un mismo comando.
+
+Formatos de pista:
+- MPEG-TS o fMP4 (como el video)
+- Audio empaquetado (.aac, .ac3, .ec3, .mp3 con etiquetas ID3)
+- Subtítulos WebVTT: se unen en un único .vtt y se multiplexan como mov_text
+"""
+
+import os
+import threading
+from typing import TYPE_CHECKING, Callable, List, Optional, Sequence
+
+from m3u8_playlist import MediaRendition, MediaSegment
+from ts_concat import concat_ts_segments
+
+if TYPE_CHECKING:
+    from m3u8_downloader import M3U8Downloader
+
+# Tipo de #EXT-X-MEDIA -> nombre de la pista (y subdirectorio temporal)
+RENDITION_KINDS = {'AUDIO': 'audio', 'SUBTITLES': 'subtitles'}
+PACKED_AUDIO_CONTAINERS = ('aac', 'ac3', 'ec3', 'mp3')
+WEBVTT_CONTAINER = 'webvtt'
+
+
+def raw_container_for(url: str) -> Optional[str]:
+    """Contenedor de segmentos que no son MPEG-TS ni fMP4, según la extensión de la URL"""
+    extension = os.path.splitext(url.split('?', 1)[0])[1].lower().lstrip('.')
+    if extension in PACKED_AUDIO_CONTAINERS:
+        return extension
+    if extension in ('vtt', 'webvtt'):
+        return WEBVTT_CONTAINER
+    return None
+
+
+def is_raw_segment_header(container: str, header: bytes) -> bool:
+    """Cabecera plausible para audio empaquetado (ID3 o sincronía de trama) o WebVTT"""
+    if container == WEBVTT_CONTAINER:
+        return header.lstrip(b'\xef\xbb\xbf').startswith(b'WEBVTT')
+    if header[:3] == b'ID3':
+        return True
+    if len(header) >= 2 and header[0] == 0xFF and header[1] & 0xE0 == 0xE0:
+        return True  # ADTS (AAC) o MPEG audio
+    return header[:2] == b'\x0b\x77'  # AC-3 / E-AC-3
+
+
+def pick_rendition(renditions: Sequence[MediaRendition], media_type: str, group_id: Optional[str],
+                   language: Optional[str] = None) -> Optional[MediaRendition]:
+    """Pista del grupo con playlist propia: la del idioma pedido, DEFAULT, AUTOSELECT o la primera"""
+    if not group_id:
+        return None
+    candidates = [rendition for rendition in renditions
+                  if rendition.type == media_type and rendition.group_id == group_id and rendition.uri]
+    if language:
+        matching = [rendition for rendition in candidates
+                    if (rendition.language or '').lower().startswith(language.lower())]
+        candidates = matching or candidates
+    for flag in ('default', 'autoselect'):
+        for rendition in candidates:
+            if getattr(rendition, flag):
+                return rendition
+    return candidates[0] if candidates else None
+
+
+def merge_webvtt(segment_paths: Sequence[str], output_path: str) -> int:
+    """
+    Une segmentos WebVTT en un único archivo: una cabecera y los bloques de cada segmento.
+
+    Se descartan las cabeceras repetidas (incluido X-TIMESTAMP-MAP): los
+    empaquetadores habituales emiten los cues ya relativos al inicio de la
+    presentación, que es como queda el MP4 tras el remux.
+
+    Returns:
+        int: Número de segmentos con contenido
+    """
+    written = 0
+    with open(output_path, 'w', encoding='utf-8') as output:
+        output.write('WEBVTT\n\n')
+        for path in segment_paths:
+            with open(path, 'r', encoding='utf-8-sig', errors='replace') as f:
+                text = f.read().replace('\r\n', '\n')
+            # La cabecera termina en la primera línea en blanco
+            _, _, body = text.partition('\n\n')
+            body = body.strip('\n')
+            if body:
+                output.write(body + '\n\n')
+                written += 1
+    return written
+
+
+def mux_command(video_input_args: List[str], tracks: Sequence['RenditionTrack'], output_path: str) -> List[str]:
+    """
+    Comando ffmpeg que une el video (sus argumentos de entrada) con las pistas alternativas.
+
+    Sin pistas es el remux de siempre: ffmpeg <entrada> -c copy -y <salida>.
+    """
+    command = ['ffmpeg', *video_input_args]
+    for track in tracks:
+        command += ['-i', track.output_path]
+    if tracks:
+        command += ['-map', '0:v', '-map', '0:a?']
+        for input_index, track in enumerate(tracks, start=1):
+            command += ['-map', f"{input_index}:{'s' if track.kind == 'subtitles' else 'a'}"]
+    command += ['-c', 'copy']
+    subtitles = [track for track in tracks if track.kind == 'subtitles']
+    if subtitles:
+        command += ['-c:s', 'mov_text']
+        for subtitle_index, track in enumerate(subtitles):
+            if track.rendition.language:
+                command += [f'-metadata:s:s:{subtitle_index}', f'language={track.rendition.language}']
+    return command + ['-y', output_path]
+
+
+class RenditionTrack:
+    """Pista alternativa que se descarga junto al video con su propio M3U8Downloader"""
+
+    def __init__(self, rendition: MediaRendition, kind: str, downloader: 'M3U8Downloader',
+                 segments: List[MediaSegment]):
+        self.rendition = rendition
+        self.kind = kind
+        self.downloader = downloader
+        self.segments = segments
+        self.summary: Optional[dict] = None
+        self.error: Optional[str] = None
+        self.output_path: Optional[str] = None
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def label(self) -> str:
+        details = ', '.join(part for part in (self.rendition.name, self.rendition.language) if part)
+        return f"{self.kind} ({details})" if details else self.kind
+
+    @property
+    def failed(self) -> int:
+        """Segmentos con fallo definitivo (o todos si la pista no llegó a descargarse)"""
+        if self.error:
+            return len(self.segments)
+        return len(self.summary['failed']) if self.summary else 0
+
+    def start(self, executor, is_cancelled: Callable[[], bool]) -> None:
+        """Descarga la pista en segundo plano enviando sus segmentos a executor (los workers del video)"""
+        self._thread = threading.Thread(target=self._run, args=(executor, is_cancelled),
+                                        name=f'rendition-{self.kind}', daemon=True)
+        self._thread.start()
+
+    def _run(self, executor, is_cancelled: Callable[[], bool]) -> None:
+        downloader = self.downloader
+        downloader.shared_executor = executor
+        try:
+            # Al reanudar, los segmentos que ya están en disco no se vuelven a pedir
+            present = set()
+            for index in range(len(self.segments)):
+                path = os.path.join(downloader.temp_dir, downloader.segment_filename(index))
+                if os.path.exists(path) and os.path.getsize(path) > 0:
+                    present.add(index)
+            self.summary = downloader.download_segments_concurrent(self.segments, skip_indices=present,
+                                                                   is_cancelled=is_cancelled)
+        except Exception as e:
+            self.error = str(e)
+            downloader.log_function(f"❌ Error descargando la pista {self.label}: {e}")
+        finally:
+            downloader.shared_executor = None
+
+    def join(self) -> None:
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def merge(self) -> Optional[str]:
+        """Une los segmentos de la pista en un único archivo de entrada para ffmpeg"""
+        downloader = self.downloader
+        paths = [os.path.join(downloader.temp_dir, downloader.segment_filename(index))
+                 for index in range(len(self.segments))]
+        paths = [path for path in paths if os.path.exists(path)]
+        if not paths:
+            return None
+        base = os.path.join(os.path.dirname(os.path.abspath(downloader.temp_dir)), f'{self.kind}_track')
+        if downloader.container == WEBVTT_CONTAINER:
+            output_path = base + '.vtt'
+            merge_webvtt(paths, output_path)
+        elif downloader.container == 'fmp4':
+            output_path = base + '.mp4'
+            if not downloader.merge_fmp4(paths, output_path):
+                return None
+        else:
+            output_path = base + ('.ts' if downloader.container == 'ts' else f'.{downloader.container}')
+            concat_ts_segments(paths, output_path, log_function=downloader.log_function)
+        self.output_path = output_path
+        return output_path
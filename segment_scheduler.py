@@ -0,0 +1,461 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Planificador de Segmentos con Ventana Deslizante
+================================================
+
+En lugar de crear un future por cada segmento de la playlist (20k segmentos
+= 20k futures vivos), el productor solo mantiene N+k tareas pendientes y va
+enviando más a medida que terminan. La memoria queda plana sea cual sea la
+longitud de la playlist y abortar solo tiene que cancelar la ventana actual.
+
+- on_complete: se llama en orden de finalización (progreso, velocidad)
+- on_ordered: se llama en el orden original de los elementos (prefijo contiguo)
+
+Ambos callbacks se ejecutan en el hilo (o corrutina) que llama al planificador.
+Un iterador puede devolver NOT_READY cuando aún no tiene el siguiente
+elemento (playlists en vivo): la ventana sigue atendiendo lo que está en
+vuelo y vuelve a preguntar poco después.
+
+GlobalSegmentScheduler es el pool de workers único del proceso: todas las
+descargas activas envían sus segmentos a él y el presupuesto global de
+workers se reparte entre ellas (a partes iguales ponderadas por prioridad,
+o estrictamente por prioridad). Cuando una descarga termina, sus workers
+pasan al momento a las que siguen activas.
+
+DeferredRetryQueue aparta los segmentos fallidos con backoff exponencial y
+jitter para reintentarlos después de la pasada principal, sin que ningún
+worker se quede dormido esperando entre intentos.
+"""
+
+import asyncio
+import heapq
+import itertools
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, wait
+from typing import Any, Awaitable, Callable, Deque, Dict, Hashable, Iterable, List, Optional, Tuple, TypeVar, Union
+
+T = TypeVar('T')
+
+# Holgura por defecto sobre el número de workers (la "k" de N+k)
+DEFAULT_WINDOW_SLACK = 8
+# Elementos que pueden enviarse por delante del primero sin entregar en orden (buffer de on_ordered)
+DEFAULT_MAX_REORDER = 256
+# Centinela de los iteradores en vivo: el siguiente elemento todavía no existe
+NOT_READY = object()
+# Espera entre consultas a un iterador NOT_READY cuando no hay nada en vuelo
+NOT_READY_WAIT = 0.1
+
+
+def _window_size(window: Union[int, Callable[[], int]]) -> int:
+    return max(1, window() if callable(window) else window)
+
+
+def run_windowed(submit: Callable[[T], Future], items: Iterable[T],
+                 window: Union[int, Callable[[], int]],
+                 on_complete: Callable[[T, Any], None],
+                 on_ordered: Optional[Callable[[T, Any], None]] = None,
+                 should_stop: Optional[Callable[[], bool]] = None,
+                 max_reorder: Optional[int] = None,
+                 poll_interval: float = 0.5) -> bool:
+    """
+    Ejecuta submit(item) sobre los elementos con a lo sumo `window` futures pendientes.
+
+    Args:
+        submit: Envía un elemento a un executor y devuelve su Future
+        items: Elementos a procesar (se consumen de forma perezosa)
+        window: Tamaño de ventana fijo o función que lo devuelve (para límites adaptativos)
+        on_complete: Callback (item, resultado) en orden de finalización
+        on_ordered: Callback (item, resultado) en el orden original de `items`
+        should_stop: Consultada periódicamente; si devuelve True se cancela la ventana
+        max_reorder: Máximo de elementos enviados por delante del primero sin entregar
+                     en orden (acota el buffer de reordenación)
+        poll_interval: Cada cuánto se consulta should_stop aunque nada termine
+
+    Returns:
+        bool: True si se detuvo antes de procesar todos los elementos
+    """
+    iterator = iter(items)
+    in_flight: Dict[Future, Tuple[int, T]] = {}
+    ready: Dict[int, Tuple[T, Any]] = {}
+    next_position = 0
+    next_ordered = 0
+    exhausted = False
+    stopped = False
+    waiting = False
+
+    while True:
+        # Productor: rellenar la ventana
+        while not stopped and not exhausted and len(in_flight) < _window_size(window):
+            if on_ordered and max_reorder and next_position - next_ordered >= max_reorder:
+                break
+            try:
+                item = next(iterator)
+            except StopIteration:
+                exhausted = True
+                break
+            waiting = item is NOT_READY
+            if waiting:
+                break
+            in_flight[submit(item)] = (next_position, item)
+            next_position += 1
+
+        if not in_flight:
+            if exhausted or stopped or not waiting:
+                break
+            # Fuente en vivo sin elementos nuevos: esperar sin girar en vacío
+            if should_stop and should_stop():
+                stopped = True
+                break
+            time.sleep(NOT_READY_WAIT)
+            continue
+
+        # Consumidor: recoger lo que haya terminado
+        done, _ = wait(in_flight, timeout=poll_interval, return_when=FIRST_COMPLETED)
+        for future in done:
+            position, item = in_flight.pop(future)
+            if future.cancelled():
+                continue
+            result = future.result()
+            on_complete(item, result)
+            if on_ordered:
+                ready[position] = (item, result)
+
+        if on_ordered and not stopped:
+            while next_ordered in ready:
+                item, result = ready.pop(next_ordered)
+                on_ordered(item, result)
+                next_ordered += 1
+
+        if not stopped and should_stop and should_stop():
+            # Abortar: cancelar lo que no ha empezado y dejar terminar lo que está en vuelo
+            stopped = True
+            for future in in_flight:
+                future.cancel()
+
+    return stopped or not exhausted
+
+
+async def run_windowed_async(create: Callable[[T], Awaitable[Any]], items: Iterable[T],
+                             window: Union[int, Callable[[], int]],
+                             on_complete: Callable[[T, Any], None],
+                             on_ordered: Optional[Callable[[T, Any], None]] = None,
+                             should_stop: Optional[Callable[[], bool]] = None,
+                             max_reorder: Optional[int] = None,
+                             poll_interval: float = 0.5) -> bool:
+    """Equivalente asyncio de run_windowed: create(item) devuelve la corrutina a ejecutar"""
+    iterator = iter(items)
+    in_flight: Dict[asyncio.Task, Tuple[int, T]] = {}
+    ready: Dict[int, Tuple[T, Any]] = {}
+    next_position = 0
+    next_ordered = 0
+    exhausted = False
+    stopped = False
+    waiting = False
+
+    while True:
+        while not stopped and not exhausted and len(in_flight) < _window_size(window):
+            if on_ordered and max_reorder and next_position - next_ordered >= max_reorder:
+                break
+            try:
+                item = next(iterator)
+            except StopIteration:
+                exhausted = True
+                break
+            waiting = item is NOT_READY
+            if waiting:
+                break
+            in_flight[asyncio.ensure_future(create(item))] = (next_position, item)
+            next_position += 1
+
+        if not in_flight:
+            if exhausted or stopped or not waiting:
+                break
+            # Fuente en vivo sin elementos nuevos: esperar sin girar en vacío
+            if should_stop and should_stop():
+                stopped = True
+                break
+            await asyncio.sleep(NOT_READY_WAIT)
+            continue
+
+        done, _ = await asyncio.wait(set(in_flight), timeout=poll_interval, return_when=asyncio.FIRST_COMPLETED)
+        for task in done:
+            position, item = in_flight.pop(task)
+            if task.cancelled():
+                continue
+            result = task.result()
+            on_complete(item, result)
+            if on_ordered:
+                ready[position] = (item, result)
+
+        if on_ordered and not stopped:
+            while next_ordered in ready:
+                item, result = ready.pop(next_ordered)
+                on_ordered(item, result)
+                next_ordered += 1
+
+        if not stopped and should_stop and should_stop():
+            stopped = True
+            for task in in_flight:
+                task.cancel()
+
+    return stopped or not exhausted
+
+
+# ============================================================================
+# COLA DE REINTENTOS DIFERIDOS
+# ============================================================================
+
+class DeferredRetryQueue:
+    """Elementos fallidos ordenados por el instante en que toca reintentarlos"""
+
+    def __init__(self, max_attempts: int = 4, base_delay: float = 1.0, max_delay: float = 30.0):
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.deferred_total = 0
+        self._heap: List[Tuple[float, int, Any]] = []
+        self._counter = itertools.count()
+
+    def __len__(self) -> int:
+        return len(self._heap)
+
+    def backoff_delay(self, attempts_done: int) -> float:
+        """Backoff exponencial con "equal jitter": la mitad fija y la otra mitad aleatoria"""
+        ceiling = min(self.max_delay, self.base_delay * (2 ** max(0, attempts_done - 1)))
+        return ceiling / 2 + random.uniform(0, ceiling / 2)
+
+    def defer(self, item: Any, attempts_done: int) -> Optional[float]:
+        """
+        Aparta un elemento para reintentarlo más tarde.
+
+        Returns:
+            float: Segundos hasta el reintento, o None si ya agotó sus intentos (fallo permanente)
+        """
+        if attempts_done >= self.max_attempts:
+            return None
+        delay = self.backoff_delay(attempts_done)
+        heapq.heappush(self._heap, (time.time() + delay, next(self._counter), item))
+        self.deferred_total += 1
+        return delay
+
+    def next_due_in(self) -> Optional[float]:
+        """Segundos hasta el próximo reintento (0 si ya toca, None si la cola está vacía)"""
+        if not self._heap:
+            return None
+        return max(0.0, self._heap[0][0] - time.time())
+
+    def pop_due(self) -> List[Any]:
+        """Saca todos los elementos cuyo reintento ya toca, en orden de vencimiento"""
+        now = time.time()
+        due = []
+        while self._heap and self._heap[0][0] <= now:
+            due.append(heapq.heappop(self._heap)[2])
+        return due
+
+    def drain(self) -> List[Any]:
+        """Vacía la cola (p. ej. al cancelar) devolviendo lo que quedaba pendiente"""
+        items = [entry[2] for entry in sorted(self._heap)]
+        self._heap = []
+        return items
+
+
+# ============================================================================
+# PLANIFICADOR GLOBAL COMPARTIDO POR TODAS LAS DESCARGAS
+# ============================================================================
+
+SCHEDULER_POLICIES = ('fair', 'priority')
+
+
+class ScheduledJob:
+    """Cola de segmentos de una descarga dentro del planificador global (API tipo Executor)"""
+
+    def __init__(self, scheduler: 'GlobalSegmentScheduler', job_id: Hashable, priority: int = 1,
+                 capacity: Optional[Callable[[], int]] = None):
+        self.scheduler = scheduler
+        self.job_id = job_id
+        self.priority = max(1, priority)
+        self.capacity = capacity
+        self.running = 0
+        self.completed = 0
+        self.queue: Deque[Tuple[Future, Callable, tuple, dict]] = deque()
+        self.closed = False
+
+    def submit(self, fn: Callable, *args, **kwargs) -> Future:
+        """Encola una tarea; se ejecuta cuando el planificador le asigna un worker"""
+        future = Future()
+        self.scheduler._enqueue(self, (future, fn, args, kwargs))
+        return future
+
+    def close(self) -> None:
+        """Cancela lo que no ha empezado y libera la parte de workers de esta descarga"""
+        self.scheduler._close_job(self)
+
+    def _has_room(self) -> bool:
+        return self.capacity is None or self.running < max(1, self.capacity())
+
+
+class GlobalSegmentScheduler:
+    """Pool de workers único del proceso con reparto justo o por prioridad entre descargas"""
+
+    def __init__(self, budget: int = 300, policy: str = 'fair', idle_timeout: float = 30.0):
+        self.budget = max(1, budget)
+        self.policy = policy if policy in SCHEDULER_POLICIES else 'fair'
+        self.idle_timeout = idle_timeout
+        self._condition = threading.Condition()
+        self._jobs: Dict[Hashable, ScheduledJob] = {}
+        self._threads: List[threading.Thread] = []
+        self._idle = 0
+
+    def register(self, job_id: Hashable, priority: int = 1,
+                 capacity: Optional[Callable[[], int]] = None) -> ScheduledJob:
+        """
+        Da de alta una descarga en el planificador.
+
+        Args:
+            job_id: Identificador de la descarga
+            priority: Peso en modo 'fair' / orden en modo 'priority' (mayor = más workers)
+            capacity: Máximo de tareas simultáneas propias (p. ej. el límite AIMD actual)
+        """
+        with self._condition:
+            job = ScheduledJob(self, job_id, priority=priority, capacity=capacity)
+            previous = self._jobs.get(job_id)
+            if previous is not None:
+                self._cancel_queued(previous)
+            self._jobs[job_id] = job
+            return job
+
+    def set_priority(self, job_id: Hashable, priority: int) -> bool:
+        """Cambia la prioridad de una descarga en curso. Devuelve False si no está registrada"""
+        with self._condition:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return False
+            job.priority = max(1, priority)
+            self._condition.notify_all()
+            return True
+
+    def set_budget(self, budget: int) -> None:
+        """Cambia el presupuesto global de workers en caliente"""
+        with self._condition:
+            self.budget = max(1, budget)
+            self._spawn_workers()
+            self._condition.notify_all()
+
+    def set_policy(self, policy: str) -> None:
+        with self._condition:
+            if policy in SCHEDULER_POLICIES:
+                self.policy = policy
+                self._condition.notify_all()
+
+    def snapshot(self) -> Dict[str, object]:
+        """Estado serializable: workers, y reparto actual por descarga"""
+        with self._condition:
+            return {
+                'budget': self.budget,
+                'policy': self.policy,
+                'threads': len(self._threads),
+                'idle': self._idle,
+                'jobs': {
+                    str(job_id): {
+                        'priority': job.priority,
+                        'running': job.running,
+                        'queued': len(job.queue),
+                        'completed': job.completed,
+                        'capacity': job.capacity() if job.capacity else None
+                    }
+                    for job_id, job in self._jobs.items()
+                }
+            }
+
+    def _enqueue(self, job: ScheduledJob, task) -> None:
+        with self._condition:
+            if job.closed:
+                task[0].cancel()
+                return
+            job.queue.append(task)
+            if self._idle:
+                self._condition.notify()
+            else:
+                self._spawn_workers()
+
+    def _close_job(self, job: ScheduledJob) -> None:
+        with self._condition:
+            job.closed = True
+            self._cancel_queued(job)
+            if self._jobs.get(job.job_id) is job:
+                del self._jobs[job.job_id]
+            self._condition.notify_all()
+
+    @staticmethod
+    def _cancel_queued(job: ScheduledJob) -> None:
+        while job.queue:
+            job.queue.popleft()[0].cancel()
+
+    def _spawn_workers(self) -> None:
+        """Crea workers mientras haya trabajo sin atender y quede presupuesto (con el lock tomado)"""
+        queued = sum(len(job.queue) for job in self._jobs.values())
+        while queued > self._idle and len(self._threads) < self.budget:
+            thread = threading.Thread(target=self._worker, name=f'segment-worker-{len(self._threads)}',
+                                      daemon=True)
+            self._threads.append(thread)
+            thread.start()
+            queued -= 1
+
+    def _pick_job(self) -> Optional[ScheduledJob]:
+        """Elige de qué descarga sale la siguiente tarea (con el lock tomado)"""
+        candidates = [job for job in self._jobs.values() if job.queue and job._has_room()]
+        if not candidates:
+            return None
+        if self.policy == 'priority':
+            top = max(job.priority for job in candidates)
+            candidates = [job for job in candidates if job.priority == top]
+        # Reparto justo ponderado: la descarga con menos workers por unidad de prioridad
+        return min(candidates, key=lambda job: job.running / job.priority)
+
+    def _worker(self) -> None:
+        current = threading.current_thread()
+        while True:
+            with self._condition:
+                while True:
+                    if len(self._threads) > self.budget:
+                        self._threads.remove(current)
+                        return
+                    job = self._pick_job()
+                    if job is not None:
+                        break
+                    self._idle += 1
+                    woken = self._condition.wait(self.idle_timeout)
+                    self._idle -= 1
+                    if not woken and self._pick_job() is None:
+                        self._threads.remove(current)
+                        return
+                future, fn, args, kwargs = job.queue.popleft()
+                job.running += 1
+
+            try:
+                if future.set_running_or_notify_cancel():
+                    try:
+                        future.set_result(fn(*args, **kwargs))
+                    except BaseException as e:
+                        future.set_exception(e)
+            finally:
+                with self._condition:
+                    job.running -= 1
+                    job.completed += 1
+
+
+_global_scheduler: Optional[GlobalSegmentScheduler] = None
+_global_scheduler_lock = threading.Lock()
+
+
+def get_global_scheduler() -> GlobalSegmentScheduler:
+    """Planificador único del proceso (se crea la primera vez que se pide)"""
+    global _global_scheduler
+    with _global_scheduler_lock:
+        if _global_scheduler is None:
+            _global_scheduler = GlobalSegmentScheduler()
+        return _global_scheduler
@@ -0,0 +1,221 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Estado Persistente de Descargas (SQLite)
+========================================
+
+save_download_state() volcaba todo multi_progress (incluidas las listas
+downloaded_segments de cada descarga) a download_state.json con indent=2,
+desde muchos hilos a la vez, sin lock y sin escritura atómica: con varias
+descargas grandes el archivo crecía, reescribirlo era un punto caliente y
+una escritura interrumpida lo dejaba corrupto.
+
+El estado vive ahora en una base SQLite en modo WAL:
+
+- downloads: una fila por descarga (el dict de progreso sin la lista de
+  segmentos); sync() solo reescribe las filas que cambiaron
+- segments: una fila por segmento descargado, que se añade al completarlo
+  (add_segment) en lugar de reescribir la lista entera
+- meta: cola de descargas y su estado
+
+Cada escritura es una transacción: tras un cierre inesperado la base queda
+en el último commit. Si no existe la base pero sí download_state.json, se
+importa la primera vez.
+"""
+
+import json
+import os
+import sqlite3
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+
+DEFAULT_DB_PATH = 'download_state.db'
+LEGACY_JSON_PATH = 'download_state.json'
+
+_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS downloads (
+    id TEXT PRIMARY KEY,
+    data TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS segments (
+    download_id TEXT NOT NULL,
+    idx INTEGER NOT NULL,
+    PRIMARY KEY (download_id, idx)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+'''
+
+
+class DownloadStateStore:
+    """Estado de descargas y cola en SQLite (WAL) con actualizaciones incrementales"""
+
+    def __init__(self, path: str = DEFAULT_DB_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        created = not os.path.exists(path)
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')  # En WAL: consistente tras un corte, sin fsync por commit
+        self._conn.executescript(_SCHEMA)
+        # Lo último escrito de cada descarga: fila serializada y segmentos (lista y cuántos)
+        self._rows: Dict[str, str] = {}
+        self._segments: Dict[str, Tuple[List[int], int]] = {}
+        self._meta: Dict[str, str] = {}
+        self.legacy_imported = created and self._import_legacy(LEGACY_JSON_PATH)
+
+    def _import_legacy(self, json_path: str) -> bool:
+        """Importa download_state.json (formato anterior) en una base recién creada"""
+        if not os.path.exists(json_path):
+            return False
+        try:
+            with open(json_path, 'r', encoding='utf-8') as f:
+                state = json.load(f)
+        except (OSError, ValueError):
+            return False
+        self.sync(state.get('multi_progress', {}), state.get('download_queue', []), state.get('queue_running', False))
+        return True
+
+    def _transaction(self):
+        return _Transaction(self._conn)
+
+    def sync(self, downloads: Dict[str, Dict[str, Any]], queue: List[Dict[str, Any]], queue_running: bool) -> int:
+        """
+        Persiste el estado completo escribiendo solo lo que cambió desde la última vez.
+
+        Returns:
+            int: Descargas cuya fila se reescribió
+        """
+        with self._lock:
+            # Otros hilos modifican los dicts mientras se recorren: reintentar con una copia nueva
+            for _ in range(3):
+                try:
+                    items = [(download_id, dict(progress)) for download_id, progress in list(downloads.items())]
+                    rows = {}
+                    for download_id, progress in items:
+                        segments = progress.pop('downloaded_segments', None)
+                        rows[download_id] = (json.dumps(progress, ensure_ascii=False, default=str),
+                                             list(segments) if segments is not None else [], segments)
+                    meta = {'download_queue': json.dumps(queue, ensure_ascii=False, default=str),
+                            'queue_running': json.dumps(bool(queue_running))}
+                    break
+                except RuntimeError:
+                    continue
+            else:
+                return 0
+
+            written = 0
+            with self._transaction():
+                for download_id, (data, segments_copy, segments) in rows.items():
+                    if self._rows.get(download_id) != data:
+                        self._conn.execute('INSERT OR REPLACE INTO downloads (id, data) VALUES (?, ?)',
+                                           (download_id, data))
+                        self._rows[download_id] = data
+                        written += 1
+                    if segments is not None:
+                        # Se escribe la copia, pero la identidad es la de la lista viva
+                        self._write_segments(download_id, segments, segments_copy)
+                for download_id in [known for known in self._known_ids() if known not in rows]:
+                    self._delete(download_id)
+                for key, value in meta.items():
+                    if self._meta.get(key) != value:
+                        self._conn.execute('INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)', (key, value))
+                        self._meta[key] = value
+            return written
+
+    def _write_segments(self, download_id: str, segments: List[int], segments_copy: List[int]) -> None:
+        """Añade los segmentos nuevos de la lista (o la reescribe si se sustituyó o se acortó)"""
+        previous = self._segments.get(download_id)
+        if previous is not None and previous[0] is segments and previous[1] <= len(segments_copy):
+            new = segments_copy[previous[1]:]
+        else:
+            self._conn.execute('DELETE FROM segments WHERE download_id = ?', (download_id,))
+            new = segments_copy
+        if new:
+            self._conn.executemany('INSERT OR IGNORE INTO segments (download_id, idx) VALUES (?, ?)',
+                                   [(download_id, int(index)) for index in new])
+        self._segments[download_id] = (segments, len(segments_copy))
+
+    def _known_ids(self) -> List[str]:
+        if not self._rows:
+            return [row[0] for row in self._conn.execute('SELECT id FROM downloads')]
+        return list(self._rows)
+
+    def _delete(self, download_id: str) -> None:
+        self._conn.execute('DELETE FROM downloads WHERE id = ?', (download_id,))
+        self._conn.execute('DELETE FROM segments WHERE download_id = ?', (download_id,))
+        self._rows.pop(download_id, None)
+        self._segments.pop(download_id, None)
+
+    def add_segment(self, download_id: str, index: int) -> None:
+        """Registra un segmento descargado (una fila, sin tocar el resto del estado)"""
+        with self._lock:
+            self._conn.execute('INSERT OR IGNORE INTO segments (download_id, idx) VALUES (?, ?)',
+                               (download_id, int(index)))
+
+    def load(self) -> Tuple[Dict[str, Dict[str, Any]], List[Dict[str, Any]], bool]:
+        """
+        Estado guardado.
+
+        Returns:
+            (multi_progress, cola de descargas, cola en marcha)
+        """
+        with self._lock:
+            downloads: Dict[str, Dict[str, Any]] = {}
+            for download_id, data in self._conn.execute('SELECT id, data FROM downloads'):
+                try:
+                    progress = json.loads(data)
+                except ValueError:
+                    continue
+                progress['downloaded_segments'] = []
+                downloads[download_id] = progress
+                self._rows[download_id] = data
+            for download_id, index in self._conn.execute(
+                    'SELECT download_id, idx FROM segments ORDER BY download_id, idx'):
+                if download_id in downloads:
+                    downloads[download_id]['downloaded_segments'].append(index)
+            for download_id, progress in downloads.items():
+                segments = progress['downloaded_segments']
+                self._segments[download_id] = (segments, len(segments))
+            meta = dict(self._conn.execute('SELECT key, value FROM meta'))
+            self._meta.update(meta)
+        queue = json.loads(meta.get('download_queue', '[]'))
+        queue_running = json.loads(meta.get('queue_running', 'false'))
+        return downloads, queue, queue_running
+
+    def close(self) -> None:
+        with self._lock:
+            try:
+                self._conn.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+            finally:
+                self._conn.close()
+
+
+class _Transaction:
+    """BEGIN IMMEDIATE ... COMMIT (ROLLBACK si hay una excepción)"""
+
+    def __init__(self, conn: sqlite3.Connection):
+        self._conn = conn
+
+    def __enter__(self):
+        self._conn.execute('BEGIN IMMEDIATE')
+        return self._conn
+
+    def __exit__(self, exc_type, exc, tb) -> bool:
+        self._conn.execute('ROLLBACK' if exc_type else 'COMMIT')
+        return False
+
+
+_store: Optional[DownloadStateStore] = None
+_store_lock = threading.Lock()
+
+
+def get_state_store(path: str = DEFAULT_DB_PATH) -> DownloadStateStore:
+    """Almacén único del proceso (se abre la primera vez que se pide)"""
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = DownloadStateStore(path)
+        return _store
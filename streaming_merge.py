@@ -0,0 +1,159 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Unión en Streaming de Segmentos con FFmpeg
+==========================================
+
+En lugar de esperar al último segmento para lanzar `ffmpeg -f concat` y
+releer todo el directorio temporal, un proceso ffmpeg arranca con la
+descarga y recibe por stdin el prefijo contiguo de segmentos completados.
+El remux se solapa con la descarga y el MP4 final queda listo segundos
+después del último segmento.
+
+Los segmentos se conservan en disco: si la unión en streaming no puede
+completarse (segmentos fallidos, cancelación, error de ffmpeg) se aborta y
+se usa la unión clásica con filelist.txt.
+"""
+
+import os
+import queue
+import shutil
+import subprocess
+import threading
+from typing import Callable, Iterable, Optional
+
+# Trozo de copia de cada segmento hacia el stdin de ffmpeg
+PIPE_CHUNK_SIZE = 1024 * 1024
+
+
+class StreamingMerger:
+    """Alimenta un ffmpeg en marcha con los segmentos en orden de playlist"""
+
+    def __init__(self, output_path: str, temp_dir: str, total: int, ready: Iterable[int] = (),
+                 log_function: Optional[Callable[[str], None]] = None,
+                 filename_for: Callable[[int], str] = lambda index: f'segment_{index:05d}.ts'):
+        self.output_path = output_path
+        self.temp_dir = temp_dir
+        self.total = total
+        self.log_function = log_function or print
+        self.filename_for = filename_for
+        self._ready = set(ready)
+        self._cursor = 0
+        self._lock = threading.Lock()
+        self._queue: 'queue.Queue[Optional[int]]' = queue.Queue()
+        self._process: Optional[subprocess.Popen] = None
+        self._writer: Optional[threading.Thread] = None
+        self._stderr_path = os.path.join(temp_dir, 'ffmpeg_stream.log')
+        self._closed = False
+        self.fed = 0
+        self.error: Optional[str] = None
+
+    @property
+    def complete(self) -> bool:
+        """True cuando todos los segmentos de la playlist se han encolado hacia ffmpeg"""
+        return self._cursor >= self.total
+
+    def start(self) -> bool:
+        """Arranca ffmpeg leyendo MPEG-TS por stdin. Devuelve False si no se pudo lanzar"""
+        command = ['ffmpeg', '-hide_banner', '-loglevel', 'error', '-f', 'mpegts', '-i', 'pipe:0',
+                   '-c', 'copy', '-y', self.output_path]
+        try:
+            with open(self._stderr_path, 'wb') as stderr_file:
+                self._process = subprocess.Popen(command, stdin=subprocess.PIPE, stdout=subprocess.DEVNULL,
+                                                 stderr=stderr_file)
+        except (FileNotFoundError, OSError) as e:
+            self.error = f"No se pudo iniciar ffmpeg: {e}"
+            self.log_function(f"⚠️ Unión en streaming desactivada: {self.error}")
+            return False
+
+        self._writer = threading.Thread(target=self._write_loop, name='streaming-merge', daemon=True)
+        self._writer.start()
+        self.log_function(f"🌊 Unión en streaming iniciada ({len(self._ready)} segmentos ya en disco)")
+        # Los segmentos de una descarga anterior pueden formar ya un prefijo
+        self._advance()
+        return True
+
+    def mark_ready(self, index: int) -> None:
+        """Un segmento terminó de descargarse (pensado para on_ordered de download_segments_concurrent)"""
+        with self._lock:
+            self._ready.add(index)
+        self._advance()
+
+    def _advance(self) -> None:
+        with self._lock:
+            while self._cursor < self.total and self._cursor in self._ready:
+                self._queue.put(self._cursor)
+                self._ready.discard(self._cursor)
+                self._cursor += 1
+
+    def _write_loop(self) -> None:
+        stdin = self._process.stdin
+        while True:
+            index = self._queue.get()
+            if index is None or self.error:
+                break
+            segment_path = os.path.join(self.temp_dir, self.filename_for(index))
+            try:
+                with open(segment_path, 'rb') as segment_file:
+                    shutil.copyfileobj(segment_file, stdin, PIPE_CHUNK_SIZE)
+                self.fed += 1
+            except (BrokenPipeError, OSError) as e:
+                self.error = f"segmento {index}: {e}"
+                break
+        try:
+            stdin.close()
+        except OSError:
+            pass
+
+    def finish(self) -> bool:
+        """Cierra el stdin de ffmpeg tras el último segmento y espera el MP4. True si quedó completo"""
+        if self._process is None or self._closed:
+            return False
+        if not self.complete:
+            self.abort(f"faltan {self.total - self._cursor} segmentos en el prefijo contiguo")
+            return False
+
+        self._closed = True
+        self._queue.put(None)
+        self._writer.join()
+        returncode = self._process.wait()
+        if self.error or returncode != 0:
+            self.error = self.error or f"ffmpeg terminó con código {returncode}: {self._read_stderr()}"
+            self.log_function(f"⚠️ Unión en streaming fallida: {self.error}")
+            self._remove_output()
+            return False
+        if not os.path.exists(self.output_path) or os.path.getsize(self.output_path) == 0:
+            self.error = "ffmpeg no generó el archivo de salida"
+            self.log_function(f"⚠️ Unión en streaming fallida: {self.error}")
+            return False
+        self.log_function(f"🌊 Unión en streaming completada: {self.fed} segmentos enviados a ffmpeg")
+        return True
+
+    def abort(self, reason: str = 'cancelada') -> None:
+        """Detiene ffmpeg y borra la salida parcial (los segmentos siguen en disco)"""
+        if self._process is None or self._closed:
+            return
+        self._closed = True
+        self.error = self.error or reason
+        self._queue.put(None)
+        if self._process.poll() is None:
+            self._process.kill()
+        if self._writer is not None:
+            self._writer.join()
+        self._process.wait()
+        self._remove_output()
+        self.log_function(f"⚠️ Unión en streaming abortada ({reason}); se usará la unión clásica")
+
+    def _remove_output(self) -> None:
+        try:
+            if os.path.exists(self.output_path):
+                os.remove(self.output_path)
+        except OSError:
+            pass
+
+    def _read_stderr(self) -> str:
+        try:
+            with open(self._stderr_path, 'r', encoding='utf-8', errors='replace') as f:
+                return f.read()[-500:]
+        except OSError:
+            return ''
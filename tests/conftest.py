@@ -0,0 +1,7 @@
+# -*- coding: utf-8 -*-
+"""Los módulos viven en la raíz del repositorio: hacerlos importables desde tests/"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
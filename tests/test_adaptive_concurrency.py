@@ -0,0 +1,64 @@
+# -*- coding: utf-8 -*-
+"""AdaptiveConcurrencyController: reducción multiplicativa, incremento aditivo y límites"""
+
+from adaptive_concurrency import AdaptiveConcurrencyController
+
+
+def controller():
+    # window_seconds=0: cada release con muestras suficientes cierra la ventana
+    return AdaptiveConcurrencyController(initial_limit=10, min_limit=2, max_limit=20, window_seconds=0, min_samples=4)
+
+
+def test_error_rate_cuts_the_limit():
+    limiter = controller()
+    for _ in range(4):
+        limiter.acquire()
+        limiter.release(0.1, 1000, error=True)
+
+    assert limiter.limit == 7
+    assert 'tasa de error' in limiter.reason
+
+
+def test_throttle_responses_halve_the_limit():
+    limiter = controller()
+    for _ in range(4):
+        limiter.acquire()
+        limiter.release(0.1, 0, status_code=429)
+
+    assert limiter.limit == 5
+
+
+def test_saturated_window_with_steady_throughput_grows_the_limit():
+    limiter = controller()
+    for _ in range(10):
+        limiter.acquire()
+    for _ in range(4):
+        limiter.release(0.1, 1000)
+
+    assert limiter.limit == 12
+    assert limiter.reason == 'throughput creciente'
+
+
+def test_limit_is_clamped_to_bounds():
+    limiter = AdaptiveConcurrencyController(initial_limit=500, min_limit=2, max_limit=20)
+    assert limiter.limit == 20
+
+    limiter.set_bounds(max_limit=8)
+    assert limiter.limit == 8
+    assert limiter.snapshot()['max_limit'] == 8
+
+
+def test_try_acquire_respects_the_limit():
+    limiter = AdaptiveConcurrencyController(initial_limit=2, min_limit=1)
+    assert limiter.try_acquire() and limiter.try_acquire()
+    assert not limiter.try_acquire()
+
+    limiter.release(0.1)
+    assert limiter.try_acquire()
+
+
+def test_in_flight_never_goes_negative():
+    limiter = controller()
+    limiter.release(0.1)
+
+    assert limiter.snapshot()['in_flight'] == 0
@@ -0,0 +1,55 @@
+# -*- coding: utf-8 -*-
+"""Publicación atómica: ruta temporal oculta, publish con rename y discard"""
+
+import os
+
+from atomic_output import discard, prepare_staging, publish, staging_path
+
+
+def test_staging_path_is_hidden_next_to_final_and_keeps_extension(tmp_path):
+    final = tmp_path / 'videos' / 'clip.mp4'
+
+    assert staging_path(str(final)) == os.path.join(str(tmp_path / 'videos'), '.clip.partial.mp4')
+
+
+def test_prepare_staging_creates_directory_and_removes_leftovers(tmp_path):
+    final = tmp_path / 'videos' / 'clip.mp4'
+    staged = prepare_staging(str(final))
+    with open(staged, 'wb') as f:
+        f.write(b'resto de un intento anterior')
+
+    assert prepare_staging(str(final)) == staged
+    assert (tmp_path / 'videos').is_dir()
+    assert not os.path.exists(staged)
+
+
+def test_publish_replaces_final_file(tmp_path):
+    final = tmp_path / 'clip.mp4'
+    final.write_bytes(b'version anterior')
+    staged = prepare_staging(str(final))
+    with open(staged, 'wb') as f:
+        f.write(b'video completo')
+
+    assert publish(staged, str(final))
+    assert final.read_bytes() == b'video completo'
+    assert not os.path.exists(staged)
+
+
+def test_publish_refuses_missing_or_empty_staging(tmp_path):
+    final = tmp_path / 'clip.mp4'
+    staged = prepare_staging(str(final))
+
+    assert not publish(staged, str(final))
+    open(staged, 'wb').close()
+    assert not publish(staged, str(final))
+    assert not final.exists()
+
+
+def test_discard_removes_staging_and_ignores_missing(tmp_path):
+    staged = prepare_staging(str(tmp_path / 'clip.mp4'))
+    with open(staged, 'wb') as f:
+        f.write(b'parcial')
+
+    discard(staged)
+    assert not os.path.exists(staged)
+    discard(staged)
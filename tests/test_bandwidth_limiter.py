@@ -0,0 +1,84 @@
+# -*- coding: utf-8 -*-
+"""TokenBucket y BandwidthLimiter: espera proporcional a la deuda, ráfaga acotada y cambios de límite sin aplicar a medias"""
+
+import time
+
+import pytest
+
+from bandwidth_limiter import MB, BandwidthLimiter, TokenBucket
+
+
+def test_unlimited_bucket_never_waits_but_counts_bytes():
+    bucket = TokenBucket()
+    assert bucket.rate is None
+    assert bucket.reserve(10 * 1024 * 1024) == 0.0
+    assert bucket.consumed == 10 * 1024 * 1024
+
+
+def test_wait_is_debt_divided_by_rate():
+    bucket = TokenBucket(rate=1000, burst_seconds=0.5)
+
+    assert bucket.reserve(1000) == pytest.approx(1.0, abs=0.05)
+    # La deuda se acumula: la siguiente reserva espera también la anterior
+    assert bucket.reserve(500) == pytest.approx(1.5, abs=0.05)
+
+
+def test_idle_time_refills_at_most_one_burst():
+    bucket = TokenBucket(rate=10000, burst_seconds=0.01)  # Ráfaga de 100 bytes
+    time.sleep(0.05)
+
+    assert bucket.reserve(100) == 0.0
+    assert bucket.reserve(100) == pytest.approx(0.01, abs=0.005)
+
+
+def test_set_rate_none_removes_limit():
+    bucket = TokenBucket(rate=100)
+    assert bucket.reserve(1000) > 0
+
+    bucket.set_rate(None)
+    assert bucket.reserve(1000) == 0.0
+    bucket.set_rate(0)
+    assert bucket.rate is None
+
+
+def test_download_limit_applies_to_registered_bucket_and_snapshot():
+    limiter = BandwidthLimiter()
+    limiter.register('dl-1')
+
+    limiter.set_download_limit('dl-1', 2)
+    assert limiter.snapshot()['downloads']['dl-1']['limit_mbps'] == 2
+    assert limiter.reserve('dl-1', 4 * MB) == pytest.approx(2.0, abs=0.1)
+
+    limiter.set_download_limit('dl-1', None)
+    assert limiter.reserve('dl-1', 4 * MB) == 0.0
+
+
+def test_invalid_schedule_leaves_previous_rules_untouched():
+    limiter = BandwidthLimiter()
+    limiter.set_schedule([{'start': '00:00', 'end': '23:59', 'mbps': 3}])
+
+    with pytest.raises((KeyError, ValueError)):
+        limiter.set_schedule([{'start': '08:00', 'end': '09:00'}, {'start': '25:99'}])
+    assert limiter.snapshot()['schedule'] == [{'start': '00:00', 'end': '23:59', 'mbps': 3.0}]
+
+
+def test_bandwidth_route_rejects_unknown_id_without_partial_changes(tmp_path, monkeypatch):
+    # app carga y guarda su estado en el directorio actual
+    monkeypatch.chdir(tmp_path)
+    import app as app_module
+
+    limiter = BandwidthLimiter()
+    monkeypatch.setattr(app_module, 'bandwidth_limiter', limiter)
+    monkeypatch.setitem(app_module.multi_progress, 'dl-ok', {})
+    client = app_module.app.test_client()
+
+    response = client.post('/api/bandwidth', json={
+        'global_mbps': 5,
+        'downloads': {'dl-ok': 1, 'dl-missing': 2}
+    })
+
+    assert response.status_code == 404
+    assert 'dl-missing' in response.get_json()['error']
+    assert limiter.global_mbps is None
+    assert 'bandwidth_limit_mbps' not in app_module.multi_progress['dl-ok']
+    assert limiter.snapshot()['downloads'] == {}
@@ -0,0 +1,66 @@
+# -*- coding: utf-8 -*-
+"""fMP4: detección de cajas, init insertado antes de sus fragmentos y envío por tubería"""
+
+import struct
+import subprocess
+
+import pytest
+
+from fmp4 import concat_fmp4_segments, is_fragment_header, is_init_header, pipe_fmp4_segments
+
+
+def _box(box_type: bytes, payload: bytes = b'') -> bytes:
+    return struct.pack('>I4s', 8 + len(payload), box_type) + payload
+
+
+def _write(path, data):
+    path.write_bytes(data)
+    return str(path)
+
+
+def test_box_headers_are_classified():
+    assert is_init_header(_box(b'ftyp', b'isom'))
+    assert is_fragment_header(_box(b'moof'))
+    assert is_fragment_header(_box(b'styp'))
+    assert not is_init_header(_box(b'moof'))
+    # Un paquete MPEG-TS o una cabecera truncada no son fMP4
+    assert not is_fragment_header(b'\x47\x40\x00\x10' + b'\xff' * 184)
+    assert not is_init_header(b'\x00\x00')
+    assert not is_fragment_header(struct.pack('>I4s', 4, b'moof'))
+
+
+def test_concat_inserts_each_init_before_its_first_fragment(tmp_path):
+    init_a = _write(tmp_path / 'init_a.mp4', _box(b'ftyp', b'A'))
+    init_b = _write(tmp_path / 'init_b.mp4', _box(b'ftyp', b'B'))
+    fragments = [_write(tmp_path / f'frag_{index}.m4s', _box(b'moof', bytes([index]))) for index in range(4)]
+    output = tmp_path / 'out.mp4'
+
+    written = concat_fmp4_segments(fragments, [init_a, init_a, init_b, init_b], str(output),
+                                   sizes=[9, 9, 9, 9])
+
+    expected = b''.join(open(path, 'rb').read()
+                        for path in (init_a, fragments[0], fragments[1], init_b, fragments[2], fragments[3]))
+    assert written == len(expected)
+    assert output.read_bytes() == expected
+
+
+def test_pipe_sends_init_and_fragments_to_command_stdin(tmp_path):
+    init = _write(tmp_path / 'init.mp4', _box(b'ftyp', b'I'))
+    fragments = [_write(tmp_path / f'frag_{index}.m4s', _box(b'moof', bytes([index]))) for index in range(3)]
+    output = tmp_path / 'piped.mp4'
+
+    pipe_fmp4_segments(fragments, [init] * 3, ['sh', '-c', 'cat > "$1"', 'sh', str(output)],
+                       log_function=lambda message: None)
+
+    assert output.read_bytes() == b''.join(open(path, 'rb').read() for path in [init] + fragments)
+
+
+def test_pipe_raises_with_stderr_when_command_fails(tmp_path):
+    fragment = _write(tmp_path / 'frag.m4s', _box(b'moof'))
+
+    with pytest.raises(subprocess.CalledProcessError) as excinfo:
+        pipe_fmp4_segments([fragment], [None], ['sh', '-c', 'cat > /dev/null; echo fallo >&2; exit 3'],
+                           log_function=lambda message: None)
+
+    assert excinfo.value.returncode == 3
+    assert 'fallo' in excinfo.value.stderr
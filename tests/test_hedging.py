@@ -0,0 +1,163 @@
+# -*- coding: utf-8 -*-
+"""HedgeRace (un solo ganador), HedgingPolicy (percentil y presupuesto) y la carrera real con un origen lento"""
+
+import http.server
+import os
+import threading
+import time
+import types
+
+import pytest
+
+from adaptive_concurrency import AdaptiveConcurrencyController
+from hedging import HEDGE, PRIMARY, HedgeRace, HedgingPolicy
+from m3u8_downloader import FetchUnit, M3U8Downloader
+from m3u8_playlist import MediaSegment
+
+SEGMENT = b''.join(bytes([0x47, 0x01, 0x00, 0x10 | cc]) + b'\xff' * 184 for cc in range(16))
+
+
+def test_first_claim_wins_and_other_contender_loses():
+    race = HedgeRace()
+    assert not race.decided
+    assert not race.lost(PRIMARY) and not race.lost(HEDGE)
+
+    assert race.claim(HEDGE)
+    assert race.claim(HEDGE)  # Volver a reclamar la propia victoria no cambia nada
+    assert not race.claim(PRIMARY)
+    assert race.decided and race.winner == HEDGE
+    assert race.lost(PRIMARY) and not race.lost(HEDGE)
+
+
+def test_concurrent_claims_have_a_single_winner():
+    for _ in range(50):
+        race = HedgeRace()
+        barrier = threading.Barrier(2)
+        results = {}
+
+        def contend(contender):
+            barrier.wait()
+            results[contender] = race.claim(contender)
+
+        threads = [threading.Thread(target=contend, args=(contender,)) for contender in (PRIMARY, HEDGE)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert sorted(results.values()) == [False, True]
+
+
+def test_temp_filename_is_per_contender():
+    assert HedgeRace.temp_filename('segment_00001.ts', PRIMARY) != HedgeRace.temp_filename('segment_00001.ts', HEDGE)
+
+
+def test_delay_needs_min_samples_then_tracks_percentile():
+    policy = HedgingPolicy(percentile=0.9, min_samples=10, min_delay=0.0)
+    for latency in range(1, 10):
+        policy.record_latency(float(latency))
+    assert policy.delay() is None
+
+    policy.record_latency(10.0)
+    assert policy.delay() == 10.0  # Percentil 90 de 1..10
+
+
+def test_delay_never_below_min_delay():
+    policy = HedgingPolicy(min_samples=5, min_delay=0.5)
+    for _ in range(5):
+        policy.record_latency(0.01)
+    assert policy.delay() == 0.5
+
+
+def test_budget_limits_issued_hedges():
+    policy = HedgingPolicy(budget_ratio=0.05)
+    for _ in range(100):
+        policy.delay()  # Cada consulta cuenta como una petición
+
+    issued = sum(policy.try_spend() for _ in range(20))
+    assert issued == 5
+    policy.record_win()
+    snapshot = policy.snapshot()
+    assert (snapshot['requests'], snapshot['hedges_issued'], snapshot['hedges_won']) == (100, 5, 1)
+
+
+def test_claim_cuts_the_losers_response():
+    race = HedgeRace()
+    closed = []
+    response = types.SimpleNamespace(close=lambda: closed.append(PRIMARY))
+    assert race.attach(PRIMARY, response)
+
+    assert race.claim(HEDGE)
+    assert closed == [PRIMARY]
+    # Un contendiente que llega tarde ya no puede registrar su respuesta
+    assert not race.attach(PRIMARY, response)
+
+
+def test_abandoned_requests_free_the_slot_without_counting():
+    limiter = AdaptiveConcurrencyController(initial_limit=10, min_limit=2, max_limit=20,
+                                            window_seconds=0, min_samples=4)
+    for _ in range(10):
+        limiter.acquire()
+    assert not limiter.try_acquire()
+
+    for _ in range(10):
+        limiter.abandon()
+
+    snapshot = limiter.snapshot()
+    assert snapshot['in_flight'] == 0
+    assert snapshot['limit'] == 10 and snapshot['adjustments'] == 0
+    assert limiter.try_acquire()
+
+
+class _StallFirstHandler(http.server.BaseHTTPRequestHandler):
+    """La primera petición envía un paquete y se queda colgada; las siguientes responden al momento"""
+    protocol_version = 'HTTP/1.1'
+    requests_seen = 0
+
+    def do_GET(self):
+        type(self).requests_seen += 1
+        first = type(self).requests_seen == 1
+        self.send_response(200)
+        self.send_header('Content-Length', str(len(SEGMENT)))
+        self.end_headers()
+        if first:
+            self.wfile.write(SEGMENT[:188])
+            self.wfile.flush()
+            time.sleep(5)
+            return
+        self.wfile.write(SEGMENT)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def stalling_server():
+    _StallFirstHandler.requests_seen = 0
+    server = http.server.ThreadingHTTPServer(('127.0.0.1', 0), _StallFirstHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f'http://127.0.0.1:{server.server_address[1]}'
+    server.shutdown()
+    server.server_close()
+
+
+def test_hedge_winner_returns_without_waiting_for_stalled_primary(stalling_server, tmp_path):
+    downloader = M3U8Downloader(f'{stalling_server}/index.m3u8', temp_dir=str(tmp_path), hedge=True,
+                                log_function=lambda message: None)
+    downloader.hedging.min_delay = 0.2
+    for _ in range(downloader.hedging.min_samples):
+        downloader.hedging.record_latency(0.01)
+    unit = FetchUnit(0, MediaSegment(f'{stalling_server}/s0.ts'), downloader.segment_filename(0))
+
+    start = time.time()
+    result = downloader._download_segment_hedged(unit)
+    elapsed = time.time() - start
+
+    assert result == (downloader.segment_filename(0), len(SEGMENT))
+    assert elapsed < 2  # No espera al timeout de lectura (15 s) de la original
+    assert downloader.hedging.snapshot()['hedges_won'] == 1
+    downloader._shutdown_hedging()
+    # La original se cortó: sin archivos temporales de la carrera y sin hueco AIMD ocupado
+    assert sorted(os.listdir(tmp_path)) == [downloader.segment_filename(0)]
+    assert downloader.concurrency.snapshot()['in_flight'] == 0
+    assert downloader.concurrency.snapshot()['adjustments'] == 0
@@ -0,0 +1,93 @@
+# -*- coding: utf-8 -*-
+"""SharedHTTPPool: conexiones reutilizadas entre sesiones y límites global/por host"""
+
+import http.server
+import threading
+import types
+
+import pytest
+
+from http_pool import SharedHTTPPool
+
+
+class _KeepAliveHandler(http.server.BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        body = self.headers.get('X-Client', '-').encode()
+        self.send_response(200)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def server_url():
+    server = http.server.ThreadingHTTPServer(('127.0.0.1', 0), _KeepAliveHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f'http://127.0.0.1:{server.server_address[1]}/'
+    server.shutdown()
+    server.server_close()
+
+
+def fake_pool(port=80):
+    return types.SimpleNamespace(host='cdn.example.com', port=port, pool=None)
+
+
+def test_sessions_share_connections_but_keep_their_headers(server_url):
+    registry = SharedHTTPPool()
+    first = registry.new_session(headers={'X-Client': 'a'})
+    second = registry.new_session(headers={'X-Client': 'b'})
+
+    assert first.get(server_url, timeout=5).text == 'a'
+    assert second.get(server_url, timeout=5).text == 'b'
+
+    stats = registry.stats()
+    assert stats['requests'] == 2
+    # La segunda sesión reutiliza la conexión keep-alive abierta por la primera
+    assert stats['new_connections'] == 1
+    assert stats['reuse_rate'] == 0.5
+    assert stats['in_use'] == 0
+
+
+def test_per_host_limit_waits_and_gives_up_after_timeout():
+    registry = SharedHTTPPool(max_connections=10, max_per_host=1, wait_timeout=0.05)
+    pool = fake_pool()
+
+    registry._acquire(pool)
+    registry._acquire(pool)  # Sin hueco: espera wait_timeout y sigue igualmente
+
+    host = registry.stats()['hosts']['cdn.example.com:80']
+    assert (host['waits'], host['wait_timeouts'], host['in_use']) == (1, 1, 2)
+
+
+def test_release_wakes_a_waiting_request():
+    registry = SharedHTTPPool(max_connections=1, max_per_host=1, wait_timeout=5)
+    pool = fake_pool()
+    registry._acquire(pool)
+
+    acquired = threading.Event()
+
+    def waiter():
+        registry._acquire(fake_pool(port=443))  # Otro host, pero el límite global está lleno
+        acquired.set()
+
+    thread = threading.Thread(target=waiter)
+    thread.start()
+    assert not acquired.wait(0.05)
+    registry._release(pool)
+    assert acquired.wait(1)
+    thread.join()
+    assert registry.stats()['hosts']['cdn.example.com:443']['wait_timeouts'] == 0
+
+
+def test_set_limits_keeps_per_host_within_global():
+    registry = SharedHTTPPool(max_connections=100, max_per_host=50)
+
+    registry.set_limits(max_connections=20)
+
+    stats = registry.stats()
+    assert (stats['max_connections'], stats['max_per_host']) == (20, 20)
@@ -0,0 +1,91 @@
+# -*- coding: utf-8 -*-
+"""LivePlaylistFollower: segmentos por secuencia, perdidos por huecos, ENDLIST y reinicio de la secuencia"""
+
+from live_follower import LivePlaylistFollower
+from m3u8_playlist import parse_playlist
+from segment_scheduler import NOT_READY
+
+PLAYLIST_URL = 'https://cdn.example.com/live/index.m3u8'
+
+
+def _window(first_sequence, names, endlist=False):
+    lines = ['#EXTM3U', '#EXT-X-TARGETDURATION:4', f'#EXT-X-MEDIA-SEQUENCE:{first_sequence}']
+    for name in names:
+        lines += ['#EXTINF:4.0,', name]
+    if endlist:
+        lines.append('#EXT-X-ENDLIST')
+    return parse_playlist('\n'.join(lines), PLAYLIST_URL)
+
+
+def _follower(initial, messages=None):
+    log = messages.append if messages is not None else (lambda message: None)
+    return LivePlaylistFollower(None, PLAYLIST_URL, initial=initial, log_function=log)
+
+
+def _names(segments):
+    return [segment.url.rsplit('/', 1)[1] for segment in segments]
+
+
+def test_reload_only_queues_unseen_sequences():
+    follower = _follower(_window(100, ['a.ts', 'b.ts', 'c.ts']))
+    assert _names(follower.take()) == ['a.ts', 'b.ts', 'c.ts']
+
+    # El servidor reutiliza nombres: manda la secuencia, no la URL
+    assert follower._ingest(_window(101, ['b.ts', 'c.ts', 'a.ts'])) == 1
+    segment = follower.take()[0]
+    assert (segment.sequence, follower.index_of(segment)) == (103, 3)
+    assert follower._ingest(_window(101, ['b.ts', 'c.ts', 'a.ts'])) == 0
+
+
+def test_sequence_gap_is_counted_as_lost():
+    messages = []
+    follower = _follower(_window(10, ['s10.ts', 's11.ts']), messages)
+
+    assert follower._ingest(_window(15, ['s15.ts', 's16.ts'])) == 2
+
+    assert follower.lost == 3
+    assert [follower.index_of(segment) for segment in follower.take()] == [0, 1, 5, 6]
+    assert any('secuencias 12-14' in message for message in messages)
+
+
+def test_endlist_finishes_after_pending_segments_are_delivered():
+    follower = _follower(_window(0, ['a.ts']))
+    items = iter(follower)
+    assert next(items).sequence == 0
+    assert next(items) is NOT_READY
+
+    follower._ingest(_window(0, ['a.ts', 'b.ts'], endlist=True))
+
+    assert follower.ended and follower.end_reason == '#EXT-X-ENDLIST'
+    assert not follower.finished
+    assert _names(list(items)) == ['b.ts']
+    assert follower.finished
+
+
+def test_sequence_reset_reanchors_numbering():
+    messages = []
+    follower = _follower(_window(500, ['a500.ts', 'a501.ts', 'a502.ts']), messages)
+    follower.take()
+
+    # El encoder se reinició: la ventana nueva queda entera por detrás y no comparte segmentos
+    assert follower._ingest(_window(0, ['b0.ts', 'b1.ts'])) == 2
+
+    segments = follower.take()
+    assert _names(segments) == ['b0.ts', 'b1.ts']
+    assert [follower.index_of(segment) for segment in segments] == [3, 4]
+    assert follower.sequence_resets == 1 and follower.lost == 0
+    assert any('retrocedió (de 502 a 0)' in message for message in messages)
+
+    # Las recargas siguientes continúan con la numeración reanclada
+    assert follower._ingest(_window(1, ['b1.ts', 'b2.ts'])) == 1
+    assert follower.index_of(follower.take()[0]) == 5
+
+
+def test_stale_window_is_not_mistaken_for_a_reset():
+    follower = _follower(_window(500, ['a500.ts', 'a501.ts', 'a502.ts']))
+    follower._ingest(_window(501, ['a501.ts', 'a502.ts', 'a503.ts', 'a504.ts']))
+    follower.take()
+
+    # Una réplica atrasada que comparte segmentos con la ventana anterior no reancla nada
+    assert follower._ingest(_window(500, ['a500.ts', 'a501.ts', 'a502.ts'])) == 0
+    assert follower.sequence_resets == 0
@@ -0,0 +1,76 @@
+# -*- coding: utf-8 -*-
+"""LiveRecorder: escritura en orden del archivo que crece, ventana, huecos y duración máxima"""
+
+import os
+from types import SimpleNamespace
+
+import pytest
+
+from live_recorder import LiveRecorder
+from m3u8_playlist import MediaSegment
+
+
+@pytest.fixture
+def recorder(tmp_path):
+    downloader = SimpleNamespace(
+        temp_dir=str(tmp_path),
+        segment_filename=lambda index: f'segment_{index:05d}.ts',
+        validated_segments={},
+        segment_inits=[],
+        container='ts',
+        log_function=lambda message: None,
+    )
+    recorder = LiveRecorder(downloader, str(tmp_path / 'directo.ts'), max_duration=10)
+    recorder._fd = os.open(recorder.output_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+    yield recorder
+    if recorder._fd is not None:
+        os.close(recorder._fd)
+
+
+def _arrive(recorder, index, duration=4.0):
+    """El follower ve el segmento y el worker lo deja en el directorio temporal"""
+    recorder._track(index, MediaSegment(f'https://cdn.example.com/live/{index}.ts', duration=duration))
+    path = os.path.join(recorder.downloader.temp_dir, recorder.downloader.segment_filename(index))
+    with open(path, 'wb') as f:
+        f.write(bytes([index]) * 188)
+    return path
+
+
+def test_segments_are_appended_and_removed_from_temp_dir(recorder):
+    paths = [_arrive(recorder, index) for index in range(2)]
+    assert recorder.window_size == 2
+
+    recorder._append(0)
+    recorder._append(1)
+
+    with open(recorder.output_path, 'rb') as f:
+        assert f.read() == bytes([0]) * 188 + bytes([1]) * 188
+    assert not any(os.path.exists(path) for path in paths)
+    assert recorder.window_size == 0
+    assert (recorder.segments_recorded, recorder.bytes_written) == (2, 376)
+
+
+def test_failed_segment_is_a_gap_counted_as_lost(recorder):
+    _arrive(recorder, 0)
+    _arrive(recorder, 1, duration=6.0)
+    recorder._append(0)
+
+    recorder._skip(1, 'HTTP 404')
+
+    assert recorder.failed_segments == 1
+    assert recorder.failed_seconds == 6.0
+    assert recorder.window_size == 0
+    assert recorder.snapshot()['lost'] == 1
+
+
+def test_max_duration_requests_stop(recorder):
+    for index in range(3):
+        _arrive(recorder, index)
+
+    recorder._append(0)
+    recorder._append(1)
+    assert not recorder._should_stop()
+    recorder._append(2)
+
+    assert recorder._should_stop()
+    assert recorder.stop_reason == 'duración máxima (10s)'
@@ -0,0 +1,144 @@
+# -*- coding: utf-8 -*-
+"""M3U8Downloader: planificación de peticiones, escritura validada de segmentos y backends de descarga"""
+
+import http.server
+import os
+import threading
+from collections import deque
+
+import pytest
+
+from async_segment_fetcher import AIOHTTP_AVAILABLE
+from m3u8_downloader import RANGE_PART_SIZE, RANGE_SPLIT_THRESHOLD, M3U8Downloader
+from m3u8_playlist import MediaSegment
+
+
+@pytest.fixture
+def downloader(tmp_path):
+    return M3U8Downloader('http://127.0.0.1:9/index.m3u8', output_filename=str(tmp_path / 'out.mp4'),
+                          temp_dir=str(tmp_path / 'segments'), log_function=lambda message: None)
+
+
+def test_fetch_units_are_planned_lazily(downloader):
+    consumed = []
+
+    def work():
+        for index in range(1_000_000):
+            consumed.append(index)
+            yield index, MediaSegment(f'http://127.0.0.1:9/s{index}.ts')
+
+    ordered = deque()
+    units = downloader._plan_fetch_units(work(), ordered_indices=ordered)
+    first = [next(units) for _ in range(3)]
+
+    assert [unit.index for unit in first] == [0, 1, 2]
+    assert first[0].filename == downloader.segment_filename(0)
+    # Solo se planifica lo que se pide, y el orden de playlist avanza con ello
+    assert len(consumed) == 3
+    assert list(ordered) == [0, 1, 2]
+
+
+def test_large_ranged_segment_is_split_into_parts(downloader):
+    size = RANGE_SPLIT_THRESHOLD + RANGE_PART_SIZE // 2
+    big = MediaSegment('http://127.0.0.1:9/movie.ts', 10.0, byte_offset=100, byte_length=size)
+    small = MediaSegment('http://127.0.0.1:9/movie.ts', 10.0, byte_offset=100 + size, byte_length=1000)
+
+    units = list(downloader._plan_fetch_units([(0, big), (1, small)]))
+
+    parts = [unit for unit in units if unit.index == 0]
+    assert len(parts) == -(-size // RANGE_PART_SIZE)
+    assert all(unit.parts == len(parts) and not unit.validate for unit in parts)
+    assert [unit.segment.byte_offset for unit in parts] == [100 + i * RANGE_PART_SIZE for i in range(len(parts))]
+    assert sum(unit.segment.byte_length for unit in parts) == size
+    assert parts[0].filename == downloader.segment_filename(0) + '.part000'
+    # Los segmentos pequeños siguen siendo una única petición validada
+    assert [(unit.index, unit.parts, unit.validate) for unit in units if unit.index == 1] == [(1, 1, True)]
+
+
+class _SegmentHandler(http.server.BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    bodies = {}
+
+    def do_GET(self):
+        body = self.bodies.get(self.path)
+        if body is None:
+            self.send_error(404)
+            return
+        self.send_response(200)
+        self.send_header('Content-Type', 'video/mp2t')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def segment_server():
+    server = http.server.ThreadingHTTPServer(('127.0.0.1', 0), _SegmentHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f'http://127.0.0.1:{server.server_address[1]}'
+    server.shutdown()
+    server.server_close()
+
+
+TS_SEGMENT = b''.join(bytes([0x47, 0x01, 0x00, 0x10 | (cc % 16)]) + b'\xff' * 184 for cc in range(40))
+
+
+def test_segment_is_written_and_validated_in_one_pass(downloader, segment_server):
+    _SegmentHandler.bodies = {'/good.ts': TS_SEGMENT}
+    os.makedirs(downloader.temp_dir)
+
+    result = downloader._download_segment(MediaSegment(f'{segment_server}/good.ts'), 0)
+
+    filename = downloader.segment_filename(0)
+    assert result == (filename, len(TS_SEGMENT))
+    # El tamaño validado queda registrado: la unión no vuelve a abrir ni a consultar el archivo
+    assert downloader.validated_segments[filename] == len(TS_SEGMENT)
+    with open(os.path.join(downloader.temp_dir, filename), 'rb') as f:
+        assert f.read() == TS_SEGMENT
+
+
+def test_invalid_segment_is_cut_and_removed(downloader, segment_server):
+    # Página de error servida con 200 y Content-Type de video
+    _SegmentHandler.bodies = {'/bad.ts': b'<html><body>404 Not Found</body></html>' + b' ' * 64 * 1024}
+    os.makedirs(downloader.temp_dir)
+
+    assert downloader._download_segment(MediaSegment(f'{segment_server}/bad.ts'), 1) is None
+    assert os.listdir(downloader.temp_dir) == []
+    assert downloader.segment_filename(1) not in downloader.validated_segments
+    assert downloader.concurrency.snapshot()['in_flight'] == 0
+
+
+@pytest.mark.parametrize('backend', [
+    'threads',
+    pytest.param('asyncio', marks=pytest.mark.skipif(not AIOHTTP_AVAILABLE, reason='aiohttp no instalado')),
+])
+def test_concurrent_download_reports_completed_and_failed(tmp_path, segment_server, backend):
+    _SegmentHandler.bodies = {f'/s{index}.ts': TS_SEGMENT for index in range(8) if index != 5}
+    downloader = M3U8Downloader(f'{segment_server}/index.m3u8', output_filename=str(tmp_path / 'out.mp4'),
+                                temp_dir=str(tmp_path / 'segments'), max_workers=4, backend=backend,
+                                log_function=lambda message: None)
+    ordered = []
+
+    summary = downloader.download_segments_concurrent(
+        [MediaSegment(f'{segment_server}/s{index}.ts') for index in range(8)],
+        skip_indices={0}, max_attempts=1, on_ordered=ordered.append)
+
+    assert downloader.backend == backend
+    assert sorted(summary['completed']) == [1, 2, 3, 4, 6, 7]
+    assert list(summary['failed']) == [5]
+    # El prefijo ordenado salta el segmento ya descargado y se detiene en el fallido
+    assert ordered == [1, 2, 3, 4]
+    assert downloader.concurrency.snapshot()['in_flight'] == 0
+
+
+@pytest.mark.skipif(AIOHTTP_AVAILABLE, reason='aiohttp instalado')
+def test_asyncio_backend_falls_back_to_threads_without_aiohttp(tmp_path):
+    messages = []
+    downloader = M3U8Downloader('http://127.0.0.1:9/index.m3u8', temp_dir=str(tmp_path / 'segments'),
+                                backend='asyncio', log_function=messages.append)
+
+    assert downloader.backend == 'threads'
+    assert any('aiohttp' in message for message in messages)
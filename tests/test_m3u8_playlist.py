@@ -0,0 +1,140 @@
+# -*- coding: utf-8 -*-
+"""parse_playlist: rangos de bytes (#EXT-X-BYTERANGE), herencia de MAP/KEY, discontinuidades y secuencia"""
+
+from m3u8_playlist import init_sections, parse_playlist
+
+BASE_URL = 'https://cdn.example.com/video/index.m3u8'
+
+
+def test_byterange_without_offset_continues_previous_range():
+    playlist = parse_playlist('\n'.join([
+        '#EXTM3U',
+        '#EXTINF:4.0,',
+        '#EXT-X-BYTERANGE:1000@0',
+        'main.ts',
+        '#EXTINF:4.0,',
+        '#EXT-X-BYTERANGE:500',
+        'main.ts',
+        '#EXTINF:4.0,',
+        '#EXT-X-BYTERANGE:200',
+        'other.ts',
+        '#EXTINF:4.0,',
+        '#EXT-X-BYTERANGE:300',
+        'main.ts',
+    ]), BASE_URL)
+
+    ranges = [(segment.url.rsplit('/', 1)[1], segment.byte_offset, segment.byte_length)
+              for segment in playlist.segments]
+    # El desplazamiento se lleva por recurso: other.ts empieza en 0 sin mover el de main.ts
+    assert ranges == [('main.ts', 0, 1000), ('main.ts', 1000, 500), ('other.ts', 0, 200), ('main.ts', 1500, 300)]
+    assert playlist.segments[1].range_header == 'bytes=1000-1499'
+
+
+def test_segment_without_byterange_is_whole_file():
+    playlist = parse_playlist('#EXTM3U\n#EXTINF:6.0,\nseg0.ts\n', BASE_URL)
+
+    segment = playlist.segments[0]
+    assert segment.url == 'https://cdn.example.com/video/seg0.ts'
+    assert segment.byte_length is None
+    assert segment.range_header is None
+
+
+def test_slice_is_relative_to_the_segment_range():
+    playlist = parse_playlist('#EXTM3U\n#EXTINF:4.0,\n#EXT-X-BYTERANGE:1000@5000\nmain.ts\n', BASE_URL)
+
+    part = playlist.segments[0].slice(200, 300)
+    assert (part.byte_offset, part.byte_length) == (5200, 300)
+    assert part.range_header == 'bytes=5200-5499'
+    assert part.url == playlist.segments[0].url
+
+
+def test_map_and_key_are_inherited_until_replaced():
+    playlist = parse_playlist('\n'.join([
+        '#EXTM3U',
+        '#EXT-X-MAP:URI="init_a.mp4",BYTERANGE="720@0"',
+        '#EXT-X-KEY:METHOD=AES-128,URI="key1.bin",IV=0x000102030405060708090a0b0c0d0e0f',
+        '#EXTINF:4.0,',
+        'frag0.m4s',
+        '#EXTINF:4.0,',
+        'frag1.m4s',
+        '#EXT-X-MAP:URI="init_b.mp4"',
+        '#EXT-X-KEY:METHOD=NONE',
+        '#EXTINF:4.0,',
+        'frag2.m4s',
+    ]), BASE_URL)
+
+    first, second, third = playlist.segments
+    # Los segmentos comparten por referencia el init y la clave en vigor
+    assert first.init is second.init
+    assert first.encryption is second.encryption
+    assert first.init.url.endswith('/init_a.mp4')
+    assert (first.init.byte_offset, first.init.byte_length) == (0, 720)
+    assert first.encryption.uri == 'https://cdn.example.com/video/key1.bin'
+    assert first.encryption.iv_bytes == bytes(range(16))
+    # METHOD=NONE corta el cifrado pero queda registrada
+    assert third.init.url.endswith('/init_b.mp4')
+    assert third.encryption is None
+    assert [key.method for key in playlist.keys] == ['AES-128', 'NONE']
+    assert playlist.has_encryption
+    assert [init.url.rsplit('/', 1)[1] for init in init_sections(playlist.segments)] == ['init_a.mp4', 'init_b.mp4']
+
+
+def test_discontinuity_marks_only_the_next_segment():
+    playlist = parse_playlist('\n'.join([
+        '#EXTM3U',
+        '#EXTINF:4.0,',
+        'a.ts',
+        '#EXT-X-DISCONTINUITY',
+        '#EXTINF:4.0,',
+        'b.ts',
+        '#EXTINF:4.0,',
+        'c.ts',
+    ]), BASE_URL)
+
+    assert [segment.discontinuity for segment in playlist.segments] == [False, True, False]
+
+
+def test_media_sequence_numbers_segments_and_header_fields():
+    playlist = parse_playlist('\n'.join([
+        '#EXTM3U',
+        '#EXT-X-VERSION:7',
+        '#EXT-X-TARGETDURATION:6',
+        '#EXT-X-MEDIA-SEQUENCE:1200',
+        '#EXT-X-PLAYLIST-TYPE:vod',
+        '#EXTINF:5.5,Intro',
+        'a.ts',
+        '#EXTINF:6.0,',
+        'b.ts',
+        '#EXT-X-ENDLIST',
+    ]), BASE_URL)
+
+    assert [segment.sequence for segment in playlist.segments] == [1200, 1201]
+    assert playlist.segments[0].title == 'Intro'
+    assert playlist.version == 7
+    assert playlist.target_duration == 6.0
+    assert playlist.is_vod and playlist.endlist
+    assert playlist.total_duration == 11.5
+
+
+def test_master_playlist_variants_and_renditions():
+    playlist = parse_playlist('\n'.join([
+        '#EXTM3U',
+        '#EXT-X-MEDIA:TYPE=AUDIO,GROUP-ID="aud",NAME="Español",LANGUAGE="es",DEFAULT=YES,URI="audio/es.m3u8"',
+        '#EXT-X-STREAM-INF:BANDWIDTH=2500000,AVERAGE-BANDWIDTH=2000000,RESOLUTION=1280x720,'
+        'CODECS="avc1.4d401f,mp4a.40.2",AUDIO="aud"',
+        '720p/index.m3u8',
+        '#EXT-X-STREAM-INF:BANDWIDTH=800000,RESOLUTION=640x360',
+        '360p/index.m3u8',
+    ]), BASE_URL)
+
+    assert playlist.is_master
+    assert not playlist.segments
+    high, low = playlist.variants
+    assert high.url == 'https://cdn.example.com/video/720p/index.m3u8'
+    assert (high.bandwidth, high.average_bandwidth, high.height) == (2500000, 2000000, 720)
+    assert high.codecs == 'avc1.4d401f,mp4a.40.2'
+    assert high.audio == 'aud'
+    assert low.height == 360
+    rendition = playlist.renditions[0]
+    assert (rendition.type, rendition.group_id, rendition.language, rendition.default) == ('AUDIO', 'aud', 'es', True)
+    assert rendition.uri == 'https://cdn.example.com/video/audio/es.m3u8'
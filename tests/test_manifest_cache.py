@@ -0,0 +1,118 @@
+# -*- coding: utf-8 -*-
+"""ManifestCache: aciertos dentro del TTL, revalidación con 304, TTL en vivo y no-store"""
+
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+import requests
+
+from manifest_cache import ManifestCache
+
+VOD = '#EXTM3U\n#EXT-X-TARGETDURATION:6\n#EXTINF:6.0,\nseg0.ts\n#EXT-X-ENDLIST\n'
+LIVE = '#EXTM3U\n#EXT-X-TARGETDURATION:8\n#EXT-X-MEDIA-SEQUENCE:40\n#EXTINF:8.0,\nseg40.ts\n'
+
+
+class _PlaylistHandler(BaseHTTPRequestHandler):
+    """Sirve playlists con ETag y responde 304 a If-None-Match"""
+
+    def do_GET(self):
+        server = self.server
+        server.requests.append((self.path, self.headers.get('If-None-Match')))
+        body, etag, cache_control = server.routes[self.path]
+        if etag and self.headers.get('If-None-Match') == etag:
+            self.send_response(304)
+            self.end_headers()
+            return
+        data = body.encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/vnd.apple.mpegurl')
+        self.send_header('Content-Length', str(len(data)))
+        if etag:
+            self.send_header('ETag', etag)
+        if cache_control:
+            self.send_header('Cache-Control', cache_control)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def playlist_server():
+    server = ThreadingHTTPServer(('127.0.0.1', 0), _PlaylistHandler)
+    server.requests = []
+    server.routes = {
+        '/vod.m3u8': (VOD, '"v1"', None),
+        '/live.m3u8': (LIVE, '"l1"', None),
+        '/private.m3u8': (VOD, None, 'no-store'),
+        '/short.m3u8': (VOD, None, 'max-age=2'),
+    }
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    base_url = f'http://127.0.0.1:{server.server_address[1]}'
+    with requests.Session() as session:
+        yield server, session, base_url
+    server.shutdown()
+    server.server_close()
+
+
+def test_fresh_entry_is_served_without_a_request(playlist_server):
+    server, session, base_url = playlist_server
+    cache = ManifestCache(ttl=30)
+
+    assert cache.fetch(session, base_url + '/vod.m3u8') == VOD
+    assert cache.fetch(session, base_url + '/vod.m3u8') == VOD
+
+    assert len(server.requests) == 1
+    assert (cache.misses, cache.hits) == (1, 1)
+
+
+def test_max_age_zero_revalidates_with_etag_and_reuses_body(playlist_server):
+    server, session, base_url = playlist_server
+    cache = ManifestCache(ttl=30)
+    cache.fetch(session, base_url + '/vod.m3u8')
+
+    assert cache.fetch(session, base_url + '/vod.m3u8', max_age=0) == VOD
+
+    assert server.requests[-1] == ('/vod.m3u8', '"v1"')
+    assert (cache.misses, cache.revalidated, cache.hits) == (1, 1, 0)
+    assert cache.snapshot()['hit_ratio'] == 0.5
+
+
+def test_live_playlist_expires_at_half_target_duration(playlist_server):
+    _, session, base_url = playlist_server
+    cache = ManifestCache(ttl=30)
+
+    cache.fetch(session, base_url + '/live.m3u8')
+    cache.fetch(session, base_url + '/short.m3u8')
+
+    live = cache._entries[base_url + '/live.m3u8']
+    assert live.expires - live.stored_at == pytest.approx(4.0, abs=0.1)
+    # Cache-Control: max-age acorta el TTL configurado
+    short = cache._entries[base_url + '/short.m3u8']
+    assert short.expires - short.stored_at == pytest.approx(2.0, abs=0.1)
+
+
+def test_no_store_is_never_cached(playlist_server):
+    server, session, base_url = playlist_server
+    cache = ManifestCache(ttl=30)
+
+    cache.fetch(session, base_url + '/private.m3u8')
+    cache.fetch(session, base_url + '/private.m3u8')
+
+    assert len(server.requests) == 2
+    assert cache.snapshot()['entries'] == 0
+
+
+def test_lru_eviction_respects_max_entries(playlist_server):
+    _, session, base_url = playlist_server
+    cache = ManifestCache(ttl=30, max_entries=1)
+
+    cache.fetch(session, base_url + '/vod.m3u8')
+    cache.fetch(session, base_url + '/live.m3u8')
+
+    assert list(cache._entries) == [base_url + '/live.m3u8']
+    assert cache.evictions == 1
+    assert cache.bytes == len(LIVE.encode('utf-8'))
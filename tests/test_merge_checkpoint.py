@@ -0,0 +1,73 @@
+# -*- coding: utf-8 -*-
+"""CheckpointedMerge: checkpoints periódicos, recorte al reanudar y borrado de segmentos unidos"""
+
+import json
+
+from merge_checkpoint import CHECKPOINT_FILENAME, MERGED_FILENAME, CheckpointedMerge
+
+
+def _write_segments(temp_dir, indices, length=188):
+    for index in indices:
+        (temp_dir / f'segment_{index:05d}.ts').write_bytes(bytes([index]) * length)
+
+
+def _merge(temp_dir, total, **kwargs):
+    return CheckpointedMerge(str(temp_dir), total, log_function=lambda message: None, **kwargs)
+
+
+def test_full_merge_commits_and_removes_segments(tmp_path):
+    _write_segments(tmp_path, range(5))
+    merge = _merge(tmp_path, 5, checkpoint_every=2)
+
+    merge.start()
+    for index in (1, 0, 4, 2, 3):
+        merge.mark_ready(index)
+
+    assert merge.close()
+    assert (tmp_path / MERGED_FILENAME).read_bytes() == b''.join(bytes([index]) * 188 for index in range(5))
+    checkpoint = json.loads((tmp_path / CHECKPOINT_FILENAME).read_text(encoding='utf-8'))
+    assert checkpoint['segments'] == 5 and checkpoint['bytes'] == 5 * 188 and checkpoint['total'] == 5
+    assert not list(tmp_path.glob('segment_*.ts'))
+
+
+def test_resume_truncates_to_last_checkpoint(tmp_path):
+    _write_segments(tmp_path, range(3))
+    first = _merge(tmp_path, 6, checkpoint_every=2, remove_merged=False)
+    first.start(ready=[0, 1, 2])
+    # Simular una caída: el hilo escribe pero no se llama a close()
+    first._queue.put(None)
+    first._writer.join()
+    assert first.committed == 2
+    assert (tmp_path / MERGED_FILENAME).stat().st_size == 3 * 188
+
+    resumed = _merge(tmp_path, 6)
+    assert resumed.load() == 2
+    assert (tmp_path / MERGED_FILENAME).stat().st_size == 2 * 188
+
+    _write_segments(tmp_path, range(2, 6))
+    resumed.start(ready=range(6))
+    assert resumed.close()
+    assert (tmp_path / MERGED_FILENAME).read_bytes() == b''.join(bytes([index]) * 188 for index in range(6))
+
+
+def test_checkpoint_is_ignored_when_playlist_length_changes(tmp_path):
+    (tmp_path / MERGED_FILENAME).write_bytes(b'\x00' * 376)
+    (tmp_path / CHECKPOINT_FILENAME).write_text(json.dumps({'segments': 2, 'bytes': 376, 'total': 4}),
+                                                encoding='utf-8')
+
+    merge = _merge(tmp_path, 5)
+    assert merge.load() == 0
+    assert (tmp_path / MERGED_FILENAME).stat().st_size == 0
+    merge.close()
+
+
+def test_missing_segment_stops_merge_without_completing(tmp_path):
+    _write_segments(tmp_path, [0, 2])
+    merge = _merge(tmp_path, 3, checkpoint_every=1)
+
+    merge.start(ready=[0, 1, 2])
+
+    assert not merge.close()
+    assert 'segmento 1' in merge.error
+    # Lo confirmado antes del error sigue siendo válido
+    assert merge.committed == 1
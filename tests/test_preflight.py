@@ -0,0 +1,107 @@
+# -*- coding: utf-8 -*-
+"""Estimación previa: BYTERANGE, HEAD y BANDWIDTH por orden de fiabilidad, y espacio por dispositivo"""
+
+import threading
+from collections import namedtuple
+
+import pytest
+import requests
+
+import preflight
+from m3u8_playlist import MediaSegment
+from preflight import _sample_indices, estimate_download, find_disk_shortage
+
+GB = 1024 ** 3
+
+
+class _HeadSession:
+    """Responde a HEAD con el Content-Length configurado por URL (None = sin cabecera, Exception = error)"""
+
+    def __init__(self, sizes):
+        self.sizes = sizes
+        self.requested = []
+        self._lock = threading.Lock()
+
+    def head(self, url, timeout=None, allow_redirects=False):
+        with self._lock:
+            self.requested.append(url)
+        size = self.sizes.get(url)
+        if isinstance(size, Exception):
+            raise size
+        headers = {'content-length': str(size)} if size is not None else {}
+        return type('Response', (), {'ok': True, 'headers': headers})()
+
+
+def _segments(count, duration=4.0, byte_length=None):
+    return [MediaSegment(f'https://cdn/seg{index}.ts', duration=duration, byte_length=byte_length,
+                         byte_offset=0 if byte_length else None) for index in range(count)]
+
+
+def test_sample_indices_spread_over_playlist():
+    assert _sample_indices(3, 5) == [0, 1, 2]
+    assert _sample_indices(100, 5) == [0, 25, 50, 74, 99]
+    assert _sample_indices(100, 1) == [0]
+
+
+def test_byterange_gives_exact_size_without_requests():
+    session = _HeadSession({})
+
+    estimate = estimate_download(session, _segments(10, byte_length=1000), bandwidth=8000000)
+
+    assert estimate.method == 'byterange'
+    assert estimate.expected_bytes == 10000
+    assert estimate.bytes_per_second == 250
+    assert session.requested == []
+
+
+def test_head_samples_are_extrapolated_by_duration():
+    segments = _segments(100)
+    session = _HeadSession({segment.url: 400000 for segment in segments})
+    # Una muestra falla y otra no anuncia tamaño: solo cuentan las demás
+    session.sizes[segments[0].url] = requests.exceptions.ConnectionError('caído')
+    session.sizes[segments[99].url] = None
+
+    estimate = estimate_download(session, segments, bandwidth=8000000)
+
+    assert estimate.method == 'head'
+    assert estimate.samples == 3
+    assert len(session.requested) == 5
+    assert estimate.bytes_per_second == 100000
+    assert estimate.expected_bytes == pytest.approx(100000 * 400)
+
+
+def test_bandwidth_is_the_last_resort():
+    segments = _segments(10)
+
+    estimate = estimate_download(_HeadSession({}), segments, bandwidth=800000)
+
+    assert estimate.method == 'bandwidth'
+    assert estimate.expected_bytes == 100000 * 40
+    assert estimate.segment_bytes(segments[0]) == 400000
+    # Sin BANDWIDTH ni muestras no hay estimación
+    assert estimate_download(_HeadSession({}), segments, samples=0).method is None
+
+
+_Usage = namedtuple('_Usage', 'total used free')
+
+
+def test_disk_shortage_sums_needs_on_the_same_device(tmp_path, monkeypatch):
+    monkeypatch.setattr(preflight.shutil, 'disk_usage', lambda path: _Usage(100 * GB, 90 * GB, 10 * GB))
+    temp_dir = tmp_path / 'temp_segments'
+    output_dir = tmp_path / 'static' / 'videos'  # Todavía no existe: se mide su primer ancestro
+
+    # Cada uno cabe por separado, pero comparten disco
+    assert find_disk_shortage([(str(temp_dir), 6 * GB)], margin=1.0) is None
+    shortage = find_disk_shortage([(str(temp_dir), 6 * GB), (str(output_dir), 6 * GB)], margin=1.0)
+
+    assert shortage is not None
+    assert str(tmp_path) in shortage
+    assert '12.00 GB' in shortage and '10.00 GB libres' in shortage
+
+
+def test_disk_shortage_applies_margin_and_reserved_space(tmp_path, monkeypatch):
+    monkeypatch.setattr(preflight.shutil, 'disk_usage', lambda path: _Usage(100 * GB, 90 * GB, 10 * GB))
+
+    assert find_disk_shortage([(str(tmp_path), 8 * GB)], margin=1.2) is None
+    assert find_disk_shortage([(str(tmp_path), 9 * GB)], margin=1.2) is not None
+    assert find_disk_shortage([(str(tmp_path), 8 * GB)], min_free_bytes=3 * GB, margin=1.0) is not None
@@ -0,0 +1,99 @@
+# -*- coding: utf-8 -*-
+"""Pistas alternativas: elección de la pista, contenedores crudos, unión WebVTT y comando de mux"""
+
+import asyncio
+import threading
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from adaptive_concurrency import AdaptiveConcurrencyController
+from m3u8_playlist import MediaRendition
+from renditions import merge_webvtt, mux_command, pick_rendition, raw_container_for
+
+RENDITIONS = [
+    MediaRendition('AUDIO', 'aud', 'English', language='en', autoselect=True, uri='https://cdn/en.m3u8'),
+    MediaRendition('AUDIO', 'aud', 'Español', language='es-ES', default=True, uri='https://cdn/es.m3u8'),
+    MediaRendition('AUDIO', 'aud', 'Muxed', language='fr'),  # Sin URI: va en la variante
+    MediaRendition('SUBTITLES', 'subs', 'English', language='en', uri='https://cdn/subs_en.m3u8'),
+]
+
+
+@pytest.mark.parametrize('media_type, group_id, language, expected', [
+    ('AUDIO', 'aud', None, 'Español'),       # DEFAULT antes que AUTOSELECT
+    ('AUDIO', 'aud', 'en', 'English'),       # El idioma pedido manda
+    ('AUDIO', 'aud', 'es', 'Español'),       # Coincide por prefijo (es-ES)
+    ('AUDIO', 'aud', 'fr', 'Español'),       # Sin pista descargable en ese idioma
+    ('SUBTITLES', 'subs', None, 'English'),  # La primera si ninguna tiene marca
+])
+def test_pick_rendition(media_type, group_id, language, expected):
+    assert pick_rendition(RENDITIONS, media_type, group_id, language).name == expected
+
+
+def test_pick_rendition_without_group_or_candidates():
+    assert pick_rendition(RENDITIONS, 'AUDIO', None) is None
+    assert pick_rendition(RENDITIONS, 'AUDIO', 'otro') is None
+
+
+@pytest.mark.parametrize('url, expected', [
+    ('https://cdn/audio/seg1.aac', 'aac'),
+    ('https://cdn/audio/seg1.EC3?token=abc', 'ec3'),
+    ('https://cdn/subs/seg1.vtt', 'webvtt'),
+    ('https://cdn/video/seg1.ts', None),
+    ('https://cdn/video/seg1.m4s', None),
+])
+def test_raw_container_for(url, expected):
+    assert raw_container_for(url) == expected
+
+
+def test_merge_webvtt_keeps_one_header(tmp_path):
+    first = tmp_path / 'a.vtt'
+    second = tmp_path / 'b.vtt'
+    empty = tmp_path / 'c.vtt'
+    first.write_text('WEBVTT\nX-TIMESTAMP-MAP=MPEGTS:900000,LOCAL:00:00:00.000\n\n00:00.000 --> 00:02.000\nHola\n',
+                     encoding='utf-8')
+    second.write_text('WEBVTT\r\n\r\n00:02.000 --> 00:04.000\r\nAdiós\r\n', encoding='utf-8')
+    empty.write_text('WEBVTT\n', encoding='utf-8')
+    output = tmp_path / 'subs.vtt'
+
+    assert merge_webvtt([str(first), str(second), str(empty)], str(output)) == 2
+    assert output.read_text(encoding='utf-8') == ('WEBVTT\n\n00:00.000 --> 00:02.000\nHola\n\n'
+                                                  '00:02.000 --> 00:04.000\nAdiós\n\n')
+
+
+def _track(kind, path, language=None):
+    return SimpleNamespace(kind=kind, output_path=path, rendition=MediaRendition(kind.upper(), 'g', language=language))
+
+
+def test_mux_command_without_tracks_is_plain_remux():
+    assert mux_command(['-i', 'video.ts'], [], 'out.mp4') == ['ffmpeg', '-i', 'video.ts', '-c', 'copy', '-y', 'out.mp4']
+
+
+def test_mux_command_maps_audio_and_subtitle_tracks():
+    tracks = [_track('audio', 'audio.aac'), _track('subtitles', 'subs.vtt', language='es')]
+
+    command = mux_command(['-f', 'mpegts', '-i', 'pipe:0'], tracks, 'out.mp4')
+
+    assert command == ['ffmpeg', '-f', 'mpegts', '-i', 'pipe:0', '-i', 'audio.aac', '-i', 'subs.vtt',
+                       '-map', '0:v', '-map', '0:a?', '-map', '1:a', '-map', '2:s',
+                       '-c', 'copy', '-c:s', 'mov_text', '-metadata:s:s:0', 'language=es',
+                       '-y', 'out.mp4']
+
+
+def test_async_waiter_gets_slot_released_by_rendition_thread():
+    async_segment_fetcher = pytest.importorskip('async_segment_fetcher')
+    pytest.importorskip('aiohttp')
+    concurrency = AdaptiveConcurrencyController(initial_limit=1, min_limit=1, max_limit=1)
+    downloader = SimpleNamespace(concurrency=concurrency, max_workers=1)
+    fetcher = async_segment_fetcher.AsyncSegmentFetcher(downloader)
+    # Un hilo de pista alternativa ocupa el único hueco y lo libera sin pasar por el event loop
+    assert concurrency.try_acquire()
+    threading.Timer(0.2, concurrency.abandon).start()
+
+    start = time.time()
+    asyncio.run(asyncio.wait_for(fetcher._acquire_slot(), timeout=5))
+
+    assert time.time() - start < 1.0
+    # La corrutina se quedó el hueco
+    assert not concurrency.try_acquire()
@@ -0,0 +1,245 @@
+# -*- coding: utf-8 -*-
+"""run_windowed (ventana, orden, consumo perezoso, reordenación, NOT_READY), planificador global y cola de reintentos"""
+
+import random
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+
+import pytest
+
+from segment_scheduler import NOT_READY, DeferredRetryQueue, GlobalSegmentScheduler, run_windowed
+
+
+class _Tracker:
+    """Cuenta las tareas en vuelo y el máximo alcanzado"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.running = 0
+        self.peak = 0
+
+    def task(self, item):
+        with self.lock:
+            self.running += 1
+            self.peak = max(self.peak, self.running)
+        time.sleep(random.uniform(0.001, 0.01))
+        with self.lock:
+            self.running -= 1
+        return item * 10
+
+
+def test_run_windowed_respects_window_and_delivers_in_order():
+    tracker = _Tracker()
+    completed, ordered = [], []
+    with ThreadPoolExecutor(max_workers=16) as executor:
+        stopped = run_windowed(lambda item: executor.submit(tracker.task, item), range(60), window=4,
+                               on_complete=lambda item, result: completed.append((item, result)),
+                               on_ordered=lambda item, result: ordered.append((item, result)))
+
+    assert not stopped
+    assert tracker.peak <= 4
+    assert sorted(completed) == [(i, i * 10) for i in range(60)]
+    # on_ordered entrega en el orden original aunque terminen desordenados
+    assert ordered == [(i, i * 10) for i in range(60)]
+
+
+def test_run_windowed_consumes_items_lazily():
+    pulled = []
+
+    def items():
+        for i in range(1000):
+            pulled.append(i)
+            yield i
+
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        stopped = run_windowed(lambda item: executor.submit(time.sleep, 0.001), items(), window=2,
+                               on_complete=lambda item, result: None,
+                               should_stop=lambda: len(pulled) >= 10, poll_interval=0.01)
+
+    assert stopped
+    # Solo se sacan del iterador los elementos que caben en la ventana
+    assert len(pulled) < 20
+
+
+def test_max_reorder_bounds_items_ahead_of_a_stalled_head():
+    head = Future()
+    submitted = []
+
+    def submit(item):
+        submitted.append(item)
+        if item == 0:
+            return head
+        future = Future()
+        future.set_result(item)
+        return future
+
+    def release_head():
+        # Cuando la ventana ya no puede avanzar, el primer elemento termina
+        time.sleep(0.05)
+        head.set_result(0)
+
+    threading.Thread(target=release_head).start()
+    peak_ahead = []
+    ordered = []
+    run_windowed(submit, range(100), window=8,
+                 on_complete=lambda item, result: peak_ahead.append(len(submitted) - len(ordered)),
+                 on_ordered=lambda item, result: ordered.append(item), max_reorder=5, poll_interval=0.01)
+
+    assert ordered == list(range(100))
+    # Con el primero atascado solo se enviaron max_reorder elementos
+    assert peak_ahead[0] <= 5
+
+
+def test_run_windowed_waits_on_not_ready_items():
+    def live_items():
+        yield 0
+        yield NOT_READY
+        yield NOT_READY
+        yield 1
+        yield NOT_READY
+        yield 2
+
+    ordered = []
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        stopped = run_windowed(lambda item: executor.submit(lambda: item), live_items(), window=2,
+                               on_complete=lambda item, result: None,
+                               on_ordered=lambda item, result: ordered.append(result))
+
+    assert not stopped
+    # NOT_READY no se envía como elemento ni termina la iteración
+    assert ordered == [0, 1, 2]
+
+
+def test_run_windowed_stops_while_source_not_ready():
+    def stalled_items():
+        yield 0
+        while True:
+            yield NOT_READY
+
+    calls = []
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        stopped = run_windowed(lambda item: executor.submit(lambda: item), stalled_items(), window=1,
+                               on_complete=lambda item, result: calls.append(item),
+                               should_stop=lambda: bool(calls), poll_interval=0.01)
+
+    assert stopped
+    assert calls == [0]
+
+
+def _queue_task(job):
+    """Tarea encolada sin pasar por submit (no arranca workers)"""
+    job.queue.append((Future(), lambda: None, (), {}))
+
+
+def test_global_scheduler_runs_tasks_within_budget():
+    scheduler = GlobalSegmentScheduler(budget=3, idle_timeout=0.2)
+    tracker = _Tracker()
+    job = scheduler.register('a')
+
+    futures = [job.submit(tracker.task, i) for i in range(20)]
+
+    assert [future.result(timeout=5) for future in futures] == [i * 10 for i in range(20)]
+    assert tracker.peak <= 3
+    assert scheduler.snapshot()['jobs']['a']['completed'] == 20
+    job.close()
+
+
+def test_fair_policy_weights_running_tasks_by_priority():
+    scheduler = GlobalSegmentScheduler(budget=10, policy='fair')
+    heavy = scheduler.register('heavy', priority=3)
+    light = scheduler.register('light', priority=1)
+    _queue_task(heavy)
+    _queue_task(light)
+
+    heavy.running, light.running = 2, 1
+    assert scheduler._pick_job() is heavy  # 2/3 < 1/1
+    heavy.running = 4
+    assert scheduler._pick_job() is light  # 4/3 > 1/1
+
+
+def test_priority_policy_serves_highest_priority_first():
+    scheduler = GlobalSegmentScheduler(budget=10, policy='priority')
+    high = scheduler.register('high', priority=5)
+    low = scheduler.register('low', priority=1)
+    _queue_task(high)
+    _queue_task(low)
+    high.running = 8
+
+    assert scheduler._pick_job() is high
+
+
+def test_job_capacity_excludes_full_jobs():
+    scheduler = GlobalSegmentScheduler(budget=10)
+    limited = scheduler.register('limited', capacity=lambda: 2)
+    other = scheduler.register('other')
+    _queue_task(limited)
+    _queue_task(other)
+    limited.running, other.running = 2, 5
+
+    assert scheduler._pick_job() is other
+
+
+def test_close_cancels_queued_tasks_and_unregisters():
+    scheduler = GlobalSegmentScheduler(budget=1)
+    job = scheduler.register('a')
+    _queue_task(job)
+    queued = job.queue[0][0]
+
+    job.close()
+
+    assert queued.cancelled()
+    assert 'a' not in scheduler.snapshot()['jobs']
+    assert job.submit(lambda: 1).cancelled()
+    assert not scheduler.set_priority('a', 3)
+
+
+def test_backoff_delay_grows_exponentially_with_jitter():
+    retries = DeferredRetryQueue(base_delay=1.0, max_delay=30.0)
+
+    for attempts_done, ceiling in [(1, 1.0), (2, 2.0), (3, 4.0), (6, 30.0), (10, 30.0)]:
+        for _ in range(20):
+            # "Equal jitter": entre la mitad del techo y el techo
+            assert ceiling / 2 <= retries.backoff_delay(attempts_done) <= ceiling
+
+
+def test_defer_returns_none_once_attempts_are_exhausted():
+    retries = DeferredRetryQueue(max_attempts=3, base_delay=0.01)
+
+    assert retries.defer('seg-1', attempts_done=1) is not None
+    assert retries.defer('seg-2', attempts_done=2) is not None
+    assert retries.defer('seg-3', attempts_done=3) is None
+
+    assert len(retries) == 2
+    assert retries.deferred_total == 2
+
+
+def test_pop_due_returns_items_in_due_order():
+    retries = DeferredRetryQueue(max_attempts=5, base_delay=0.01)
+    assert retries.next_due_in() is None
+
+    retries.defer('late', attempts_done=3)   # 0.02-0.04 s
+    retries.defer('early', attempts_done=1)  # 0.005-0.01 s
+    assert retries.pop_due() == []
+    assert 0 < retries.next_due_in() <= 0.01
+
+    time.sleep(0.05)
+    assert retries.next_due_in() == 0.0
+    assert retries.pop_due() == ['early', 'late']
+    assert len(retries) == 0
+
+
+def test_drain_empties_queue_in_due_order():
+    retries = DeferredRetryQueue(base_delay=10.0, max_delay=100.0)
+    retries.defer('second', attempts_done=3)
+    retries.defer('first', attempts_done=1)
+
+    assert retries.drain() == ['first', 'second']
+    assert len(retries) == 0
+    assert retries.next_due_in() is None
+
+
+@pytest.mark.parametrize('attempts_done', [0, -1])
+def test_backoff_delay_handles_first_attempt(attempts_done):
+    retries = DeferredRetryQueue(base_delay=2.0)
+    assert 1.0 <= retries.backoff_delay(attempts_done) <= 2.0
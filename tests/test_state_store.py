@@ -0,0 +1,155 @@
+# -*- coding: utf-8 -*-
+"""DownloadStateStore: persistencia incremental de segmentos, recarga e importación del JSON anterior"""
+
+import json
+import sqlite3
+
+import pytest
+
+from state_store import DownloadStateStore
+
+
+@pytest.fixture
+def db_path(tmp_path, monkeypatch):
+    # download_state.json se busca en el directorio actual: aislarlo del repositorio
+    monkeypatch.chdir(tmp_path)
+    return str(tmp_path / 'state.db')
+
+
+def reopen(path):
+    store = DownloadStateStore(path)
+    try:
+        return store.load()
+    finally:
+        store.close()
+
+
+def segment_rows(path, download_id):
+    with sqlite3.connect(path) as conn:
+        return [row[0] for row in conn.execute(
+            'SELECT idx FROM segments WHERE download_id = ? ORDER BY idx', (download_id,))]
+
+
+def test_sync_and_load_round_trip(db_path):
+    store = DownloadStateStore(db_path)
+    downloads = {'a': {'status': 'downloading', 'current': 3, 'downloaded_segments': [0, 1, 2]},
+                 'b': {'status': 'done', 'downloaded_segments': []}}
+    queue = [{'url': 'https://example.com/x.m3u8', 'output_name': 'x'}]
+
+    assert store.sync(downloads, queue, True) == 2
+    store.close()
+
+    loaded, loaded_queue, running = reopen(db_path)
+    assert loaded == downloads
+    assert loaded_queue == queue
+    assert running is True
+    # sync no modifica el dict de progreso
+    assert downloads['a']['downloaded_segments'] == [0, 1, 2]
+
+
+def test_unchanged_rows_are_not_rewritten(db_path):
+    store = DownloadStateStore(db_path)
+    downloads = {'a': {'status': 'downloading', 'downloaded_segments': [0]}}
+
+    assert store.sync(downloads, [], False) == 1
+    assert store.sync(downloads, [], False) == 0
+    downloads['a']['status'] = 'done'
+    assert store.sync(downloads, [], False) == 1
+    store.close()
+
+
+def test_appended_segments_are_persisted_incrementally(db_path):
+    store = DownloadStateStore(db_path)
+    segments = [0, 1]
+    downloads = {'a': {'status': 'downloading', 'downloaded_segments': segments}}
+    store.sync(downloads, [], False)
+
+    segments.extend([2, 5])
+    store.sync(downloads, [], False)
+    assert segment_rows(db_path, 'a') == [0, 1, 2, 5]
+
+    # Otra conexión borra una fila: si se reescribiera la lista entera volvería a aparecer
+    with sqlite3.connect(db_path) as conn:
+        conn.execute("DELETE FROM segments WHERE download_id = 'a' AND idx = 0")
+    segments.append(6)
+    store.sync(downloads, [], False)
+    assert segment_rows(db_path, 'a') == [1, 2, 5, 6]
+    store.close()
+
+
+def test_replaced_or_shortened_list_is_rewritten(db_path):
+    store = DownloadStateStore(db_path)
+    downloads = {'a': {'status': 'downloading', 'downloaded_segments': [0, 1, 2, 3]}}
+    store.sync(downloads, [], False)
+
+    # Reanudación: la lista se sustituye por una nueva con menos segmentos
+    downloads['a']['downloaded_segments'] = [0, 2]
+    store.sync(downloads, [], False)
+    assert segment_rows(db_path, 'a') == [0, 2]
+
+    segments = downloads['a']['downloaded_segments']
+    del segments[1:]
+    store.sync(downloads, [], False)
+    assert segment_rows(db_path, 'a') == [0]
+    store.close()
+
+
+def test_removed_downloads_are_deleted(db_path):
+    store = DownloadStateStore(db_path)
+    downloads = {'a': {'downloaded_segments': [0, 1]}, 'b': {'downloaded_segments': [4]}}
+    store.sync(downloads, [], False)
+
+    del downloads['a']
+    store.sync(downloads, [], False)
+    store.close()
+
+    loaded, _, _ = reopen(db_path)
+    assert list(loaded) == ['b']
+    assert segment_rows(db_path, 'a') == []
+
+
+def test_add_segment_then_sync_keeps_both(db_path):
+    store = DownloadStateStore(db_path)
+    segments = [0]
+    downloads = {'a': {'status': 'downloading', 'downloaded_segments': segments}}
+    store.sync(downloads, [], False)
+
+    store.add_segment('a', 7)
+    segments.append(1)
+    store.sync(downloads, [], False)
+    store.close()
+
+    loaded, _, _ = reopen(db_path)
+    assert loaded['a']['downloaded_segments'] == [0, 1, 7]
+
+
+def test_loaded_lists_continue_incrementally(db_path):
+    store = DownloadStateStore(db_path)
+    store.sync({'a': {'downloaded_segments': [0, 1]}}, [], False)
+    store.close()
+
+    store = DownloadStateStore(db_path)
+    downloads, queue, running = store.load()
+    assert (queue, running) == ([], False)
+    downloads['a']['downloaded_segments'].append(2)
+    assert store.sync(downloads, queue, running) == 0
+    store.close()
+    assert segment_rows(db_path, 'a') == [0, 1, 2]
+
+
+def test_legacy_json_is_imported_into_new_database(db_path, tmp_path):
+    legacy = {'multi_progress': {'old': {'status': 'error', 'downloaded_segments': [3, 4]}},
+              'download_queue': [{'url': 'u'}], 'queue_running': False}
+    (tmp_path / 'download_state.json').write_text(json.dumps(legacy), encoding='utf-8')
+
+    store = DownloadStateStore(db_path)
+    assert store.legacy_imported
+    store.close()
+
+    loaded, queue, running = reopen(db_path)
+    assert loaded == legacy['multi_progress']
+    assert queue == [{'url': 'u'}] and running is False
+    # Una base ya existente no vuelve a importar
+    store = DownloadStateStore(db_path)
+    assert not store.legacy_imported
+    store.close()
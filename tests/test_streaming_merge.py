@@ -0,0 +1,82 @@
+# -*- coding: utf-8 -*-
+"""StreamingMerger: prefijo contiguo en orden, cierre con finish y limpieza con abort"""
+
+import subprocess
+
+import pytest
+
+import streaming_merge
+from streaming_merge import StreamingMerger
+
+_REAL_POPEN = subprocess.Popen
+
+
+@pytest.fixture
+def cat_ffmpeg(monkeypatch):
+    """Sustituye ffmpeg por un `cat` que escribe stdin en la ruta de salida"""
+    def fake_popen(command, **kwargs):
+        return _REAL_POPEN(['sh', '-c', 'cat > "$1"', 'sh', command[-1]], **kwargs)
+    monkeypatch.setattr(streaming_merge.subprocess, 'Popen', fake_popen)
+
+
+def _write_segments(temp_dir, count):
+    for index in range(count):
+        (temp_dir / f'segment_{index:05d}.ts').write_bytes(bytes([index]) * 188)
+
+
+def test_segments_are_fed_in_playlist_order(tmp_path, cat_ffmpeg):
+    _write_segments(tmp_path, 4)
+    output = tmp_path / 'out.mp4'
+    merger = StreamingMerger(str(output), str(tmp_path), total=4, log_function=lambda message: None)
+
+    assert merger.start()
+    for index in (2, 0, 3):
+        merger.mark_ready(index)
+    # Sin el segmento 1 el prefijo contiguo se detiene en el 0
+    assert not merger.complete
+    merger.mark_ready(1)
+
+    assert merger.complete
+    assert merger.finish()
+    assert merger.fed == 4
+    assert output.read_bytes() == b''.join(bytes([index]) * 188 for index in range(4))
+
+
+def test_segments_already_on_disk_form_the_initial_prefix(tmp_path, cat_ffmpeg):
+    _write_segments(tmp_path, 3)
+    merger = StreamingMerger(str(tmp_path / 'out.mp4'), str(tmp_path), total=3, ready=[0, 1, 2],
+                             log_function=lambda message: None)
+
+    assert merger.start()
+    assert merger.complete
+    assert merger.finish()
+    assert merger.fed == 3
+
+
+def test_finish_with_a_gap_aborts_and_removes_partial_output(tmp_path, cat_ffmpeg):
+    _write_segments(tmp_path, 3)
+    output = tmp_path / 'out.mp4'
+    merger = StreamingMerger(str(output), str(tmp_path), total=3, log_function=lambda message: None)
+
+    assert merger.start()
+    merger.mark_ready(0)
+    merger.mark_ready(2)
+
+    assert not merger.finish()
+    assert 'faltan 2 segmentos' in merger.error
+    assert not output.exists()
+    # Los segmentos se conservan para la unión clásica
+    assert (tmp_path / 'segment_00002.ts').exists()
+
+
+def test_start_reports_failure_when_ffmpeg_is_missing(tmp_path, monkeypatch):
+    def missing(command, **kwargs):
+        raise FileNotFoundError(command[0])
+    monkeypatch.setattr(streaming_merge.subprocess, 'Popen', missing)
+    messages = []
+    merger = StreamingMerger(str(tmp_path / 'out.mp4'), str(tmp_path), total=1, log_function=messages.append)
+
+    assert not merger.start()
+    assert 'No se pudo iniciar ffmpeg' in merger.error
+    assert not merger.finish()
+    assert any('desactivada' in message for message in messages)
@@ -0,0 +1,83 @@
+# -*- coding: utf-8 -*-
+"""concat_ts_segments: unión byte a byte, tamaños reales y cambio de método de copia"""
+
+import errno
+import os
+
+import pytest
+
+import ts_concat
+from ts_concat import append_segment, concat_ts_segments
+
+
+def _segments(tmp_path, lengths):
+    paths = []
+    for index, length in enumerate(lengths):
+        path = tmp_path / f'segment_{index:05d}.ts'
+        path.write_bytes(bytes([0x47]) + bytes([index]) * (length - 1))
+        paths.append(str(path))
+    return paths
+
+
+def _expected(paths):
+    return b''.join(open(path, 'rb').read() for path in paths)
+
+
+@pytest.mark.parametrize('copy_file_range, sendfile', [
+    (ts_concat.COPY_FILE_RANGE_AVAILABLE, ts_concat.SENDFILE_AVAILABLE),
+    (False, ts_concat.SENDFILE_AVAILABLE),
+    (False, False),
+])
+def test_concat_matches_segments_in_order(tmp_path, monkeypatch, copy_file_range, sendfile):
+    monkeypatch.setattr(ts_concat, 'COPY_FILE_RANGE_AVAILABLE', copy_file_range)
+    monkeypatch.setattr(ts_concat, 'SENDFILE_AVAILABLE', sendfile)
+    paths = _segments(tmp_path, [188, 376, 1, 188 * 7])
+    output = tmp_path / 'out.ts'
+
+    written = concat_ts_segments(paths, str(output))
+
+    assert written == 188 + 376 + 1 + 188 * 7
+    assert output.read_bytes() == _expected(paths)
+
+
+def test_stale_sizes_are_corrected_by_the_real_length(tmp_path):
+    paths = _segments(tmp_path, [188, 188])
+    output = tmp_path / 'out.ts'
+
+    # Los tamaños conocidos exceden a los reales: la salida se recorta a lo copiado
+    written = concat_ts_segments(paths, str(output), sizes=[188, 1000])
+
+    assert written == 376
+    assert output.read_bytes() == _expected(paths)
+
+
+@pytest.mark.skipif(not ts_concat.COPY_FILE_RANGE_AVAILABLE, reason='sin os.copy_file_range')
+def test_unsupported_kernel_copy_falls_back_and_logs(tmp_path, monkeypatch):
+    def unsupported(*args, **kwargs):
+        raise OSError(errno.EXDEV, 'cross-device')
+    monkeypatch.setattr(ts_concat.os, 'copy_file_range', unsupported)
+    paths = _segments(tmp_path, [188, 188, 188])
+    output = tmp_path / 'out.ts'
+    messages = []
+
+    concat_ts_segments(paths, str(output), log_function=messages.append)
+
+    assert output.read_bytes() == _expected(paths)
+    # Solo se avisa una vez: el método se cambia para el resto de segmentos
+    warnings = [message for message in messages if 'no disponible' in message]
+    assert len(warnings) == 1
+    assert 'copy_file_range' in warnings[0]
+    assert 'método: sendfile' in messages[-1]
+
+
+def test_append_segment_writes_at_offset(tmp_path):
+    paths = _segments(tmp_path, [188, 188])
+    output = tmp_path / 'out.ts'
+    fd = os.open(str(output), os.O_RDWR | os.O_CREAT | os.O_TRUNC, 0o644)
+    try:
+        assert append_segment(fd, paths[1], 188) == 188
+        assert append_segment(fd, paths[0], 0) == 188
+    finally:
+        os.close(fd)
+
+    assert output.read_bytes() == _expected(paths)
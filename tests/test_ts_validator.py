@@ -0,0 +1,102 @@
+# -*- coding: utf-8 -*-
+"""validate_ts_bytes: sync, contadores de continuidad y detección de PAT/PMT (con y sin NumPy)"""
+
+import pytest
+
+import ts_validator
+from ts_validator import TS_PACKET_SIZE, find_sync_offset, validate_ts_bytes
+
+PMT_PID = 0x1000
+VIDEO_PID = 0x0100
+
+
+def ts_packet(pid, cc, payload_start=False, discontinuity=False):
+    """Paquete TS de 188 bytes con payload (y campo de adaptación si se marca discontinuidad)"""
+    header = bytes([0x47, (0x40 if payload_start else 0) | (pid >> 8), pid & 0xFF])
+    if discontinuity:
+        body = bytes([0x30 | cc, 1, 0x80])
+    else:
+        body = bytes([0x10 | cc])
+    packet = header + body
+    return packet + b'\xff' * (TS_PACKET_SIZE - len(packet))
+
+
+def pat_packet(pmt_pid=PMT_PID, cc=0):
+    """PAT con un programa que anuncia pmt_pid"""
+    section = bytes([0x00, 0xB0, 13, 0x00, 0x01, 0xC1, 0x00, 0x00,
+                     0x00, 0x01, 0xE0 | (pmt_pid >> 8), pmt_pid & 0xFF]) + b'\x00' * 4
+    packet = bytes([0x47, 0x40, 0x00, 0x10 | cc, 0x00]) + section
+    return packet + b'\xff' * (TS_PACKET_SIZE - len(packet))
+
+
+def segment(video_ccs, with_pat=True, with_pmt=True):
+    packets = []
+    if with_pat:
+        packets.append(pat_packet())
+    if with_pmt:
+        packets.append(ts_packet(PMT_PID, 0, payload_start=True))
+    packets += [ts_packet(VIDEO_PID, cc) for cc in video_ccs]
+    return b''.join(packets)
+
+
+@pytest.fixture(params=[False, True], ids=['python', 'numpy'])
+def scanner(request, monkeypatch):
+    if request.param and not ts_validator.NUMPY_AVAILABLE:
+        pytest.skip('NumPy no instalado')
+    monkeypatch.setattr(ts_validator, 'NUMPY_AVAILABLE', request.param)
+
+
+def test_valid_segment_has_tables_and_continuous_counters(scanner):
+    report = validate_ts_bytes(segment([i % 16 for i in range(40)]))
+
+    assert report['valid'], report['reason']
+    assert report['has_pat'] and report['has_pmt']
+    assert report['packets'] == 42
+    assert report['cc_errors'] == 0 and report['sync_errors'] == 0
+
+
+def test_continuity_counter_gaps_are_counted(scanner):
+    ccs = [0, 1, 2, 5, 6, 7, 11, 12, 0, 1]  # Tres saltos
+    report = validate_ts_bytes(segment(ccs))
+
+    assert report['cc_errors'] == 3
+    assert not report['valid']
+    assert 'continuidad' in report['reason']
+
+
+def test_repeated_counter_and_signalled_discontinuity_are_allowed(scanner):
+    data = segment([0, 1, 1, 2]) + ts_packet(VIDEO_PID, 9, discontinuity=True) + ts_packet(VIDEO_PID, 10)
+    report = validate_ts_bytes(data)
+
+    assert report['cc_errors'] == 0
+    assert report['valid'], report['reason']
+
+
+def test_missing_pat_or_pmt(scanner):
+    without_pat = validate_ts_bytes(segment(range(10), with_pat=False))
+    without_pmt = validate_ts_bytes(segment(range(10), with_pmt=False))
+
+    assert without_pat['reason'] == 'sin PAT' and not without_pat['valid']
+    assert without_pmt['has_pat'] and not without_pmt['has_pmt']
+    assert without_pmt['reason'] == 'sin PMT'
+    # Sin exigir tablas el mismo segmento es válido
+    assert validate_ts_bytes(segment(range(10), with_pat=False), require_tables=False)['valid']
+
+
+def test_pmt_must_be_the_pid_announced_by_pat(scanner):
+    data = pat_packet(pmt_pid=0x1001) + ts_packet(PMT_PID, 0, payload_start=True) + ts_packet(VIDEO_PID, 0)
+    report = validate_ts_bytes(data)
+
+    assert report['has_pat'] and not report['has_pmt']
+
+
+def test_leading_garbage_is_skipped_by_sync_offset(scanner):
+    data = b'\x00\x11garbage' + segment(range(12))
+
+    assert find_sync_offset(data) == 9
+    assert validate_ts_bytes(data)['valid']
+
+
+def test_non_ts_data_is_rejected(scanner):
+    assert validate_ts_bytes(b'\x00' * 50)['reason'] == 'menos de un paquete TS'
+    assert validate_ts_bytes(b'<html>' + b'\x00' * 1000)['reason'] == 'sin sync byte 0x47 cada 188 bytes'
@@ -0,0 +1,59 @@
+# -*- coding: utf-8 -*-
+"""Selección de variante: por altura, best/worst y la mejor que cabe en el presupuesto de tiempo"""
+
+import pytest
+
+from m3u8_playlist import VariantStream
+from variant_selector import quality_height, select_for_throughput, select_variant
+
+VARIANTS = [
+    VariantStream('720p.m3u8', bandwidth=3000000, resolution='1280x720'),
+    VariantStream('1080p.m3u8', bandwidth=6000000, resolution='1920x1080'),
+    VariantStream('360p.m3u8', bandwidth=800000, resolution='640x360'),
+]
+
+
+def _name(variant):
+    return variant.url.split('.')[0]
+
+
+@pytest.mark.parametrize('quality, expected', [
+    ('best', '1080p'),
+    ('auto', '1080p'),
+    ('worst', '360p'),
+    ('720p', '720p'),
+    ('900', '720p'),
+    ('2160p', '1080p'),
+    ('240p', '360p'),  # Todas superan la altura: la más baja
+])
+def test_select_variant_by_quality(quality, expected):
+    assert _name(select_variant(VARIANTS, quality)) == expected
+
+
+def test_select_variant_without_resolution_falls_back_to_bandwidth():
+    variants = [VariantStream('a.m3u8', bandwidth=500000), VariantStream('b.m3u8', bandwidth=900000)]
+
+    assert _name(select_variant(variants, '480p')) == 'b'
+    with pytest.raises(ValueError):
+        select_variant([], 'best')
+
+
+def test_quality_height_parsing():
+    assert quality_height('1080p') == 1080
+    assert quality_height(' 720 ') == 720
+    assert quality_height('best') is None
+
+
+def test_select_for_throughput_picks_best_variant_within_budget():
+    # 1 MB/s medido -> 0,8 MB/s planificado; 10 minutos de contenido
+    variant, estimate = select_for_throughput(VARIANTS, throughput=1000000, content_seconds=600, time_budget=300)
+
+    assert _name(variant) == '720p'
+    assert estimate == pytest.approx(281.25)
+
+
+def test_select_for_throughput_returns_lowest_when_nothing_fits():
+    variant, estimate = select_for_throughput(VARIANTS, throughput=1000000, content_seconds=600, time_budget=10)
+
+    assert _name(variant) == '360p'
+    assert estimate == pytest.approx(75.0)
@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Concatenación Binaria de Segmentos MPEG-TS
+==========================================
+
+Los segmentos MPEG-TS de una playlist HLS se pueden unir byte a byte: el
+resultado es un único .ts reproducible. Esta etapa lo hace con copias en el
+kernel (os.copy_file_range, o os.sendfile como alternativa) sobre un archivo
+prealocado, sin pasar los datos por Python ni abrir miles de entradas en
+ffmpeg. Si se pide MP4, ffmpeg recibe después ese único .ts como entrada.
+"""
+
+import os
+import shutil
+from typing import Callable, List, Optional, Sequence
+
+# Bytes por llamada al kernel (copy_file_range/sendfile pueden copiar menos de lo pedido)
+COPY_CHUNK_SIZE = 64 * 1024 * 1024
+
+COPY_FILE_RANGE_AVAILABLE = hasattr(os, 'copy_file_range')
+SENDFILE_AVAILABLE = hasattr(os, 'sendfile')
+
+
+def _preallocate(fd: int, size: int) -> None:
+    """Reserva el espacio del archivo final de una vez (menos fragmentación, ENOSPC temprano)"""
+    if size <= 0:
+        return
+    if hasattr(os, 'posix_fallocate'):
+        try:
+            os.posix_fallocate(fd, 0, size)
+            return
+        except OSError:
+            pass  # Sistemas de archivos sin soporte (p. ej. algunos montajes de red)
+    os.ftruncate(fd, size)
+
+
+def _copy_kernel(src_fd: int, dst_fd: int, offset: int, size: int, method: str) -> int:
+    """Copia size bytes de src_fd a dst_fd en offset; devuelve los bytes copiados"""
+    copied = 0
+    while copied < size:
+        count = min(COPY_CHUNK_SIZE, size - copied)
+        if method == 'copy_file_range':
+            sent = os.copy_file_range(src_fd, dst_fd, count, copied, offset + copied)
+        else:
+            os.lseek(dst_fd, offset + copied, os.SEEK_SET)
+            sent = os.sendfile(dst_fd, src_fd, copied, count)
+        if sent == 0:
+            break  # El origen es más corto de lo esperado
+        copied += sent
+    return copied
+
+
+def _copy_userspace(src_fd: int, dst_fd: int, offset: int) -> int:
+    os.lseek(dst_fd, offset, os.SEEK_SET)
+    with os.fdopen(os.dup(src_fd), 'rb') as src, os.fdopen(os.dup(dst_fd), 'wb', closefd=True) as dst:
+        src.seek(0)
+        before = dst.tell()
+        shutil.copyfileobj(src, dst, 1024 * 1024)
+        dst.flush()
+        return dst.tell() - before
+
+
+def append_segment(dst_fd: int, segment_path: str, offset: int, size: Optional[int] = None) -> int:
+    """
+    Copia un segmento en dst_fd a partir de offset (copy_file_range -> sendfile -> espacio de usuario).
+
+    Returns:
+        int: Bytes copiados
+    """
+    if size is None:
+        size = os.path.getsize(segment_path)
+    methods = [method for method, available in (('copy_file_range', COPY_FILE_RANGE_AVAILABLE),
+                                                ('sendfile', SENDFILE_AVAILABLE)) if available]
+    src_fd = os.open(segment_path, os.O_RDONLY | getattr(os, 'O_BINARY', 0))
+    try:
+        for method in methods:
+            try:
+                return _copy_kernel(src_fd, dst_fd, offset, size, method)
+            except OSError:
+                continue  # El sistema de archivos no lo soporta: probar el siguiente método
+        return _copy_userspace(src_fd, dst_fd, offset)
+    finally:
+        os.close(src_fd)
+
+
+def concat_ts_segments(segment_paths: Sequence[str], output_path: str,
+                       sizes: Optional[Sequence[int]] = None,
+                       log_function: Optional[Callable[[str], None]] = None) -> int:
+    """
+    Une segmentos MPEG-TS en un único archivo con copias en el kernel.
+
+    Args:
+        segment_paths: Rutas de los segmentos en orden de playlist
+        output_path: Archivo .ts de salida (se sobrescribe)
+        sizes: Tamaños ya conocidos de cada segmento (evita un stat por archivo)
+        log_function: Función de logging
+
+    Returns:
+        int: Bytes escritos en output_path
+    """
+    log = log_function or (lambda message: None)
+    if sizes is None:
+        sizes = [os.path.getsize(path) for path in segment_paths]
+    total = sum(sizes)
+
+    methods: List[str] = []
+    if COPY_FILE_RANGE_AVAILABLE:
+        methods.append('copy_file_range')
+    if SENDFILE_AVAILABLE:
+        methods.append('sendfile')
+    method = methods.pop(0) if methods else 'userspace'
+
+    dst_fd = os.open(output_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC | getattr(os, 'O_BINARY', 0), 0o644)
+    offset = 0
+    try:
+        _preallocate(dst_fd, total)
+        for path, size in zip(segment_paths, sizes):
+            src_fd = os.open(path, os.O_RDONLY | getattr(os, 'O_BINARY', 0))
+            try:
+                while True:
+                    if method == 'userspace':
+                        copied = _copy_userspace(src_fd, dst_fd, offset)
+                        break
+                    try:
+                        copied = _copy_kernel(src_fd, dst_fd, offset, size, method)
+                        break
+                    except OSError as e:
+                        # EXDEV/EINVAL/ENOSYS: el sistema de archivos no lo soporta, probar el siguiente método
+                        fallback = methods.pop(0) if methods else 'userspace'
+                        log(f"⚠️ {method} no disponible ({e}); usando {fallback}")
+                        method = fallback
+            finally:
+                os.close(src_fd)
+            offset += copied
+        # El tamaño real manda si algún segmento cambió desde que se midió
+        os.ftruncate(dst_fd, offset)
+    finally:
+        os.close(dst_fd)
+
+    log(f"🧩 {len(sizes)} segmentos concatenados en {output_path} ({offset / (1024 * 1024):.1f} MB, método: {method})")
+    return offset
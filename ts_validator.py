@@ -0,0 +1,233 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Validador Rápido de Paquetes MPEG-TS
+====================================
+
+Sustituye a las llamadas a ffprobe por segmento (un subproceso de hasta 5 s
+cada uno) y al simple "¿hay un 0x47 en los 4 primeros bytes?":
+
+- Sync byte 0x47 en cada paquete de 188 bytes
+- Contadores de continuidad por PID (con duplicados y discontinuidades permitidos)
+- Presencia de PAT (PID 0) y de la PMT que anuncia
+
+Trabaja sobre memoryview (o NumPy si está instalado) y reparte muchos
+archivos en un pool de procesos.
+"""
+
+import mmap
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional, Sequence, Set
+
+try:
+    import numpy as np
+    NUMPY_AVAILABLE = True
+except ImportError:
+    NUMPY_AVAILABLE = False
+
+TS_PACKET_SIZE = 188
+SYNC_BYTE = 0x47
+PAT_PID = 0x0000
+NULL_PID = 0x1FFF
+# Fracción de paquetes con sync incorrecto o saltos de continuidad que se tolera
+DEFAULT_MAX_ERROR_RATIO = 0.01
+# Por debajo de este número de archivos no compensa arrancar procesos
+MIN_FILES_FOR_POOL = 32
+
+
+def find_sync_offset(data, probe_packets: int = 4) -> Optional[int]:
+    """Desplazamiento (0..187) en el que el sync byte se repite cada 188 bytes, o None"""
+    view = memoryview(data)
+    available = len(view)
+    for offset in range(min(TS_PACKET_SIZE, available)):
+        if view[offset] != SYNC_BYTE:
+            continue
+        packets = min(probe_packets, (available - offset - 1) // TS_PACKET_SIZE + 1)
+        if all(view[offset + i * TS_PACKET_SIZE] == SYNC_BYTE for i in range(packets)):
+            return offset
+    return None
+
+
+def _payload_start(packet) -> Optional[int]:
+    """Inicio del payload dentro del paquete (None si no tiene payload)"""
+    adaptation = (packet[3] >> 4) & 0x3
+    if not adaptation & 0x1:
+        return None
+    start = 4
+    if adaptation & 0x2:
+        start += 1 + packet[4]
+    return start if start < TS_PACKET_SIZE else None
+
+
+def _parse_pat(packet) -> Set[int]:
+    """PIDs de PMT anunciados en una sección PAT que empieza en este paquete"""
+    start = _payload_start(packet)
+    if start is None:
+        return set()
+    start += 1 + packet[start]  # pointer_field
+    if start + 8 > TS_PACKET_SIZE or packet[start] != 0x00:
+        return set()
+    section_length = ((packet[start + 1] & 0x0F) << 8) | packet[start + 2]
+    end = min(start + 3 + section_length - 4, TS_PACKET_SIZE)  # Sin CRC32
+    pmt_pids = set()
+    for position in range(start + 8, end - 3, 4):
+        program_number = (packet[position] << 8) | packet[position + 1]
+        if program_number != 0:  # 0 = NIT
+            pmt_pids.add(((packet[position + 2] & 0x1F) << 8) | packet[position + 3])
+    return pmt_pids
+
+
+def _has_discontinuity(packet) -> bool:
+    return bool((packet[3] & 0x20) and packet[4] > 0 and packet[5] & 0x80)
+
+
+def _scan_python(view: memoryview, offset: int, packets: int):
+    """Recorrido paquete a paquete sobre memoryview (sin dependencias)"""
+    sync_errors = 0
+    cc_errors = 0
+    last_cc: Dict[int, int] = {}
+    pids: Set[int] = set()
+    pat_packets = []
+    for i in range(packets):
+        base = offset + i * TS_PACKET_SIZE
+        if view[base] != SYNC_BYTE:
+            sync_errors += 1
+            continue
+        pid = ((view[base + 1] & 0x1F) << 8) | view[base + 2]
+        pids.add(pid)
+        if pid == PAT_PID and view[base + 1] & 0x40 and len(pat_packets) < 4:
+            pat_packets.append(view[base:base + TS_PACKET_SIZE])
+        if pid == NULL_PID or not (view[base + 3] & 0x10):
+            continue  # Sin payload: el contador no avanza
+        cc = view[base + 3] & 0x0F
+        previous = last_cc.get(pid)
+        if previous is not None and cc != (previous + 1) & 0x0F and cc != previous:
+            if not _has_discontinuity(view[base:base + TS_PACKET_SIZE]):
+                cc_errors += 1
+        last_cc[pid] = cc
+    return sync_errors, cc_errors, pids, pat_packets
+
+
+def _scan_numpy(data, offset: int, packets: int):
+    """Mismo recorrido vectorizado con NumPy"""
+    table = np.frombuffer(data, dtype=np.uint8, count=packets * TS_PACKET_SIZE, offset=offset)
+    table = table.reshape(packets, TS_PACKET_SIZE)
+    synced = table[:, 0] == SYNC_BYTE
+    sync_errors = int(packets - np.count_nonzero(synced))
+    table = table[synced]
+
+    pid = ((table[:, 1].astype(np.uint16) & 0x1F) << 8) | table[:, 2]
+    pids = set(np.unique(pid).tolist())
+    pat_rows = np.nonzero((pid == PAT_PID) & ((table[:, 1] & 0x40) != 0))[0][:4]
+    pat_packets = [memoryview(table[row].tobytes()) for row in pat_rows]
+
+    # Continuidad: solo paquetes con payload y fuera del PID nulo, agrupados por PID en orden
+    with_payload = ((table[:, 3] & 0x10) != 0) & (pid != NULL_PID)
+    rows = np.nonzero(with_payload)[0]
+    order = rows[np.argsort(pid[rows], kind='stable')]
+    cc_errors = 0
+    if len(order) > 1:
+        sorted_pid = pid[order]
+        cc = (table[order, 3] & 0x0F).astype(np.int16)
+        same_pid = sorted_pid[1:] == sorted_pid[:-1]
+        step = (cc[1:] - cc[:-1]) % 16
+        bad = same_pid & (step != 1) & (step != 0)
+        if bad.any():
+            # Los saltos marcados con discontinuity_indicator son legítimos
+            current = table[order[1:][bad]]
+            discontinuity = ((current[:, 3] & 0x20) != 0) & (current[:, 4] > 0) & ((current[:, 5] & 0x80) != 0)
+            cc_errors = int(np.count_nonzero(~discontinuity))
+    return sync_errors, cc_errors, pids, pat_packets
+
+
+def validate_ts_bytes(data, require_tables: bool = True,
+                      max_error_ratio: float = DEFAULT_MAX_ERROR_RATIO) -> Dict[str, object]:
+    """
+    Valida un segmento MPEG-TS completo en memoria.
+
+    Args:
+        data: bytes, bytearray, memoryview o mmap con el segmento
+        require_tables: Exigir PAT y PMT en el segmento (cada segmento HLS las repite)
+        max_error_ratio: Fracción tolerada de paquetes sin sync o con salto de continuidad
+
+    Returns:
+        Dict: {'valid', 'reason', 'packets', 'sync_errors', 'cc_errors', 'has_pat', 'has_pmt'}
+    """
+    report: Dict[str, object] = {'valid': False, 'reason': '', 'packets': 0, 'sync_errors': 0,
+                                 'cc_errors': 0, 'has_pat': False, 'has_pmt': False}
+    view = memoryview(data)
+    if len(view) < TS_PACKET_SIZE:
+        report['reason'] = 'menos de un paquete TS'
+        return report
+    offset = find_sync_offset(view)
+    if offset is None:
+        report['reason'] = 'sin sync byte 0x47 cada 188 bytes'
+        return report
+
+    packets = (len(view) - offset) // TS_PACKET_SIZE
+    if NUMPY_AVAILABLE:
+        sync_errors, cc_errors, pids, pat_packets = _scan_numpy(data, offset, packets)
+    else:
+        sync_errors, cc_errors, pids, pat_packets = _scan_python(view, offset, packets)
+
+    pmt_pids: Set[int] = set()
+    for packet in pat_packets:
+        pmt_pids |= _parse_pat(packet)
+    report.update({
+        'packets': packets,
+        'sync_errors': sync_errors,
+        'cc_errors': cc_errors,
+        'has_pat': PAT_PID in pids,
+        'has_pmt': bool(pmt_pids & pids)
+    })
+
+    tolerance = max(1, int(packets * max_error_ratio))
+    if sync_errors > tolerance:
+        report['reason'] = f'{sync_errors} paquetes sin sync byte'
+    elif cc_errors > tolerance:
+        report['reason'] = f'{cc_errors} saltos de contador de continuidad'
+    elif require_tables and not report['has_pat']:
+        report['reason'] = 'sin PAT'
+    elif require_tables and not report['has_pmt']:
+        report['reason'] = 'sin PMT'
+    else:
+        report['valid'] = True
+    return report
+
+
+def validate_ts_file(path: str, require_tables: bool = True,
+                     max_error_ratio: float = DEFAULT_MAX_ERROR_RATIO) -> Dict[str, object]:
+    """Valida un archivo .ts mapeándolo en memoria (sin copiarlo a un bytes)"""
+    try:
+        with open(path, 'rb') as f:
+            if os.fstat(f.fileno()).st_size == 0:
+                return {'valid': False, 'reason': 'archivo vacío', 'packets': 0}
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                report = validate_ts_bytes(mapped, require_tables, max_error_ratio)
+                return report
+    except (OSError, ValueError) as e:
+        return {'valid': False, 'reason': str(e), 'packets': 0}
+
+
+def _validate_file_task(args) -> Dict[str, object]:
+    return validate_ts_file(*args)
+
+
+def validate_ts_files(paths: Sequence[str], workers: Optional[int] = None, require_tables: bool = True,
+                      max_error_ratio: float = DEFAULT_MAX_ERROR_RATIO) -> Dict[str, Dict[str, object]]:
+    """
+    Valida muchos segmentos repartiéndolos en un pool de procesos.
+
+    Returns:
+        Dict: ruta -> informe de validate_ts_bytes
+    """
+    tasks: List[tuple] = [(path, require_tables, max_error_ratio) for path in paths]
+    if len(tasks) < MIN_FILES_FOR_POOL or (workers is not None and workers <= 1):
+        return {path: _validate_file_task(task) for path, task in zip(paths, tasks)}
+
+    workers = workers or os.cpu_count() or 2
+    chunksize = max(1, len(tasks) // (workers * 4))
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        reports = executor.map(_validate_file_task, tasks, chunksize=chunksize)
+        return dict(zip(paths, reports))
@@ -0,0 +1,174 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Selección de Variante de un Master Playlist
+===========================================
+
+Hasta ahora se descargaba la última línea .m3u8 del master, que no tiene por
+qué ser ni la mejor ni la pedida. La elección se hace ahora con los atributos
+BANDWIDTH y RESOLUTION de #EXT-X-STREAM-INF según el parámetro `quality`:
+
+- 'best' / 'worst': mayor / menor BANDWIDTH (a igualdad, mayor resolución)
+- '1080p', '720p', '480p'...: la mejor variante que no supera esa altura
+  (si todas la superan, la de menor altura)
+- 'auto': se descargan los primeros segmentos de la variante más alta para
+  medir el caudal real y se elige la mejor variante que terminaría dentro
+  del presupuesto de tiempo (en un directo, la que se descarga más rápido
+  de lo que se emite)
+
+La medición es el caudal de cada conexión (las que fallan no cuentan), que
+se multiplica por los workers con los que se va a descargar: la descarga
+real usa decenas de conexiones, no una. Los segmentos de la medición se
+guardan y, si gana esa variante, son los primeros de la descarga.
+"""
+
+import os
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, List, Optional, Sequence, Tuple
+
+import requests
+
+from m3u8_playlist import MediaSegment, VariantStream
+
+QUALITY_PRESETS = ('auto', 'best', 'worst')
+# Presupuesto de tiempo por defecto del modo 'auto' (segundos)
+DEFAULT_TIME_BUDGET = 15 * 60
+# Segmentos descargados (en paralelo) para medir el caudal en modo 'auto'
+PROBE_SEGMENTS = 3
+# Fracción del caudal medido con la que se planifica (margen para variaciones de la red)
+THROUGHPUT_SAFETY = 0.8
+
+_HEIGHT_RE = re.compile(r'^(\d{3,4})p?$')
+
+
+def quality_height(quality: str) -> Optional[int]:
+    """Altura pedida en '1080p' / '720' (None para 'best', 'worst', 'auto' o valores no reconocidos)"""
+    match = _HEIGHT_RE.match((quality or '').strip().lower())
+    return int(match.group(1)) if match else None
+
+
+def variant_rank(variant: VariantStream) -> Tuple[int, int]:
+    """Clave de orden de calidad: BANDWIDTH (o AVERAGE-BANDWIDTH) y después altura"""
+    return (variant.bandwidth or variant.average_bandwidth or 0, variant.height)
+
+
+def select_variant(variants: Sequence[VariantStream], quality: str = 'best') -> VariantStream:
+    """
+    Variante que corresponde a quality sin medir la red ('auto' se trata como 'best').
+
+    Raises:
+        ValueError: Si no hay variantes
+    """
+    if not variants:
+        raise ValueError("El master playlist no contiene variantes")
+    ranked = sorted(variants, key=variant_rank)
+    quality = (quality or 'best').strip().lower()
+    if quality == 'worst':
+        return ranked[0]
+    height = quality_height(quality)
+    if height is None or not any(variant.height for variant in ranked):
+        return ranked[-1]
+    fitting = [variant for variant in ranked if variant.height and variant.height <= height]
+    if fitting:
+        return fitting[-1]
+    # Todas superan la altura pedida: la más baja que declare resolución
+    return min((variant for variant in ranked if variant.height), key=lambda variant: (variant.height, variant_rank(variant)))
+
+
+def estimate_download_seconds(variant: VariantStream, content_seconds: float, throughput: float) -> Optional[float]:
+    """Segundos para descargar content_seconds de la variante a throughput bytes/s (None sin BANDWIDTH)"""
+    bandwidth = variant.average_bandwidth or variant.bandwidth
+    if not bandwidth or throughput <= 0:
+        return None
+    return bandwidth / 8 * content_seconds / throughput
+
+
+def select_for_throughput(variants: Sequence[VariantStream], throughput: float, content_seconds: float,
+                          time_budget: float) -> Tuple[VariantStream, Optional[float]]:
+    """
+    Mejor variante cuya descarga estimada cabe en time_budget.
+
+    Args:
+        variants: Variantes del master
+        throughput: Caudal medido en bytes/s
+        content_seconds: Duración del contenido a descargar (suma de #EXTINF)
+        time_budget: Segundos disponibles para la descarga
+
+    Returns:
+        (variante, segundos estimados); la variante más baja si ninguna cabe
+    """
+    usable = throughput * THROUGHPUT_SAFETY
+    ranked = sorted(variants, key=variant_rank, reverse=True)
+    for variant in ranked:
+        estimate = estimate_download_seconds(variant, content_seconds, usable)
+        if estimate is not None and estimate <= time_budget:
+            return variant, estimate
+    lowest = ranked[-1]
+    return lowest, estimate_download_seconds(lowest, content_seconds, usable)
+
+
+def measure_throughput(session, segments: Sequence[MediaSegment], timeout: float = 15,
+                       on_chunk: Optional[Callable[[int], None]] = None,
+                       paths: Optional[Sequence[str]] = None) -> Tuple[Optional[float], List[Optional[int]]]:
+    """
+    Caudal por conexión (bytes/s) descargando en paralelo los segmentos dados.
+
+    Cada petición se cronometra por separado y las que fallan no cuentan: un
+    timeout no rebaja la medición del resto.
+
+    Args:
+        session: requests.Session con la que pedirlos
+        segments: Segmentos de muestra (normalmente los primeros PROBE_SEGMENTS)
+        timeout: Timeout de cada petición
+        on_chunk: Callback con los bytes de cada trozo (p. ej. el limitador de ancho de banda)
+        paths: Archivo donde guardar cada muestra (None = se descartan)
+
+    Returns:
+        (bytes/s medio de las conexiones que terminaron o None, bytes de cada muestra o None si falló)
+    """
+    def fetch(job: Tuple[MediaSegment, Optional[str]]) -> Tuple[Optional[int], float]:
+        segment, path = job
+        headers = {'Range': segment.range_header} if segment.range_header else None
+        received = 0
+        partial = f'{path}.part' if path else None
+        start = time.time()
+        try:
+            with session.get(segment.url, headers=headers, stream=True, timeout=timeout) as response:
+                response.raise_for_status()
+                with open(partial, 'wb') if partial else _NullSink() as output:
+                    for chunk in response.iter_content(chunk_size=64 * 1024):
+                        received += len(chunk)
+                        output.write(chunk)
+                        if on_chunk:
+                            on_chunk(len(chunk))
+        except (requests.exceptions.RequestException, OSError):
+            if partial and os.path.exists(partial):
+                os.remove(partial)
+            return None, 0.0
+        elapsed = time.time() - start
+        if partial:
+            os.replace(partial, path)
+        return (received or None), elapsed
+
+    if not segments:
+        return None, []
+    jobs = list(zip(segments, paths if paths is not None else [None] * len(segments)))
+    with ThreadPoolExecutor(max_workers=len(jobs)) as executor:
+        results = list(executor.map(fetch, jobs))
+    rates = [size / elapsed for size, elapsed in results if size and elapsed > 0]
+    return (sum(rates) / len(rates) if rates else None), [size for size, _ in results]
+
+
+class _NullSink:
+    """Destino de las muestras que no se guardan"""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc) -> bool:
+        return False
+
+    def write(self, data: bytes) -> None:
+        pass